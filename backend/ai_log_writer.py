@@ -0,0 +1,246 @@
+"""ai_messages write-behind logger.
+
+Endpoint'ler log kaydını kuyruğa bırakır, arka plan thread'i kayıtları
+AI_LOG_BATCH_SIZE satırda bir ya da AI_LOG_FLUSH_MS'de bir tek bulk INSERT
+ile yazar. Satır ID'si gereken çağıranlar (ör. risk detection için
+lab_summary_id) log_ai_message_sync / async_create_ai_message kullanır.
+
+Kuyruk doluyken event loop thread'inden (async handler'lar) gelen kayıtlar
+beklemeden default executor'da yazılır; loop bloklanmaz. Diğer thread'ler
+AI_LOG_ENQUEUE_TIMEOUT_S kadar bekler, sonra kaydı kendi thread'inde yazar.
+"""
+import asyncio
+import atexit
+import datetime
+import queue
+import threading
+import time
+
+from backend.config import AI_LOG_BATCH_SIZE, AI_LOG_FLUSH_MS, AI_LOG_QUEUE_MAX, AI_LOG_ENQUEUE_TIMEOUT_S
+from backend.db import SessionLocal, bulk_create_ai_messages, create_ai_message
+from backend.metrics import REGISTRY, CallbackMetric, register_queue
+from backend.log_utils import get_logger
+
+logger = get_logger("ai_log_writer")
+
+
+class AIMessageWriter:
+    """Bounded kuyruk + tek writer thread ile toplu ai_messages yazımı"""
+
+    def __init__(self, batch_size: int, flush_ms: int, max_queue: int, enqueue_timeout: float):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(flush_ms, 1) / 1000.0
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "sync_fallback": 0,
+            "offloaded": 0,
+            "failed": 0,
+        }
+
+    def _bump(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def start(self):
+        """Writer thread'i başlat (idempotent)"""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ai-log-writer", daemon=True)
+            self._thread.start()
+
+    def enqueue(
+        self,
+        external_user_id: str | None,
+        message_type: str,
+        request_payload: dict | None,
+        response_payload: dict | None,
+        model_used: str | None = None,
+    ):
+        """Kaydı kuyruğa al. Kuyruk doluysa: loop thread'inde executor'a devredilir, diğer thread'lerde çağıran yazar."""
+        row = {
+            "external_user_id": external_user_id,
+            "message_type": message_type,
+            "request_payload": request_payload,
+            "response_payload": response_payload,
+            "model_used": model_used,
+            # Sıralama flush zamanına değil istek zamanına göre olsun
+            "created_at": datetime.datetime.utcnow(),
+        }
+        self._put([row])
+
+    def enqueue_many(self, rows: list[dict]):
+        """Birden çok kaydı kuyruğa al (ör. /ai/lab/batch test sonuçları); writer thread'i aynı bulk INSERT'te birleştirir"""
+        now = datetime.datetime.utcnow()
+        self._put([{"model_used": None, "created_at": now, **row} for row in rows])
+
+    def _put(self, rows: list[dict]):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if self._stop.is_set():
+            self._write_overflow(rows, loop)
+            return
+        self.start()
+        overflow = []
+        for row in rows:
+            try:
+                if loop is not None or overflow:
+                    # Event loop thread'i kuyrukta beklemez
+                    self._queue.put_nowait(row)
+                else:
+                    self._queue.put(row, timeout=self.enqueue_timeout)
+                self._bump("enqueued")
+            except queue.Full:
+                overflow.append(row)
+        if overflow:
+            logger.warning(f"ai_messages kuyruğu dolu ({self._queue.maxsize}), {len(overflow)} kayıt kuyruk dışında yazılıyor")
+            self._write_overflow(overflow, loop)
+
+    def _write_overflow(self, rows: list[dict], loop: asyncio.AbstractEventLoop | None):
+        if loop is None:
+            self._bump("sync_fallback", len(rows))
+            self._write(rows)
+            return
+        # Loop thread'inde sync INSERT yapılmaz; _write hataları kendisi loglar
+        self._bump("offloaded", len(rows))
+        loop.run_in_executor(None, self._write, rows)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _drain(self, limit: int) -> list:
+        rows = []
+        while len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, rows: list):
+        if not rows:
+            return
+        db = SessionLocal()
+        try:
+            bulk_create_ai_messages(db, rows)
+            self._bump("written", len(rows))
+            self._bump("batches")
+            return
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"ai_messages bulk insert hatası ({len(rows)} satır), tek tek deneniyor: {e}")
+        finally:
+            db.close()
+
+        # Toplu yazım başarısızsa satırları tek tek dene; bozuk tek kayıt tüm batch'i kaybettirmesin
+        for row in rows:
+            db = SessionLocal()
+            try:
+                bulk_create_ai_messages(db, [row])
+                self._bump("written")
+            except Exception as e:
+                db.rollback()
+                self._bump("failed")
+                logger.error(f"ai_messages kaydı yazılamadı (user={row.get('external_user_id')}, type={row.get('message_type')}): {e}")
+            finally:
+                db.close()
+
+    def flush(self):
+        """Kuyrukta bekleyenleri çağıran thread'de hemen yaz"""
+        while True:
+            rows = self._drain(self.batch_size)
+            if not rows:
+                break
+            self._write(rows)
+
+    def stop(self, timeout: float = 10.0):
+        """Shutdown: writer thread'i durdur ve kuyrukta kalan her şeyi yaz"""
+        self._stop.set()
+        thread = self._thread
+        if thread and thread.is_alive():
+            thread.join(timeout=timeout)
+        self.flush()
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["queue_depth"] = self.queue_depth()
+        return stats
+
+
+ai_log_writer = AIMessageWriter(
+    batch_size=AI_LOG_BATCH_SIZE,
+    flush_ms=AI_LOG_FLUSH_MS,
+    max_queue=AI_LOG_QUEUE_MAX,
+    enqueue_timeout=AI_LOG_ENQUEUE_TIMEOUT_S,
+)
+
+# Uygulama shutdown event'i çalışmasa bile process çıkışında kuyruk boşaltılsın
+atexit.register(ai_log_writer.stop)
+
+register_queue("ai_log_writer", ai_log_writer.queue_depth)
+REGISTRY.register(CallbackMetric(
+    "longo_ai_log_writer_rows_total", "Write-behind logger satır sayaçları", ("result",),
+    lambda: {(key,): value for key, value in ai_log_writer.get_stats().items() if key != "queue_depth"},
+    kind="counter",
+))
+
+
+def log_ai_message(
+    external_user_id: str | None,
+    message_type: str,
+    request_payload: dict | None,
+    response_payload: dict | None,
+    model_used: str | None = None,
+):
+    """ai_messages kaydını write-behind kuyruğa bırak (ID dönmez)"""
+    ai_log_writer.enqueue(external_user_id, message_type, request_payload, response_payload, model_used)
+
+
+def log_ai_messages_bulk(rows: list[dict]):
+    """Birden çok ai_messages kaydını write-behind kuyruğa bırak (ID dönmez)"""
+    ai_log_writer.enqueue_many(rows)
+
+
+def log_ai_message_sync(
+    external_user_id: str | None,
+    message_type: str,
+    request_payload: dict | None,
+    response_payload: dict | None,
+    model_used: str | None = None,
+):
+    """Senkron-ID modu: kaydı hemen yazar ve satırı döndürür (row id gereken çağıranlar için)"""
+    db = SessionLocal()
+    try:
+        return create_ai_message(db, external_user_id, message_type, request_payload, response_payload, model_used)
+    finally:
+        db.close()
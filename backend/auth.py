@@ -1,6 +1,6 @@
 from fastapi import Header, HTTPException
 from sqlalchemy.orm import Session
-from backend.db import SessionLocal
+from backend.db import SessionLocal, AsyncSessionLocal
 import time
 
 def get_db():
@@ -10,5 +10,39 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """async def handler'lar için AsyncSession (event loop'u bloklamaz)"""
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async DB sürücüsü kurulu değil (aiosqlite / asyncpg).")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Basic Authentication
+def check_basic_auth(username: str, password: str):
+    """Basit authentication kontrolü"""
+    from backend.config import AUTH_USERNAME, AUTH_PASSWORD
+    if username == AUTH_USERNAME and password == AUTH_PASSWORD:
+        return True
+    return False
+
+def get_current_user(username: str = Header(None), password: str = Header(None)):
+    """Header'dan username/password al ve kontrol et"""
+    if not username or not password:
+        raise HTTPException(status_code=401, detail="Username ve password gerekli")
+    
+    if not check_basic_auth(username, password):
+        raise HTTPException(status_code=401, detail="Geçersiz kullanıcı adı veya şifre")
+    
+    return username
+
+def validate_chat_user_id(user_id: str, user_plan: str) -> bool:
+    """Chat için user ID validasyonu (Free: Session ID, Premium: Real ID)"""
+    if user_plan in ['premium', 'premium_plus']:
+        # Premium için session ID kabul etme
+        return not user_id.startswith('session-')
+    else:
+        # Free için her türlü ID kabul et
+        return True
+
 # get_or_create_user function removed - User model not used in production
 # All user data is managed via external_user_id in ai_messages table
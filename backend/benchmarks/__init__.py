@@ -0,0 +1 @@
+"""Performans ölçüm script'leri (python -m backend.benchmarks.<modül>)."""
@@ -0,0 +1,94 @@
+"""Sync Session vs AsyncSession: eşzamanlı istek throughput karşılaştırması.
+
+Her simüle istek chat handler'ının DB desenini izler: geçmişi oku, LLM
+bekleme süresi kadar await et, ai_messages'a yaz.
+
+    python -m backend.benchmarks.async_db --requests 200 --concurrency 50
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+def _setup_env() -> str:
+    # backend.db import edilmeden önce geçici bir SQLite dosyası seç
+    path = os.path.join(tempfile.mkdtemp(prefix="longo_bench_"), "bench.db")
+    os.environ["DB_TYPE"] = "sqlite"
+    os.environ["DB_PATH"] = path
+    return path
+
+
+async def _run(label: str, handler, total: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with sem:
+            await handler(f"bench_user_{i % 50}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    rps = total / elapsed if elapsed else 0.0
+    print(f"{label:<14} {total} istek, {elapsed:.2f}s, {rps:.1f} req/s")
+    return rps
+
+
+async def main(total: int, concurrency: int, llm_ms: int, seed_rows: int):
+    from backend import db as dbm
+
+    if dbm.AsyncSessionLocal is None:
+        raise SystemExit("aiosqlite kurulu değil - pip install -r requirements.txt")
+
+    dbm.Base.metadata.create_all(bind=dbm.engine)
+    with dbm.SessionLocal() as session:
+        session.add_all([
+            dbm.AIMessage(
+                external_user_id=f"bench_user_{i % 50}",
+                message_type="chat",
+                request_payload={"message": f"soru {i}"},
+                response_payload={"reply": "cevap " * 40},
+                model_used="bench",
+            )
+            for i in range(seed_rows)
+        ])
+        session.commit()
+
+    llm_delay = llm_ms / 1000.0
+
+    async def sync_handler(user_id: str):
+        # Eski desen: async def içinde sync Session -> her sorgu event loop'u bloklar.
+        # Not: session await boyunca açık tutulursa concurrency sync pool boyutunu aştığında
+        # checkout bloklanmış loop içinde bekler ve kilitlenir; ölçüm için bağlantı await öncesi bırakılır.
+        with dbm.SessionLocal() as session:
+            dbm.get_user_ai_messages_by_type(session, user_id, "chat", limit=20)
+        await asyncio.sleep(llm_delay)
+        with dbm.SessionLocal() as session:
+            dbm.create_ai_message(session, user_id, "chat", {"message": "x"}, {"reply": "y"}, "bench")
+
+    async def async_handler(user_id: str):
+        async with dbm.AsyncSessionLocal() as session:
+            await dbm.async_get_user_ai_messages_by_type(session, user_id, "chat", limit=20)
+            await asyncio.sleep(llm_delay)
+            await dbm.async_create_ai_message(session, user_id, "chat", {"message": "x"}, {"reply": "y"}, "bench")
+
+    print(f"concurrency={concurrency}, llm_delay={llm_ms}ms, seed_rows={seed_rows}")
+    before = await _run("sync Session", sync_handler, total, concurrency)
+    after = await _run("AsyncSession", async_handler, total, concurrency)
+    if before:
+        print(f"hızlanma: x{after / before:.2f}")
+    await dbm.async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--llm-ms", type=int, default=50)
+    parser.add_argument("--seed-rows", type=int, default=5000)
+    args = parser.parse_args()
+    _setup_env()
+    asyncio.run(main(args.requests, args.concurrency, args.llm_ms, args.seed_rows))
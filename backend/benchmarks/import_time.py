@@ -0,0 +1,118 @@
+"""Cold start profili: `import backend.main` süresi ve ilk /health yanıtına kadar geçen süre.
+
+Her tekrar temiz bir process'te `python -X importtime` ile çalışır; toplam
+import süresinin medyanı ve kümülatif süreye göre en pahalı modüller
+raporlanır. --serve ile uvicorn başlatılıp ilk 200 /health yanıtına kadar
+geçen süre (import + startup hook'ları) de ölçülür.
+
+    python -m backend.benchmarks.import_time --runs 5 --top 25 --serve
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _env(scratch: str) -> dict:
+    return {
+        **os.environ,
+        "OPENROUTER_API_KEY": os.getenv("OPENROUTER_API_KEY", "import-bench"),
+        "DB_TYPE": "sqlite",
+        "DB_PATH": os.path.join(scratch, "import.db"),
+        "LOG_LEVEL": "WARNING",
+    }
+
+
+def profile_import(module: str, scratch: str) -> tuple[float, dict[str, tuple[int, int]]]:
+    """(toplam saniye, {modül: (self_us, cumulative_us)})"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, env=_env(scratch), capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    modules = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            modules[m.group(4)] = (int(m.group(1)), int(m.group(2)))
+    return elapsed, modules
+
+
+def time_to_first_health(scratch: str, timeout: float = 60.0) -> float:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    import httpx
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=_env(scratch), stdout=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.02)
+        raise RuntimeError("/health zaman aşımı")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=15)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="backend.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20, help="Gösterilecek en pahalı modül sayısı")
+    parser.add_argument("--serve", action="store_true", help="uvicorn ile ilk /health süresini de ölç")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="longo_import_")
+    totals, cumulative = [], {}
+    for _ in range(args.runs):
+        elapsed, modules = profile_import(args.module, scratch)
+        totals.append(elapsed)
+        for name, (_, cum) in modules.items():
+            cumulative.setdefault(name, []).append(cum)
+
+    print(f"{args.module} import (process dahil): medyan {statistics.median(totals) * 1000:.0f} ms, "
+          f"min {min(totals) * 1000:.0f} ms ({args.runs} tekrar)")
+    own = cumulative.get(args.module)
+    if own:
+        print(f"  {args.module} kümülatif import: {statistics.median(own) / 1000:.0f} ms")
+    print(f"\n{'kümülatif ms':>12}  modül")
+    ranked = sorted(cumulative.items(), key=lambda kv: statistics.median(kv[1]), reverse=True)
+    shown = 0
+    for name, values in ranked:
+        if name == args.module:
+            continue
+        print(f"{statistics.median(values) / 1000:>12.1f}  {name}")
+        shown += 1
+        if shown >= args.top:
+            break
+
+    if args.serve:
+        ttfh = [time_to_first_health(scratch) for _ in range(args.runs)]
+        print(f"\nuvicorn başlangıcından ilk /health 200'e: medyan {statistics.median(ttfh) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""Offline yük testi: sahte OpenRouter + Ideasoft XML'e karşı gerçek uvicorn worker'ları.
+
+Her --workers değeri için `uvicorn backend.main:app --workers N` geçici bir
+SQLite DB ile başlatılır; OPENROUTER_BASE_URL ve XML_PRODUCTS_URL yerel
+mock_openrouter sunucusuna yönlendirilir (gerçek token harcanmaz). Senaryolar
+(chat, quiz, lab, premium-plus, wellness-plan, medical-id unlock) --concurrency sanal
+kullanıcıyla --duration saniye koşturulur; senaryo/worker başına p50/p95/p99,
+RPS ve hata oranı raporlanır. --baseline verilirse p95 --max-regression
+oranından fazla kötüleşen senaryolarda exit code 1 döner.
+
+    python -m backend.benchmarks.load_test --workers 1,2,4 --concurrency 16 --duration 20 --out run.json
+    python -m backend.benchmarks.load_test --baseline run.json --rate-429 0.02 --malformed-rate 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from backend.benchmarks.mock_openrouter import MockServer, add_mock_arguments, config_from_args
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+AUTH_HEADERS = {"username": "longopass", "password": "change_this_password"}
+PREMIUM, PREMIUM_PLUS = 2, 3
+
+LAB_TESTS = [
+    {"name": "Glukoz", "value": "110", "unit": "mg/dL", "reference_range": "70-100"},
+    {"name": "Hemoglobin", "value": "13.5", "unit": "g/dL", "reference_range": "12-16"},
+    {"name": "Ferritin", "value": "18", "unit": "ng/mL", "reference_range": "20-250"},
+    {"name": "D Vitamini", "value": "22", "unit": "ng/mL", "reference_range": "30-100"},
+]
+QUIZ_ANSWERS = {
+    "age": 38, "gender": "female", "height": 168, "weight": 64,
+    "activity_level": "orta", "sleep_hours": 6, "diet": "karışık",
+    "health_goals": ["enerji", "bağışıklık"], "chronic_conditions": [], "medications": [],
+}
+CHAT_MESSAGES = [
+    "Son zamanlarda çok yorgun hissediyorum, ne önerirsin?",
+    "D vitamini takviyesi ne zaman alınmalı?",
+    "Uyku kalitemi artırmak için neler yapabilirim?",
+    "Magnezyum ile çinko birlikte alınabilir mi?",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[idx]
+
+
+class VirtualUser:
+    """Sanal kullanıcı: kendi x-user-id'si, chat konuşması ve medical-id token'ı"""
+
+    def __init__(self, client, index: int):
+        self.client = client
+        self.user_id = f"load_user_{index}"
+        self.conversation_id: int | None = None
+        self.medical_token: str | None = None
+
+    def headers(self, level: int) -> dict:
+        return {**AUTH_HEADERS, "x-user-id": self.user_id, "x-user-level": str(level)}
+
+    async def chat(self):
+        if self.conversation_id is None:
+            r = await self.client.post("/ai/chat/start", json={}, headers=self.headers(PREMIUM))
+            r.raise_for_status()
+            self.conversation_id = r.json()["conversation_id"]
+        return await self.client.post(
+            "/ai/chat",
+            json={"message": random.choice(CHAT_MESSAGES), "conversation_id": self.conversation_id},
+            headers=self.headers(PREMIUM),
+        )
+
+    async def quiz(self):
+        return await self.client.post("/ai/quiz", json={"quiz_answers": QUIZ_ANSWERS}, headers=self.headers(PREMIUM))
+
+    async def lab_single(self):
+        return await self.client.post("/ai/lab/single", json={"test": random.choice(LAB_TESTS)}, headers=self.headers(PREMIUM))
+
+    async def lab_session(self):
+        return await self.client.post("/ai/lab/session", json={"session_tests": LAB_TESTS}, headers=self.headers(PREMIUM))
+
+    async def lab_summary(self):
+        return await self.client.post("/ai/lab/summary", json={"tests": LAB_TESTS}, headers=self.headers(PREMIUM))
+
+    async def premium_plus(self):
+        path = random.choice([
+            "/ai/premium-plus/diet-recommendations",
+            "/ai/premium-plus/exercise-recommendations",
+            "/ai/premium-plus/lifestyle-recommendations",
+        ])
+        return await self.client.post(path, headers=self.headers(PREMIUM_PLUS))
+
+    async def wellness_plan(self):
+        return await self.client.post("/ai/premium-plus/wellness-plan", headers=self.headers(PREMIUM_PLUS))
+
+    async def medical_id_unlock(self):
+        if self.medical_token is None:
+            r = await self.client.post(
+                "/ai/medical-id/form",
+                json={"form": {"full_name": f"Yük Testi {self.user_id}", "blood_type": "A+"}},
+                headers=self.headers(PREMIUM),
+            )
+            r.raise_for_status()
+            self.medical_token = r.json()["token"]
+        return await self.client.post(f"/m/{self.medical_token}/unlock", json={"pin": "1234"})
+
+
+SCENARIOS = {
+    "chat": VirtualUser.chat,
+    "quiz": VirtualUser.quiz,
+    "lab_single": VirtualUser.lab_single,
+    "lab_session": VirtualUser.lab_session,
+    "lab_summary": VirtualUser.lab_summary,
+    "premium_plus": VirtualUser.premium_plus,
+    "wellness_plan": VirtualUser.wellness_plan,
+    "medical_id_unlock": VirtualUser.medical_id_unlock,
+}
+
+
+async def run_scenario(base_url: str, name: str, concurrency: int, duration: float, timeout: float) -> dict:
+    import httpx
+
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        action = SCENARIOS[name]
+        deadline = time.perf_counter() + duration
+
+        async def worker(index: int):
+            user = VirtualUser(client, index)
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await action(user)
+                    key = str(response.status_code)
+                except Exception as e:
+                    key = type(e).__name__
+                elapsed = time.perf_counter() - start
+                statuses[key] = statuses.get(key, 0) + 1
+                if key == "200":
+                    latencies.append(elapsed)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    total = sum(statuses.values())
+    return {
+        "requests": total,
+        "ok": len(latencies),
+        "error_rate": round(1 - len(latencies) / total, 4) if total else 0.0,
+        "rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+        "statuses": statuses,
+    }
+
+
+def _start_app(workers: int, port: int, mock_url: str, scratch: str, show_logs: bool) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "OPENROUTER_API_KEY": os.getenv("OPENROUTER_API_KEY", "load-test"),
+        "OPENROUTER_BASE_URL": f"{mock_url}/api/v1",
+        "XML_PRODUCTS_URL": f"{mock_url}/ideasoft.xml",
+        "DB_TYPE": "sqlite",
+        "DB_PATH": os.path.join(scratch, f"load_{workers}w.db"),
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    }
+    cmd = [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+           "--port", str(port), "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    return subprocess.Popen(cmd, cwd=REPO_ROOT, env=env, stdout=None if show_logs else subprocess.DEVNULL)
+
+
+def _wait_healthy(url: str, proc: subprocess.Popen, timeout: float = 60.0):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn erken kapandı (exit {proc.returncode})")
+        try:
+            # /ready: warm-up bitmiş worker'lar ölçülsün (ilk istek cold start maliyeti ödemesin)
+            if httpx.get(f"{url}/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError("uvicorn /ready zaman aşımı")
+
+
+def _stop_app(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def _print_table(results: dict):
+    print(f"{'workers':>7} {'scenario':<18} {'req':>6} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'err%':>6}")
+    for workers, scenarios in results.items():
+        for name, r in scenarios.items():
+            print(f"{workers:>7} {name:<18} {r['requests']:>6} {r['rps']:>7} {r['p50_ms']:>8} "
+                  f"{r['p95_ms']:>8} {r['p99_ms']:>8} {r['error_rate'] * 100:>6.1f}")
+
+
+def _compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """p95'i baseline'a göre max_regression oranından fazla artan (workers, senaryo) çiftleri"""
+    failures = []
+    for workers, scenarios in results.items():
+        for name, r in scenarios.items():
+            base = baseline.get(workers, {}).get(name)
+            if not base or not base.get("p95_ms"):
+                continue
+            change = r["p95_ms"] / base["p95_ms"] - 1
+            print(f"  {workers}w {name:<18} p95 {base['p95_ms']} -> {r['p95_ms']} ms ({change:+.1%})")
+            if change > max_regression:
+                failures.append(f"{workers}w/{name}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="Virgülle ayrılmış uvicorn worker sayıları")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Virgülle ayrılmış senaryolar")
+    parser.add_argument("--concurrency", type=int, default=16, help="Eşzamanlı sanal kullanıcı")
+    parser.add_argument("--duration", type=float, default=20.0, help="Senaryo başına saniye")
+    parser.add_argument("--timeout", type=float, default=60.0, help="İstek timeout'u")
+    parser.add_argument("--mock-port", type=int, default=0)
+    parser.add_argument("--app-logs", action="store_true", help="Uygulama stdout'unu gizleme")
+    parser.add_argument("--out", help="Sonuçları JSON olarak yaz")
+    parser.add_argument("--baseline", help="Önceki --out dosyası; p95 regresyonu kontrol edilir")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="İzin verilen p95 artış oranı")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"bilinmeyen senaryo: {', '.join(sorted(unknown))}")
+
+    mock = MockServer(config_from_args(args), port=args.mock_port or _free_port()).start()
+    scratch = tempfile.mkdtemp(prefix="longo_load_")
+    results: dict[str, dict] = {}
+    try:
+        for workers in [int(w) for w in args.workers.split(",")]:
+            port = _free_port()
+            url = f"http://127.0.0.1:{port}"
+            proc = _start_app(workers, port, mock.base_url, scratch, args.app_logs)
+            try:
+                _wait_healthy(url, proc)
+                results[str(workers)] = {}
+                for name in scenarios:
+                    print(f"▶ {workers} worker / {name} ({args.concurrency} kullanıcı, {args.duration:.0f}s)")
+                    results[str(workers)][name] = asyncio.run(
+                        run_scenario(url, name, args.concurrency, args.duration, args.timeout)
+                    )
+            finally:
+                _stop_app(proc)
+    finally:
+        mock.stop()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print()
+    _print_table(results)
+    print(f"\nmock: {mock.cfg.stats}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps({
+            "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+            "results": results,
+        }, indent=2, ensure_ascii=False))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())["results"]
+        print(f"\nBaseline karşılaştırma (izin verilen p95 artışı {args.max_regression:.0%}):")
+        failures = _compare(results, baseline, args.max_regression)
+        if failures:
+            print(f"❌ p95 regresyonu: {', '.join(failures)}")
+            sys.exit(1)
+        print("✅ regresyon yok")
+
+
+if __name__ == "__main__":
+    main()
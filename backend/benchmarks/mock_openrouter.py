@@ -0,0 +1,255 @@
+"""Token harcamadan yük testi için yerel sahte OpenRouter + Ideasoft XML sunucusu.
+
+/api/v1/chat/completions OpenAI uyumlu yanıt döner: gecikme lognormal
+dağılımdan çekilir, belirli oranda 429 ve bozuk (kesik / ```json sarılı)
+JSON üretilir, stream=true ise SSE chunk'ları gönderilir. /ideasoft.xml
+verilen boyutta sahte ürün kataloğu döner.
+
+    python -m backend.benchmarks.mock_openrouter --port 8900 --latency-ms 800 --rate-429 0.02 --malformed-rate 0.05
+    # uygulama: OPENROUTER_BASE_URL=http://127.0.0.1:8900/api/v1 XML_PRODUCTS_URL=http://127.0.0.1:8900/ideasoft.xml
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 800.0  # Medyan gecikme
+    latency_sigma: float = 0.5  # Lognormal sigma (0 = sabit gecikme)
+    rate_429: float = 0.0
+    malformed_rate: float = 0.0
+    reply_chars: int = 600  # Chat yanıt uzunluğu
+    catalog_size: int = 120
+    stream_chunk_ms: float = 20.0
+    seed: int | None = None
+    stats: dict = field(default_factory=lambda: {"requests": 0, "rate_limited": 0, "malformed": 0, "streamed": 0})
+    seen_prefixes: set = field(default_factory=set)  # Provider prompt cache taklidi: görülmüş mesaj önekleri
+
+
+def sample_latency(cfg: MockConfig, rng: random.Random) -> float:
+    if cfg.latency_sigma <= 0:
+        return cfg.latency_ms / 1000
+    return rng.lognormvariate(math.log(max(cfg.latency_ms, 1.0)), cfg.latency_sigma) / 1000
+
+
+def build_catalog_xml(size: int) -> str:
+    """Ideasoft output XML formatında sahte katalog"""
+    categories = ["Longevity", "Günlük Takviyeler", "Vitaminler", "Mineraller", "Sporcu Takviyeleri"]
+    items = []
+    for i in range(size):
+        items.append(
+            "<item>"
+            f"<id>{100 + i}</id>"
+            f"<label>Takviye {i}</label>"
+            f"<mainCategory>{categories[i % len(categories)]}</mainCategory>"
+            f"<price>{199 + (i * 37) % 800}.90</price>"
+            f"<stockAmount>{(i * 13) % 50}</stockAmount>"
+            "</item>"
+        )
+    return "<?xml version=\"1.0\" encoding=\"UTF-8\"?><root>" + "".join(items) + "</root>"
+
+
+def _structured_reply() -> dict:
+    """Quiz / lab / premium-plus parser'larının baktığı alanların birleşimi"""
+    return {
+        "title": "Test Sonucu Yorumu",
+        "test_name": "Glukoz",
+        "last_result": "Son Test Sonucunuz: 110 mg/dL Yüksek",
+        "reference_range": "Referans Aralığı: 70-100 mg/dL",
+        "test_analysis": "Değer referans aralığının biraz üzerinde.",
+        "genel_saglik_durumu": "Genel durum iyi, glukoz takibi önerilir.",
+        "nutrition_advice": {"title": "Beslenme Önerileri", "recommendations": ["Rafine şekeri azaltın", "Lifli gıdalar tüketin"]},
+        "lifestyle_advice": {"title": "Yaşam Tarzı Önerileri", "recommendations": ["Haftada 150 dk yürüyüş"]},
+        "general_warnings": {"title": "Genel Uyarılar", "warnings": ["Doktorunuza danışın"]},
+        "supplement_recommendations": [
+            {"name": "Takviye 1", "description": "Destek", "daily_dose": "1 kapsül", "benefits": ["Enerji"], "warnings": [], "priority": "high"},
+            {"name": "Takviye 2", "description": "Destek", "daily_dose": "2 kapsül", "benefits": ["Bağışıklık"], "warnings": [], "priority": "medium"},
+        ],
+        "recommended_tests": [{"test_name": "HbA1c", "reason": "Glukoz yüksek", "benefit": "Uzun dönem takip"}],
+        "is_high_risk": False,
+        "risk_level": "low",
+    }
+
+
+_LAB_SINGLE_KEYS = ("title", "test_name", "last_result", "reference_range", "test_analysis")
+
+
+def _message_text(message: dict) -> str:
+    """content string ya da (cache_control'lü) content part listesi olabilir"""
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "".join(str(part.get("text", "")) for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def build_completion(cfg: MockConfig, body: dict, rng: random.Random) -> tuple[str, dict]:
+    messages = body.get("messages") or []
+    texts = [_message_text(m) for m in messages]
+    prompt_text = " ".join(texts)
+    wants_json = "json" in prompt_text.lower()
+    if wants_json:
+        reply = _structured_reply()
+        # /ai/lab/batch: prompt'taki her "[n] ..." test satırı için bir sonuç
+        batch_indexes = re.findall(r"^\[(\d+)\] ", prompt_text, flags=re.MULTILINE)
+        if batch_indexes:
+            reply = {"results": [{"index": int(i), **{k: reply[k] for k in _LAB_SINGLE_KEYS}} for i in batch_indexes]}
+        content = json.dumps(reply, ensure_ascii=False)
+        if rng.random() < cfg.malformed_rate:
+            cfg.stats["malformed"] += 1
+            # Gerçek modellerdeki gibi: code fence + yarıda kesilmiş JSON
+            content = "```json\n" + content[: int(len(content) * 0.7)]
+    else:
+        sentence = "Düzenli uyku, dengeli beslenme ve hareket sağlığınız için önemlidir. "
+        content = (sentence * (cfg.reply_chars // len(sentence) + 1))[: cfg.reply_chars]
+    usage = {
+        "prompt_tokens": max(1, len(prompt_text) // 4),
+        "completion_tokens": max(1, len(content) // 4),
+    }
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    # Daha önce görülmüş baştaki mesajlar cache'ten okunmuş sayılır (OpenAI usage formatı)
+    cached, prefix = 0, ""
+    for text in texts:
+        prefix += "\x00" + text
+        if prefix in cfg.seen_prefixes:
+            cached += len(text) // 4
+        else:
+            cfg.seen_prefixes.add(prefix)
+            break
+    usage["prompt_tokens_details"] = {"cached_tokens": min(cached, usage["prompt_tokens"])}
+    return content, usage
+
+
+def create_app(cfg: MockConfig):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+    app = FastAPI(title="mock-openrouter")
+    rng = random.Random(cfg.seed)
+    catalog = build_catalog_xml(cfg.catalog_size)
+
+    @app.get("/ideasoft.xml")
+    async def ideasoft_xml():
+        return Response(catalog, media_type="application/xml")
+
+    @app.get("/stats")
+    async def stats():
+        return cfg.stats
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        cfg.stats["requests"] += 1
+        delay = sample_latency(cfg, rng)
+        if rng.random() < cfg.rate_429:
+            cfg.stats["rate_limited"] += 1
+            await asyncio.sleep(min(delay, 0.05))
+            return JSONResponse({"error": {"code": 429, "message": "Rate limit exceeded"}}, status_code=429)
+
+        content, usage = build_completion(cfg, body, rng)
+        model = body.get("model", "mock/model")
+        created = int(time.time())
+
+        if body.get("stream"):
+            cfg.stats["streamed"] += 1
+
+            async def events():
+                # İlk token'a kadar gecikmenin yarısı, kalanı chunk'lara yayılır
+                await asyncio.sleep(delay / 2)
+                step = max(1, len(content) // 20)
+                for i in range(0, len(content), step):
+                    chunk = {"id": "mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                             "choices": [{"index": 0, "delta": {"content": content[i:i + step]}, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    await asyncio.sleep(cfg.stream_chunk_ms / 1000)
+                final = {"id": "mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+                yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(delay)
+        return {
+            "id": f"mock-{cfg.stats['requests']}",
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    return app
+
+
+class MockServer:
+    """Uvicorn'u arka plan thread'inde çalıştır (load_test.py içinden)"""
+
+    def __init__(self, cfg: MockConfig, host: str = "127.0.0.1", port: int = 8900):
+        import uvicorn
+
+        self.cfg = cfg
+        self.host = host
+        self.port = port
+        self._server = uvicorn.Server(uvicorn.Config(create_app(cfg), host=host, port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, name="mock-openrouter", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout: float = 10.0):
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("mock OpenRouter başlatılamadı")
+            time.sleep(0.05)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="Medyan LLM gecikmesi")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Lognormal sigma (0 = sabit)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="429 döndürülecek istek oranı")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Bozuk JSON döndürülecek oran")
+    parser.add_argument("--reply-chars", type=int, default=600)
+    parser.add_argument("--catalog-size", type=int, default=120, help="Sahte Ideasoft XML ürün sayısı")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args) -> MockConfig:
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        rate_429=args.rate_429,
+        malformed_rate=args.malformed_rate,
+        reply_chars=args.reply_chars,
+        catalog_size=args.catalog_size,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    server = MockServer(config_from_args(args), args.host, args.port).start()
+    print(f"mock OpenRouter: {server.base_url}/api/v1  XML: {server.base_url}/ideasoft.xml")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
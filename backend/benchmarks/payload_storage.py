@@ -0,0 +1,124 @@
+"""ai_messages payload depolama: legacy JSON vs sıkıştırılmış + dedup.
+
+Gerçek kullanım desenini taklit eder: her lab_summary kullanıcının tüm geçmiş
+testlerini (kullanıcıya özgü değer/tarihlerle, her panelde büyüyen liste) ve
+ortak katalog snapshot'ını tekrar gömer. Kullanıcılar arası test verisi
+paylaşılmaz; dedup kazancı kullanıcının kendi geçmişinden ve katalogdan gelir. Legacy satırlar yazılır, tablo boyutu ve
+okuma gecikmesi ölçülür, ardından compress_legacy_ai_message_payloads
+migration'ı çalıştırılıp aynı ölçümler tekrarlanır.
+
+    python -m backend.benchmarks.payload_storage --users 50 --summaries 20
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def _setup_env() -> str:
+    path = os.path.join(tempfile.mkdtemp(prefix="longo_bench_"), "bench.db")
+    os.environ["DB_TYPE"] = "sqlite"
+    os.environ["DB_PATH"] = path
+    return path
+
+
+def _catalog(size: int) -> list[dict]:
+    return [
+        {"id": 100 + i, "name": f"Takviye {i}", "category": "Longevity" if i % 2 else "Günlük Takviyeler"}
+        for i in range(size)
+    ]
+
+
+def _lab_tests(user: int, session_no: int, per_session: int) -> list[dict]:
+    rng = random.Random(user)  # Aynı kullanıcının geçmiş panelleri her özette aynı, kullanıcılar farklı
+    tests = []
+    for s in range(session_no + 1):
+        day = 1 + rng.randrange(28)
+        for t in range(per_session):
+            tests.append({
+                "name": f"Test {t}",
+                "value": f"{rng.uniform(5, 60):.1f}",
+                "unit": "mg/dL",
+                "reference_range": "10-40",
+                "test_date": f"2024-{1 + s % 12:02d}-{day:02d}",
+            })
+    return tests
+
+
+def _db_size(dbm, path: str) -> int:
+    from sqlalchemy import text
+
+    # VACUUM transaction içinde çalışmaz
+    with dbm.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
+        # WAL modunda sayfalar ana dosyaya checkpoint'te geçer
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    return os.path.getsize(path)
+
+
+def _read_latency(dbm, users: int, rounds: int) -> float:
+    samples = []
+    for r in range(rounds):
+        with dbm.SessionLocal() as session:
+            start = time.perf_counter()
+            rows = dbm.get_user_ai_messages_by_type(session, f"bench_user_{r % users}", "lab_summary", limit=20)
+            for row in rows:
+                _ = row.request_payload, row.response_payload
+            samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(users: int, summaries: int, per_session: int, catalog_size: int, rounds: int):
+    path = _setup_env()
+    from backend import db as dbm
+
+    dbm.Base.metadata.create_all(bind=dbm.engine)
+    catalog = _catalog(catalog_size)
+    with dbm.SessionLocal() as session:
+        for u in range(users):
+            for n in range(summaries):
+                session.add(dbm.AIMessage(
+                    external_user_id=f"bench_user_{u}",
+                    message_type="lab_summary",
+                    request_payload={"tests": _lab_tests(u, n, per_session), "available_supplements": catalog},
+                    response_payload={"summary": "Genel değerlendirme " * 30, "test_count": n + 1},
+                    model_used="bench",
+                ))
+            session.commit()
+
+    legacy_size = _db_size(dbm, path)
+    dbm.payload_store.blob_cache._items.clear()
+    legacy_ms = _read_latency(dbm, users, rounds)
+
+    start = time.perf_counter()
+    with dbm.SessionLocal() as session:
+        migrated = dbm.compress_legacy_ai_message_payloads(session)
+        blob_count = session.query(dbm.PayloadBlob).count()
+    migrate_s = time.perf_counter() - start
+
+    packed_size = _db_size(dbm, path)
+    dbm.payload_store.blob_cache._items.clear()
+    packed_cold_ms = _read_latency(dbm, users, rounds)
+    packed_warm_ms = _read_latency(dbm, users, rounds)
+
+    codec = "zstd" if dbm.payload_store._zstd is not None else "zlib"
+    print(f"satır={migrated}, payload_blobs={blob_count}, codec={codec}, migration={migrate_s:.2f}s")
+    print(f"tablo boyutu   legacy={legacy_size / 1e6:.2f} MB  sıkıştırılmış={packed_size / 1e6:.2f} MB  "
+          f"(x{legacy_size / packed_size:.1f})")
+    print(f"okuma p50 (20 lab_summary)  legacy={legacy_ms:.2f} ms  "
+          f"sıkıştırılmış soğuk={packed_cold_ms:.2f} ms  sıcak cache={packed_warm_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--summaries", type=int, default=20)
+    parser.add_argument("--per-session", type=int, default=25)
+    parser.add_argument("--catalog-size", type=int, default=120)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    main(args.users, args.summaries, args.per_session, args.catalog_size, args.rounds)
@@ -0,0 +1,124 @@
+"""Endpoint başına DB sorgu ve yüklenen ai_messages satırı bütçesi.
+
+Kullanıcı geçmişi --history kadar lab_summary (ve quiz) kaydıyla doldurulur,
+LLM mock OpenRouter'a yönlendirilir ve her endpoint için SELECT sayısı ile
+ORM'e yüklenen ai_messages satırı sayılır. Sayım/ilk-son tarih gibi bilgiler
+aggregate sorgularla alındığı sürece bu sayılar geçmiş uzunluğundan
+bağımsızdır; bütçe aşılırsa çıkış kodu 1 (CI'da regresyon kontrolü).
+
+    python -m backend.benchmarks.query_budget --history 150
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import socket
+import sys
+import tempfile
+
+# route -> (en fazla SELECT, en fazla yüklenen ai_messages satırı)
+BUDGETS = {
+    "/ai/premium-plus/metabolic-age-test": (8, 4),  # son quiz + son lab_summary + ilk/son lab_summary
+}
+
+_HEADERS = {
+    "username": "longopass",
+    "password": "change_this_password",
+    "x-user-id": "query-budget-user",
+    "x-user-level": "3",
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _seed(history: int):
+    from backend.db import SessionLocal, bulk_create_ai_messages, init_schema
+
+    init_schema()
+    start = datetime.datetime.utcnow() - datetime.timedelta(days=history)
+    tests = [{"name": f"Test {i}", "value": str(10 + i), "unit": "mg/dL", "reference_range": "10-40"} for i in range(25)]
+    rows = []
+    for i in range(history):
+        created_at = start + datetime.timedelta(days=i)
+        for message_type, request_payload in (
+            ("lab_summary", {"tests": tests, "session_count": i + 1}),
+            ("quiz", {"quiz_answers": {"age": 40, "gender": "female"}}),
+        ):
+            rows.append({
+                "external_user_id": _HEADERS["x-user-id"],
+                "message_type": message_type,
+                "request_payload": request_payload,
+                "response_payload": {"summary": f"{message_type} {i}"},
+                "model_used": "mock",
+                "created_at": created_at,
+            })
+    with SessionLocal() as db:
+        bulk_create_ai_messages(db, rows)
+
+
+def main(history: int) -> int:
+    from sqlalchemy import event
+    from fastapi.testclient import TestClient
+    from backend.benchmarks.mock_openrouter import MockConfig, MockServer
+
+    mock = MockServer(MockConfig(latency_ms=1, latency_sigma=0), port=_free_port()).start()
+    os.environ["OPENROUTER_BASE_URL"] = f"{mock.base_url}/api/v1"
+    os.environ["XML_PRODUCTS_URL"] = f"{mock.base_url}/ideasoft.xml"
+
+    from backend.db import AIMessage, async_engine, engine, read_engine
+    from backend.main import app
+    from backend.metrics import current_scope
+
+    _seed(history)
+    counts = {"select": 0, "rows": 0}
+
+    # Sadece ölçülen isteğin context'indeki sorgular; warm-up/retention/log writer thread'leri sayılmaz
+    def _in_request() -> bool:
+        scope = current_scope.get()
+        return scope is not None and scope.get("path") in BUDGETS
+
+    def _count_select(conn, cursor, statement, parameters, context, executemany):
+        if _in_request() and statement.lstrip()[:6].upper() == "SELECT":
+            counts["select"] += 1
+
+    def _count_row(target, context):
+        if _in_request():
+            counts["rows"] += 1
+
+    sync_engines = {engine, read_engine} | ({async_engine.sync_engine} if async_engine is not None else set())
+    for eng in sync_engines:
+        event.listen(eng, "before_cursor_execute", _count_select)
+    event.listen(AIMessage, "load", _count_row)
+
+    failures = 0
+    try:
+        with TestClient(app) as client:
+            payload = {"chronological_age": 42, "metabolic_age": 38}
+            for route, (max_queries, max_rows) in BUDGETS.items():
+                counts.update(select=0, rows=0)
+                response = client.post(route, headers=_HEADERS, json=payload)
+                ok = response.status_code == 200 and counts["select"] <= max_queries and counts["rows"] <= max_rows
+                failures += not ok
+                print(f"{route:<45} status {response.status_code}  "
+                      f"select {counts['select']}/{max_queries}  rows {counts['rows']}/{max_rows}  "
+                      f"{'OK' if ok else 'BÜTÇE AŞILDI'}")
+    finally:
+        mock.stop()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", type=int, default=150, help="Kullanıcı başına lab_summary/quiz kaydı")
+    args = parser.parse_args()
+    # backend import edilmeden önce: config modül seviyesinde okur
+    os.environ["DB_TYPE"] = "sqlite"
+    os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="longo_query_budget_"), "budget.db")
+    os.environ.setdefault("OPENROUTER_API_KEY", "query-budget")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.exit(main(args.history))
@@ -0,0 +1,153 @@
+"""Yakalanmış HTTP trafiğini LLM cassette'i ile ağsız tekrar oynat.
+
+Trafik dosyası JSON lines: {"method", "path", "headers", "json"} (her satır
+bir istek, sırayla). Uygulama process içinde (TestClient) geçici SQLite DB
+ile açılır; LLM çağrıları LLM_CASSETTE_MODE=replay ile cassette'ten gelir.
+Endpoint (route şablonu) başına istek sayısı, p50/p95 gecikme, istek başına
+CPU süresi ve DB sorgu sayısı raporlanır; --baseline ile önceki build'in
+--out çıktısıyla karşılaştırılır.
+
+    # Cassette'i bir kez (gerçek veya mock OpenRouter'a karşı) kaydet
+    python -m backend.benchmarks.replay_traffic --traffic day.jsonl --cassette day.jsonl.gz --mode record
+    # Her build'de ağsız tekrar oynat
+    python -m backend.benchmarks.replay_traffic --traffic day.jsonl --cassette day.jsonl.gz --latency-scale 0 --out new.json --baseline old.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def _setup_env(args) -> str:
+    # backend import edilmeden önce: config modül seviyesinde okur
+    scratch = tempfile.mkdtemp(prefix="longo_replay_")
+    os.environ["DB_TYPE"] = "sqlite"
+    os.environ["DB_PATH"] = os.path.join(scratch, "replay.db")
+    os.environ["LLM_CASSETTE_MODE"] = args.mode
+    os.environ["LLM_CASSETTE_PATH"] = os.path.abspath(args.cassette)
+    os.environ["LLM_CASSETTE_LATENCY_SCALE"] = str(args.latency_scale)
+    os.environ.setdefault("OPENROUTER_API_KEY", "replay")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    return scratch
+
+
+def _db_query_counts() -> dict[str, int]:
+    from backend.metrics import stage_duration
+
+    with stage_duration._lock:
+        items = [(key, entry[2]) for key, entry in stage_duration._values.items()]
+    counts: dict[str, int] = {}
+    for (stage_name, endpoint), count in items:
+        if stage_name in ("db_read", "db_write"):
+            counts[endpoint] = counts.get(endpoint, 0) + count
+    return counts
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(pct / 100 * len(sorted_values)))]
+
+
+def replay(traffic_path: str) -> dict:
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from backend.llm_cassette import cassette
+
+    per_endpoint: dict[str, dict] = {}
+    with TestClient(app) as client:
+        db_before = _db_query_counts()
+        with open(traffic_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                req = json.loads(line)
+                cpu_start, start = time.process_time(), time.perf_counter()
+                response = client.request(
+                    req.get("method", "POST"), req["path"],
+                    headers=req.get("headers") or {}, json=req.get("json"),
+                )
+                elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+                route = _route_for(app, req.get("method", "POST"), req["path"])
+                stats = per_endpoint.setdefault(route, {"latencies": [], "cpu": 0.0, "errors": 0})
+                stats["latencies"].append(elapsed)
+                stats["cpu"] += cpu
+                if response.status_code >= 400:
+                    stats["errors"] += 1
+        db_after = _db_query_counts()
+
+    results = {}
+    for route, stats in sorted(per_endpoint.items()):
+        latencies = sorted(stats["latencies"])
+        n = len(latencies)
+        results[route] = {
+            "requests": n,
+            "errors": stats["errors"],
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+            "cpu_ms_per_req": round(stats["cpu"] / n * 1000, 2),
+            "db_queries_per_req": round((db_after.get(route, 0) - db_before.get(route, 0)) / n, 2),
+        }
+    return {"endpoints": results, "cassette": {"hits": cassette.hits, "misses": cassette.misses} if cassette else None}
+
+
+def _route_for(app, method: str, path: str) -> str:
+    """İstek path'ini route şablonuna çevir (/m/abc -> /m/{token}), metrik label'larıyla aynı"""
+    from starlette.routing import Match
+
+    scope = {"type": "http", "method": method.upper(), "path": path}
+    for route in app.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", path)
+    return "unmatched"
+
+
+def _compare(current: dict, baseline: dict):
+    print(f"\n{'endpoint':<45} {'p95 ms':>17} {'cpu ms/req':>17} {'db q/req':>15}")
+    for route, r in current.items():
+        b = baseline.get(route)
+        if not b:
+            continue
+        print(f"{route:<45} {b['p95_ms']:>7} -> {r['p95_ms']:<7} {b['cpu_ms_per_req']:>7} -> {r['cpu_ms_per_req']:<7} "
+              f"{b['db_queries_per_req']:>6} -> {r['db_queries_per_req']:<6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--traffic", required=True, help="JSON lines istek dosyası")
+    parser.add_argument("--cassette", required=True, help="gzip'li cassette dosyası")
+    parser.add_argument("--mode", choices=("replay", "record"), default="replay")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Kayıtlı LLM gecikmesi çarpanı (0 = beklemeden)")
+    parser.add_argument("--out", help="Sonuçları JSON olarak yaz")
+    parser.add_argument("--baseline", help="Önceki --out dosyası ile karşılaştır")
+    args = parser.parse_args()
+
+    scratch = _setup_env(args)
+    try:
+        report = replay(args.traffic)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"{'endpoint':<45} {'req':>5} {'err':>4} {'p50':>9} {'p95':>9} {'cpu/req':>9} {'db q/req':>9}")
+    for route, r in report["endpoints"].items():
+        print(f"{route:<45} {r['requests']:>5} {r['errors']:>4} {r['p50_ms']:>9} {r['p95_ms']:>9} "
+              f"{r['cpu_ms_per_req']:>9} {r['db_queries_per_req']:>9}")
+    print(f"\ncassette: {report['cassette']}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.baseline:
+        _compare(report["endpoints"], json.loads(Path(args.baseline).read_text())["endpoints"])
+    if report["cassette"] and report["cassette"]["misses"] and args.mode == "replay":
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Büyük AI yanıtları: JSON serileştirme süresi ve ağdaki bayt.
+
+Temsili GeneralLabSummaryResponse ve MetabolicAgeTestResponse payload'ları
+için endpoint'in yaptığı işin tamamı ölçülür: sanitize_json_links,
+response_model doğrulama + jsonable_encoder, ardından yanıt sınıfının render'ı
+(stdlib JSONResponse vs ORJSONResponse). Bayt tarafında ham, gzip ve br
+boyutları ile sıkıştırma süresi raporlanır.
+
+    python -m backend.benchmarks.serialization --rounds 500 --scale 2
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import time
+
+
+def _lab_summary(scale: int) -> dict:
+    tests = [f"Test {i}" for i in range(12 * scale)]
+    return {
+        "title": "Tüm Testlerin Genel Yorumu",
+        "genel_saglik_durumu": "Genel sağlık durumunuz iyi; bazı değerler referans aralığının sınırında. " * 3,
+        "genel_durum": " ".join(
+            f"{t}: son sonuç 42 mg/dL, önceki 38 mg/dL; artış eğilimi izlenmeli ve (bkz. kılavuz) değerlendirilmeli."
+            for t in tests
+        ),
+        "oneriler": [f"{t} için 3 ay sonra kontrol; beslenmede lif ve omega-3 artırılmalı." for t in tests],
+        "urun_onerileri": [
+            {"id": 100 + i, "name": f"Takviye {i}", "category": "Longevity",
+             "reason": "D vitamini düşüklüğü ve yorgunluk şikayeti nedeniyle önerildi. Detay: www.example.com/d3",
+             "source": "consensus"}
+            for i in range(6 * scale)
+        ],
+        "test_recommendations": {
+            "title": "Test Önerileri",
+            "recommended_tests": [
+                {"test_name": f"Ek Test {i}", "reason": "Mevcut sonuçlar tiroid fonksiyonunu tam göstermiyor.",
+                 "benefit": "Metabolizma ve enerji seviyesindeki değişimin nedeni netleşir."}
+                for i in range(4 * scale)
+            ],
+            "analysis_summary": "Önceki testlerle karşılaştırmalı özet.",
+        },
+        "lab_tests": [
+            {"name": t, "value": str(10 + i), "unit": "mg/dL", "reference_range": "10-40", "test_date": "2024-05-01"}
+            for i, t in enumerate(tests)
+        ],
+    }
+
+
+def _metabolic_age(scale: int) -> dict:
+    return {
+        "chronological_age": 42,
+        "metabolic_age": 38,
+        "age_difference": -4,
+        "biological_age_status": "Kronolojik yaşınızdan genç",
+        "longevity_score": 78,
+        "health_span_prediction": "Mevcut alışkanlıklarla 75+ yaşa kadar sağlıklı yaşam süresi öngörülüyor.",
+        "risk_factors": [f"Risk faktörü {i}: uyku düzensizliği ve yüksek stres" for i in range(5 * scale)],
+        "protective_factors": [f"Koruyucu faktör {i}: düzenli egzersiz" for i in range(5 * scale)],
+        "longevity_factors": [
+            {"factor_name": f"Faktör {i}", "current_status": "Orta", "impact_score": 1 + i % 10,
+             "recommendation": "Haftada 150 dakika orta yoğunlukta aerobik egzersiz ve 2 gün kuvvet antrenmanı."}
+            for i in range(8 * scale)
+        ],
+        "personalized_recommendations": [f"Öneri {i}: akşam 21:00'den sonra ekran süresini azaltın." for i in range(8 * scale)],
+        "future_health_outlook": "Olumlu; kardiyometabolik belirteçler iyileşme eğiliminde. " * 4,
+        "analysis_summary": "Metabolik yaşınız kronolojik yaşınızdan 4 yıl genç. " * 10,
+    }
+
+
+def _time_ms(fn, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(rounds: int, scale: int):
+    os.environ.setdefault("OPENROUTER_API_KEY", "serialization-bench")
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from backend.routers.common import sanitize_json_links
+    from backend.responses import compress, brotli
+    from backend.schemas import GeneralLabSummaryResponse, MetabolicAgeTestResponse
+
+    cases = [
+        ("GeneralLabSummaryResponse", GeneralLabSummaryResponse, _lab_summary(scale)),
+        ("MetabolicAgeTestResponse", MetabolicAgeTestResponse, _metabolic_age(scale)),
+    ]
+    for name, model, payload in cases:
+        encoded = jsonable_encoder(model(**sanitize_json_links(payload)))
+        stdlib_body = JSONResponse(encoded).body
+        orjson_body = ORJSONResponse(encoded).body
+
+        print(f"\n{name} (scale={scale})")
+        print(f"  sanitize_json_links          {_time_ms(lambda: sanitize_json_links(payload), rounds):8.3f} ms")
+        print(f"  model + jsonable_encoder     {_time_ms(lambda: jsonable_encoder(model(**payload)), rounds):8.3f} ms")
+        print(f"  render stdlib json           {_time_ms(lambda: JSONResponse(encoded), rounds):8.3f} ms")
+        print(f"  render orjson                {_time_ms(lambda: ORJSONResponse(encoded), rounds):8.3f} ms")
+        print(f"  bayt: stdlib {len(stdlib_body)}, orjson {len(orjson_body)}")
+        encodings = ["gzip"] + (["br"] if brotli is not None else [])
+        for encoding in encodings:
+            compressed = compress(orjson_body, encoding)
+            ms = _time_ms(lambda: compress(orjson_body, encoding), max(1, rounds // 5))
+            print(f"  {encoding:<5} {len(compressed):>7} bayt ({len(compressed) / len(orjson_body):.0%}), {ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=300)
+    parser.add_argument("--scale", type=int, default=1, help="Liste uzunluklarını çarp (daha büyük payload)")
+    args = parser.parse_args()
+    main(args.rounds, args.scale)
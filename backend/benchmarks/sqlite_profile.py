@@ -0,0 +1,118 @@
+"""SQLite varsayılan profil vs tuned profil (WAL + pragmas + single-writer + okuma havuzu).
+
+app.db'nin bir kopyası üzerinde eşzamanlı okuyucu/yazıcı thread'leri
+çalıştırır (request handler'ları + background risk detection / log writer
+deseni); saniyedeki okuma/yazma sayısı ve "database is locked" hataları raporlanır.
+
+    python -m backend.benchmarks.sqlite_profile --db app.db --readers 8 --writers 4 --seconds 10
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+
+def _setup_env() -> str:
+    # backend.db import'u gerçek app.db'ye dokunmasın
+    scratch = tempfile.mkdtemp(prefix="longo_bench_")
+    os.environ["DB_TYPE"] = "sqlite"
+    os.environ["DB_PATH"] = os.path.join(scratch, "import.db")
+    return scratch
+
+
+def _run_profile(dbm, label: str, path: str, tuned: bool, readers: int, writers: int, seconds: float) -> dict:
+    from sqlalchemy.orm import sessionmaker
+
+    writer, reader = dbm.create_sqlite_engines(path, tuned=tuned)
+    dbm.Base.metadata.create_all(bind=writer)
+    if tuned:
+        factory = sessionmaker(class_=dbm.RoutingSession, autoflush=False, info={"writer": writer, "reader": reader})
+    else:
+        factory = sessionmaker(autoflush=False, bind=writer)
+
+    with factory() as session:
+        dbm.bulk_create_ai_messages(session, [
+            {
+                "external_user_id": f"bench_user_{i % 100}",
+                "message_type": "chat",
+                "request_payload": {"message": f"soru {i}"},
+                "response_payload": {"reply": "cevap " * 30},
+                "model_used": "bench",
+            }
+            for i in range(5000)
+        ])
+
+    counts = {"reads": 0, "writes": 0, "locked": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def bump(key: str):
+        with lock:
+            counts[key] += 1
+
+    def read_loop(n: int):
+        i = 0
+        while not stop.is_set():
+            try:
+                with factory() as session:
+                    dbm.get_user_ai_messages_by_type(session, f"bench_user_{(n + i) % 100}", "chat", limit=20)
+                bump("reads")
+            except Exception as e:
+                bump("locked" if "locked" in str(e) else "errors")
+            i += 1
+
+    def write_loop(n: int):
+        i = 0
+        while not stop.is_set():
+            try:
+                with factory() as session:
+                    dbm.create_ai_message(session, f"bench_user_{(n + i) % 100}", "chat", {"message": "x"}, {"reply": "y"}, "bench")
+                bump("writes")
+            except Exception as e:
+                bump("locked" if "locked" in str(e) else "errors")
+            i += 1
+
+    threads = [threading.Thread(target=read_loop, args=(n,)) for n in range(readers)]
+    threads += [threading.Thread(target=write_loop, args=(n,)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    writer.dispose()
+    reader.dispose()
+
+    print(f"{label:<8} okuma={counts['reads'] / seconds:8.1f}/s  yazma={counts['writes'] / seconds:7.1f}/s  "
+          f"locked={counts['locked']}  diğer_hata={counts['errors']}")
+    return counts
+
+
+def main(db: str, readers: int, writers: int, seconds: float):
+    scratch = _setup_env()
+    from backend import db as dbm
+
+    results = {}
+    for label, tuned in (("default", False), ("tuned", True)):
+        path = os.path.join(scratch, f"{label}.db")
+        if os.path.exists(db):
+            shutil.copyfile(db, path)
+        results[label] = _run_profile(dbm, label, path, tuned, readers, writers, seconds)
+
+    base, tuned = results["default"], results["tuned"]
+    if base["reads"] and base["writes"]:
+        print(f"okuma x{tuned['reads'] / base['reads']:.2f}, yazma x{tuned['writes'] / base['writes']:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="app.db", help="Kopyalanıp üzerinde ölçüm yapılacak SQLite dosyası")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+    main(args.db, args.readers, args.writers, args.seconds)
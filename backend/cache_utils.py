@@ -7,11 +7,13 @@ import time
 from typing import Any, Dict, Optional
 from functools import wraps
 import threading
+from backend.metrics import record_cache
 
 class MemoryCache:
     """Simple in-memory cache with TTL support"""
     
-    def __init__(self):
+    def __init__(self, name: str = "memory"):
+        self.name = name  # /metrics hit/miss label'ı
         self._cache: Dict[str, Dict[str, Any]] = {}
         self._lock = threading.Lock()
     
@@ -21,10 +23,12 @@ class MemoryCache:
             if key in self._cache:
                 item = self._cache[key]
                 if time.time() < item['expires_at']:
+                    record_cache(self.name, True)
                     return item['value']
                 else:
                     # Expired, remove it
                     del self._cache[key]
+        record_cache(self.name, False)
         return None
     
     def set(self, key: str, value: Any, ttl_seconds: int = 300) -> None:
@@ -69,10 +73,10 @@ class MemoryCache:
         return removed
 
 # Global cache instance
-cache = MemoryCache()
+cache = MemoryCache("supplements")
 
 # Session-based question count cache (free users için)
-session_question_cache = MemoryCache()
+session_question_cache = MemoryCache("session_questions")
 
 def get_session_question_count(user_id: str) -> int:
     """Free kullanıcının günlük soru sayısını getir"""
@@ -0,0 +1,155 @@
+"""Premium chat için kayan konuşma özeti.
+
+Prompt'a son CHAT_MEMORY_WINDOW mesaj olduğu gibi, daha eskileri ise kullanıcı
+başına tek bir özet (en fazla CHAT_MEMORY_SUMMARY_CHARS karakter) olarak girer;
+tur başına prompt boyutu konuşma uzadıkça büyümez. Pencere ile özet arasında
+henüz katlanmamış (en fazla CHAT_MEMORY_FOLD_MIN tur) mesajlar bir sonraki
+katlamada özete girer.
+
+Her chat yazımı precompute worker'a "chat_summary" işi bırakır (gecikmeli,
+kullanıcı başına birleştirilir). İş pencere dışında en az
+CHAT_MEMORY_FOLD_MIN tur biriktiyse bunları ucuz modelle (CHAT_MEMORY_MODEL)
+mevcut özete katlar ve conversation_summaries.covered_until_id'yi ilerletir;
+biriken tur azsa sadece bir COUNT sorgusu çalışır. Precompute worker kapalıyken
+(PRECOMPUTE_ENABLED=false) katlama olmayacağı için hafıza devre dışıdır ve
+chat eskisi gibi son CHAT_HISTORY_LIMIT turu kullanır.
+"""
+from backend.config import (
+    CHAT_MEMORY_ENABLED,
+    CHAT_MEMORY_FOLD_MIN,
+    CHAT_MEMORY_MAX_FOLD,
+    CHAT_MEMORY_MODEL,
+    CHAT_MEMORY_SUMMARY_CHARS,
+    CHAT_MEMORY_WINDOW,
+    PRECOMPUTE_ENABLED,
+)
+from backend.log_utils import get_logger
+from backend.metrics import REGISTRY, CallbackMetric
+from backend.precompute import register as register_precompute
+
+logger = get_logger("chat_memory")
+
+# Katlamayı precompute worker yapar; worker yokken özet ilerlemez, geçmiş kısaltılmamalı
+MEMORY_ACTIVE = CHAT_MEMORY_ENABLED and PRECOMPUTE_ENABLED
+
+# Özete giden tek mesajın üst sınırı (uzun ürün listeleri/yanıtlar özeti şişirmesin)
+_TURN_CHARS = 600
+
+_SYSTEM_PROMPT = (
+    "Sen bir sağlık asistanının konuşma hafızasını tutuyorsun. Mevcut özeti ve yeni konuşma turlarını "
+    "birleştirip güncel TEK bir özet yaz. Koru: kullanıcının sağlık durumu, şikayetleri, hedefleri, "
+    "tercihleri, kullandığı/önerilen takviyeler, konuşulan lab değerleri ve açık kalan sorular. "
+    "Selamlaşma ve tekrarları at. Madde işaretli, kısa ve Türkçe yaz. "
+    f"En fazla {CHAT_MEMORY_SUMMARY_CHARS} karakter. Sadece özeti yaz."
+)
+
+stats = {"folds": 0, "turns_folded": 0, "skipped": 0, "failed": 0}
+
+
+def _clip(text, limit: int) -> str:
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[: limit - 1].rstrip() + "…"
+
+
+def _turn_lines(records) -> list[str]:
+    lines = []
+    for record in records:
+        request_payload = record.request_payload or {}
+        response_payload = record.response_payload or {}
+        if request_payload.get("message"):
+            lines.append(f"KULLANICI: {_clip(request_payload['message'], _TURN_CHARS)}")
+        if response_payload.get("reply"):
+            lines.append(f"ASISTAN: {_clip(response_payload['reply'], _TURN_CHARS)}")
+    return lines
+
+
+def format_summary_block(summary: str | None) -> str | None:
+    """Prompt'a giren sabit boyutlu özet bloğu (özet yoksa None)"""
+    if not summary:
+        return None
+    return (
+        "=== ÖNCEKİ KONUŞMALARIN ÖZETİ ===\n"
+        f"{summary[:CHAT_MEMORY_SUMMARY_CHARS]}\n"
+        "Bu özet kullanıcıyla daha önceki konuşmalarındır; gerektiğinde bağlam olarak kullan."
+    )
+
+
+async def load_memory(db, user_id: str | None) -> tuple[str | None, int]:
+    """Chat handler'ı için: (güncel özet, özetin kapsadığı son ai_messages id'si) - tek satır okuma"""
+    from backend.db import async_get_conversation_summary
+
+    if not MEMORY_ACTIVE or not user_id:
+        return None, 0
+    try:
+        row = await async_get_conversation_summary(db, user_id)
+    except Exception as e:
+        logger.warning(f"Konuşma özeti okunamadı: {e}")
+        return None, 0
+    return (row.summary, row.covered_until_id) if row is not None else (None, 0)
+
+
+async def fold_conversation(user_id: str):
+    """Pencere dışında biriken chat turlarını özete katla (precompute worker işi)"""
+    from backend.db import (
+        AsyncSessionLocal,
+        async_count_chat_messages_after,
+        async_get_chat_messages_after,
+        async_get_conversation_summary,
+        async_upsert_conversation_summary,
+    )
+    from backend.openrouter_client import async_get_ai_response
+
+    if not MEMORY_ACTIVE or AsyncSessionLocal is None:
+        return
+    async with AsyncSessionLocal() as db:
+        row = await async_get_conversation_summary(db, user_id)
+        covered_until_id = row.covered_until_id if row is not None else 0
+        pending = await async_count_chat_messages_after(db, user_id, covered_until_id)
+        to_fold = pending - CHAT_MEMORY_WINDOW
+        if to_fold < CHAT_MEMORY_FOLD_MIN:
+            stats["skipped"] += 1
+            return
+        records = await async_get_chat_messages_after(db, user_id, covered_until_id, min(to_fold, CHAT_MEMORY_MAX_FOLD))
+        previous_summary = row.summary if row is not None else ""
+        previous_turns = row.turn_count if row is not None else 0
+
+    user_message = (
+        f"MEVCUT ÖZET:\n{previous_summary or '(henüz yok)'}\n\n"
+        "YENİ KONUŞMA TURLARI (eskiden yeniye):\n" + "\n".join(_turn_lines(records))
+    )
+    try:
+        summary = await async_get_ai_response(
+            system_prompt=_SYSTEM_PROMPT,
+            user_message=user_message,
+            model=CHAT_MEMORY_MODEL,
+            max_tokens=max(200, CHAT_MEMORY_SUMMARY_CHARS // 2),
+        )
+    except Exception:
+        stats["failed"] += 1
+        raise
+    summary = (summary or "").strip()
+    if not summary:
+        # Boş yanıtla özet silinmesin; turlar bir sonraki işte tekrar denenir
+        stats["failed"] += 1
+        return
+
+    async with AsyncSessionLocal() as db:
+        await async_upsert_conversation_summary(
+            db,
+            user_id,
+            summary=summary[:CHAT_MEMORY_SUMMARY_CHARS],
+            covered_until_id=records[-1].id,
+            turn_count=previous_turns + len(records),
+            model_used=CHAT_MEMORY_MODEL,
+        )
+    stats["folds"] += 1
+    stats["turns_folded"] += len(records)
+
+
+register_precompute("chat_summary", fold_conversation)
+
+REGISTRY.register(CallbackMetric(
+    "longo_chat_memory_total", "Konuşma özeti katlama işleri (folds/turns_folded/skipped/failed)", ("result",),
+    lambda: {(key,): value for key, value in stats.items()},
+    kind="counter",
+))
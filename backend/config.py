@@ -37,6 +37,17 @@ else:
 LOG_PROVIDER_RAW = True
 RETENTION_DAYS = 365
 
+# Retention / arşivleme job'ı (backend/retention.py)
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "true").lower() == "true"
+FREE_RETENTION_DAYS = int(os.getenv("FREE_RETENTION_DAYS", "30"))  # Free (session-*) kullanıcı verisi arşivlenmeden silinir
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "./archive")  # gzip NDJSON arşivleri
+RETENTION_BATCH_SIZE = 500  # Batch başına satır
+RETENTION_BATCH_PAUSE_S = 0.5  # Batch'ler arası bekleme (request trafiğiyle yarışmasın)
+RETENTION_INTERVAL_HOURS = 24  # Job çalışma aralığı
+RETENTION_PARTITION_MONTHS_AHEAD = 3  # Postgres: önceden açılacak aylık partition sayısı
+# Hiçbir ai_messages satırının referans almadığı payload_blobs bu süreden sonra silinir (blob touch aralığından uzun olmalı)
+RETENTION_BLOB_GRACE_HOURS = int(os.getenv("RETENTION_BLOB_GRACE_HOURS", "2"))
+
 # Safety and rate limits
 PRESCRIPTION_BLOCK = True
 # DAILY_CHAT_LIMIT = 100  # KALDIRILDI - Gereksiz
@@ -54,6 +65,8 @@ MODERATION_TIMEOUT_MS = 10000  # 10 saniye (ücretli modeller için - hızlı)
 
 # Magic Numbers - Config'e taşındı
 XML_REQUEST_TIMEOUT = 10  # XML request timeout saniye
+XML_PRODUCTS_URL = os.getenv("XML_PRODUCTS_URL", "https://longopass.myideasoft.com/output/7995561125")  # Ideasoft ürün XML'i (benchmark'ta mock)
+XML_CATALOG_TTL_S = int(os.getenv("XML_CATALOG_TTL_S", "900"))  # Ürün kataloğu bellekte bu kadar saniye tutulur
 FREE_QUESTION_LIMIT = 10  # Free kullanıcı günlük soru limiti
 FREE_SESSION_TIMEOUT_SECONDS = 7200  # Free session timeout (2 saat)
 CHAT_HISTORY_LIMIT = 20  # Chat history limiti
@@ -62,11 +75,102 @@ QUIZ_LAB_MESSAGES_LIMIT = 5  # Quiz/lab messages limiti
 AI_MESSAGES_LIMIT = 50  # AI messages limiti
 AI_MESSAGES_LIMIT_LARGE = 100  # Büyük AI messages limiti
 LAB_MESSAGES_LIMIT = 50  # Lab messages limiti
+LAB_TEST_HISTORY_LIMIT = 50  # Tek test geçmişi (lab_test_results) limiti
+LAB_BATCH_MAX_TESTS = int(os.getenv("LAB_BATCH_MAX_TESTS", "100"))  # /ai/lab/batch istek başına test limiti
+LAB_BATCH_CHUNK_SIZE = int(os.getenv("LAB_BATCH_CHUNK_SIZE", "8"))  # LLM çağrısı başına test
+LAB_BATCH_MAX_PARALLEL = int(os.getenv("LAB_BATCH_MAX_PARALLEL", "4"))  # Aynı anda çalışan chunk çağrısı
+
+# Risk detection ön elemesi: net normal/kritik batch'ler LLM'siz karara bağlanır (backend/risk_prescreen.py)
+RISK_PRESCREEN_ENABLED = os.getenv("RISK_PRESCREEN_ENABLED", "true").lower() == "true"
+RISK_PRESCREEN_SUMMARY_CHARS = int(os.getenv("RISK_PRESCREEN_SUMMARY_CHARS", "600"))  # Belirsiz batch prompt'unda özet kısaltması
 QUIZ_LAB_ANALYSES_LIMIT = 50  # Quiz/lab analyses limiti
 DEBUG_AI_MESSAGES_LIMIT = 10  # Debug AI messages limiti
 MILLISECOND_MULTIPLIER = 1000  # Millisecond çarpanı
 MIN_LAB_TESTS_FOR_COMPARISON = 2  # Lab test karşılaştırması için minimum test sayısı
 
+# ai_messages write-behind logger (backend/ai_log_writer.py)
+AI_LOG_BATCH_SIZE = int(os.getenv("AI_LOG_BATCH_SIZE", "50"))  # Bu kadar satır birikince bulk INSERT
+AI_LOG_FLUSH_MS = int(os.getenv("AI_LOG_FLUSH_MS", "250"))  # En geç bu kadar ms'de bir flush
+AI_LOG_QUEUE_MAX = int(os.getenv("AI_LOG_QUEUE_MAX", "5000"))  # Kuyruk kapasitesi (back-pressure)
+AI_LOG_ENQUEUE_TIMEOUT_S = 2.0  # Kuyruk doluyken loop dışı thread'lerin bekleme süresi; aşılırsa kayıt senkron yazılır (loop thread'i beklemez)
+
+# /metrics endpoint'i (Prometheus text format)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # Set edilirse scrape için "Authorization: Bearer <token>" gerekir
+
+# Structured logging (backend/log_utils.py)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json veya text
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))  # Doluysa satır düşürülür, istek beklemez
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))  # DEBUG satırlarının yazılan oranı
+# Production'da kullanıcı verisi / AI yanıt gövdeleri log'a yazılmasın
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "false" if os.getenv("ENVIRONMENT") == "production" else "true").lower() == "true"
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+
+# Provider prompt cache (backend/prompt_layout.py): statik önek sabit tutulur, destekleyen modellere cache_control eklenir
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+# Açık cache_control işareti isteyen model önekleri; OpenAI/DeepSeek gibi diğerleri önekleri otomatik cache'ler
+PROMPT_CACHE_CONTROL_PREFIXES = tuple(
+    p.strip() for p in os.getenv("PROMPT_CACHE_CONTROL_PREFIXES", "anthropic/,google/gemini").split(",") if p.strip()
+)
+
+# OpenRouter token / maliyet ledger'ı (backend/usage_ledger.py)
+USAGE_LEDGER_ENABLED = os.getenv("USAGE_LEDGER_ENABLED", "true").lower() == "true"
+USAGE_LEDGER_FLUSH_S = float(os.getenv("USAGE_LEDGER_FLUSH_S", "5"))  # Bellekteki toplamların DB'ye yazılma aralığı
+# usage.cost gelmediğinde kullanılan fiyatlar: model -> (prompt, completion) USD / 1M token
+MODEL_PRICES_PER_MTOK = {
+    "openai/gpt-5-chat:online": (1.25, 10.0),
+    "openai/gpt-4o:online": (2.5, 10.0),
+    "google/gemini-2.5-flash": (0.30, 2.50),
+}
+
+# LLM record/replay cassette'i (backend/llm_cassette.py) - performans regresyon testleri için
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off").lower()  # off, record veya replay
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "llm_cassette.jsonl.gz")
+LLM_CASSETTE_LATENCY_SCALE = float(os.getenv("LLM_CASSETTE_LATENCY_SCALE", "1.0"))  # Replay'de kayıtlı gecikme çarpanı (0 = beklemeden)
+LLM_CASSETTE_ON_MISS = os.getenv("LLM_CASSETTE_ON_MISS", "error").lower()  # Replay'de kayıt yoksa: error veya passthrough
+
+# OpenRouter HTTP client havuzu (process başına tek client, keep-alive)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY_S = float(os.getenv("LLM_KEEPALIVE_EXPIRY_S", "60"))  # Boşta bekleyen TLS bağlantısının ömrü
+
+# Startup warm-up + /ready (backend/warmup.py)
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "4"))  # Havuz başına önceden açılan bağlantı
+WARMUP_STEP_TIMEOUT_S = float(os.getenv("WARMUP_STEP_TIMEOUT_S", "15"))  # Bu süreyi aşan adım readiness'i bekletmez
+
+# Premium chat konuşma özeti (backend/chat_memory.py)
+CHAT_MEMORY_ENABLED = os.getenv("CHAT_MEMORY_ENABLED", "true").lower() == "true"
+CHAT_MEMORY_WINDOW = int(os.getenv("CHAT_MEMORY_WINDOW", "4"))  # Prompt'a olduğu gibi giren son chat turu
+CHAT_MEMORY_FOLD_MIN = int(os.getenv("CHAT_MEMORY_FOLD_MIN", "6"))  # Pencere dışında bu kadar tur birikince özete katlanır
+CHAT_MEMORY_MAX_FOLD = int(os.getenv("CHAT_MEMORY_MAX_FOLD", "40"))  # Tek özet çağrısında katlanan en fazla tur
+CHAT_MEMORY_SUMMARY_CHARS = int(os.getenv("CHAT_MEMORY_SUMMARY_CHARS", "1500"))  # Özetin üst sınırı (prompt'taki sabit boyut)
+CHAT_MEMORY_MODEL = os.getenv("CHAT_MEMORY_MODEL", MODERATION_MODEL)  # Ucuz model yeterli
+
+# Free chat FAQ / benzer soru cache'i (backend/faq_cache.py)
+FAQ_CACHE_ENABLED = os.getenv("FAQ_CACHE_ENABLED", "true").lower() == "true"
+FAQ_CACHE_THRESHOLD = float(os.getenv("FAQ_CACHE_THRESHOLD", "0.88"))  # Aynı parmak izli sorular arasında char 3-gram TF-IDF cosine alt sınırı
+FAQ_CACHE_TTL_S = int(os.getenv("FAQ_CACHE_TTL_S", "86400"))  # Öğrenilen yanıtın ömrü; katalog değişince zaten silinir
+FAQ_CACHE_MAX_ENTRIES = int(os.getenv("FAQ_CACHE_MAX_ENTRIES", "2000"))  # Öğrenilen kayıt sınırı (LRU)
+FAQ_CACHE_PROMOTE_AFTER = int(os.getenv("FAQ_CACHE_PROMOTE_AFTER", "0"))  # Öğrenilen yanıt aynı soruya kaç kez aynı üretilince servis edilir (0 = sadece seed servis edilir)
+FAQ_CACHE_SEED_PATH = os.getenv("FAQ_CACHE_SEED_PATH")  # Elle onaylanmış [{"questions": [...], "answer", "language"}] JSON'u
+
+# Önceden hesaplanan öneriler (backend/precompute.py)
+PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_ENABLED", "true").lower() == "true"
+PRECOMPUTE_DELAY_S = float(os.getenv("PRECOMPUTE_DELAY_S", "3"))  # Yazımdan sonra bekleme: write-behind flush + ardışık quiz/lab birleşsin
+PRECOMPUTE_CONCURRENCY = int(os.getenv("PRECOMPUTE_CONCURRENCY", "2"))  # Aynı anda çalışan arka plan üretimi
+PRECOMPUTE_MAX_PENDING = int(os.getenv("PRECOMPUTE_MAX_PENDING", "1000"))  # Aşılırsa yeni işler düşürülür (endpoint yine üretir)
+
+# Yanıt sıkıştırma (backend/responses.py)
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))  # Bundan küçük yanıtlar sıkıştırılmaz
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))  # Dinamik yanıtlar için; 11 çok yavaş
+
+# Widget asset'leri (backend/widget_assets.py)
+WIDGET_MINIFY = os.getenv("WIDGET_MINIFY", "true").lower() == "true"  # rjsmin/rcssmin kuruluysa JS/CSS startup'ta minify edilir
+WIDGET_CACHE_MAX_AGE = int(os.getenv("WIDGET_CACHE_MAX_AGE", "300"))  # Kararlı URL'ler (fingerprint'siz) için tarayıcı cache süresi
+
 # XML Supplement Listesi - Tüm endpoint'lerde kullanılacak
 SUPPLEMENTS_LIST = [
     {"id": 247, "name": "Zeaksantin", "category": "Longevity"},
@@ -1,8 +1,19 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Enum, ForeignKey, Boolean, JSON
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Enum, ForeignKey, Boolean, JSON, LargeBinary
+from sqlalchemy import Date, Float, Index, UniqueConstraint, event, func, insert, or_, select, update
+from sqlalchemy.sql.dml import UpdateBase
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship, Session
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 import datetime
+import logging
 import os
 
+from backend import payload_store
+from backend.metrics import instrument_engine
+
+# log_utils config'i import ediyor (API anahtarı ister); db'yi kullanan benchmark'lar anahtarsız çalışsın diye
+# handler'lar uygulama tarafında (configure_logging) kurulur
+logger = logging.getLogger("longo.db")
+
 # Database configuration - Support both local SQLite and production PostgreSQL
 DB_TYPE = os.getenv("DB_TYPE", "sqlite")  # sqlite or postgresql
 
@@ -23,25 +34,134 @@ if DB_TYPE == "postgresql":
             max_overflow=30,     # 30 ek connection oluştur
             pool_pre_ping=True   # Connection'ları test et
         )
-        print(f"Connected to PostgreSQL database: {DB_HOST}:{DB_PORT}/{DB_NAME} with connection pooling")
+        DB_DESCRIPTION = f"PostgreSQL {DB_HOST}:{DB_PORT}/{DB_NAME} (connection pooling)"
     else:
-        print("PostgreSQL credentials incomplete, falling back to SQLite")
+        logger.warning("PostgreSQL credentials incomplete, falling back to SQLite")
         DB_TYPE = "sqlite"
         DB_PATH = os.getenv("DB_PATH", "./app.db")
         DATABASE_URL = f"sqlite:///{DB_PATH}"
         engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-        print(f"Using SQLite database: {DB_PATH}")
+
+# SQLite production profili: WAL + pragmas, tek writer bağlantısı, query_only okuma havuzu
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "true").lower() == "true"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+
+
+def _apply_sqlite_pragmas(dbapi_conn, query_only: bool = False):
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")  # WAL ile güvenli; her commit'te fsync yok
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    if query_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def create_sqlite_engines(db_path: str, tuned: bool = True):
+    """SQLite için (writer, reader) engine çifti; tuned=False eski varsayılan tek engine'i döndürür."""
+    url = f"sqlite:///{db_path}"
+    if not tuned:
+        plain = create_engine(url, connect_args={"check_same_thread": False})
+        return plain, plain
+
+    # Tek bağlantılı pool = process içi single-writer kuyruğu (thread'ler checkout'ta sıraya girer)
+    writer = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "isolation_level": None},
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=30,
+    )
+
+    @event.listens_for(writer, "connect")
+    def _writer_connect(dbapi_conn, _record):
+        _apply_sqlite_pragmas(dbapi_conn)
+
+    @event.listens_for(writer, "begin")
+    def _writer_begin(conn):
+        # AUTOCOMMIT bağlantılar (VACUUM, warm-up gibi bakım işleri) transaction'sız çalışır
+        if conn.get_execution_options().get("isolation_level") == "AUTOCOMMIT":
+            return
+        # Yazma kilidini baştan al: okuma->yazma kilit yükseltmesi busy_timeout'u beklemeden SQLITE_BUSY verir
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    reader = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=SQLITE_READ_POOL_SIZE,
+        max_overflow=SQLITE_READ_POOL_SIZE,
+    )
+
+    @event.listens_for(reader, "connect")
+    def _reader_connect(dbapi_conn, _record):
+        _apply_sqlite_pragmas(dbapi_conn, query_only=True)
+
+    return writer, reader
+
+
+class RoutingSession(Session):
+    """Okumalar read-only havuza, flush ve INSERT/UPDATE/DELETE tek writer bağlantısına gider.
+
+    Not: commit edilmemiş yazılar aynı session'daki okumalarda görünmez; helper'lar yazdıktan sonra hemen commit eder.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        # clause=None: ORM bulk insert/update persistence veya session.connection() -> writer
+        if self._flushing or clause is None or isinstance(clause, UpdateBase):
+            return self.info["writer"]
+        return self.info["reader"]
+
 
 if DB_TYPE == "sqlite":
     # Local development or fallback: Use SQLite
     DB_PATH = os.getenv("DB_PATH", "./app.db")
     DATABASE_URL = f"sqlite:///{DB_PATH}"
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-    print(f"Using SQLite database: {DB_PATH}")
+    engine, read_engine = create_sqlite_engines(DB_PATH, tuned=SQLITE_TUNED)
+    DB_DESCRIPTION = f"SQLite {DB_PATH}" + (" (WAL, tuned profile)" if SQLITE_TUNED else "")
+else:
+    read_engine = engine
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+if DB_TYPE == "sqlite" and SQLITE_TUNED:
+    SessionLocal = sessionmaker(
+        class_=RoutingSession, autocommit=False, autoflush=False, info={"writer": engine, "reader": read_engine}
+    )
+else:
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# /metrics: db_read / db_write stage süreleri
+instrument_engine(engine)
+if read_engine is not engine:
+    instrument_engine(read_engine)
+
+# Async engine - async def handler'lar event loop'u bloklamasın (asyncpg / aiosqlite)
+if DB_TYPE == "postgresql":
+    ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    _async_engine_kwargs = {"pool_size": 20, "max_overflow": 30, "pool_pre_ping": True}
+else:
+    ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
+    _async_engine_kwargs = {}
+
+try:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_async_engine_kwargs)
+    if DB_TYPE == "sqlite" and SQLITE_TUNED:
+        @event.listens_for(async_engine.sync_engine, "connect")
+        def _async_sqlite_connect(dbapi_conn, _record):
+            _apply_sqlite_pragmas(dbapi_conn)
+    instrument_engine(async_engine.sync_engine)
+    # expire_on_commit=False: commit sonrası attribute erişimi lazy load (await) gerektirmesin
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+except ImportError as e:
+    logger.warning(f"Async database driver bulunamadı (asyncpg/aiosqlite), async session devre dışı: {e}")
+    async_engine = None
+    AsyncSessionLocal = None
+
 # User model removed - only ai_messages table is used in production
 
 
@@ -50,13 +170,62 @@ Base = declarative_base()
 # Simpler, single-table logging for all AI messages without user table dependency
 class AIMessage(Base):
     __tablename__ = "ai_messages"
+    # Kullanıcı + tip başına sayım, ilk/son tarih ve son kayıt sorguları tablo taramadan index'ten cevaplanır
+    __table_args__ = (Index("ix_ai_messages_user_type_created", "external_user_id", "message_type", "created_at"),)
     id = Column(Integer, primary_key=True, index=True)
     external_user_id = Column(String, index=True, nullable=True)
     message_type = Column(String, index=True)  # chat, quiz, lab_single, lab_session, lab_summary
-    request_payload = Column(JSON, nullable=True)
-    response_payload = Column(JSON, nullable=True)
+    # Legacy düz JSON kolonları - yeni kayıtlar *_payload_z (sıkıştırılmış) kolonlarına yazılır
+    request_payload_json = Column("request_payload", JSON, nullable=True)
+    response_payload_json = Column("response_payload", JSON, nullable=True)
+    request_payload_z = Column(LargeBinary, nullable=True)
+    response_payload_z = Column(LargeBinary, nullable=True)
     model_used = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+    # Çağıranlar her zaman çözülmüş dict görür (sıkıştırılmış veya legacy fark etmez)
+    @property
+    def request_payload(self):
+        return self._payload("request")
+
+    @request_payload.setter
+    def request_payload(self, value):
+        self.request_payload_json = value
+        self.__dict__.get(_PAYLOAD_CACHE_ATTR, {}).pop("request", None)
+
+    @property
+    def response_payload(self):
+        return self._payload("response")
+
+    @response_payload.setter
+    def response_payload(self, value):
+        self.response_payload_json = value
+        self.__dict__.get(_PAYLOAD_CACHE_ATTR, {}).pop("response", None)
+
+    def _payload(self, kind: str):
+        cache = self.__dict__.get(_PAYLOAD_CACHE_ATTR)
+        if cache is None or kind not in cache:
+            # Helper'lar (_hydrate_ai_messages / _async_hydrate_ai_messages) blob'ları toplu yükler; burada
+            # sorgu açılmaz. Blob'suz ya da blob'ları cache'te olan payload yerinde açılır.
+            pending, missing = _prepare_payload_hydration([self])
+            if missing:
+                self.__dict__.pop(_PAYLOAD_CACHE_ATTR, None)
+                logger.error(f"ai_messages {self.id}: payload blob'ları yüklenmemiş ({len(missing)} adet); satır hydrate helper'ı dışında okundu")
+                raise RuntimeError(f"ai_messages {self.id} payload'ı hydrate edilmeden okundu")
+            _finish_payload_hydration(pending, {})
+            cache = self.__dict__[_PAYLOAD_CACHE_ATTR]
+        return cache[kind]
+
+
+# ai_messages payload'larındaki büyük alt nesneler (test listeleri, katalog snapshot'ları) - content-hash ile tekil
+class PayloadBlob(Base):
+    __tablename__ = "payload_blobs"
+    hash = Column(String(64), primary_key=True)  # sha256 (sort_keys JSON)
+    data = Column(LargeBinary, nullable=False)  # zstd/zlib sıkıştırılmış JSON
+    raw_size = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Son yazımın bu blob'u referans aldığı zaman (en fazla BLOB_TOUCH_INTERVAL_S gecikmeli); retention orphan sweep'i için
+    referenced_at = Column(DateTime, nullable=True)
 
 
 # High risk users table - Lab sonuçlarında high risk tespit edilen kullanıcılar
@@ -70,12 +239,158 @@ class HighRiskUser(Base):
     risk_reason = Column(Text, nullable=True)  # AI'nin risk tespit nedeni
     risky_tests = Column(JSON, nullable=True)  # Riskli testler listesi
     ai_analysis = Column(Text, nullable=True)  # AI'nin tam analizi
-    detected_at = Column(DateTime, default=datetime.datetime.utcnow)
+    detected_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
     notified = Column(Boolean, default=False)  # Mail gönderildi mi?
     notified_at = Column(DateTime, nullable=True)
 
 
 
+# ---------- Payload storage (backend/payload_store.py) ----------
+
+_PAYLOAD_CACHE_ATTR = "_decoded_payloads"
+
+
+def _encode_ai_message_payloads(request_payload, response_payload) -> tuple[dict, dict]:
+    """Payload'ları sıkıştırılmış kolon değerlerine çevir; dedup blob'larını da döndür."""
+    request_z, request_blobs = payload_store.encode_payload(request_payload)
+    response_z, response_blobs = payload_store.encode_payload(response_payload)
+    return (
+        {"request_payload_z": request_z, "response_payload_z": response_z},
+        {**request_blobs, **response_blobs},
+    )
+
+
+def _payload_blob_insert(dialect_name: str, now: datetime.datetime):
+    """Aynı hash zaten varsa sadece referenced_at'i (bayatsa) tazele; eşzamanlı yazımlarda IntegrityError olmasın."""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(PayloadBlob).on_conflict_do_update(
+        index_elements=["hash"],
+        set_={"referenced_at": now},
+        where=_stale_blob_reference(now),
+    )
+
+
+def _stale_blob_reference(now: datetime.datetime):
+    # Her dedup isabetinde UPDATE olmasın: referenced_at en fazla BLOB_TOUCH_INTERVAL_S'de bir yazılır
+    touch_before = now - datetime.timedelta(seconds=payload_store.BLOB_TOUCH_INTERVAL_S)
+    return or_(PayloadBlob.referenced_at.is_(None), PayloadBlob.referenced_at < touch_before)
+
+
+def _payload_blob_rows(blobs: dict, now: datetime.datetime) -> list[dict]:
+    return [
+        {"hash": digest, "data": data, "raw_size": raw_size, "created_at": now, "referenced_at": now}
+        for digest, (data, raw_size) in blobs.items()
+    ]
+
+
+def _store_payload_blobs(db: Session, blobs: dict):
+    if not blobs:
+        return
+    now = datetime.datetime.utcnow()
+    stmt = _payload_blob_insert(db.get_bind().dialect.name, now)
+    if stmt is not None:
+        db.execute(stmt, _payload_blob_rows(blobs, now))
+        return
+    existing = set(db.execute(select(PayloadBlob.hash).where(PayloadBlob.hash.in_(list(blobs)))).scalars())
+    rows = [row for row in _payload_blob_rows(blobs, now) if row["hash"] not in existing]
+    if rows:
+        db.execute(insert(PayloadBlob), rows)
+    if existing:
+        db.execute(
+            update(PayloadBlob)
+            .where(PayloadBlob.hash.in_(list(existing)), _stale_blob_reference(now))
+            .values(referenced_at=now)
+        )
+
+
+async def _async_store_payload_blobs(db: AsyncSession, blobs: dict):
+    if not blobs:
+        return
+    now = datetime.datetime.utcnow()
+    stmt = _payload_blob_insert(db.get_bind().dialect.name, now)
+    if stmt is not None:
+        await db.execute(stmt, _payload_blob_rows(blobs, now))
+        return
+    result = await db.execute(select(PayloadBlob.hash).where(PayloadBlob.hash.in_(list(blobs))))
+    existing = set(result.scalars())
+    rows = [row for row in _payload_blob_rows(blobs, now) if row["hash"] not in existing]
+    if rows:
+        await db.execute(insert(PayloadBlob), rows)
+    if existing:
+        await db.execute(
+            update(PayloadBlob)
+            .where(PayloadBlob.hash.in_(list(existing)), _stale_blob_reference(now))
+            .values(referenced_at=now)
+        )
+
+
+def _prepare_payload_hydration(records) -> tuple[list, set]:
+    """Satırların payload'larını aç; cache'te olmayan blob hash'lerini topla."""
+    pending = []
+    missing = set()
+    for record in records:
+        cache = record.__dict__.setdefault(_PAYLOAD_CACHE_ATTR, {})
+        for kind in ("request", "response"):
+            if kind in cache:
+                continue
+            blob = getattr(record, f"{kind}_payload_z")
+            if blob is None:
+                cache[kind] = getattr(record, f"{kind}_payload_json")
+                continue
+            obj, refs = payload_store.unpack_payload(blob)
+            pending.append((cache, kind, obj))
+            missing |= payload_store.missing_refs(refs)
+    return pending, missing
+
+
+def _finish_payload_hydration(pending: list, fetched: dict):
+    texts = payload_store.load_fetched(fetched)
+    for cache, kind, obj in pending:
+        cache[kind] = payload_store.resolve_payload(obj, texts)
+
+
+def _fetch_payload_blobs(db: Session, hashes: set) -> dict:
+    rows = db.execute(select(PayloadBlob.hash, PayloadBlob.data).where(PayloadBlob.hash.in_(list(hashes))))
+    return {digest: data for digest, data in rows}
+
+
+def _hydrate_ai_messages(db: Session, records):
+    """Tek sorguda tüm blob referanslarını çözerek payload'ları hazırla."""
+    pending, missing = _prepare_payload_hydration(records)
+    _finish_payload_hydration(pending, _fetch_payload_blobs(db, missing) if missing else {})
+    return records
+
+
+async def _async_hydrate_ai_messages(db: AsyncSession, records):
+    pending, missing = _prepare_payload_hydration(records)
+    fetched = {}
+    if missing:
+        result = await db.execute(
+            select(PayloadBlob.hash, PayloadBlob.data).where(PayloadBlob.hash.in_(list(missing)))
+        )
+        fetched = {digest: data for digest, data in result}
+    _finish_payload_hydration(pending, fetched)
+    return records
+
+
+def _new_ai_message(external_user_id, message_type, request_payload, response_payload, model_used) -> tuple[AIMessage, dict]:
+    columns, blobs = _encode_ai_message_payloads(request_payload, response_payload)
+    record = AIMessage(
+        external_user_id=external_user_id,
+        message_type=message_type,
+        model_used=model_used,
+        **columns,
+    )
+    # Yazılan satırı tekrar açmaya gerek yok
+    record.__dict__[_PAYLOAD_CACHE_ATTR] = {"request": request_payload, "response": response_payload}
+    return record, blobs
+
+
 def create_ai_message(
     db: Session,
     external_user_id: str | None,
@@ -85,18 +400,55 @@ def create_ai_message(
     model_used: str | None = None,
 ):
     """Log a unified AI message row without requiring a User record."""
-    record = AIMessage(
-        external_user_id=external_user_id,
-        message_type=message_type,
-        request_payload=request_payload,
-        response_payload=response_payload,
-        model_used=model_used,
-    )
+    record, blobs = _new_ai_message(external_user_id, message_type, request_payload, response_payload, model_used)
+    _store_payload_blobs(db, blobs)
     db.add(record)
+    db.flush()  # id + created_at: lab testleri aynı transaction'da side table'a açılır
+    lab_rows = _lab_test_rows(record.id, external_user_id, message_type, request_payload, record.created_at)
+    if lab_rows:
+        db.execute(insert(LabTestResult), lab_rows)
     db.commit()
     db.refresh(record)
     return record
 
+def bulk_create_ai_messages(db: Session, rows: list[dict]) -> int:
+    """Tek executemany INSERT ile birden çok ai_messages satırı yaz (write-behind logger için)."""
+    if not rows:
+        return 0
+    from backend.lab_history import LAB_MESSAGE_TYPES
+
+    encoded_rows = []
+    lab_rows = []  # (encoded satır, request_payload): side table için id gerekiyor
+    blobs = {}
+    for row in rows:
+        row = dict(row)
+        request_payload = row.pop("request_payload", None)
+        columns, row_blobs = _encode_ai_message_payloads(request_payload, row.pop("response_payload", None))
+        row.update(columns)
+        if row.get("external_user_id") and row.get("message_type") in LAB_MESSAGE_TYPES:
+            row.setdefault("created_at", datetime.datetime.utcnow())
+            lab_rows.append((row, request_payload))
+        else:
+            encoded_rows.append(row)
+        blobs.update(row_blobs)
+    _store_payload_blobs(db, blobs)
+    if encoded_rows:
+        db.execute(insert(AIMessage), encoded_rows)
+    if lab_rows:
+        ids = db.execute(
+            insert(AIMessage).returning(AIMessage.id, sort_by_parameter_order=True),
+            [row for row, _ in lab_rows],
+        ).scalars().all()
+        test_rows = []
+        for ai_message_id, (row, request_payload) in zip(ids, lab_rows):
+            test_rows.extend(_lab_test_rows(
+                ai_message_id, row["external_user_id"], row["message_type"], request_payload, row["created_at"],
+            ))
+        if test_rows:
+            db.execute(insert(LabTestResult), test_rows)
+    db.commit()
+    return len(rows)
+
 def get_ai_messages(
     db: Session,
     external_user_id: str | None = None,
@@ -109,7 +461,7 @@ def get_ai_messages(
         query = query.filter(AIMessage.external_user_id == external_user_id)
     if message_type:
         query = query.filter(AIMessage.message_type == message_type)
-    return query.order_by(AIMessage.created_at.desc()).limit(limit).all()
+    return _hydrate_ai_messages(db, query.order_by(AIMessage.created_at.desc()).limit(limit).all())
 
 def get_user_ai_messages_by_type(db: Session, external_user_id: str, message_type: str, limit: int = 10):
     """Get user's AI messages by type (replacement for get_user_ai_interactions)"""
@@ -119,6 +471,101 @@ def get_user_ai_messages(db: Session, external_user_id: str, limit: int = 10):
     """Get all user's AI messages (replacement for get_user_ai_interactions)"""
     return get_ai_messages(db, external_user_id=external_user_id, limit=limit)
 
+def _ai_message_stats_stmt(external_user_id: str, message_type: str):
+    return select(
+        func.count(AIMessage.id),
+        func.min(AIMessage.created_at),
+        func.max(AIMessage.created_at),
+        func.min(AIMessage.id),
+        func.max(AIMessage.id),
+    ).where(AIMessage.external_user_id == external_user_id, AIMessage.message_type == message_type)
+
+def _ai_message_stats(row) -> dict:
+    count, first_at, last_at, first_id, last_id = row
+    return {"count": count or 0, "first_at": first_at, "last_at": last_at, "first_id": first_id, "last_id": last_id}
+
+def get_ai_message_stats(db: Session, external_user_id: str, message_type: str) -> dict:
+    """Tek aggregate sorgu: kayıt sayısı, ilk/son created_at ve ilk/son id (payload okunmaz)"""
+    return _ai_message_stats(db.execute(_ai_message_stats_stmt(external_user_id, message_type)).one())
+
+def get_latest_ai_message(db: Session, external_user_id: str, message_type: str):
+    """Sadece en son kayıt (limit 1); yoksa None"""
+    records = get_ai_messages(db, external_user_id=external_user_id, message_type=message_type, limit=1)
+    return records[0] if records else None
+
+def get_ai_messages_by_ids(db: Session, ids) -> dict:
+    """id -> kayıt; stats'tan gelen ilk/son id'ler için sadece o satırlar yüklenir"""
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    records = _hydrate_ai_messages(db, db.query(AIMessage).filter(AIMessage.id.in_(ids)).all())
+    return {record.id: record for record in records}
+
+
+# ---------- Async helpers (AsyncSession) ----------
+
+async def async_create_ai_message(
+    db: AsyncSession,
+    external_user_id: str | None,
+    message_type: str,
+    request_payload: dict | None,
+    response_payload: dict | None,
+    model_used: str | None = None,
+):
+    """Async version of create_ai_message."""
+    record, blobs = _new_ai_message(external_user_id, message_type, request_payload, response_payload, model_used)
+    await _async_store_payload_blobs(db, blobs)
+    db.add(record)
+    await db.flush()
+    lab_rows = _lab_test_rows(record.id, external_user_id, message_type, request_payload, record.created_at)
+    if lab_rows:
+        await db.execute(insert(LabTestResult), lab_rows)
+    await db.commit()
+    await db.refresh(record)
+    return record
+
+async def async_get_ai_messages(
+    db: AsyncSession,
+    external_user_id: str | None = None,
+    message_type: str | None = None,
+    limit: int = 50,
+):
+    """Async version of get_ai_messages."""
+    stmt = select(AIMessage)
+    if external_user_id:
+        stmt = stmt.where(AIMessage.external_user_id == external_user_id)
+    if message_type:
+        stmt = stmt.where(AIMessage.message_type == message_type)
+    result = await db.execute(stmt.order_by(AIMessage.created_at.desc()).limit(limit))
+    return await _async_hydrate_ai_messages(db, result.scalars().all())
+
+async def async_get_user_ai_messages_by_type(db: AsyncSession, external_user_id: str, message_type: str, limit: int = 10):
+    """Async version of get_user_ai_messages_by_type."""
+    return await async_get_ai_messages(db, external_user_id=external_user_id, message_type=message_type, limit=limit)
+
+async def async_get_user_ai_messages(db: AsyncSession, external_user_id: str, limit: int = 10):
+    """Async version of get_user_ai_messages."""
+    return await async_get_ai_messages(db, external_user_id=external_user_id, limit=limit)
+
+async def async_get_ai_message_stats(db: AsyncSession, external_user_id: str, message_type: str) -> dict:
+    """Async version of get_ai_message_stats."""
+    result = await db.execute(_ai_message_stats_stmt(external_user_id, message_type))
+    return _ai_message_stats(result.one())
+
+async def async_get_latest_ai_message(db: AsyncSession, external_user_id: str, message_type: str):
+    """Async version of get_latest_ai_message."""
+    records = await async_get_ai_messages(db, external_user_id=external_user_id, message_type=message_type, limit=1)
+    return records[0] if records else None
+
+async def async_get_ai_messages_by_ids(db: AsyncSession, ids) -> dict:
+    """Async version of get_ai_messages_by_ids."""
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    result = await db.execute(select(AIMessage).where(AIMessage.id.in_(ids)))
+    records = await _async_hydrate_ai_messages(db, result.scalars().all())
+    return {record.id: record for record in records}
+
 
 def create_high_risk_user(
     db: Session,
@@ -161,6 +608,48 @@ def get_high_risk_users(
     return query.order_by(HighRiskUser.detected_at.desc()).limit(limit).all()
 
 
+async def async_create_high_risk_user(
+    db: AsyncSession,
+    external_user_id: str,
+    user_level: int | None,
+    lab_summary_id: int | None,
+    risk_level: str,
+    risk_reason: str | None,
+    risky_tests: list | None,
+    ai_analysis: str | None,
+):
+    """create_high_risk_user async versiyonu"""
+    record = HighRiskUser(
+        external_user_id=external_user_id,
+        user_level=user_level,
+        lab_summary_id=lab_summary_id,
+        risk_level=risk_level,
+        risk_reason=risk_reason,
+        risky_tests=risky_tests,
+        ai_analysis=ai_analysis,
+    )
+    db.add(record)
+    await db.commit()
+    await db.refresh(record)
+    return record
+
+
+async def async_get_high_risk_users(
+    db: AsyncSession,
+    external_user_id: str | None = None,
+    notified: bool | None = None,
+    limit: int = 100,
+):
+    """get_high_risk_users async versiyonu"""
+    stmt = select(HighRiskUser)
+    if external_user_id:
+        stmt = stmt.where(HighRiskUser.external_user_id == external_user_id)
+    if notified is not None:
+        stmt = stmt.where(HighRiskUser.notified == notified)
+    result = await db.execute(stmt.order_by(HighRiskUser.detected_at.desc()).limit(limit))
+    return result.scalars().all()
+
+
 # Medical ID / QR sağlık künyesi — mevcut tablolara dokunmaz
 class MedicalId(Base):
     __tablename__ = "medical_ids"
@@ -197,9 +686,143 @@ def ensure_medical_id_schema():
             with engine.begin() as conn:
                 for stmt in statements:
                     conn.execute(text(stmt))
-            print("medical_ids schema updated:", statements)
+            logger.info(f"medical_ids schema updated: {statements}")
+    except Exception as e:
+        logger.warning(f"medical_ids schema ensure skipped/failed: {e}")
+
+
+def ensure_ai_messages_payload_schema():
+    """Mevcut ai_messages tablosuna sıkıştırılmış payload kolonlarını ekle (payload_blobs create_all ile gelir)."""
+    from sqlalchemy import inspect, text
+
+    try:
+        insp = inspect(engine)
+        if "ai_messages" not in insp.get_table_names():
+            return
+        cols = {c["name"] for c in insp.get_columns("ai_messages")}
+        blob_type = LargeBinary().compile(dialect=engine.dialect)
+        statements = [
+            f"ALTER TABLE ai_messages ADD COLUMN {name} {blob_type}"
+            for name in ("request_payload_z", "response_payload_z")
+            if name not in cols
+        ]
+        if statements:
+            with engine.begin() as conn:
+                for stmt in statements:
+                    conn.execute(text(stmt))
+            logger.info(f"ai_messages schema updated: {statements}")
+        if "payload_blobs" in insp.get_table_names():
+            blob_cols = {c["name"] for c in insp.get_columns("payload_blobs")}
+            if "referenced_at" not in blob_cols:
+                stmt = f"ALTER TABLE payload_blobs ADD COLUMN referenced_at {DateTime().compile(dialect=engine.dialect)}"
+                with engine.begin() as conn:
+                    conn.execute(text(stmt))
+                logger.info(f"payload_blobs schema updated: {[stmt]}")
+        # create_all mevcut tabloya yeni index eklemez
+        for index in AIMessage.__table__.indexes:
+            if index.name == "ix_ai_messages_user_type_created":
+                index.create(bind=engine, checkfirst=True)
     except Exception as e:
-        print(f"medical_ids schema ensure skipped/failed: {e}")
+        logger.warning(f"ai_messages schema ensure skipped/failed: {e}")
+
+
+def ensure_llm_usage_schema():
+    """Mevcut llm_usage_daily tablosuna cached_prompt_tokens kolonunu ekle."""
+    from sqlalchemy import inspect, text
+
+    try:
+        insp = inspect(engine)
+        if "llm_usage_daily" not in insp.get_table_names():
+            return
+        cols = {c["name"] for c in insp.get_columns("llm_usage_daily")}
+        if "cached_prompt_tokens" not in cols:
+            stmt = "ALTER TABLE llm_usage_daily ADD COLUMN cached_prompt_tokens INTEGER NOT NULL DEFAULT 0"
+            with engine.begin() as conn:
+                conn.execute(text(stmt))
+            logger.info(f"llm_usage_daily schema updated: {[stmt]}")
+    except Exception as e:
+        logger.warning(f"llm_usage_daily schema ensure skipped/failed: {e}")
+
+
+def init_schema():
+    """Tabloları oluştur + eksik kolonları ekle. Import'ta değil startup'ta çağrılır (cold start'ı bloklamasın)."""
+    logger.info(f"Database: {DB_DESCRIPTION}")
+    Base.metadata.create_all(bind=engine)
+    ensure_medical_id_schema()
+    ensure_ai_messages_payload_schema()
+    ensure_llm_usage_schema()
+
+
+def _warm_count(eng, connections: int) -> int:
+    # Havuz kapasitesini aşarsak checkout pool timeout'a kadar bekler (SQLite writer pool_size=1)
+    size = getattr(eng.pool, "size", None)
+    return max(1, min(connections, size() if callable(size) else 1))
+
+
+def warm_pools(connections: int) -> int:
+    """Sync havuzlarda bağlantıları açıp geri bırak: ilk istekler connect + pragma maliyeti ödemesin"""
+    opened = 0
+    for eng in ([engine] if read_engine is engine else [engine, read_engine]):
+        conns = []
+        try:
+            for _ in range(_warm_count(eng, connections)):
+                # AUTOCOMMIT: SQLite writer'da warm-up yazma kilidi almasın
+                conn = eng.connect().execution_options(isolation_level="AUTOCOMMIT")
+                conns.append(conn)
+                conn.exec_driver_sql("SELECT 1")
+        finally:
+            for conn in conns:
+                conn.close()
+        opened += len(conns)
+    return opened
+
+
+async def async_warm_pool(connections: int) -> int:
+    """Async havuz için aynısı; app'in event loop'unda çağrılmalı (asyncpg bağlantıları loop'a bağlı)"""
+    if async_engine is None:
+        return 0
+    conns = []
+    try:
+        for _ in range(_warm_count(async_engine.sync_engine, connections)):
+            conn = await async_engine.connect()
+            conns.append(conn)
+            await conn.exec_driver_sql("SELECT 1")
+    finally:
+        for conn in conns:
+            await conn.close()
+    return len(conns)
+
+
+def compress_legacy_ai_message_payloads(db: Session, batch_size: int = 500, after_id: int = 0) -> int:
+    """Legacy JSON payload'ları sıkıştırılmış kolonlara taşı (id sırasıyla, kaldığı yerden devam edebilir)."""
+    migrated = 0
+    last_id = after_id
+    while True:
+        rows = db.execute(
+            select(AIMessage.id, AIMessage.request_payload_json, AIMessage.response_payload_json)
+            .where(
+                AIMessage.id > last_id,
+                AIMessage.request_payload_z.is_(None),
+                AIMessage.response_payload_z.is_(None),
+            )
+            .order_by(AIMessage.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        blobs = {}
+        updates = []
+        for row_id, request_payload, response_payload in rows:
+            columns, row_blobs = _encode_ai_message_payloads(request_payload, response_payload)
+            blobs.update(row_blobs)
+            updates.append({"id": row_id, **columns, "request_payload_json": None, "response_payload_json": None})
+        _store_payload_blobs(db, blobs)
+        db.execute(update(AIMessage), updates)
+        db.commit()
+        migrated += len(rows)
+        last_id = rows[-1][0]
+        logger.info(f"ai_messages payload migration: {migrated} satır (son id {last_id})")
+    return migrated
 
 
 def create_medical_id(
@@ -282,3 +905,495 @@ def ensure_medical_id_pin(db: Session, record: MedicalId, pin_hash: str):
         db.commit()
         db.refresh(record)
     return record
+
+
+# ---------- Medical ID async helpers ----------
+
+async def async_create_medical_id(
+    db: AsyncSession,
+    external_user_id: str,
+    token: str,
+    profile_snapshot: dict | None = None,
+    form_data: dict | None = None,
+    pin_hash: str | None = None,
+    expires_at: datetime.datetime | None = None,
+):
+    """create_medical_id async versiyonu."""
+    record = MedicalId(
+        token=token,
+        external_user_id=external_user_id,
+        is_active=True,
+        profile_snapshot=profile_snapshot,
+        form_data=form_data,
+        pin_hash=pin_hash,
+        form_updated_at=datetime.datetime.utcnow() if form_data else None,
+        expires_at=expires_at,
+    )
+    db.add(record)
+    await db.commit()
+    await db.refresh(record)
+    return record
+
+
+async def async_get_active_medical_id(db: AsyncSession, external_user_id: str):
+    """get_active_medical_id async versiyonu."""
+    result = await db.execute(
+        select(MedicalId)
+        .where(MedicalId.external_user_id == external_user_id, MedicalId.is_active == True)
+        .order_by(MedicalId.created_at.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+
+async def async_get_medical_id_by_token(db: AsyncSession, token: str):
+    """get_medical_id_by_token async versiyonu."""
+    result = await db.execute(select(MedicalId).where(MedicalId.token == token).limit(1))
+    return result.scalars().first()
+
+
+async def async_revoke_medical_ids_for_user(db: AsyncSession, external_user_id: str) -> int:
+    """revoke_medical_ids_for_user async versiyonu."""
+    now = datetime.datetime.utcnow()
+    result = await db.execute(
+        select(MedicalId).where(MedicalId.external_user_id == external_user_id, MedicalId.is_active == True)
+    )
+    rows = result.scalars().all()
+    for row in rows:
+        row.is_active = False
+        row.revoked_at = now
+    await db.commit()
+    return len(rows)
+
+
+async def async_update_medical_id_profile(db: AsyncSession, record: MedicalId, profile_snapshot: dict | None):
+    """update_medical_id_profile async versiyonu."""
+    record.profile_snapshot = profile_snapshot
+    await db.commit()
+    await db.refresh(record)
+    return record
+
+
+async def async_update_medical_id_form(db: AsyncSession, record: MedicalId, form_data: dict | None):
+    """update_medical_id_form async versiyonu."""
+    record.form_data = form_data
+    record.form_updated_at = datetime.datetime.utcnow()
+    await db.commit()
+    await db.refresh(record)
+    return record
+
+
+async def async_ensure_medical_id_pin(db: AsyncSession, record: MedicalId, pin_hash: str):
+    """ensure_medical_id_pin async versiyonu."""
+    if not record.pin_hash:
+        record.pin_hash = pin_hash
+        await db.commit()
+        await db.refresh(record)
+    return record
+
+
+# ---------- LLM token / maliyet ledger'ı (backend/usage_ledger.py) ----------
+
+class LLMUsageDaily(Base):
+    """Gün + endpoint + model + plan + kullanıcı başına toplanmış OpenRouter usage"""
+    __tablename__ = "llm_usage_daily"
+    __table_args__ = (
+        UniqueConstraint("day", "endpoint", "model", "user_plan", "external_user_id", name="uq_llm_usage_daily_key"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False, index=True)
+    endpoint = Column(String, nullable=False)  # route şablonu (/ai/chat) veya "-" (request dışı)
+    model = Column(String, nullable=False)
+    user_plan = Column(String, nullable=False)  # free, premium, premium_plus
+    external_user_id = Column(String, nullable=False, default="")  # unique key'de NULL olmasın diye ""
+    requests = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    cost_usd = Column(Float, nullable=False, default=0.0)
+    max_prompt_tokens = Column(Integer, nullable=False, default=0)  # outlier tespiti için
+    cached_prompt_tokens = Column(Integer, nullable=False, default=0)  # prompt_tokens'ın provider cache'inden okunan kısmı
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+
+_LLM_USAGE_KEY = ("day", "endpoint", "model", "user_plan", "external_user_id")
+_LLM_USAGE_SUMS = ("requests", "prompt_tokens", "completion_tokens", "cost_usd", "cached_prompt_tokens")
+
+
+def upsert_llm_usage(db: Session, rows: list[dict]) -> int:
+    """Ledger satırlarını mevcut günlük toplamların üstüne ekle (tek INSERT ... ON CONFLICT DO UPDATE)."""
+    if not rows:
+        return 0
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name in ("postgresql", "sqlite"):
+        if dialect_name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            greatest = func.greatest
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            greatest = func.max  # SQLite'ta iki argümanlı max() skaler fonksiyondur
+        table = LLMUsageDaily.__table__
+        stmt = dialect_insert(table)
+        update = {name: table.c[name] + stmt.excluded[name] for name in _LLM_USAGE_SUMS}
+        update["max_prompt_tokens"] = greatest(table.c.max_prompt_tokens, stmt.excluded.max_prompt_tokens)
+        update["updated_at"] = datetime.datetime.utcnow()
+        db.execute(stmt.on_conflict_do_update(index_elements=list(_LLM_USAGE_KEY), set_=update), rows)
+    else:
+        for row in rows:
+            existing = db.execute(
+                select(LLMUsageDaily).where(*(getattr(LLMUsageDaily, k) == row[k] for k in _LLM_USAGE_KEY))
+            ).scalar_one_or_none()
+            if existing is None:
+                db.add(LLMUsageDaily(**row))
+                continue
+            for name in _LLM_USAGE_SUMS:
+                setattr(existing, name, getattr(existing, name) + row[name])
+            existing.max_prompt_tokens = max(existing.max_prompt_tokens, row["max_prompt_tokens"])
+    db.commit()
+    return len(rows)
+
+
+def get_llm_usage_report(db: Session, since: datetime.date, limit: int = 20, outlier_factor: float = 3.0) -> dict:
+    """Top tüketiciler, endpoint başına istek maliyeti ve prompt-token outlier'ları"""
+    U = LLMUsageDaily
+    window = U.day >= since
+    totals = (
+        func.sum(U.requests), func.sum(U.prompt_tokens), func.sum(U.completion_tokens), func.sum(U.cost_usd),
+        func.sum(U.cached_prompt_tokens),
+    )
+
+    def _row(keys: dict, requests, prompt, completion, cost, cached) -> dict:
+        requests = requests or 0
+        return {
+            **keys,
+            "requests": requests,
+            "prompt_tokens": prompt or 0,
+            "completion_tokens": completion or 0,
+            "cost_usd": round(cost or 0.0, 6),
+            "cost_per_request_usd": round((cost or 0.0) / requests, 6) if requests else 0.0,
+            "avg_prompt_tokens": round((prompt or 0) / requests, 1) if requests else 0.0,
+            "cached_prompt_tokens": cached or 0,
+            "cached_prompt_ratio": round((cached or 0) / prompt, 4) if prompt else 0.0,
+        }
+
+    top_users = [
+        _row({"external_user_id": user_id, "user_plan": plan}, *sums)
+        for user_id, plan, *sums in db.execute(
+            select(U.external_user_id, U.user_plan, *totals).where(window)
+            .group_by(U.external_user_id, U.user_plan).order_by(func.sum(U.cost_usd).desc()).limit(limit)
+        )
+    ]
+    by_endpoint = [
+        _row({"endpoint": endpoint, "model": model}, *sums)
+        for endpoint, model, *sums in db.execute(
+            select(U.endpoint, U.model, *totals).where(window)
+            .group_by(U.endpoint, U.model).order_by(func.sum(U.cost_usd).desc())
+        )
+    ]
+    by_plan = [
+        _row({"user_plan": plan}, *sums)
+        for plan, *sums in db.execute(select(U.user_plan, *totals).where(window).group_by(U.user_plan))
+    ]
+
+    # Outlier: tek istekteki prompt, aynı endpoint'in ortalama prompt'unun outlier_factor katından büyük
+    endpoint_avg = {}
+    for row in by_endpoint:
+        agg = endpoint_avg.setdefault(row["endpoint"], [0, 0])
+        agg[0] += row["prompt_tokens"]
+        agg[1] += row["requests"]
+    outliers = []
+    for r in db.execute(select(U).where(window).order_by(U.max_prompt_tokens.desc()).limit(limit * 5)).scalars():
+        prompt_sum, request_count = endpoint_avg.get(r.endpoint, (0, 0))
+        avg = prompt_sum / request_count if request_count else 0
+        if avg and r.max_prompt_tokens >= outlier_factor * avg:
+            outliers.append({
+                "day": r.day.isoformat(),
+                "endpoint": r.endpoint,
+                "model": r.model,
+                "user_plan": r.user_plan,
+                "external_user_id": r.external_user_id,
+                "max_prompt_tokens": r.max_prompt_tokens,
+                "endpoint_avg_prompt_tokens": round(avg, 1),
+            })
+            if len(outliers) >= limit:
+                break
+
+    return {
+        "since": since.isoformat(),
+        "top_users": top_users,
+        "by_endpoint": by_endpoint,
+        "by_plan": by_plan,
+        "prompt_outliers": outliers,
+    }
+
+
+# ---------- Önceden hesaplanmış öneriler (backend/precompute.py) ----------
+
+class PrecomputedRecommendation(Base):
+    """Kullanıcı + öneri tipi başına son üretilen yanıt; girdiler (quiz/lab) değişmediyse tekrar üretilmez"""
+    __tablename__ = "precomputed_recommendations"
+    __table_args__ = (UniqueConstraint("external_user_id", "kind", name="uq_precomputed_user_kind"),)
+    id = Column(Integer, primary_key=True)
+    external_user_id = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # diet, exercise, lifestyle, test_recommendations:quiz, test_recommendations:lab
+    input_fingerprint = Column(String(64), nullable=False)  # Girdi (quiz + lab + parametreler) hash'i
+    response_payload = Column(JSON, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+
+async def async_get_precomputed_recommendation(db: AsyncSession, external_user_id: str, kind: str):
+    result = await db.execute(
+        select(PrecomputedRecommendation).where(
+            PrecomputedRecommendation.external_user_id == external_user_id,
+            PrecomputedRecommendation.kind == kind,
+        )
+    )
+    return result.scalar_one_or_none()
+
+
+async def async_upsert_precomputed_recommendation(
+    db: AsyncSession, external_user_id: str, kind: str, input_fingerprint: str, response_payload: dict | None,
+):
+    """(kullanıcı, tip) satırını yaz/güncelle (eşzamanlı istek + arka plan işi çakışırsa son yazan kazanır)"""
+    values = {
+        "external_user_id": external_user_id,
+        "kind": kind,
+        "input_fingerprint": input_fingerprint,
+        "response_payload": response_payload,
+        "updated_at": datetime.datetime.utcnow(),
+    }
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name in ("postgresql", "sqlite"):
+        if dialect_name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(PrecomputedRecommendation).values(**values)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["external_user_id", "kind"],
+            set_={k: stmt.excluded[k] for k in ("input_fingerprint", "response_payload", "updated_at")},
+        ))
+    else:
+        existing = await async_get_precomputed_recommendation(db, external_user_id, kind)
+        if existing is None:
+            db.add(PrecomputedRecommendation(**values))
+        else:
+            existing.input_fingerprint = input_fingerprint
+            existing.response_payload = response_payload
+            existing.updated_at = values["updated_at"]
+    await db.commit()
+
+
+# ---------- Premium chat konuşma özeti (backend/chat_memory.py) ----------
+
+class ConversationSummary(Base):
+    """Kullanıcı başına kayan konuşma özeti; covered_until_id'ye kadarki chat kayıtları özete katlanmıştır"""
+    __tablename__ = "conversation_summaries"
+    id = Column(Integer, primary_key=True)
+    external_user_id = Column(String, nullable=False, unique=True)
+    summary = Column(Text, nullable=False, default="")
+    covered_until_id = Column(Integer, nullable=False, default=0)  # Özete giren son ai_messages.id
+    turn_count = Column(Integer, nullable=False, default=0)  # Özete giren toplam chat turu
+    model_used = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+
+async def async_get_conversation_summary(db: AsyncSession, external_user_id: str):
+    result = await db.execute(select(ConversationSummary).where(ConversationSummary.external_user_id == external_user_id))
+    return result.scalar_one_or_none()
+
+
+def _chat_after_filter(external_user_id: str, after_id: int):
+    return (
+        AIMessage.external_user_id == external_user_id,
+        AIMessage.message_type == "chat",
+        AIMessage.id > after_id,
+    )
+
+
+async def async_count_chat_messages_after(db: AsyncSession, external_user_id: str, after_id: int) -> int:
+    """Özete henüz girmemiş chat turu sayısı (payload açılmaz)"""
+    result = await db.execute(select(func.count(AIMessage.id)).where(*_chat_after_filter(external_user_id, after_id)))
+    return result.scalar_one()
+
+
+async def async_get_chat_messages_after(db: AsyncSession, external_user_id: str, after_id: int, limit: int):
+    """after_id'den sonraki en eski chat kayıtları (id sırasıyla)"""
+    result = await db.execute(
+        select(AIMessage).where(*_chat_after_filter(external_user_id, after_id)).order_by(AIMessage.id).limit(limit)
+    )
+    return await _async_hydrate_ai_messages(db, result.scalars().all())
+
+
+async def async_get_recent_chat_messages_after(db: AsyncSession, external_user_id: str, after_id: int, limit: int):
+    """after_id'den sonraki en yeni chat kayıtları (özete henüz girmemiş turlar)"""
+    result = await db.execute(
+        select(AIMessage).where(*_chat_after_filter(external_user_id, after_id)).order_by(AIMessage.id.desc()).limit(limit)
+    )
+    return await _async_hydrate_ai_messages(db, result.scalars().all())
+
+
+async def async_upsert_conversation_summary(
+    db: AsyncSession, external_user_id: str, summary: str, covered_until_id: int, turn_count: int, model_used: str | None,
+):
+    """Özeti yaz/güncelle; eşzamanlı iki katlama olursa daha ileriyi kapsayan kalır"""
+    existing = await async_get_conversation_summary(db, external_user_id)
+    if existing is None:
+        db.add(ConversationSummary(
+            external_user_id=external_user_id,
+            summary=summary,
+            covered_until_id=covered_until_id,
+            turn_count=turn_count,
+            model_used=model_used,
+        ))
+    elif covered_until_id > existing.covered_until_id:
+        existing.summary = summary
+        existing.covered_until_id = covered_until_id
+        existing.turn_count = turn_count
+        existing.model_used = model_used
+        existing.updated_at = datetime.datetime.utcnow()
+    await db.commit()
+
+
+# ---------- Lab test geçmişi side table'ı (backend/lab_history.py) ----------
+
+class LabTestResult(Base):
+    """lab_single/lab_session/lab_summary payload'larındaki her test bir satır; tek testin geçmişi index'ten okunur"""
+    __tablename__ = "lab_test_results"
+    __table_args__ = (Index("ix_lab_test_results_user_test", "external_user_id", "normalized_name", "measured_at"),)
+    id = Column(Integer, primary_key=True)
+    ai_message_id = Column(Integer, nullable=True, index=True)  # Kaynak ai_messages kaydı (backfill bunu kontrol eder)
+    external_user_id = Column(String, nullable=False)
+    source_type = Column(String, nullable=False)  # lab_single, lab_session, lab_summary
+    normalized_name = Column(String, nullable=False)
+    name = Column(String, nullable=True)
+    value = Column(JSON, nullable=True)  # Ham değer (herhangi bir tip)
+    value_numeric = Column(Float, nullable=True)  # Sayıya çevrilebiliyorsa
+    unit = Column(String, nullable=True)
+    reference_range = Column(String, nullable=True)
+    status = Column(String, nullable=True)
+    measured_at = Column(DateTime, nullable=True)  # Kaynak kaydın created_at'i
+
+
+def _optional_str(value):
+    return None if value is None else str(value)
+
+
+def _lab_test_rows(ai_message_id, external_user_id, message_type, request_payload, created_at) -> list[dict]:
+    from backend.lab_history import LAB_MESSAGE_TYPES, extract_lab_tests, normalize_test_name, parse_numeric
+
+    if not external_user_id or message_type not in LAB_MESSAGE_TYPES:
+        return []
+    rows = []
+    for test in extract_lab_tests(message_type, request_payload):
+        normalized_name = normalize_test_name(test.get("name"))
+        if not normalized_name:
+            continue
+        rows.append({
+            "ai_message_id": ai_message_id,
+            "external_user_id": external_user_id,
+            "source_type": message_type,
+            "normalized_name": normalized_name,
+            "name": test.get("name"),
+            "value": test.get("value"),
+            "value_numeric": parse_numeric(test.get("value")),
+            "unit": _optional_str(test.get("unit")),
+            "reference_range": _optional_str(test.get("reference_range")),
+            "status": _optional_str(test.get("status")),
+            "measured_at": created_at,
+        })
+    return rows
+
+
+def _lab_history_stmt(external_user_id: str, test_name: str, limit: int):
+    from backend.lab_history import normalize_test_name
+
+    return (
+        select(LabTestResult)
+        .where(
+            LabTestResult.external_user_id == external_user_id,
+            LabTestResult.normalized_name == normalize_test_name(test_name),
+        )
+        .order_by(LabTestResult.measured_at.desc(), LabTestResult.id)
+        .limit(limit)
+    )
+
+
+def _lab_history_item(row: LabTestResult) -> dict:
+    return {
+        "name": row.name,
+        "value": row.value,
+        "unit": row.unit,
+        "reference_range": row.reference_range,
+        "status": row.status,
+        "date": row.measured_at.isoformat() if row.measured_at else None,
+    }
+
+
+def get_lab_test_history(db: Session, external_user_id: str, test_name: str, limit: int = 50) -> list[dict]:
+    """Tek testin geçmiş sonuçları (en yeni önce); ai_messages payload'ları açılmaz"""
+    return [_lab_history_item(row) for row in db.execute(_lab_history_stmt(external_user_id, test_name, limit)).scalars()]
+
+
+async def async_get_lab_test_history(db: AsyncSession, external_user_id: str, test_name: str, limit: int = 50) -> list[dict]:
+    """Async version of get_lab_test_history."""
+    result = await db.execute(_lab_history_stmt(external_user_id, test_name, limit))
+    return [_lab_history_item(row) for row in result.scalars()]
+
+
+def get_lab_test_histories(db: Session, external_user_id: str, test_names: list[str], limit: int = 50) -> dict[str, list[dict]]:
+    """Birden çok testin geçmişi tek sorguda: normalized_name -> sonuçlar (en yeni önce, test başına limit)"""
+    from backend.lab_history import normalize_test_name
+
+    names = {normalize_test_name(name) for name in test_names} - {""}
+    histories = {name: [] for name in names}
+    if not names:
+        return histories
+    rank = func.row_number().over(
+        partition_by=LabTestResult.normalized_name,
+        order_by=(LabTestResult.measured_at.desc(), LabTestResult.id),
+    ).label("rank")
+    ranked = (
+        select(LabTestResult.id, rank)
+        .where(LabTestResult.external_user_id == external_user_id, LabTestResult.normalized_name.in_(names))
+        .subquery()
+    )
+    rows = db.execute(
+        select(LabTestResult)
+        .join(ranked, ranked.c.id == LabTestResult.id)
+        .where(ranked.c.rank <= limit)
+        .order_by(LabTestResult.measured_at.desc(), LabTestResult.id)
+    ).scalars()
+    for row in rows:
+        histories[row.normalized_name].append(_lab_history_item(row))
+    return histories
+
+
+def backfill_lab_test_results(db: Session, batch_size: int = 500, after_id: int = 0) -> int:
+    """Side table'da satırı olmayan lab kayıtlarını aç (id sırasıyla, tekrar çalıştırılabilir)."""
+    from backend.lab_history import LAB_MESSAGE_TYPES
+
+    indexed = select(LabTestResult.id).where(LabTestResult.ai_message_id == AIMessage.id).exists()
+    processed = 0
+    last_id = after_id
+    while True:
+        records = db.execute(
+            select(AIMessage)
+            .where(AIMessage.id > last_id, AIMessage.message_type.in_(LAB_MESSAGE_TYPES), ~indexed)
+            .order_by(AIMessage.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not records:
+            break
+        _hydrate_ai_messages(db, records)
+        rows = []
+        for record in records:
+            rows.extend(_lab_test_rows(
+                record.id, record.external_user_id, record.message_type, record.request_payload, record.created_at,
+            ))
+        if rows:
+            db.execute(insert(LabTestResult), rows)
+        db.commit()
+        processed += len(records)
+        last_id = records[-1].id
+        logger.info(f"lab_test_results backfill: {processed} kayıt, {len(rows)} test satırı (son id {last_id})")
+    return processed
@@ -10,6 +10,9 @@ DEPRECATED - This script is no longer used. User model has been removed.
 # from sqlalchemy import create_engine, text
 # from sqlalchemy.orm import sessionmaker
 # from backend.db import Base, SessionLocal, User, Conversation, Message
+from backend.log_utils import get_logger
+
+logger = get_logger("db_migration")
 
 def migrate_to_postgresql():
     """SQLite'dan PostgreSQL'e veri taşıma"""
@@ -22,9 +25,7 @@ def migrate_to_postgresql():
     pg_password = os.getenv("DB_PASSWORD")
     
     if not all([pg_host, pg_name, pg_user, pg_password]):
-        print("❌ PostgreSQL credentials eksik!")
-        print("Şu environment variables'ları ayarlayın:")
-        print("  DB_HOST, DB_NAME, DB_USER, DB_PASSWORD")
+        logger.error("PostgreSQL credentials eksik! DB_HOST, DB_NAME, DB_USER, DB_PASSWORD environment variables'larını ayarlayın")
         return False
     
     # PostgreSQL engine
@@ -33,30 +34,30 @@ def migrate_to_postgresql():
     
     try:
         # PostgreSQL'de tabloları oluştur
-        print("🔄 PostgreSQL'de tablolar oluşturuluyor...")
+        logger.info("PostgreSQL'de tablolar oluşturuluyor...")
         Base.metadata.create_all(bind=pg_engine)
-        print("✅ Tablolar oluşturuldu")
+        logger.info("Tablolar oluşturuldu")
         
         # SQLite'dan veri oku
-        print("📖 SQLite'dan veri okunuyor...")
+        logger.info("SQLite'dan veri okunuyor...")
         sqlite_session = SessionLocal()
         
         # Users
         users = sqlite_session.query(User).all()
-        print(f"👥 {len(users)} kullanıcı bulundu")
+        logger.info(f"{len(users)} kullanıcı bulundu")
         
         # Conversations
         conversations = sqlite_session.query(Conversation).all()
-        print(f"💬 {len(conversations)} konuşma bulundu")
+        logger.info(f"{len(conversations)} konuşma bulundu")
         
         # Messages
         messages = sqlite_session.query(Message).all()
-        print(f"💭 {len(messages)} mesaj bulundu")
+        logger.info(f"{len(messages)} mesaj bulundu")
         
         
         
         # PostgreSQL'e veri yaz
-        print("💾 PostgreSQL'e veri yazılıyor...")
+        logger.info("PostgreSQL'e veri yazılıyor...")
         pg_session = sessionmaker(bind=pg_engine)()
         
         # Users
@@ -104,7 +105,7 @@ def migrate_to_postgresql():
         
         # Commit
         pg_session.commit()
-        print("✅ Veri migration tamamlandı!")
+        logger.info("Veri migration tamamlandı!")
         
         # Session'ları kapat
         sqlite_session.close()
@@ -113,25 +114,24 @@ def migrate_to_postgresql():
         return True
         
     except Exception as e:
-        print(f"❌ Migration hatası: {e}")
+        logger.error(f"Migration hatası: {e}")
         return False
 
 def switch_to_postgresql():
     """Database tipini PostgreSQL'e çevir"""
-    print("🔄 Database tipi PostgreSQL'e çevriliyor...")
+    logger.info("Database tipi PostgreSQL'e çevriliyor...")
     
     # Environment variable'ı güncelle
     os.environ["DB_TYPE"] = "postgresql"
     
     # Database'i yeniden başlat
     from backend.db import engine, SessionLocal
-    print("✅ Database PostgreSQL'e geçti!")
+    logger.info("Database PostgreSQL'e geçti!")
     
     return True
 
 if __name__ == "__main__":
-    print("🚀 Database Migration Tool")
-    print("=" * 40)
+    logger.info("Database Migration Tool")
     
     choice = input("""
 Seçenekler:
@@ -146,6 +146,6 @@ Seçiminiz (1-3): """)
     elif choice == "2":
         switch_to_postgresql()
     elif choice == "3":
-        print("👋 Görüşürüz!")
+        logger.info("Görüşürüz!")
     else:
-        print("❌ Geçersiz seçim!")
+        logger.error("Geçersiz seçim!")
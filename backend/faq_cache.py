@@ -0,0 +1,312 @@
+"""Free tier chat için yerel FAQ / benzer soru yanıt cache'i.
+
+Free kullanıcılar aynı soruları küçük farklarla tekrar sorar ("D vitamini ne
+işe yarar", "d vitamini ne ise yarar acaba?"). Sorular Türkçe karakter
+katlamasıyla normalize edilir; selam/rica gibi dolgu kelimeleri atılır ve
+kalan içerik kelimelerinin ilk 5 harfi (kısa/rakamlı kelimeler olduğu gibi:
+"d", "b12", "q10") soru parmak izini oluşturur. Aynı parmak izli kayıtlar
+arasından char 3-gram TF-IDF cosine benzerliği FAQ_CACHE_THRESHOLD'u geçen en
+iyisi döner. Harici embedding servisi yok; lookup bir dict erişimi ve birkaç
+vektör karşılaştırmasıdır.
+
+- Varsayılan olarak sadece FAQ_CACHE_SEED_PATH'teki elle onaylanmış
+  soru/yanıtlar servis edilir; bunlar TTL'siz ve katalogdan bağımsızdır.
+- Bağlamsız üretilmiş (konuşma geçmişi boş) ve kontrolden geçen LLM yanıtları
+  sadece aday olarak tutulur ve lookup'ta kullanılmaz. Aynı soruya aynı yanıt
+  FAQ_CACHE_PROMOTE_AFTER kez üretilirse aday terfi eder ve servis edilir
+  (0 = öğrenilen yanıt hiç servis edilmez). Takip soruları ("peki bunu...")
+  cache'e bakmaz.
+- Öğrenilen kayıtlar (aday/terfi) FAQ_CACHE_TTL_S sonra düşer; ürün kataloğu
+  değişince (yanıtlar katalogdan ürün önerir) tamamı silinir.
+
+İsabet oranı /metrics'te (longo_cache_requests_total{cache="faq"}) ve
+/ai/usage/report'ta (faq_cache) görünür.
+"""
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from backend.config import (
+    FAQ_CACHE_ENABLED,
+    FAQ_CACHE_MAX_ENTRIES,
+    FAQ_CACHE_PROMOTE_AFTER,
+    FAQ_CACHE_SEED_PATH,
+    FAQ_CACHE_THRESHOLD,
+    FAQ_CACHE_TTL_S,
+)
+from backend.log_utils import get_logger
+from backend.metrics import REGISTRY, CallbackMetric, record_cache
+
+logger = get_logger("faq_cache")
+
+_TR_FOLD = str.maketrans("çğıöşüâîû", "cgiosuaiu")
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+# Anlamı değiştirmeyen dolgu kelimeleri (katlanmış hali)
+_STOPWORDS = frozenset((
+    "merhaba", "selam", "slm", "lutfen", "acaba", "bana", "beni", "benim", "bir", "ve", "ile",
+    "mi", "mu", "da", "de", "ki", "hocam", "sence", "sizce", "tesekkurler", "tesekkur", "ederim",
+    "sorum", "soru", "var", "sormak", "istiyorum", "merak", "ediyorum",
+    "hi", "hello", "hey", "please", "the", "a", "an", "me", "i", "thanks",
+))
+# Önceki mesaja atıf yapan kelimeler: bu sorular bağlamsız yanıtla karşılanamaz
+_FOLLOWUP_WORDS = frozenset((
+    "peki", "o", "bu", "onu", "bunu", "onun", "bunun", "ona", "buna", "onlar", "bunlar", "onlari", "bunlari",
+    "it", "that", "this", "those", "them", "they",
+))
+
+# Cache'e girecek yanıtın boyut sınırları (hata/kesik yanıtlar girmesin)
+_MIN_ANSWER_CHARS = 40
+_MAX_ANSWER_CHARS = 4000
+
+
+def normalize_question(text) -> str:
+    """Küçük harf + Türkçe karakter katlama + noktalama temizliği"""
+    text = str(text or "").replace("İ", "i").replace("I", "ı").lower().translate(_TR_FOLD)
+    return " ".join(_NON_WORD_RE.sub(" ", text).split())
+
+
+def _term_key(token: str) -> str:
+    # Kısa ya da rakamlı kelimeler (vitamin/mineral kodları) birebir, diğerleri ek farkı gözetmeden
+    return token if len(token) <= 3 or any(ch.isdigit() for ch in token) else token[:5]
+
+
+def question_fingerprint(normalized: str) -> tuple:
+    return tuple(sorted({_term_key(t) for t in normalized.split() if t not in _STOPWORDS}))
+
+
+def is_standalone(question: str) -> bool:
+    """Önceki mesaja atıf yapmayan (cache'ten yanıtlanabilir) soru mu"""
+    return not any(token in _FOLLOWUP_WORDS for token in normalize_question(question).split())
+
+
+_last_catalog = (None, None)
+
+
+def catalog_version(products) -> str:
+    """Ürün kataloğunun kısa özeti; katalog değişince öğrenilen yanıtlar geçersizleşir"""
+    global _last_catalog
+    # get_xml_products TTL boyunca aynı listeyi döndürür; özet liste başına bir kez hesaplanır
+    if _last_catalog[0] is products and products is not None:
+        return _last_catalog[1]
+    names = "\n".join(str(p.get("name", "")) for p in products or [])
+    version = hashlib.sha1(names.encode("utf-8")).hexdigest()[:12]
+    _last_catalog = (products, version)
+    return version
+
+
+def _answer_key(answer: str) -> str:
+    # Boşluk/noktalama farkı aynı yanıt sayılır
+    return hashlib.sha1(normalize_question(answer).encode("utf-8")).hexdigest()
+
+
+def _ngrams(normalized: str) -> Counter:
+    # Dolgu kelimeleri benzerliği düşürmesin
+    padded = " " + " ".join(t for t in normalized.split() if t not in _STOPWORDS) + " "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class FAQCache:
+    """Parmak izi bucket'ları + char 3-gram TF-IDF ile benzer soru -> yanıt cache'i"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()  # LRU sırası
+        self._buckets: dict[tuple, list[int]] = {}
+        self._df: Counter = Counter()
+        self._next_id = 0
+        self._catalog_version = None
+        self._seeded = False
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "promoted": 0, "rejected": 0, "expired": 0, "evicted": 0, "invalidated": 0}
+
+    def _idf(self, gram: str) -> float:
+        return math.log((1 + len(self._entries)) / (1 + self._df[gram])) + 1.0
+
+    def _cosine(self, a: Counter, b: Counter) -> float:
+        weights_a = {g: tf * self._idf(g) for g, tf in a.items()}
+        weights_b = {g: tf * self._idf(g) for g, tf in b.items()}
+        dot = sum(w * weights_b.get(g, 0.0) for g, w in weights_a.items())
+        norm = math.sqrt(sum(w * w for w in weights_a.values())) * math.sqrt(sum(w * w for w in weights_b.values()))
+        return dot / norm if norm else 0.0
+
+    def _add(self, normalized: str, language: str, answer: str, pinned: bool):
+        key = (language, question_fingerprint(normalized))
+        grams = _ngrams(normalized)
+        answer_key = _answer_key(answer)
+        for entry_id in self._buckets.get(key, ()):
+            entry = self._entries[entry_id]
+            if entry["question"] != normalized:
+                continue
+            if pinned:
+                entry.update(answer=answer, answer_key=answer_key, created_at=time.time(), pinned=True, served=True)
+            elif entry["pinned"]:
+                pass  # Onaylı kayıt öğrenilenle ezilmez
+            elif entry["answer_key"] == answer_key:
+                # Aynı soruya aynı yanıt tekrar üretildi: onay sayısı artar, yeterince onaylanan aday servis edilir
+                entry["confirmations"] += 1
+                entry["created_at"] = time.time()
+                if not entry["served"] and FAQ_CACHE_PROMOTE_AFTER and entry["confirmations"] >= FAQ_CACHE_PROMOTE_AFTER:
+                    entry["served"] = True
+                    self.stats["promoted"] += 1
+            else:
+                # Farklı yanıt: tutarsız soru, aday sıfırdan başlar (terfi etmişse servis dışı kalır)
+                entry.update(answer=answer, answer_key=answer_key, created_at=time.time(), confirmations=1, served=False)
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = {
+            "key": key, "question": normalized, "grams": grams, "answer": answer, "answer_key": answer_key,
+            "created_at": time.time(), "pinned": pinned, "hits": 0, "confirmations": 1,
+            "served": pinned or FAQ_CACHE_PROMOTE_AFTER == 1,
+        }
+        if not pinned and FAQ_CACHE_PROMOTE_AFTER == 1:
+            self.stats["promoted"] += 1
+        self._buckets.setdefault(key, []).append(entry_id)
+        self._df.update(grams.keys())
+        self._evict()
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        bucket = self._buckets.get(entry["key"], [])
+        bucket.remove(entry_id)
+        if not bucket:
+            del self._buckets[entry["key"]]
+        self._df.subtract(entry["grams"].keys())
+        for gram in entry["grams"]:
+            if self._df[gram] <= 0:
+                del self._df[gram]
+
+    def _evict(self):
+        # En uzun süredir kullanılmayan öğrenilmiş kayıtlar düşer; onaylı kayıtlar sınırdan sayılmaz
+        if len(self._entries) <= FAQ_CACHE_MAX_ENTRIES:
+            return
+        learned = [entry_id for entry_id, entry in self._entries.items() if not entry["pinned"]]
+        for entry_id in learned[:max(0, len(learned) - FAQ_CACHE_MAX_ENTRIES)]:
+            self._remove(entry_id)
+            self.stats["evicted"] += 1
+
+    def _check_catalog(self, version: str | None):
+        if version is None or version == self._catalog_version:
+            return
+        if self._catalog_version is not None:
+            learned = [entry_id for entry_id, entry in self._entries.items() if not entry["pinned"]]
+            for entry_id in learned:
+                self._remove(entry_id)
+            self.stats["invalidated"] += len(learned)
+            logger.info(f"Ürün kataloğu değişti, {len(learned)} FAQ cache kaydı silindi")
+        self._catalog_version = version
+
+    def _ensure_seed(self):
+        if self._seeded:
+            return
+        self._seeded = True
+        if not FAQ_CACHE_SEED_PATH:
+            return
+        try:
+            with open(FAQ_CACHE_SEED_PATH, encoding="utf-8") as f:
+                items = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"FAQ seed dosyası okunamadı ({FAQ_CACHE_SEED_PATH}): {e}")
+            return
+        count = 0
+        for item in items if isinstance(items, list) else []:
+            answer = item.get("answer") if isinstance(item, dict) else None
+            questions = (item.get("questions") or [item.get("question")]) if answer else []
+            for question in questions:
+                normalized = normalize_question(question)
+                if normalized:
+                    self._add(normalized, item.get("language", "tr"), answer, pinned=True)
+                    count += 1
+        logger.info(f"FAQ cache: {count} onaylı soru yüklendi")
+
+    def lookup(self, question: str, language: str, version: str | None = None) -> str | None:
+        """Benzer soru için cache'teki yanıt (yoksa None)"""
+        if not FAQ_CACHE_ENABLED:
+            return None
+        normalized = normalize_question(question)
+        answer = None
+        with self._lock:
+            self._ensure_seed()
+            self._check_catalog(version)
+            key = (language, question_fingerprint(normalized))
+            grams = _ngrams(normalized)
+            best_id, best_score = None, FAQ_CACHE_THRESHOLD
+            now = time.time()
+            for entry_id in list(self._buckets.get(key, ())):
+                entry = self._entries[entry_id]
+                if not entry["pinned"] and now - entry["created_at"] > FAQ_CACHE_TTL_S:
+                    self._remove(entry_id)
+                    self.stats["expired"] += 1
+                    continue
+                if not entry["served"]:
+                    continue  # Onaylanmamış aday
+                score = self._cosine(grams, entry["grams"])
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is not None:
+                entry = self._entries[best_id]
+                entry["hits"] += 1
+                self._entries.move_to_end(best_id)
+                answer = entry["answer"]
+            self.stats["hits" if answer is not None else "misses"] += 1
+        record_cache("faq", answer is not None)
+        return answer
+
+    def store(self, question: str, language: str, answer: str, version: str | None = None) -> bool:
+        """Bağlamsız üretilmiş LLM yanıtını aday olarak kaydet; kontrolden geçmezse False"""
+        if not FAQ_CACHE_ENABLED:
+            return False
+        normalized = normalize_question(question)
+        answer = (answer or "").strip()
+        valid = (
+            bool(question_fingerprint(normalized))
+            and _MIN_ANSWER_CHARS <= len(answer) <= _MAX_ANSWER_CHARS
+            and not answer.startswith("LIMIT_POPUP")
+        )
+        with self._lock:
+            if not valid:
+                self.stats["rejected"] += 1
+                return False
+            self._check_catalog(version)
+            self._add(normalized, language, answer, pinned=False)
+            self.stats["stored"] += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._df.clear()
+            self._seeded = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["pinned"] = sum(1 for entry in self._entries.values() if entry["pinned"])
+            stats["candidates"] = sum(1 for entry in self._entries.values() if not entry["served"])
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+faq_cache = FAQCache()
+
+
+def faq_cache_stats() -> dict:
+    return faq_cache.snapshot()
+
+
+def _entry_counts() -> dict:
+    stats = faq_cache.snapshot()
+    promoted = stats["entries"] - stats["pinned"] - stats["candidates"]
+    return {("pinned",): stats["pinned"], ("promoted",): promoted, ("candidate",): stats["candidates"]}
+
+
+REGISTRY.register(CallbackMetric(
+    "longo_faq_cache_entries", "Free chat FAQ cache'indeki kayıtlar (pinned/promoted/candidate)", ("kind",), _entry_counts,
+))
@@ -1,19 +1,24 @@
 from typing import Tuple
 from backend.config import HEALTH_MODE, MODERATION_MODEL
 from backend.openrouter_client import call_chat_model
+from backend.metrics import timed_stage
+from backend.log_utils import get_logger, log_payload
 import time
 
+logger = get_logger("health_guard")
+
 
 _last_llm_call = 0
 _min_interval = 10.0  # 10 saniye minimum interval (OpenRouter rate limit için)
 
+@timed_stage("guard")
 def guard_or_message(text: str) -> Tuple[bool, str]:
     """Basit Health Guard - Sadece 2 kategori: SAFE vs BLOCK"""
     
     # LLM ile basit sınıflandırma
     try:
         label = classify_topic_simple(text)
-        print(f"Health guard classification: {text[:50]}... -> {label}")
+        logger.debug("Health guard classification: %s -> %s", log_payload(text[:50]), label)
         
         if label == "BLOCK":
             return False, "Üzgünüm, Longo bu konuda yorum yapamıyor. Sadece supplement ve temel sağlık konularında yardımcı olabilirim."
@@ -21,7 +26,7 @@ def guard_or_message(text: str) -> Tuple[bool, str]:
             return True, ""
             
     except Exception as e:
-        print(f"Health guard failed: {e}, allowing request")
+        logger.warning(f"Health guard failed: {e}, allowing request")
         return True, ""
 
 # ---------- Basit Topic Classifier ----------
@@ -87,5 +92,5 @@ def classify_topic_simple(text: str) -> str:
             return "SAFE"
         
     except Exception as e:
-        print(f"LLM classification failed: {e}")
+        logger.warning(f"LLM classification failed: {e}")
         return "SAFE"  # Güvenli default
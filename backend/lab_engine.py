@@ -0,0 +1,322 @@
+"""Lab sonuçları için deterministik sayısal hesaplar.
+
+Referans aralığı ayrıştırma (Türkçe/İngilizce yazımlar), birim
+normalizasyonu, durum (düşük/normal/yüksek), önceki sonuca göre fark ve
+kullanıcı geçmişi üzerinden trend eğimi. Eğimler tüm testler için tek
+seferde hesaplanır (NumPy varsa bincount ile vektörel, yoksa saf Python).
+Prompt'lar ham tablo yerine format_lab_facts çıktısını alır; LLM'in
+yüksek/düşük kararı vermesine gerek kalmaz.
+"""
+import datetime
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.lab_history import normalize_test_name
+
+try:
+    import numpy as np
+except ImportError:  # Opsiyonel: yoksa eğimler saf Python ile
+    np = None
+
+_NUM = r"[-+]?\d+(?:[.,]\d+)?"
+_VALUE_RE = re.compile(rf"^\s*(?P<op>[<>≤≥]=?)?\s*(?P<num>{_NUM})\s*(?:[^\d\s].*)?$")
+_BETWEEN_RE = re.compile(rf"(?P<low>{_NUM})\s*(?:-|–|—|to|ile|\.\.\.?)\s*(?P<high>{_NUM})", re.IGNORECASE)
+_UPPER_RES = (
+    re.compile(rf"(?:<=?|≤|less than|up to|below|max\.?|maks\.?|en fazla|en çok)\s*(?P<num>{_NUM})", re.IGNORECASE),
+    re.compile(rf"(?P<num>{_NUM})\s*\S*?\s*(?:'?[dt][ae]n\s+(?:az|küçük|düşük)|altı|altında)", re.IGNORECASE),
+)
+_LOWER_RES = (
+    re.compile(rf"(?:>=?|≥|greater than|more than|above|min\.?|en az)\s*(?P<num>{_NUM})", re.IGNORECASE),
+    re.compile(rf"(?P<num>{_NUM})\s*\S*?\s*(?:'?[dt][ae]n\s+(?:fazla|büyük|yüksek)|üzeri|üstü|üzerinde)", re.IGNORECASE),
+)
+
+# Yazım varyantı -> standart birim (anahtarlar küçük harf, boşluksuz)
+_UNIT_ALIASES = {
+    "mg/dl": "mg/dL", "g/dl": "g/dL", "µg/dl": "µg/dL", "ug/dl": "µg/dL", "mcg/dl": "µg/dL",
+    "mg/l": "mg/L", "g/l": "g/L", "µg/l": "µg/L", "ug/l": "µg/L", "mcg/l": "µg/L",
+    "ng/ml": "ng/mL", "pg/ml": "pg/mL", "ng/dl": "ng/dL", "µg/ml": "µg/mL", "ug/ml": "µg/mL",
+    "mmol/l": "mmol/L", "µmol/l": "µmol/L", "umol/l": "µmol/L", "μmol/l": "µmol/L",
+    "nmol/l": "nmol/L", "pmol/l": "pmol/L", "mmol/mol": "mmol/mol", "meq/l": "mmol/L",
+    "u/l": "U/L", "iu/l": "U/L", "ü/l": "U/L",
+    "miu/l": "mIU/L", "mıu/l": "mIU/L", "µiu/ml": "mIU/L", "uiu/ml": "mIU/L", "μiu/ml": "mIU/L", "miu/ml": "IU/L",
+    "10^3/ul": "10³/µL", "10³/µl": "10³/µL", "10^3/µl": "10³/µL", "x10^3/ul": "10³/µL", "k/ul": "10³/µL",
+    "10^9/l": "10³/µL", "bin/µl": "10³/µL", "bin/ul": "10³/µL",
+    "10^6/ul": "10⁶/µL", "10⁶/µl": "10⁶/µL", "10^6/µl": "10⁶/µL", "m/ul": "10⁶/µL", "10^12/l": "10⁶/µL",
+    "fl": "fL", "pg": "pg", "%": "%", "mm/saat": "mm/h", "mm/h": "mm/h", "mm/hr": "mm/h",
+}
+
+# Analit bazlı dönüşümler: (analit, kaynak birim) -> (hedef birim, çarpan)
+_ANALYTE_ALIASES = {
+    "glucose": ("glukoz", "glucose", "açlık kan şekeri", "açlık glukozu", "aks", "kan şekeri"),
+    "cholesterol": ("kolesterol", "total kolesterol", "cholesterol", "total cholesterol",
+                    "ldl", "ldl kolesterol", "ldl-c", "hdl", "hdl kolesterol", "hdl-c"),
+    "triglycerides": ("trigliserid", "trigliserit", "triglycerides", "triglyceride"),
+    "creatinine": ("kreatinin", "creatinine"),
+    "vitamin_d": ("d vitamini", "vitamin d", "25-oh vitamin d", "25(oh)d", "25-oh d vitamini"),
+    "hba1c": ("hba1c", "hemoglobin a1c", "glikozile hemoglobin"),
+}
+_ANALYTE_BY_NAME = {alias: analyte for analyte, aliases in _ANALYTE_ALIASES.items() for alias in aliases}
+_CONVERSIONS = {
+    ("glucose", "mmol/L"): ("mg/dL", 18.016),
+    ("cholesterol", "mmol/L"): ("mg/dL", 38.67),
+    ("triglycerides", "mmol/L"): ("mg/dL", 88.57),
+    ("creatinine", "µmol/L"): ("mg/dL", 1 / 88.4),
+    ("vitamin_d", "nmol/L"): ("ng/mL", 1 / 2.496),
+}
+# Analitten bağımsız, aynı boyuttaki birimler
+_GENERIC_CONVERSIONS = {
+    "g/L": ("g/dL", 0.1),
+    "µg/L": ("ng/mL", 1.0),
+}
+
+STATUS_LOW = "düşük"
+STATUS_NORMAL = "normal"
+STATUS_HIGH = "yüksek"
+
+
+def _to_float(text: str) -> float:
+    return float(text.replace(",", "."))
+
+
+def parse_value(value) -> Optional[float]:
+    """Test sonucu -> sayı ("5,4", "<0.5", "12 mg/dL" dahil); sayısal değilse None"""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _VALUE_RE.match(str(value))
+    return _to_float(match.group("num")) if match else None
+
+
+def parse_reference_range(text) -> Tuple[Optional[float], Optional[float]]:
+    """(alt, üst); tek taraflı aralıkta diğer uç None, ayrıştırılamazsa (None, None)"""
+    if not text or not isinstance(text, str):
+        return None, None
+    match = _BETWEEN_RE.search(text)
+    if match:
+        low, high = _to_float(match.group("low")), _to_float(match.group("high"))
+        return (low, high) if low <= high else (high, low)
+    for pattern in _UPPER_RES:
+        match = pattern.search(text)
+        if match:
+            return None, _to_float(match.group("num"))
+    for pattern in _LOWER_RES:
+        match = pattern.search(text)
+        if match:
+            return _to_float(match.group("num")), None
+    return None, None
+
+
+def normalize_unit(unit) -> Optional[str]:
+    if not unit or not isinstance(unit, str):
+        return None
+    key = unit.strip().lower().replace(" ", "").replace("μ", "µ")
+    return _UNIT_ALIASES.get(key, unit.strip())
+
+
+def convert_to_standard(name, value: Optional[float], low: Optional[float], high: Optional[float], unit):
+    """Değer ve aralığı analitin standart birimine çevir (ör. glukoz mmol/L -> mg/dL)"""
+    unit = normalize_unit(unit)
+    rule = _CONVERSIONS.get((_ANALYTE_BY_NAME.get(normalize_test_name(name)), unit)) or _GENERIC_CONVERSIONS.get(unit)
+    if rule is None:
+        return value, low, high, unit
+    target, factor = rule
+    scale = lambda x: None if x is None else round(x * factor, 4)
+    return scale(value), scale(low), scale(high), target
+
+
+def compute_status(value: Optional[float], low: Optional[float], high: Optional[float]) -> Optional[str]:
+    if value is None or (low is None and high is None):
+        return None
+    if low is not None and value < low:
+        return STATUS_LOW
+    if high is not None and value > high:
+        return STATUS_HIGH
+    return STATUS_NORMAL
+
+
+def deviation_ratio(value: Optional[float], low: Optional[float], high: Optional[float]) -> Optional[float]:
+    """Aralık dışına taşma oranı: üst sınırın %50 üstü -> 0.5; aralık içindeyse 0"""
+    if value is None:
+        return None
+    if high is not None and value > high:
+        return round((value - high) / abs(high), 4) if high else None
+    if low is not None and value < low:
+        return round((low - value) / abs(low), 4) if low else None
+    return 0.0 if (low is not None or high is not None) else None
+
+
+def parse_test_date(text, now: Optional[datetime.datetime] = None) -> Optional[datetime.datetime]:
+    """ISO, gg.aa.yyyy, gg/aa/yyyy; "Yeni Seans" (bu istekteki testler) -> now"""
+    if isinstance(text, datetime.datetime):
+        return text
+    if not text or not isinstance(text, str):
+        return None
+    text = text.strip()
+    if text == "Yeni Seans":
+        return now or datetime.datetime.utcnow()
+    try:
+        return datetime.datetime.fromisoformat(text.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        pass
+    for fmt in ("%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d"):
+        try:
+            return datetime.datetime.strptime(text[:10], fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def analyze_test(test: Dict[str, Any]) -> Dict[str, Any]:
+    """Tek test: standart birimde değer, aralık ve hesaplanan durum"""
+    name = test.get("name") or test.get("test_name")
+    raw_value = test.get("value") if test.get("value") is not None else test.get("result")
+    low, high = parse_reference_range(test.get("reference_range"))
+    value, low, high, unit = convert_to_standard(name, parse_value(raw_value), low, high, test.get("unit"))
+    return {
+        "name": name,
+        "raw_value": raw_value,
+        "value": value,
+        "unit": unit,
+        "low": low,
+        "high": high,
+        "reference_range": test.get("reference_range"),
+        "status": compute_status(value, low, high),
+        "deviation": deviation_ratio(value, low, high),
+    }
+
+
+def trend_slopes(series: Dict[str, List[Tuple[datetime.datetime, float]]]) -> Dict[str, Optional[float]]:
+    """Test başına en küçük kareler eğimi (birim/30 gün); en az 2 farklı tarih gerekir"""
+    names = [name for name, points in series.items() if len(points) >= 2]
+    slopes: Dict[str, Optional[float]] = {name: None for name in series}
+    if not names:
+        return slopes
+    origin = min(t for name in names for t, _ in series[name])
+    groups, xs, ys = [], [], []
+    for index, name in enumerate(names):
+        for t, y in series[name]:
+            groups.append(index)
+            xs.append((t - origin).total_seconds() / 86400.0)
+            ys.append(y)
+
+    if np is not None:
+        g = np.asarray(groups)
+        x = np.asarray(xs, dtype=float)
+        y = np.asarray(ys, dtype=float)
+        size = len(names)
+        n = np.bincount(g, minlength=size).astype(float)
+        sx = np.bincount(g, weights=x, minlength=size)
+        sy = np.bincount(g, weights=y, minlength=size)
+        sxx = np.bincount(g, weights=x * x, minlength=size)
+        sxy = np.bincount(g, weights=x * y, minlength=size)
+        denom = n * sxx - sx * sx
+        with np.errstate(divide="ignore", invalid="ignore"):
+            per_day = np.where(denom > 1e-9, (n * sxy - sx * sy) / denom, np.nan)
+        for name, slope in zip(names, per_day.tolist()):
+            slopes[name] = None if slope != slope else round(slope * 30, 4)
+        return slopes
+
+    sums: Dict[int, List[float]] = {}
+    for index, x, y in zip(groups, xs, ys):
+        acc = sums.setdefault(index, [0.0, 0.0, 0.0, 0.0, 0.0])
+        acc[0] += 1
+        acc[1] += x
+        acc[2] += y
+        acc[3] += x * x
+        acc[4] += x * y
+    for index, (n, sx, sy, sxx, sxy) in sums.items():
+        denom = n * sxx - sx * sx
+        slopes[names[index]] = round((n * sxy - sx * sy) / denom * 30, 4) if denom > 1e-9 else None
+    return slopes
+
+
+def build_lab_facts(tests: List[Dict[str, Any]], now: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+    """Geçmiş + yeni testler (test_date/date alanlı) -> test başına son durum, fark ve trend
+
+    Sıra testlerin ilk görüldüğü sıradır; tarihi olmayan ölçümler en eski kabul edilir.
+    """
+    now = now or datetime.datetime.utcnow()
+    grouped: Dict[str, List[Tuple[datetime.datetime, int, Dict[str, Any]]]] = {}
+    for position, test in enumerate(tests):
+        key = normalize_test_name(test.get("name") or test.get("test_name"))
+        if not key:
+            continue
+        when = parse_test_date(test.get("test_date") or test.get("date"), now) or datetime.datetime.min
+        grouped.setdefault(key, []).append((when, position, analyze_test(test)))
+
+    series = {}
+    for key, entries in grouped.items():
+        entries.sort(key=lambda item: (item[0], item[1]))
+        # Farklı birimdeki (dönüştürülemeyen) geçmiş ölçümler trende katılmaz
+        latest_unit = entries[-1][2]["unit"]
+        series[key] = [
+            (when, fact["value"]) for when, _, fact in entries
+            if fact["value"] is not None and when != datetime.datetime.min and fact["unit"] == latest_unit
+        ]
+    slopes = trend_slopes(series)
+
+    facts = []
+    for key, entries in grouped.items():
+        when, _, latest = entries[-1]
+        comparable = [fact for _, _, fact in entries[:-1] if fact["value"] is not None and fact["unit"] == latest["unit"]]
+        previous = comparable[-1] if comparable else None
+        values = [fact["value"] for _, _, fact in entries if fact["value"] is not None and fact["unit"] == latest["unit"]]
+        delta = delta_pct = None
+        if previous is not None and latest["value"] is not None:
+            delta = round(latest["value"] - previous["value"], 4)
+            delta_pct = round(delta / abs(previous["value"]) * 100, 1) if previous["value"] else None
+        facts.append({
+            **latest,
+            "date": when.date().isoformat() if when != datetime.datetime.min else None,
+            "previous_value": previous["value"] if previous else None,
+            "delta": delta,
+            "delta_pct": delta_pct,
+            "slope_per_30d": slopes.get(key),
+            "measurements": len(entries),
+            "min": min(values) if values else None,
+            "max": max(values) if values else None,
+        })
+    return facts
+
+
+def _fmt(number: Optional[float]) -> str:
+    if number is None:
+        return "?"
+    return f"{number:.2f}".rstrip("0").rstrip(".") if number != int(number) else str(int(number))
+
+
+def _fmt_signed(number: float) -> str:
+    return ("+" if number > 0 else "") + _fmt(number)
+
+
+def format_lab_fact(fact: Dict[str, Any]) -> str:
+    """Prompt için tek satır: değer, aralık, hesaplanan durum, önceki sonuca fark ve eğim"""
+    unit = f" {fact['unit']}" if fact.get("unit") else ""
+    if fact["value"] is None:
+        line = f"{fact['name']}: {fact['raw_value']}{unit}"
+        if fact.get("reference_range"):
+            line += f" (ref {fact['reference_range']})"
+        return line
+    line = f"{fact['name']}: {_fmt(fact['value'])}{unit}"
+    if fact["low"] is not None or fact["high"] is not None:
+        line += f" (ref {_fmt(fact['low']) if fact['low'] is not None else ''}-{_fmt(fact['high']) if fact['high'] is not None else ''})"
+    if fact["status"]:
+        line += f" → {fact['status']}"
+        if fact["deviation"]:
+            line += f" (sınırın %{fact['deviation'] * 100:.0f} dışında)"
+    # analyze_test çıktısında (geçmişsiz) trend alanları yok
+    if fact.get("previous_value") is not None:
+        pct = f", {fact['delta_pct']:+.1f}%" if fact["delta_pct"] is not None else ""
+        line += f" | önceki {_fmt(fact['previous_value'])} ({_fmt_signed(fact['delta'])}{pct})"
+    if fact.get("measurements", 1) > 1:
+        line += f" | {fact['measurements']} ölçüm, min {_fmt(fact['min'])} / max {_fmt(fact['max'])}"
+        if fact["slope_per_30d"] is not None:
+            line += f", eğilim {_fmt_signed(fact['slope_per_30d'])}{unit}/ay"
+    if fact.get("date"):
+        line += f" [{fact['date']}]"
+    return line
+
+
+def format_lab_facts(facts: List[Dict[str, Any]]) -> str:
+    return "\n".join(f"- {format_lab_fact(fact)}" for fact in facts)
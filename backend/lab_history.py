@@ -0,0 +1,72 @@
+"""Lab test geçmişi: ai_messages payload'larından test bazlı zaman serisi.
+
+lab_single / lab_session / lab_summary kayıtları yazılırken içlerindeki
+testler lab_test_results side table'ına (external_user_id, normalized_name,
+measured_at) index'iyle açılır. Tek testin geçmişi böylece kullanıcının tüm
+lab geçmişini açıp gezmeden tek sorguyla gelir (O(eşleşme)).
+
+Tablo yeni yazımlarla dolar; mevcut geçmiş için deploy sonrası bir kez:
+
+    python -m backend.lab_history --backfill
+"""
+import math
+
+LAB_MESSAGE_TYPES = ("lab_single", "lab_session", "lab_summary")
+
+
+def normalize_test_name(name) -> str:
+    """Eşleştirme anahtarı (handler'daki eski lower().strip() ile aynı)"""
+    return (name or "").lower().strip() if isinstance(name, str) else ""
+
+
+def extract_lab_tests(message_type: str, payload) -> list[dict]:
+    """Kayıt tipine göre payload içindeki test dict'leri"""
+    if not isinstance(payload, dict):
+        return []
+    if message_type == "lab_single":
+        return [payload["test"]] if isinstance(payload.get("test"), dict) else []
+    if message_type == "lab_session":
+        keys = ("session_tests", "tests")
+    elif message_type == "lab_summary":
+        keys = ("tests", "lab_results")
+    else:
+        return []
+    for key in keys:
+        if isinstance(payload.get(key), list):
+            return [test for test in payload[key] if isinstance(test, dict)]
+    return []
+
+
+def parse_numeric(value) -> float | None:
+    """Sayısal değer: "5,4" / "5.4" / 5.4 -> 5.4; sayısal olmayanlar (ör. "Negatif") None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        try:
+            number = float(value.strip().replace(",", "."))
+        except ValueError:
+            return None
+    else:
+        return None
+    return number if math.isfinite(number) else None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="lab_test_results side table bakımı")
+    parser.add_argument("--backfill", action="store_true", help="Mevcut lab kayıtlarını side table'a aç")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--after-id", type=int, default=0, help="Kaldığı yerden devam (ai_messages.id)")
+    args = parser.parse_args()
+
+    if args.backfill:
+        from backend.db import SessionLocal, backfill_lab_test_results, init_schema
+
+        init_schema()
+        with SessionLocal() as db:
+            backfill_lab_test_results(db, batch_size=args.batch_size, after_id=args.after_id)
+    else:
+        parser.print_help()
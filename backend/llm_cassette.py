@@ -0,0 +1,126 @@
+"""OpenRouter çağrıları için record/replay cassette'i.
+
+LLM_CASSETTE_MODE=record iken call_chat_model her istek/yanıt çiftini
+(HTTP status, gövde, gecikme) gzip'li JSON lines dosyasına ekler. replay
+modunda ağa çıkılmaz: istek normalize edilmiş payload hash'i ile eşlenir,
+kayıtlı yanıt LLM_CASSETTE_LATENCY_SCALE ile ölçeklenmiş gecikmeyle döner.
+Aynı payload birden fazla kez kaydedildiyse yanıtlar sırayla (döngüsel)
+verilir. Böylece gerçek bir günün trafiği yeni build'e karşı ağsız ve
+deterministik olarak tekrar oynatılabilir (benchmarks/replay_traffic.py).
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import httpx
+
+from backend.config import LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, LLM_CASSETTE_LATENCY_SCALE, LLM_CASSETTE_ON_MISS
+
+# Prompt'lara gömülen zaman damgaları her gün değişir; hash'e girmesin
+_TIMESTAMP_RE = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class CassetteMiss(LookupError):
+    """Replay modunda payload için kayıt bulunamadı"""
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return _WHITESPACE_RE.sub(" ", _TIMESTAMP_RE.sub("<ts>", value)).strip()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def payload_key(payload: dict) -> str:
+    """Model + mesajlar + parametrelerden deterministik anahtar"""
+    canonical = json.dumps(_normalize(payload), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str, latency_scale: float = 1.0, on_miss: str = "error"):
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.on_miss = on_miss
+        self._lock = threading.Lock()
+        self._entries: dict[str, list[dict]] | None = None
+        self._cursor: dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- record ----------
+
+    def record(self, payload: dict, response: httpx.Response, latency_ms: int):
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        entry = {
+            "key": payload_key(payload),
+            "model": payload.get("model"),
+            "request": payload,
+            "status": response.status_code,
+            "response": body,
+            "latency_ms": latency_ms,
+            "recorded_at": time.time(),
+        }
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            # gzip çoklu member'ı destekler: her append ayrı member, okuma tek akış
+            with gzip.open(self.path, "ab") as f:
+                f.write(line)
+
+    # ---------- replay ----------
+
+    def _load(self) -> dict[str, list[dict]]:
+        entries: dict[str, list[dict]] = {}
+        if os.path.exists(self.path):
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        entries.setdefault(entry["key"], []).append(entry)
+        return entries
+
+    def lookup(self, payload: dict) -> dict | None:
+        key = payload_key(payload)
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            candidates = self._entries.get(key)
+            if not candidates:
+                self.misses += 1
+                return None
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            self.hits += 1
+            return candidates[index % len(candidates)]
+
+    def replay(self, url: str, payload: dict) -> httpx.Response | None:
+        """Kayıtlı yanıtı (ölçeklenmiş gecikmeyle) httpx.Response olarak döndür; kayıt yoksa None"""
+        entry = self.lookup(payload)
+        if entry is None:
+            if self.on_miss == "passthrough":
+                return None
+            raise CassetteMiss(f"cassette kaydı yok: model={payload.get('model')} key={payload_key(payload)[:12]}")
+        delay = (entry.get("latency_ms") or 0) * self.latency_scale / 1000
+        if delay > 0:
+            time.sleep(delay)
+        body = entry["response"]
+        request = httpx.Request("POST", url)
+        if isinstance(body, str):
+            return httpx.Response(entry["status"], text=body, request=request)
+        return httpx.Response(entry["status"], json=body, request=request)
+
+
+cassette = Cassette(LLM_CASSETTE_PATH, LLM_CASSETTE_MODE, LLM_CASSETTE_LATENCY_SCALE, LLM_CASSETTE_ON_MISS) \
+    if LLM_CASSETTE_MODE in ("record", "replay") else None
@@ -0,0 +1,152 @@
+"""Non-blocking structured logging.
+
+Hot path'te stdout'a senkron print yerine kayıtlar bounded bir kuyruğa
+bırakılır; QueueListener thread'i JSON (veya text) satırlarını yazar.
+Kuyruk doluysa kayıt düşürülür, istek beklemez. DEBUG satırları
+LOG_DEBUG_SAMPLE_RATE oranında örneklenir. Her satıra middleware'in set
+ettiği request_id eklenir. LOG_PAYLOADS=false iken log_payload() gövdeleri
+yazmaz, sadece tip/boyut bilgisi bırakır.
+"""
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+
+from backend.metrics import REGISTRY, CallbackMetric, register_queue
+from backend.config import LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_MAX, LOG_DEBUG_SAMPLE_RATE, LOG_PAYLOADS, LOG_PAYLOAD_MAX_CHARS
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+# LogRecord'un kendi alanları; bunların dışındaki attribute'lar (extra=...) JSON'a alan olarak girer
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class _RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class _DebugSampler(logging.Filter):
+    """DEBUG kayıtlarının sadece `rate` oranını geçir (INFO ve üstü hep geçer)"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.utcfromtimestamp(record.created).isoformat(timespec="milliseconds") + "Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Kuyruk doluysa bekleme/exception yok: kayıt düşürülür ve sayılır"""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+_listener: logging.handlers.QueueListener | None = None
+_queue_handler: _DroppingQueueHandler | None = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging():
+    """'longo' logger ağacını kuyruklu handler'a bağla ve listener'ı başlat (idempotent)"""
+    global _listener, _queue_handler
+    with _configure_lock:
+        if _queue_handler is None:
+            _queue_handler = _DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_MAX))
+            _queue_handler.addFilter(_DebugSampler(LOG_DEBUG_SAMPLE_RATE))
+            _queue_handler.addFilter(_RequestIdFilter())
+            root = logging.getLogger("longo")
+            root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+            root.addHandler(_queue_handler)
+            root.propagate = False
+        if _listener is None:
+            stream = logging.StreamHandler(sys.stdout)
+            if LOG_FORMAT == "json":
+                stream.setFormatter(JsonFormatter())
+            else:
+                stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"))
+            _listener = logging.handlers.QueueListener(_queue_handler.queue, stream, respect_handler_level=True)
+            _listener.start()
+
+
+def shutdown_logging():
+    """Kuyrukta kalan satırları yaz ve listener thread'ini durdur (configure_logging ile yeniden başlar)"""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(f"longo.{name}")
+
+
+def dropped_count() -> int:
+    return _DroppingQueueHandler.dropped
+
+
+REGISTRY.register(CallbackMetric(
+    "longo_log_dropped_total", "Log kuyruğu dolu olduğu için düşürülen satırlar", (),
+    lambda: {(): dropped_count()}, kind="counter",
+))
+register_queue("log", lambda: _queue_handler.queue.qsize() if _queue_handler else 0)
+
+
+class _Payload:
+    """str() edilene kadar serialize etmez; seviye/sampling ile düşen kayıtlar için maliyet yok"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self) -> str:
+        value = self.value
+        try:
+            text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+        except Exception:
+            text = str(value)
+        if not LOG_PAYLOADS:
+            return f"<{type(value).__name__} {len(text)} chars omitted>"
+        if len(text) > LOG_PAYLOAD_MAX_CHARS:
+            return text[:LOG_PAYLOAD_MAX_CHARS] + f"...<+{len(text) - LOG_PAYLOAD_MAX_CHARS} chars>"
+        return text
+
+
+def log_payload(value) -> _Payload:
+    """logger.debug("quiz: %s", log_payload(data)) - LOG_PAYLOADS=false ise gövde yerine sadece tip/boyut"""
+    return _Payload(value)
@@ -4,9 +4,10 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Any
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from backend.db import get_user_ai_messages_by_type
+from backend.db import async_get_user_ai_messages_by_type, get_user_ai_messages_by_type
 
 
 def _pick(d: dict | None, *keys: str, default: Any = None) -> Any:
@@ -36,24 +37,18 @@ def _normalize_lab_item(item: dict) -> dict:
     }
 
 
-def _extract_labs(db: Session, user_id: str, limit: int = 40) -> list[dict]:
-    summaries = get_user_ai_messages_by_type(db, user_id, "lab_summary", limit=3)
-    for msg in summaries:
+def _labs_from_bulk(messages, *keys: str) -> list[dict]:
+    for msg in messages:
         payload = msg.request_payload or {}
-        tests = payload.get("tests") or payload.get("lab_results") or []
+        tests = next((payload[k] for k in keys if payload.get(k)), [])
         if isinstance(tests, list) and tests:
             return [_normalize_lab_item(t) for t in tests if isinstance(t, dict)]
+    return []
 
-    sessions = get_user_ai_messages_by_type(db, user_id, "lab_session", limit=3)
-    for msg in sessions:
-        payload = msg.request_payload or {}
-        tests = payload.get("session_tests") or payload.get("tests") or []
-        if isinstance(tests, list) and tests:
-            return [_normalize_lab_item(t) for t in tests if isinstance(t, dict)]
 
-    singles = get_user_ai_messages_by_type(db, user_id, "lab_single", limit=limit)
+def _labs_from_singles(messages) -> list[dict]:
     labs = []
-    for msg in singles:
+    for msg in messages:
         payload = msg.request_payload or {}
         test = payload.get("test")
         if isinstance(test, dict):
@@ -64,6 +59,30 @@ def _extract_labs(db: Session, user_id: str, limit: int = 40) -> list[dict]:
     return labs
 
 
+def _extract_labs(db: Session, user_id: str, limit: int = 40) -> list[dict]:
+    labs = _labs_from_bulk(get_user_ai_messages_by_type(db, user_id, "lab_summary", limit=3), "tests", "lab_results")
+    if labs:
+        return labs
+    labs = _labs_from_bulk(get_user_ai_messages_by_type(db, user_id, "lab_session", limit=3), "session_tests", "tests")
+    if labs:
+        return labs
+    return _labs_from_singles(get_user_ai_messages_by_type(db, user_id, "lab_single", limit=limit))
+
+
+async def _async_extract_labs(db: AsyncSession, user_id: str, limit: int = 40) -> list[dict]:
+    labs = _labs_from_bulk(
+        await async_get_user_ai_messages_by_type(db, user_id, "lab_summary", limit=3), "tests", "lab_results"
+    )
+    if labs:
+        return labs
+    labs = _labs_from_bulk(
+        await async_get_user_ai_messages_by_type(db, user_id, "lab_session", limit=3), "session_tests", "tests"
+    )
+    if labs:
+        return labs
+    return _labs_from_singles(await async_get_user_ai_messages_by_type(db, user_id, "lab_single", limit=limit))
+
+
 def _merge_profile(form_data: dict | None, profile_snapshot: dict | None) -> dict:
     """form.emergency + form.personal + diğer düz alanlar + legacy profile birleşimi."""
     merged: dict = {}
@@ -128,8 +147,27 @@ def build_health_card_data(
     profile_snapshot: dict | None = None,
     form_data: dict | None = None,
 ) -> dict:
-    profile = _merge_profile(form_data, profile_snapshot)
     labs = _extract_labs(db, external_user_id)
+    return _compose_health_card(external_user_id, profile_snapshot, form_data, labs)
+
+
+async def async_build_health_card_data(
+    db: AsyncSession,
+    external_user_id: str,
+    profile_snapshot: dict | None = None,
+    form_data: dict | None = None,
+) -> dict:
+    labs = await _async_extract_labs(db, external_user_id)
+    return _compose_health_card(external_user_id, profile_snapshot, form_data, labs)
+
+
+def _compose_health_card(
+    external_user_id: str,
+    profile_snapshot: dict | None,
+    form_data: dict | None,
+    labs: list[dict],
+) -> dict:
+    profile = _merge_profile(form_data, profile_snapshot)
     form = form_data or {}
 
     full_name = _pick(profile, "full_name", "name", "ad_soyad", "adSoyad")
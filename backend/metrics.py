@@ -0,0 +1,308 @@
+"""In-process metrik toplama + Prometheus text exposition (/metrics).
+
+Harici bağımlılık yok: counter/histogram değerleri label tuple'ı başına
+dict'te tutulur, tek lock ile güncellenir; render sadece scrape anında
+yapılır. Kuyruk derinliği ve cache oranı gibi anlık değerler callback
+metrikleriyle scrape sırasında okunur.
+"""
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from backend import tracing
+
+# Saniye cinsinden; LLM çağrıları 30s+ sürebildiği için üst bucket'lar geniş
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+# Middleware'in set ettiği ASGI scope'u. Router eşleşince scope["route"] aynı dict'e yazılır;
+# stage metrikleri endpoint label'ını (route şablonu) gözlem anında buradan okur.
+current_scope: contextvars.ContextVar[dict | None] = contextvars.ContextVar("current_scope", default=None)
+
+
+def route_label(scope: dict | None) -> str:
+    if scope is None:
+        return "-"
+    # Şablon (/m/{token}); ham path kullanılırsa label sayısı patlar
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        lines = self._header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket sayaçları (+Inf dahil, kümülatif değil), sum, count]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()]
+        lines = self._header()
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Değeri scrape anında fn() ile okunan gauge/counter. fn {label tuple: değer} döndürür."""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple, fn, kind: str = "gauge"):
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def render(self) -> list[str]:
+        try:
+            values = self.fn()
+        except Exception as e:
+            from backend.log_utils import get_logger  # log_utils metrics'i import ediyor
+            get_logger("metrics").warning(f"metrik okunamadı ({self.name}): {e}")
+            return []
+        lines = self._header()
+        for key, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            # Modül reload'larında aynı isim ikinci kez kaydedilirse eskisini koru
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_request_duration = REGISTRY.register(Histogram(
+    "longo_http_request_duration_seconds", "HTTP istek süresi (route şablonu başına)", ("method", "route", "status"),
+))
+stage_duration = REGISTRY.register(Histogram(
+    "longo_stage_duration_seconds",
+    "İstek aşaması süresi (guard, context_build, db_read, llm, json_repair, db_write)",
+    ("stage", "endpoint"),
+))
+llm_request_duration = REGISTRY.register(Histogram(
+    "longo_llm_request_duration_seconds", "OpenRouter chat completion gecikmesi", ("model",),
+))
+llm_errors = REGISTRY.register(Counter(
+    "longo_llm_errors_total", "Başarısız LLM çağrıları", ("model", "kind"),
+))
+llm_tokens = REGISTRY.register(Counter(
+    "longo_llm_tokens_total", "OpenRouter usage token sayıları", ("model", "type"),
+))
+cache_requests = REGISTRY.register(Counter(
+    "longo_cache_requests_total", "Cache okumaları (hit/miss)", ("cache", "result"),
+))
+
+
+def _cache_hit_ratios() -> dict:
+    with cache_requests._lock:
+        items = list(cache_requests._values.items())
+    totals: dict[str, list] = {}
+    for (name, result), n in items:
+        entry = totals.setdefault(name, [0, 0])
+        entry[0 if result == "hit" else 1] += n
+    return {(name,): hits / (hits + misses) for name, (hits, misses) in totals.items() if hits + misses}
+
+
+REGISTRY.register(CallbackMetric(
+    "longo_cache_hit_ratio", "Process başından beri cache hit oranı", ("cache",), _cache_hit_ratios,
+))
+
+_queue_sources: dict[str, object] = {}
+
+
+def register_queue(name: str, depth_fn):
+    """Kuyruk derinliğini scrape anında okunacak şekilde kaydet"""
+    _queue_sources[name] = depth_fn
+
+
+REGISTRY.register(CallbackMetric(
+    "longo_queue_depth", "Arka plan kuyruklarında bekleyen kayıt sayısı", ("queue",),
+    lambda: {(name, ): fn() for name, fn in list(_queue_sources.items())},
+))
+
+
+def observe_stage(stage: str, seconds: float):
+    stage_duration.observe(seconds, stage=stage, endpoint=route_label(current_scope.get()))
+
+
+@contextmanager
+def stage(name: str):
+    """with stage("guard"): ... -> longo_stage_duration_seconds{stage="guard"}"""
+    start = time.perf_counter()
+    try:
+        with tracing.span(name):
+            yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def timed_stage(name: str):
+    """Sync fonksiyonlar için stage decorator'ı"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache_name: str, hit: bool):
+    cache_requests.inc(cache=cache_name, result="hit" if hit else "miss")
+
+
+def record_llm_call(model: str, seconds: float, usage: dict | None):
+    llm_request_duration.observe(seconds, model=model)
+    observe_stage("llm", seconds)
+    if usage:
+        prompt = usage.get("prompt_tokens") or 0
+        completion = usage.get("completion_tokens") or 0
+        if prompt:
+            llm_tokens.inc(prompt, model=model, type="prompt")
+        if completion:
+            llm_tokens.inc(completion, model=model, type="completion")
+        # prompt token'larının provider cache'inden okunan kısmı (prompt'un alt kümesi)
+        from backend.prompt_layout import cached_prompt_tokens  # Lazy: metrics config'siz import edilebilsin
+
+        cached = cached_prompt_tokens(usage)
+        if cached:
+            llm_tokens.inc(cached, model=model, type="cached_prompt")
+
+
+def record_llm_error(model: str, exc: Exception):
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    llm_errors.inc(model=model, kind=str(status) if status else type(exc).__name__)
+
+
+def instrument_engine(engine):
+    """SQLAlchemy engine'ine cursor seviyesinde db_read/db_write süresi ölçümü ekle"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip()[:6].upper()
+        stage_name = "db_read" if verb in ("SELECT", "PRAGMA") else "db_write"
+        db_span = tracing.child_span(stage_name, statement=statement[:200], executemany=executemany)
+        conn.info.setdefault("_metrics_start", []).append((time.perf_counter(), stage_name, db_span))
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("_metrics_start")
+        if not starts:
+            return
+        start, stage_name, db_span = starts.pop()
+        observe_stage(stage_name, time.perf_counter() - start)
+        tracing.end_child_span(db_span)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("_metrics_start"):
+            _, _, db_span = conn.info["_metrics_start"].pop()
+            tracing.end_child_span(db_span, error=str(exception_context.original_exception)[:500])
+
+
+def render_latest() -> str:
+    return REGISTRY.render()
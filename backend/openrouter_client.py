@@ -1,7 +1,17 @@
+import asyncio
+import threading
 import time
 import httpx
 from typing import List, Dict, Any, Optional
-from backend.config import OPENROUTER_API_KEY, OPENROUTER_BASE_URL, PARALLEL_TIMEOUT_MS
+from backend.config import OPENROUTER_API_KEY, OPENROUTER_BASE_URL, PARALLEL_TIMEOUT_MS, LLM_MAX_CONNECTIONS, LLM_KEEPALIVE_EXPIRY_S
+from backend.metrics import record_llm_call, record_llm_error
+from backend.usage_ledger import record_usage
+from backend.tracing import span
+from backend.llm_cassette import cassette
+from backend.prompt_layout import apply_cache_markers
+from backend.log_utils import get_logger
+
+logger = get_logger("openrouter_client")
 
 def _get_headers():
     if not OPENROUTER_API_KEY:
@@ -11,33 +21,133 @@ def _get_headers():
         "Content-Type": "application/json",
     }
 
+_client: httpx.Client | None = None
+_client_lock = threading.Lock()
+
+def _get_client() -> httpx.Client:
+    """Process başına tek pool'lu client: her çağrıda yeni TCP + TLS handshake olmasın"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(
+                    timeout=PARALLEL_TIMEOUT_MS/1000,
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                        keepalive_expiry=LLM_KEEPALIVE_EXPIRY_S,
+                    ),
+                )
+    return _client
+
+def warm_up_connection() -> int:
+    """Warm-up: OpenRouter'a bağlantıyı (TLS dahil) önceden aç, havuzda bırak. HTTP status döner."""
+    if cassette and cassette.mode == "replay":
+        return 0
+    # Küçük, auth'lu bir endpoint: API key geçersizse 401 ile erken görünür
+    r = _get_client().get(f"{OPENROUTER_BASE_URL}/auth/key", headers=_get_headers())
+    return r.status_code
+
+def close_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+_async_client: httpx.AsyncClient | None = None
+_async_client_loop: asyncio.AbstractEventLoop | None = None
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Event loop başına tek pool'lu async client: fan-out yapan endpoint'ler worker thread'i tutmadan bekler"""
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(
+            timeout=PARALLEL_TIMEOUT_MS/1000,
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY_S,
+            ),
+        )
+        _async_client_loop = loop
+    return _async_client
+
+async def close_async_client():
+    global _async_client, _async_client_loop
+    if _async_client is not None and _async_client_loop is asyncio.get_running_loop():
+        await _async_client.aclose()
+    _async_client = None
+    _async_client_loop = None
+
 def _build_chat_payload(model: str, messages: List[Dict[str, str]], temperature: float = 0.5, max_tokens: int = 800):
     return {
         "model": model,
-        "messages": messages,
+        # İç alanlar atılır; destekleyen modellerde statik önek cache_control alır (backend/prompt_layout.py)
+        "messages": apply_cache_markers(model, messages),
         "temperature": temperature,
         "max_tokens": max_tokens,
     }
 
-def call_chat_model(model: str, messages: List[Dict[str, str]], temperature: float = 0.5, max_tokens: int = 800) -> Dict[str, Any]:
-    url = f"{OPENROUTER_BASE_URL}/chat/completions"
-    payload = _build_chat_payload(model, messages, temperature, max_tokens)
-    start = time.time()
-    with httpx.Client(timeout=PARALLEL_TIMEOUT_MS/1000) as client:
-        r = client.post(url, headers=_get_headers(), json=payload)
-        latency_ms = int((time.time() - start) * 1000)
-        r.raise_for_status()
-        data = r.json()
+def _parse_chat_response(model: str, payload: dict, r: httpx.Response, latency_ms: int) -> Dict[str, Any]:
+    if cassette and cassette.mode == "record":
+        cassette.record(payload, r, latency_ms)
+    r.raise_for_status()
+    data = r.json()
     # OpenAI-compatible structure
     content = data["choices"][0]["message"]["content"]
-    usage = data.get("usage", {})
     return {
         "content": content,
         "latency_ms": latency_ms,
-        "usage": usage,
+        "usage": data.get("usage", {}),
         "raw": data
     }
 
+def _record_chat_call(model: str, result: Dict[str, Any], llm_span):
+    usage = result["usage"]
+    llm_span.set(prompt_tokens=usage.get("prompt_tokens") or 0, completion_tokens=usage.get("completion_tokens") or 0)
+    record_llm_call(model, result["latency_ms"] / 1000, usage)
+    record_usage(model, usage)
+
+def call_chat_model(model: str, messages: List[Dict[str, str]], temperature: float = 0.5, max_tokens: int = 800) -> Dict[str, Any]:
+    url = f"{OPENROUTER_BASE_URL}/chat/completions"
+    payload = _build_chat_payload(model, messages, temperature, max_tokens)
+    start = time.time()
+    with span("llm.chat_completion", model=model, max_tokens=max_tokens) as llm_span:
+        try:
+            r = cassette.replay(url, payload) if cassette and cassette.mode == "replay" else None
+            if r is None:
+                r = _get_client().post(url, headers=_get_headers(), json=payload)
+            else:
+                llm_span.set(cassette="replay")
+            result = _parse_chat_response(model, payload, r, int((time.time() - start) * 1000))
+        except Exception as e:
+            record_llm_error(model, e)
+            raise
+        _record_chat_call(model, result, llm_span)
+    return result
+
+async def async_call_chat_model(model: str, messages: List[Dict[str, str]], temperature: float = 0.5, max_tokens: int = 800) -> Dict[str, Any]:
+    """call_chat_model'in event loop'u bloklamayan versiyonu (asyncio.gather ile paralel çağrılar için)"""
+    url = f"{OPENROUTER_BASE_URL}/chat/completions"
+    payload = _build_chat_payload(model, messages, temperature, max_tokens)
+    start = time.time()
+    with span("llm.chat_completion", model=model, max_tokens=max_tokens) as llm_span:
+        try:
+            # Cassette replay gecikmeyi time.sleep ile taklit eder; loop'u bloklamasın
+            r = await asyncio.to_thread(cassette.replay, url, payload) if cassette and cassette.mode == "replay" else None
+            if r is None:
+                r = await _get_async_client().post(url, headers=_get_headers(), json=payload)
+            else:
+                llm_span.set(cassette="replay")
+            result = _parse_chat_response(model, payload, r, int((time.time() - start) * 1000))
+        except Exception as e:
+            record_llm_error(model, e)
+            raise
+        _record_chat_call(model, result, llm_span)
+    return result
+
 async def get_ai_response(system_prompt: str, user_message: str, model: str = "openai/gpt-5-chat:online", max_tokens: int = 800) -> str:
     """Free kullanıcılar için basit AI yanıt fonksiyonu"""
     try:
@@ -50,5 +160,14 @@ async def get_ai_response(system_prompt: str, user_message: str, model: str = "o
         return result["content"]
         
     except Exception as e:
-        print(f"get_ai_response error: {e}")
+        logger.error(f"get_ai_response error: {e}")
         raise e
+
+async def async_get_ai_response(system_prompt: str, user_message: str, model: str = "openai/gpt-5-chat:online", max_tokens: int = 800) -> str:
+    """get_ai_response ile aynı; çağrı async client üzerinden (loop bloklanmaz, paralel fan-out yapılabilir)"""
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_message}
+    ]
+    result = await async_call_chat_model(model, messages, temperature=0.6, max_tokens=max_tokens)
+    return result["content"]
@@ -1,12 +1,19 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from backend.config import PARALLEL_MODELS
+from backend.config import PARALLEL_MODELS, LAB_BATCH_CHUNK_SIZE, LAB_BATCH_MAX_PARALLEL
 from backend.openrouter_client import call_chat_model
 from backend.utils import is_valid_chat, parse_json_safe
+from backend.log_utils import get_logger
+from backend.tracing import traced
+from backend.lab_engine import analyze_test, build_lab_facts, format_lab_fact, format_lab_facts
+from backend.lab_history import normalize_test_name
+import contextvars
 import time
 import json
 import re
 
+logger = get_logger("orchestrator")
+
 SYSTEM_HEALTH = ("Longopass'ın sağlık asistanısın. Sadece sağlık konusunda konuş! "
                  "👤 KİMLİK: SADECE 'sen kimsin', 'adın ne' sorulduğunda 'Ben Longo' de. Diğer mesajlara 'Ben Longo' diye başlama! "
                  "🧠 SOBET AKIŞI: Kullanıcının mesajını bağlamda anla! Tek kelime/fiil = önceki konuyu devam ettir! "
@@ -25,8 +32,13 @@ SYSTEM_HEALTH_ENGLISH = ("You are Longopass's health assistant. "
                           "💊 PRODUCT RULE: Only recommend products from given list! "
                           "🏷️ BRAND: All products are LONGOPASS brand.")
 
-def parallel_chat(messages: List[Dict[str, str]]) -> Dict[str, Any]:
-    """Run parallel chat with multiple models, then synthesize with GPT-5"""
+@traced()
+def parallel_chat(messages: List[Dict[str, str]], user_message: Optional[str] = None) -> Dict[str, Any]:
+    """Run parallel chat with multiple models, then synthesize with GPT-5
+
+    user_message: dil algılama için kullanıcının ham mesajı; verilmezse son mesaj kullanılır
+    (tur blokları Türkçe bağlam/ürün listesi içerebileceği için chat handler'ı açıkça verir).
+    """
     try:
         # Main.py'den gelen system prompt'u koru (detaylı paket bilgileri içeriyor)
         existing_system_prompt = ""
@@ -34,7 +46,8 @@ def parallel_chat(messages: List[Dict[str, str]]) -> Dict[str, Any]:
             existing_system_prompt = messages[0]["content"]
         
         # Dil algılama
-        user_message = messages[-1]["content"] if messages else ""
+        if user_message is None:
+            user_message = messages[-1]["content"] if messages else ""
         user_language = detect_language(user_message)
         
         # Eğer main.py'den detaylı prompt geldiyse onu kullan, yoksa varsayılanı kullan
@@ -67,12 +80,12 @@ def parallel_chat(messages: List[Dict[str, str]]) -> Dict[str, Any]:
                         "response": result["content"]
                     })
             except Exception as e:
-                print(f"Chat model {PARALLEL_MODELS[0]} failed: {e}")
+                logger.warning(f"Chat model {PARALLEL_MODELS[0]} failed: {e}")
         else:
             # Çoklu model - paralel çağır
             with ThreadPoolExecutor(max_workers=len(PARALLEL_MODELS)) as executor:
                 future_to_model = {
-                    executor.submit(call_chat_model, model, updated_messages, 0.6, 800): model 
+                    executor.submit(contextvars.copy_context().run, call_chat_model, model, updated_messages, 0.6, 800): model 
                     for model in PARALLEL_MODELS
                 }
                 
@@ -86,17 +99,17 @@ def parallel_chat(messages: List[Dict[str, str]]) -> Dict[str, Any]:
                                 "response": result["content"]
                             })
                     except Exception as e:
-                        print(f"Chat model {model} failed: {e}")
+                        logger.warning(f"Chat model {model} failed: {e}")
                         # Rate limiting hatası varsa biraz bekle
                         if "429" in str(e) or "Too Many Requests" in str(e):
-                            print(f"Rate limiting detected for {model}, waiting...")
+                            logger.warning(f"Rate limiting detected for {model}, waiting...")
                             time.sleep(2)
                         continue
         
         # Step 2: If no valid responses, fallback
         if not responses:
-            print("All chat models failed, fallback to GPT-4o")
-            return gpt4o_fallback(updated_messages)
+            logger.warning("All chat models failed, fallback to GPT-4o")
+            return gpt4o_fallback(updated_messages, user_message)
         
         # Step 3: If only one response, return it directly
         if len(responses) == 1:
@@ -122,13 +135,15 @@ def parallel_chat(messages: List[Dict[str, str]]) -> Dict[str, Any]:
         }
         
     except Exception as e:
-        print(f"Parallel chat failed: {e}, fallback to sequential")
-        return cascade_chat_fallback(messages)
+        logger.warning(f"Parallel chat failed: {e}, fallback to sequential")
+        return cascade_chat_fallback(messages, user_message)
 
-def cascade_chat_fallback(messages: List[Dict[str, str]]) -> Dict[str, Any]:
+@traced()
+def cascade_chat_fallback(messages: List[Dict[str, str]], user_message: Optional[str] = None) -> Dict[str, Any]:
     """Fallback to sequential cascade for chat"""
     # Detect user language
-    user_message = messages[-1]["content"] if messages else ""
+    if user_message is None:
+        user_message = messages[-1]["content"] if messages else ""
     user_language = detect_language(user_message)
     
     # Use appropriate system prompt
@@ -173,10 +188,10 @@ def cascade_chat_fallback(messages: List[Dict[str, str]]) -> Dict[str, Any]:
                 res["model_used"] = model
                 return res
         except Exception as e:
-            print(f"Chat fallback model {model} failed: {e}")
+            logger.warning(f"Chat fallback model {model} failed: {e}")
             # Rate limiting hatası varsa biraz bekle
             if "429" in str(e) or "Too Many Requests" in str(e):
-                print(f"Rate limiting detected for {model}, waiting...")
+                logger.warning(f"Rate limiting detected for {model}, waiting...")
                 time.sleep(2)
             continue
     # if none acceptable, return last model name with empty content
@@ -185,16 +200,18 @@ def cascade_chat_fallback(messages: List[Dict[str, str]]) -> Dict[str, Any]:
 # Chat synthesis prompt fonksiyonu kaldırıldı - tek model kullanıldığı için gerekli değil
 
 # Keep old function for backward compatibility
-def cascade_chat(messages: List[Dict[str, str]]) -> Dict[str, Any]:
-    return parallel_chat(messages)
+def cascade_chat(messages: List[Dict[str, str]], user_message: Optional[str] = None) -> Dict[str, Any]:
+    return parallel_chat(messages, user_message)
 
-def gpt4o_fallback(messages: List[Dict[str, str]]) -> Dict[str, Any]:
+@traced()
+def gpt4o_fallback(messages: List[Dict[str, str]], user_message: Optional[str] = None) -> Dict[str, Any]:
     """Fallback to GPT-4o when GPT-5 fails"""
     try:
-        print("GPT-5 failed, trying GPT-4o fallback...")
+        logger.warning("GPT-5 failed, trying GPT-4o fallback...")
         
         # Dil algılama
-        user_message = messages[-1]["content"] if messages else ""
+        if user_message is None:
+            user_message = messages[-1]["content"] if messages else ""
         user_language = detect_language(user_message)
         
         if user_language == "english":
@@ -233,12 +250,13 @@ def gpt4o_fallback(messages: List[Dict[str, str]]) -> Dict[str, Any]:
             raise Exception("GPT-4o response invalid")
             
     except Exception as e:
-        print(f"GPT-4o fallback also failed: {e}")
+        logger.error(f"GPT-4o fallback also failed: {e}")
         return {
             "content": "Üzgünüm, şu anda AI sistemimiz yoğun. Lütfen birkaç dakika sonra tekrar deneyin.",
             "model_used": "fallback_error"
         }
 
+@traced()
 def chat_fallback(messages: List[Dict[str, str]]) -> Dict[str, Any]:
     """Fallback for chat when all models fail"""
     return {
@@ -463,6 +481,7 @@ def build_quiz_prompt(quiz_answers: Dict[str, Any], available_supplements: List[
         {"role": "user", "content": user_prompt}
     ]
 
+@traced()
 def parallel_quiz_analyze(quiz_answers: Dict[str, Any], available_supplements: List[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Run quiz analysis with parallel LLMs and synthesis - ESNEK YAPI"""
     try:
@@ -480,12 +499,12 @@ def parallel_quiz_analyze(quiz_answers: Dict[str, Any], available_supplements: L
                         "response": result["content"]
                     })
             except Exception as e:
-                print(f"Quiz model {PARALLEL_MODELS[0]} failed: {e}")
+                logger.warning(f"Quiz model {PARALLEL_MODELS[0]} failed: {e}")
         else:
             # Çoklu model - paralel çağır
             with ThreadPoolExecutor(max_workers=len(PARALLEL_MODELS)) as executor:
                 future_to_model = {
-                    executor.submit(call_chat_model, model, messages, 0.2, 4000): model 
+                    executor.submit(contextvars.copy_context().run, call_chat_model, model, messages, 0.2, 4000): model 
                     for model in PARALLEL_MODELS
                 }
                 
@@ -500,12 +519,12 @@ def parallel_quiz_analyze(quiz_answers: Dict[str, Any], available_supplements: L
                                 "response": result["content"]
                             })
                     except Exception as e:
-                        print(f"Quiz model {model} failed: {e}")
+                        logger.warning(f"Quiz model {model} failed: {e}")
                         continue
         
         # Step 2: If no responses, fallback
         if not responses:
-            print("All quiz models failed, fallback to GPT-4o")
+            logger.warning("All quiz models failed, fallback to GPT-4o")
             return gpt4o_quiz_fallback(quiz_answers, available_supplements)
         
         # Step 3: Tek model kullanıldığı için synthesis'e gerek yok - direkt response'u döndür
@@ -517,15 +536,16 @@ def parallel_quiz_analyze(quiz_answers: Dict[str, Any], available_supplements: L
         }
         
     except Exception as e:
-        print(f"Quiz parallel analyze failed: {e}")
+        logger.warning(f"Quiz parallel analyze failed: {e}")
         return gpt4o_quiz_fallback(quiz_answers, available_supplements)
 
 # Quiz synthesis prompt fonksiyonu kaldırıldı - tek model kullanıldığı için gerekli değil
 
+@traced()
 def gpt4o_quiz_fallback(quiz_answers: Dict[str, Any], available_supplements: List[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Fallback to GPT-4o for quiz analysis when GPT-5 fails"""
     try:
-        print("GPT-5 failed, trying GPT-4o fallback for quiz analysis...")
+        logger.warning("GPT-5 failed, trying GPT-4o fallback for quiz analysis...")
         
         # Build prompt for GPT-4o
         messages = build_quiz_prompt(quiz_answers, available_supplements)
@@ -540,9 +560,10 @@ def gpt4o_quiz_fallback(quiz_answers: Dict[str, Any], available_supplements: Lis
             raise Exception("GPT-4o response invalid")
             
     except Exception as e:
-        print(f"GPT-4o quiz fallback also failed: {e}")
+        logger.error(f"GPT-4o quiz fallback also failed: {e}")
         return quiz_fallback(quiz_answers, available_supplements)
 
+@traced()
 def quiz_fallback(quiz_answers: Dict[str, Any], available_supplements: List[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Fallback quiz analysis if parallel fails"""
     messages = build_quiz_prompt(quiz_answers, available_supplements)
@@ -553,10 +574,10 @@ def quiz_fallback(quiz_answers: Dict[str, Any], available_supplements: List[Dict
                 res["model_used"] = model
                 return res
         except Exception as e:
-            print(f"Quiz fallback model {model} failed: {e}")
+            logger.warning(f"Quiz fallback model {model} failed: {e}")
             # Rate limiting hatası varsa biraz bekle
             if "429" in str(e) or "Too Many Requests" in str(e):
-                print(f"Rate limiting detected for {model}, waiting...")
+                logger.warning(f"Rate limiting detected for {model}, waiting...")
                 time.sleep(2)
             continue
     
@@ -596,6 +617,10 @@ def build_single_lab_prompt(test_data: Dict[str, Any], historical_results: List[
     if test_data.get('status'):
         test_info += f"Test Durumu: {test_data['status']}\n"
     
+    computed = analyze_test(test_data)
+    if computed['status']:
+        test_info += f"Hesaplanan Durum (referans aralığına göre): {computed['status']}\n"
+    
     if test_data.get('test_date'):
         test_info += f"Test Tarihi: {test_data['test_date']}\n"
     
@@ -605,33 +630,29 @@ def build_single_lab_prompt(test_data: Dict[str, Any], historical_results: List[
     if test_data.get('notes'):
         test_info += f"Ek Notlar: {test_data['notes']}\n"
     
-    # Geçmiş sonuçlar varsa trend analizi ekle
+    # Geçmiş sonuçlar varsa: ham tablo yerine hesaplanmış fark/eğilim + son birkaç ölçüm
     trend_analysis = ""
     if historical_results and len(historical_results) > 0:
-        trend_analysis = "\n\n📊 GEÇMİŞ SONUÇLAR VE TREND ANALİZİ:\n"
-        trend_analysis += "Tarih sırasına göre (en yeniden en eskiye):\n"
+        current_key = normalize_test_name(test_data.get('name') or test_data.get('test_name'))
+        facts = build_lab_facts([*historical_results, {**test_data, 'test_date': 'Yeni Seans'}])
+        fact = next((f for f in facts if normalize_test_name(f['name']) == current_key), None)
         
-        # Tarihe göre sırala (en yeni önce)
-        sorted_results = sorted(historical_results, key=lambda x: x.get('date', ''), reverse=True)
+        trend_analysis = "\n\n📊 GEÇMİŞ SONUÇLAR VE TREND (hesaplanmış değerler, yeniden hesaplama):\n"
+        if fact:
+            trend_analysis += f"{format_lab_fact(fact)}\n"
+        trend_analysis += "Son ölçümler (en yeniden en eskiye):\n"
         
-        for i, result in enumerate(sorted_results, 1):
-            date = result.get('date', 'Tarih yok')
-            value = result.get('value', 'Değer yok')
-            status = result.get('status', 'Durum belirtilmemiş')
-            lab = result.get('lab', 'Lab belirtilmemiş')
-            notes = result.get('notes', '')
-            
-            trend_analysis += f"{i}. {date}: {value} {test_data.get('unit', '')} - {status}"
-            if lab:
-                trend_analysis += f" ({lab})"
-            if notes:
-                trend_analysis += f" - {notes}"
+        # Tarihe göre sırala (en yeni önce)
+        sorted_results = sorted(historical_results, key=lambda x: x.get('date') or '', reverse=True)
+        for i, result in enumerate(sorted_results[:5], 1):
+            trend_analysis += f"{i}. {result.get('date') or 'Tarih yok'}: {result.get('value', 'Değer yok')} {result.get('unit') or test_data.get('unit') or ''}"
+            if result.get('status'):
+                trend_analysis += f" - {result['status']}"
             trend_analysis += "\n"
         
         trend_analysis += "\n💡 TREND ANALİZİ YAPILACAK:\n"
         trend_analysis += "- Değerlerin zaman içindeki değişimi\n"
         trend_analysis += "- İyileşme/kötüleşme trendi\n"
-        trend_analysis += "- Laboratuvar değişikliklerinin etkisi\n"
         trend_analysis += "- Genel sağlık durumu trendi\n"
     
     # Test sonucu analizi için detaylı yönlendirme
@@ -710,14 +731,17 @@ def build_single_session_prompt(session_tests: List[Dict[str, Any]], session_dat
     session_info += f"Test Tarihi: {session_date}\n"
     session_info += f"Toplam Test Sayısı: {len(session_tests)}\n\n"
     
-    # Test sonuçları
+    # Test sonuçları - durum gönderilmemişse referans aralığından hesaplanır
+    computed_statuses = [analyze_test(test)['status'] for test in session_tests]
     tests_info = "Test Sonuçları:\n"
-    for i, test in enumerate(session_tests, 1):
+    for i, (test, computed_status) in enumerate(zip(session_tests, computed_statuses), 1):
         tests_info += f"{i}. {test.get('name', 'Test')}: {test.get('value', 'Yok')} {test.get('unit', '')}"
         if test.get('reference_range'):
             tests_info += f" (Referans: {test['reference_range']})"
         if test.get('status'):
             tests_info += f" - {test['status']}"
+        elif computed_status:
+            tests_info += f" - {computed_status} (hesaplandı)"
         tests_info += "\n"
     
     # Test grupları analizi
@@ -725,7 +749,7 @@ def build_single_session_prompt(session_tests: List[Dict[str, Any]], session_dat
     normal_count = 0
     attention_count = 0
     
-    for test in session_tests:
+    for test, computed_status in zip(session_tests, computed_statuses):
         # Category field'ı yoksa 'Genel' kullan
         category = test.get('category')
         if not category:
@@ -735,8 +759,8 @@ def build_single_session_prompt(session_tests: List[Dict[str, Any]], session_dat
             test_groups[category] = 0
         test_groups[category] += 1
         
-        # Status field'ı yoksa normal say
-        status = test.get('status')
+        # Status field'ı yoksa referans aralığından hesaplanan durum
+        status = test.get('status') or computed_status
         if status and status.lower() in ['normal', 'normal aralıkta']:
             normal_count += 1
         else:
@@ -811,15 +835,13 @@ def build_multiple_lab_prompt(tests_data: List[Dict[str, Any]], session_count: i
     
     tests_info = f"Toplam Test Seansı: {session_count}\n"
     tests_info += f"ÖNEMLİ: Bu analizde {session_count} farklı test seansı bulunmaktadır!\n\n"
-    tests_info += "Test Sonuçları (Seans Bazında):\n"
-    
-    for session_key, session_tests in sessions.items():
-        tests_info += f"\n📅 SEANS: {session_key}\n"
-        for i, test in enumerate(session_tests, 1):
-            tests_info += f"  {i}. {test.get('name', 'Test')}: {test.get('value', 'Yok')} {test.get('unit', '')}"
-            if test.get('reference_range'):
-                tests_info += f" (Referans: {test['reference_range']})"
-            tests_info += "\n"
+    session_labels = [f"{key} ({len(tests)} test)" for key, tests in sessions.items()]
+    if len(session_labels) > 10:
+        session_labels = session_labels[:10] + [f"... ve {len(session_labels) - 10} seans daha"]
+    tests_info += "📅 Seanslar: " + ", ".join(session_labels) + "\n\n"
+    # Seans seans ham tablo yerine test başına son değer + hesaplanmış durum/fark/eğilim
+    tests_info += "Test Sonuçları (test başına son değer; durum, önceki sonuca fark ve eğilim hesaplanmıştır, yeniden hesaplama):\n"
+    tests_info += format_lab_facts(build_lab_facts(tests_data)) + "\n"
     
     # Quiz verisi bilgisi - KİŞİSELLEŞTİRİLMİŞ ÜRÜN ÖNERİLERİ İÇİN
     quiz_info = ""
@@ -930,6 +952,7 @@ def build_multiple_lab_prompt(tests_data: List[Dict[str, Any]], session_count: i
         {"role": "user", "content": user_prompt}
     ]
 
+@traced()
 def parallel_single_lab_analyze(test_data: Dict[str, Any], historical_results: List[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Analyze single lab test with parallel LLMs and historical trend analysis"""
     try:
@@ -939,7 +962,7 @@ def parallel_single_lab_analyze(test_data: Dict[str, Any], historical_results: L
         responses = []
         with ThreadPoolExecutor(max_workers=len(PARALLEL_MODELS)) as executor:
             future_to_model = {
-                executor.submit(call_chat_model, model, messages, 0.3, 1200): model 
+                executor.submit(contextvars.copy_context().run, call_chat_model, model, messages, 0.3, 1200): model 
                 for model in PARALLEL_MODELS
             }
             
@@ -953,15 +976,15 @@ def parallel_single_lab_analyze(test_data: Dict[str, Any], historical_results: L
                             "response": result["content"]
                         })
                 except Exception as e:
-                    print(f"Single lab model {model} failed: {e}")
+                    logger.warning(f"Single lab model {model} failed: {e}")
                     # Rate limiting hatası varsa biraz bekle
                     if "429" in str(e) or "Too Many Requests" in str(e):
-                        print(f"Rate limiting detected for {model}, waiting...")
+                        logger.warning(f"Rate limiting detected for {model}, waiting...")
                         time.sleep(2)
                     continue
         
         if not responses:
-            print("No successful responses, using GPT-4o fallback")
+            logger.warning("No successful responses, using GPT-4o fallback")
             return gpt4o_lab_fallback(test_data, historical_results)
         
         # Tek model kullanıldığı için synthesis'e gerek yok - direkt response'u döndür
@@ -982,9 +1005,167 @@ def parallel_single_lab_analyze(test_data: Dict[str, Any], historical_results: L
         }
         
     except Exception as e:
-        print(f"Single lab analyze failed: {e}")
+        logger.warning(f"Single lab analyze failed: {e}")
         return gpt4o_lab_fallback(test_data, historical_results)
 
+def build_lab_batch_prompt(tests: List[Dict[str, Any]], histories: Dict[str, List[Dict[str, Any]]], start_index: int = 1) -> List[Dict[str, str]]:
+    """Build prompt for a chunk of lab tests - her test için ayrı LabAnalysisResponse, ortak bağlam tek sefer"""
+    lines = []
+    for index, test in enumerate(tests, start_index):
+        history = histories.get(normalize_test_name(test.get('name'))) or []
+        if history:
+            facts = build_lab_facts([*history, {**test, 'test_date': 'Yeni Seans'}])
+            current_key = normalize_test_name(test.get('name'))
+            fact = next((f for f in facts if normalize_test_name(f['name']) == current_key), None) or analyze_test(test)
+        else:
+            fact = analyze_test(test)
+        line = f"[{index}] {format_lab_fact(fact)}"
+        if test.get('status'):
+            line += f" | Gönderilen Durum: {test['status']}"
+        if test.get('category'):
+            line += f" | Kategori: {test['category']}"
+        if test.get('notes'):
+            line += f" | Not: {test['notes']}"
+        lines.append(line)
+        if history:
+            recent = ", ".join(f"{h.get('date') or 'Tarih yok'}: {h.get('value')}" for h in history[:3])
+            lines.append(f"    Son ölçümler (en yeniden en eskiye): {recent}")
+    
+    schema = (
+        "STRICT JSON ŞEMASI - LAB BATCH:\n"
+        "{\n"
+        '  "results": [\n'
+        "    {\n"
+        '      "index": 1,\n'
+        '      "title": "Test Sonucu Yorumu",\n'
+        '      "test_name": "Test Adı Sonucu Değerlendirmesi",\n'
+        '      "last_result": "Son Test Sonucunuz: X değer Durum",\n'
+        '      "reference_range": "Referans Aralığı: X-Y birim",\n'
+        '      "test_analysis": "Test analizi ve trend analizi (geçmiş sonuçlar varsa)",\n'
+        '      "disclaimer": "Bu yorum sadece bilgilendirme amaçlıdır. Kesin tanı ve tedavi için mutlaka doktorunuza başvurunuz."\n'
+        "    }\n"
+        "  ]\n"
+        "}\n\n"
+        f"ÖNEMLİ: Yukarıdaki {len(tests)} testin HER BİRİ için results listesine köşeli parantezdeki numarayla (index) bir eleman ekle! "
+        "SADECE ANALİZ YAP, SUPPLEMENT ÖNERİSİ VERME! JSON formatında yanıt ver!"
+    )
+    
+    system_prompt = (
+        SYSTEM_HEALTH + " Sen bir laboratuvar sonuçları analiz uzmanısın. "
+        "SADECE ANALİZ yap, supplement ya da ilaç önerisi verme. "
+        "Her testi referans aralığı ile karşılaştır ve testlere ayrı ayrı net bir yorum yap. "
+        "Durum, fark ve eğilim değerleri hesaplanmış olarak verildi; yeniden hesaplama. "
+        "Testler birbiriyle ilişkiliyse (ör. lipid paneli) yorumda bu ilişkiye değin. "
+        "DİL: SADECE TÜRKÇE YANIT VER! İngilizce kelime, terim veya cümle kullanma!"
+    )
+    
+    user_prompt = "TOPLU LAB SONUÇLARI (hesaplanmış değerler):\n" + "\n".join(lines) + f"\n\n{schema}"
+    
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def _lab_batch_chunk(tests: List[Dict[str, Any]], histories: Dict[str, List[Dict[str, Any]]], start_index: int) -> Dict[int, Dict[str, Any]]:
+    """Tek chunk için LLM çağrısı; index -> test sonucu (eksik/bozuk olanlar dönmez)"""
+    messages = build_lab_batch_prompt(tests, histories, start_index)
+    model = PARALLEL_MODELS[0]
+    try:
+        result = call_chat_model(model, messages, 0.3, 400 + 350 * len(tests))
+    except Exception as e:
+        logger.warning(f"Lab batch chunk ({start_index}-{start_index + len(tests) - 1}) model {model} failed: {e}")
+        return {}
+    data = parse_json_safe(_sanitize_links(result.get("content") or "")) or {}
+    items = data.get("results") if isinstance(data, dict) else data
+    parsed = {}
+    for position, item in enumerate(items if isinstance(items, list) else [], start_index):
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.pop("index", position))
+        except (TypeError, ValueError):
+            index = position
+        if start_index <= index < start_index + len(tests):
+            parsed[index] = _sanitize_obj(item)
+    return parsed
+
+@traced()
+def _lab_unavailable_item(test: Dict[str, Any]) -> Dict[str, Any]:
+    """Batch, tekrar ve tekil analiz de başarısızsa test için dönen varsayılan sonuç"""
+    name = test.get('name') or "Test"
+    unit = f" {test['unit']}" if test.get('unit') else ""
+    return {
+        "title": "Test Sonucu Yorumu",
+        "test_name": f"{name} Sonucu Değerlendirmesi",
+        "last_result": f"Son Test Sonucunuz: {test.get('value')}{unit}",
+        "reference_range": f"Referans Aralığı: {test.get('reference_range') or 'Belirtilmemiş'}",
+        "test_analysis": "Laboratuvar analizi şu anda mevcut değil. Lütfen daha sonra tekrar deneyin.",
+    }
+
+def parallel_lab_batch_analyze(tests: List[Dict[str, Any]], histories: Dict[str, List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Analyze many lab tests in chunked LLM calls (LAB_BATCH_CHUNK_SIZE test/çağrı, chunk'lar paralel)
+
+    Tamamen başarısız chunk bir kez tekrar denenir; yanıtta eksik kalan testler
+    tekil analizle (aynı executor'da, en fazla LAB_BATCH_MAX_PARALLEL paralel)
+    tamamlanır; hâlâ eksik olanlar varsayılan "mevcut değil" sonucu alır.
+    """
+    histories = histories or {}
+    chunks = [(start + 1, tests[start:start + LAB_BATCH_CHUNK_SIZE]) for start in range(0, len(tests), LAB_BATCH_CHUNK_SIZE)]
+    parsed: Dict[int, Dict[str, Any]] = {}
+    llm_calls = 0
+    
+    def _run_chunks(executor, pending):
+        futures = {
+            executor.submit(contextvars.copy_context().run, _lab_batch_chunk, chunk, histories, start_index): (start_index, chunk)
+            for start_index, chunk in pending
+        }
+        failed = []
+        for future in as_completed(futures):
+            chunk_result = future.result()
+            if not chunk_result:
+                failed.append(futures[future])
+            parsed.update(chunk_result)
+        return failed
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(len(chunks), LAB_BATCH_MAX_PARALLEL))) as executor:
+        failed = _run_chunks(executor, chunks)
+        llm_calls += len(chunks)
+        if failed:
+            logger.warning(f"Lab batch: {len(failed)} chunk başarısız, bir kez tekrar deneniyor")
+            _run_chunks(executor, failed)
+            llm_calls += len(failed)
+        
+        # Batch yanıtında eksik kalan testler tekil analizle, paralel tamamlanır
+        missing = [index for index in range(1, len(tests) + 1) if index not in parsed]
+        fallback_futures = {
+            executor.submit(
+                contextvars.copy_context().run,
+                parallel_single_lab_analyze,
+                tests[index - 1],
+                histories.get(normalize_test_name(tests[index - 1].get('name'))) or [],
+            ): index
+            for index in missing
+        }
+        llm_calls += len(fallback_futures)
+        for future in as_completed(fallback_futures):
+            try:
+                item = parse_json_safe(future.result()["content"])
+            except Exception as e:
+                logger.warning(f"Lab batch tekil fallback başarısız: {e}")
+                item = None
+            # parse_json_safe çözemediği metin için genel (quiz) fallback döndürür; lab sonucu olmayanlar sayılmaz
+            if isinstance(item, dict) and item.get("test_analysis"):
+                parsed[fallback_futures[future]] = item
+    
+    results = [parsed.get(index) or _lab_unavailable_item(test) for index, test in enumerate(tests, 1)]
+    
+    return {
+        "results": results,
+        "model_used": PARALLEL_MODELS[0],
+        "llm_calls": llm_calls,
+    }
+
+@traced()
 def parallel_single_session_analyze(session_tests: List[Dict[str, Any]], session_date: str, laboratory: str) -> Dict[str, Any]:
     """Analyze single lab session with multiple tests - Tek seans analizi"""
     try:
@@ -1009,7 +1190,7 @@ def parallel_single_session_analyze(session_tests: List[Dict[str, Any]], session
             # Çoklu model - paralel çağır
             with ThreadPoolExecutor(max_workers=len(PARALLEL_MODELS)) as executor:
                 future_to_model = {
-                    executor.submit(call_chat_model, model, messages, 0.3, 1500): model 
+                    executor.submit(contextvars.copy_context().run, call_chat_model, model, messages, 0.3, 1500): model 
                     for model in PARALLEL_MODELS
                 }
                 
@@ -1023,14 +1204,14 @@ def parallel_single_session_analyze(session_tests: List[Dict[str, Any]], session
                                 "response": result["content"]
                             })
                     except Exception as e:
-                        print(f"Single session model {model} failed: {e}")
+                        logger.warning(f"Single session model {model} failed: {e}")
                         # Rate limiting hatası varsa biraz bekle
                         if "429" in str(e) or "Too Many Requests" in str(e):
                             time.sleep(2)
                         continue
         
         if not responses:
-            print("No successful responses, using GPT-4o fallback")
+            logger.warning("No successful responses, using GPT-4o fallback")
             return gpt4o_session_fallback(session_tests, session_date, laboratory)
         
         # Tek model kullanıldığı için synthesis'e gerek yok - direkt AI response'u kullan
@@ -1091,14 +1272,15 @@ def parallel_single_session_analyze(session_tests: List[Dict[str, Any]], session
                 }
                 
         except Exception as e:
-            print(f"Response formatting failed: {e}")
+            logger.warning(f"Response formatting failed: {e}")
             # Formatting başarısız olursa GPT-4o fallback kullan
             return gpt4o_session_fallback(session_tests, session_date, laboratory)
         
     except Exception as e:
-        print(f"Single session analyze failed: {e}")
+        logger.warning(f"Single session analyze failed: {e}")
         return single_session_fallback(session_tests, session_date, laboratory)
 
+@traced()
 def parallel_multiple_lab_analyze(tests_data: List[Dict[str, Any]], session_count: int, available_supplements: List[Dict[str, Any]] = None, user_profile: Dict[str, Any] = None, quiz_data: Dict[str, Any] = None) -> Dict[str, Any]:
     """Analyze multiple lab tests for general summary - ÜRÜN KATALOĞU ENTEGRASYONU"""
     try:
@@ -1108,7 +1290,7 @@ def parallel_multiple_lab_analyze(tests_data: List[Dict[str, Any]], session_coun
         responses = []
         with ThreadPoolExecutor(max_workers=len(PARALLEL_MODELS)) as executor:
             future_to_model = {
-                executor.submit(call_chat_model, model, messages, 0.3, 2000): model 
+                executor.submit(contextvars.copy_context().run, call_chat_model, model, messages, 0.3, 2000): model 
                 for model in PARALLEL_MODELS
             }
             
@@ -1128,7 +1310,7 @@ def parallel_multiple_lab_analyze(tests_data: List[Dict[str, Any]], session_coun
                     continue
         
         if not responses:
-            print("No successful responses, using GPT-4o fallback")
+            logger.warning("No successful responses, using GPT-4o fallback")
             return gpt4o_multiple_lab_fallback(tests_data, session_count, available_supplements, user_profile, quiz_data)
         
         # Tek model kullanıldığı için synthesis'e gerek yok - direkt response'u döndür
@@ -1140,17 +1322,18 @@ def parallel_multiple_lab_analyze(tests_data: List[Dict[str, Any]], session_coun
         }
         
     except Exception as e:
-        print(f"Multiple lab analyze failed: {e}")
+        logger.warning(f"Multiple lab analyze failed: {e}")
         return gpt4o_multiple_lab_fallback(tests_data, session_count, available_supplements, user_profile, quiz_data)
 
 # Session synthesis prompt fonksiyonu kaldırıldı - tek model kullanıldığı için gerekli değil
 
 # Lab synthesis prompt fonksiyonu kaldırıldı - tek model kullanıldığı için gerekli değil
 
+@traced()
 def gpt4o_lab_fallback(test_data: Dict[str, Any], historical_results: List[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Fallback to GPT-4o for lab analysis when GPT-5 fails"""
     try:
-        print("GPT-5 failed, trying GPT-4o fallback for lab analysis...")
+        logger.warning("GPT-5 failed, trying GPT-4o fallback for lab analysis...")
         
         # Build prompt for GPT-4o
         messages = build_single_lab_prompt(test_data, historical_results)
@@ -1165,16 +1348,17 @@ def gpt4o_lab_fallback(test_data: Dict[str, Any], historical_results: List[Dict[
             raise Exception("GPT-4o response invalid")
             
     except Exception as e:
-        print(f"GPT-4o lab fallback also failed: {e}")
+        logger.error(f"GPT-4o lab fallback also failed: {e}")
     return {
             "content": "Laboratuvar analizi şu anda mevcut değil. Lütfen daha sonra tekrar deneyin.",
             "models_used": ["fallback_error"]
         }
 
+@traced()
 def gpt4o_session_fallback(session_tests: List[Dict[str, Any]], session_date: str, laboratory: str) -> Dict[str, Any]:
     """Fallback to GPT-4o for session analysis when GPT-5 fails"""
     try:
-        print("GPT-5 failed, trying GPT-4o fallback for session analysis...")
+        logger.warning("GPT-5 failed, trying GPT-4o fallback for session analysis...")
         
         # Build prompt for GPT-4o
         messages = build_single_session_prompt(session_tests, session_date, laboratory)
@@ -1189,16 +1373,17 @@ def gpt4o_session_fallback(session_tests: List[Dict[str, Any]], session_date: st
             raise Exception("GPT-4o response invalid")
             
     except Exception as e:
-        print(f"GPT-4o session fallback also failed: {e}")
+        logger.error(f"GPT-4o session fallback also failed: {e}")
         return {
             "content": "Seans analizi şu anda mevcut değil. Lütfen daha sonra tekrar deneyin.",
             "models_used": ["fallback_error"]
         }
 
+@traced()
 def gpt4o_multiple_lab_fallback(tests_data: List[Dict[str, Any]], session_count: int, available_supplements: List[Dict[str, Any]] = None, user_profile: Dict[str, Any] = None, quiz_data: Dict[str, Any] = None) -> Dict[str, Any]:
     """Fallback to GPT-4o for multiple lab analysis when GPT-5 fails"""
     try:
-        print("GPT-5 failed, trying GPT-4o fallback for multiple lab analysis...")
+        logger.warning("GPT-5 failed, trying GPT-4o fallback for multiple lab analysis...")
         
         # Build prompt for GPT-4o
         messages = build_multiple_lab_prompt(tests_data, session_count, available_supplements, user_profile, quiz_data)
@@ -1213,12 +1398,13 @@ def gpt4o_multiple_lab_fallback(tests_data: List[Dict[str, Any]], session_count:
             raise Exception("GPT-4o response invalid")
             
     except Exception as e:
-        print(f"GPT-4o multiple lab fallback also failed: {e}")
+        logger.error(f"GPT-4o multiple lab fallback also failed: {e}")
         return {
             "content": "Kapsamlı laboratuvar analizi şu anda mevcut değil. Lütfen daha sonra tekrar deneyin.",
             "models_used": ["fallback_error"]
         }
 
+@traced()
 def single_session_fallback(session_tests: List[Dict[str, Any]], session_date: str, laboratory: str) -> Dict[str, Any]:
     """Fallback for single session analysis"""
     return {
@@ -1243,6 +1429,7 @@ def single_session_fallback(session_tests: List[Dict[str, Any]], session_date: s
         "model_used": "fallback"
     }
 
+@traced()
 def single_lab_fallback(test_data: Dict[str, Any], historical_results: List[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Fallback for single lab analysis with historical results"""
     fallback_response = {
@@ -1263,6 +1450,7 @@ def single_lab_fallback(test_data: Dict[str, Any], historical_results: List[Dict
         "model_used": "fallback"
     }
 
+@traced()
 def multiple_lab_fallback(tests_data: List[Dict[str, Any]], session_count: int, available_supplements: List[Dict[str, Any]] = None, user_profile: Dict[str, Any] = None) -> Dict[str, Any]:
     """Fallback for multiple lab analysis"""
     return {
@@ -1271,7 +1459,7 @@ def multiple_lab_fallback(tests_data: List[Dict[str, Any]], session_count: int,
     }
 
 def analyze_lab_progress(current_tests: List[Dict[str, Any]], previous_tests: List[Dict[str, Any]], user_profile: Dict[str, Any] = None) -> Dict[str, Any]:
-    """Lab test progress analizi - Eski vs yeni test sonuçları"""
+    """Lab test progress analizi - Eski vs yeni test sonuçları (lab_engine ile deterministik)"""
     
     if not previous_tests:
         return {
@@ -1284,36 +1472,55 @@ def analyze_lab_progress(current_tests: List[Dict[str, Any]], previous_tests: Li
     progress_info = f"Önceki test sayısı: {len(previous_tests)}\n"
     progress_info += f"Güncel test sayısı: {len(current_tests)}\n\n"
     
-    # Test bazlı karşılaştırma
+    # Güncel testler en yeni kabul edilir; geçmiş testler kendi tarihleriyle sıralanır
+    current_keys = {normalize_test_name(t.get('name') or t.get('test_name')) for t in current_tests}
+    facts = build_lab_facts([*previous_tests, *({**t, 'test_date': 'Yeni Seans'} for t in current_tests)])
+    
     comparisons = []
-    for current_test in current_tests:
-        test_name = current_test.get('name', 'Bilinmeyen')
-        current_value = current_test.get('value', 'Yok')
-        
-        # Önceki testlerde aynı test var mı?
-        previous_test = None
-        for prev_test in previous_tests:
-            if prev_test.get('name') == test_name:
-                previous_test = prev_test
-                break
-        
-        if previous_test:
-            prev_value = previous_test.get('value', 'Yok')
-            comparison = {
-                "test_name": test_name,
-                "previous_value": prev_value,
-                "current_value": current_value,
-                "change": "değişim analizi yapılacak"
-            }
-            comparisons.append(comparison)
+    improved = worsened = 0
+    for fact in facts:
+        if normalize_test_name(fact['name']) not in current_keys or fact['previous_value'] is None:
+            continue
+        direction = "değişmedi" if not fact['delta'] else ("arttı" if fact['delta'] > 0 else "azaldı")
+        # Aralık dışındaysa sınıra yaklaşmak iyileşme, uzaklaşmak kötüleşme
+        if fact['status'] == "yüksek" and fact['delta']:
+            change = "kötüleşme" if fact['delta'] > 0 else "iyileşme"
+        elif fact['status'] == "düşük" and fact['delta']:
+            change = "iyileşme" if fact['delta'] > 0 else "kötüleşme"
+        elif fact['status'] == "normal":
+            change = "normal aralıkta"
+        else:
+            change = direction
+        improved += change == "iyileşme"
+        worsened += change == "kötüleşme"
+        comparisons.append({
+            "test_name": fact['name'],
+            "previous_value": fact['previous_value'],
+            "current_value": fact['value'],
+            "unit": fact['unit'],
+            "status": fact['status'],
+            "delta": fact['delta'],
+            "delta_pct": fact['delta_pct'],
+            "slope_per_30d": fact['slope_per_30d'],
+            "change": f"{direction} ({change})" if change != direction else direction,
+        })
     
     progress_info += f"Karşılaştırılan test sayısı: {len(comparisons)}\n"
     
+    if improved > worsened:
+        overall_trend = f"Genel trend olumlu: {improved} testte iyileşme, {worsened} testte kötüleşme"
+    elif worsened > improved:
+        overall_trend = f"Genel trend olumsuz: {worsened} testte kötüleşme, {improved} testte iyileşme"
+    else:
+        overall_trend = f"Genel trend dengeli: {improved} iyileşme, {worsened} kötüleşme"
+    
     return {
         "progress_analysis": progress_info,
         "test_comparisons": comparisons,
-        "overall_trend": "Genel trend analizi yapılacak",
-        "recommendations": "Progress bazlı öneriler yapılacak"
+        "overall_trend": overall_trend,
+        "recommendations": "; ".join(
+            f"{c['test_name']} takip edilmeli ({c['change']})" for c in comparisons if "kötüleşme" in c['change']
+        ) or "Belirgin kötüleşme yok, rutin takibe devam"
     }
 
 def detect_language(text: str) -> str:
@@ -0,0 +1,209 @@
+"""ai_messages payload codec: zstd sıkıştırma + büyük alt nesneler için content-hash dedup.
+
+Büyük top-level değerler payload_blobs tablosuna sha256 ile bir kez yazılır:
+
+- Listeler (test listeleri, katalog snapshot'ları) eleman bazında,
+  içerik tanımlı parçalara bölünür: parça sınırı elemanın kendi hash'ine
+  göre seçildiği için yeni panelle büyüyen ya da başına eleman eklenen
+  listede değişmeyen elemanlar aynı parçalara düşer ve tekrar yazılmaz.
+  Payload içinde {"__blobs__": [<hash>, ...]} referansı kalır.
+- Dict değerler tek parça: {"__blob__": <hash>}.
+
+Kalan payload zstd ile sıkıştırılır. zstandard kurulu değilse zlib
+kullanılır; codec ilk byte'ta saklanır.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from backend.metrics import record_cache
+
+# log_utils config'i import ediyor; benchmark API anahtarsız çalışsın diye handler'lar uygulama tarafında kurulur
+logger = logging.getLogger("longo.payload_store")
+
+REF_KEY = "__blob__"
+CHUNKS_KEY = "__blobs__"
+DEDUP_MIN_BYTES = int(os.getenv("AI_PAYLOAD_DEDUP_MIN_BYTES", "1024"))  # Bu boyuttan büyük alt nesneler dedup edilir
+DEDUP_CHUNK_ELEMENTS = int(os.getenv("AI_PAYLOAD_DEDUP_CHUNK_ELEMENTS", "16"))  # Liste parçası başına ortalama eleman
+DEDUP_CHUNK_MIN_BYTES = int(os.getenv("AI_PAYLOAD_DEDUP_CHUNK_MIN_BYTES", "512"))  # Çok küçük parça (blob satırı) açılmasın
+DEDUP_CHUNK_MAX_BYTES = 64 * 1024
+# Var olan blob tekrar kullanıldığında payload_blobs.referenced_at en fazla bu aralıkla güncellenir
+BLOB_TOUCH_INTERVAL_S = int(os.getenv("AI_PAYLOAD_BLOB_TOUCH_INTERVAL_S", "3600"))
+ZSTD_LEVEL = int(os.getenv("AI_PAYLOAD_ZSTD_LEVEL", "3"))
+BLOB_CACHE_MAX_BYTES = int(os.getenv("AI_PAYLOAD_BLOB_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+_CODEC_ZLIB = b"\x00"
+_CODEC_ZSTD = b"\x01"
+
+try:
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+
+
+def _dumps(obj, sort_keys: bool = False) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys, default=str)
+
+
+def compress_text(text: str) -> bytes:
+    raw = text.encode("utf-8")
+    if _zstd is not None:
+        return _CODEC_ZSTD + _zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return _CODEC_ZLIB + zlib.compress(raw, 6)
+
+
+def decompress_text(blob: bytes) -> str:
+    codec, body = blob[:1], blob[1:]
+    if codec == _CODEC_ZSTD:
+        if _zstd is None:
+            raise RuntimeError("zstandard kurulu değil; zstd ile sıkıştırılmış payload okunamıyor.")
+        return _zstd.ZstdDecompressor().decompress(body).decode("utf-8")
+    if codec == _CODEC_ZLIB:
+        return zlib.decompress(body).decode("utf-8")
+    raise ValueError(f"Bilinmeyen payload codec: {codec!r}")
+
+
+class _BlobTextCache:
+    """hash -> JSON text LRU (içerik adresli, değişmez; byte limitli)"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: OrderedDict[str, str] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            text = self._items.get(key)
+            if text is not None:
+                self._items.move_to_end(key)
+        record_cache("payload_blobs", text is not None)
+        return text
+
+    def put(self, key: str, text: str):
+        if len(text) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return
+            self._items[key] = text
+            self._size += len(text)
+            while self._size > self.max_bytes and self._items:
+                _, old = self._items.popitem(last=False)
+                self._size -= len(old)
+
+
+blob_cache = _BlobTextCache(BLOB_CACHE_MAX_BYTES)
+
+
+def _is_ref(value) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and REF_KEY in value
+
+
+def _is_chunks_ref(value) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and isinstance(value.get(CHUNKS_KEY), list)
+
+
+def _add_blob(blobs: dict, text: str) -> str:
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    if digest not in blobs:
+        blobs[digest] = (compress_text(text), len(text))
+    blob_cache.put(digest, text)
+    return digest
+
+
+def _chunk_list(items: list, blobs: dict) -> list[str]:
+    """Listeyi içerik tanımlı parçalara böl; parça hash'lerini döndür"""
+    digests = []
+    chunk: list[str] = []
+    size = 0
+    for item in items:
+        # sort_keys: aynı içerik farklı anahtar sırasıyla gelse de aynı hash
+        text = _dumps(item, sort_keys=True)
+        chunk.append(text)
+        size += len(text) + 1
+        boundary = int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16) % DEDUP_CHUNK_ELEMENTS == 0
+        if (boundary and size >= DEDUP_CHUNK_MIN_BYTES) or size >= DEDUP_CHUNK_MAX_BYTES:
+            digests.append(_add_blob(blobs, "[" + ",".join(chunk) + "]"))
+            chunk, size = [], 0
+    if chunk:
+        digests.append(_add_blob(blobs, "[" + ",".join(chunk) + "]"))
+    return digests
+
+
+def encode_payload(payload) -> tuple[bytes | None, dict[str, tuple[bytes, int]]]:
+    """Payload'u sıkıştır; dedup edilen alt nesneleri {hash: (compressed, raw_size)} olarak döndür."""
+    if payload is None:
+        return None, {}
+    blobs: dict[str, tuple[bytes, int]] = {}
+    if isinstance(payload, dict):
+        slim = {}
+        for key, value in payload.items():
+            if isinstance(value, (list, dict)) and value:
+                text = _dumps(value, sort_keys=True)
+                if len(text) >= DEDUP_MIN_BYTES:
+                    if isinstance(value, list):
+                        slim[key] = {CHUNKS_KEY: _chunk_list(value, blobs)}
+                    else:
+                        slim[key] = {REF_KEY: _add_blob(blobs, text)}
+                    continue
+            slim[key] = value
+        payload = slim
+    return compress_text(_dumps(payload)), blobs
+
+
+def unpack_payload(blob: bytes) -> tuple[object, set[str]]:
+    """Sıkıştırılmış payload'u aç; çözülmesi gereken blob hash'lerini döndür."""
+    obj = json.loads(decompress_text(blob))
+    refs = set()
+    if isinstance(obj, dict):
+        for value in obj.values():
+            if _is_ref(value):
+                refs.add(value[REF_KEY])
+            elif _is_chunks_ref(value):
+                refs.update(value[CHUNKS_KEY])
+    return obj, refs
+
+
+def missing_refs(refs: set[str]) -> set[str]:
+    return {digest for digest in refs if blob_cache.get(digest) is None}
+
+
+def load_fetched(fetched: dict[str, bytes]) -> dict[str, str]:
+    """DB'den okunan {hash: compressed} blob'ları aç ve cache'e al."""
+    texts = {}
+    for digest, data in fetched.items():
+        text = decompress_text(data)
+        blob_cache.put(digest, text)
+        texts[digest] = text
+    return texts
+
+
+def resolve_payload(obj, texts: dict[str, str] | None = None):
+    """{"__blob__": hash} referanslarını blob içerikleriyle değiştir."""
+    if not isinstance(obj, dict):
+        return obj
+    texts = texts or {}
+    for key, value in obj.items():
+        if _is_ref(value):
+            text = _blob_text(value[REF_KEY], texts)
+            obj[key] = json.loads(text) if text is not None else None
+        elif _is_chunks_ref(value):
+            chunks = [_blob_text(digest, texts) for digest in value[CHUNKS_KEY]]
+            if any(text is None for text in chunks):
+                obj[key] = None
+            else:
+                obj[key] = [item for text in chunks for item in json.loads(text)]
+    return obj
+
+
+def _blob_text(digest: str, texts: dict[str, str]) -> str | None:
+    text = texts.get(digest) or blob_cache.get(digest)
+    if text is None:
+        logger.warning(f"payload blob bulunamadı: {digest}")
+    return text
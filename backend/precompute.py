@@ -0,0 +1,182 @@
+"""Premium-plus ve test önerilerinin olay tetiklemeli ön hesaplanması.
+
+Diet/exercise/lifestyle ve test önerilerinin girdileri sadece kullanıcı yeni
+quiz veya lab_summary gönderdiğinde değişir. Endpoint'ler girdilerin
+fingerprint'ini (quiz + lab + istek parametreleri + RECOMMENDATION_VERSION)
+hesaplar; precomputed_recommendations'taki kayıt aynı fingerprint'e sahipse
+LLM çağrılmadan döner, değilse üretilip saklanır. quiz/lab_summary yazımı
+on_ai_message_written ile arka plan işini kuyruğa koyar; iş aynı endpoint
+yolunu çalıştırdığı için kullanıcı sayfayı açtığında sonuç hazırdır.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Awaitable, Callable
+
+from backend.config import PRECOMPUTE_ENABLED, PRECOMPUTE_DELAY_S, PRECOMPUTE_CONCURRENCY, PRECOMPUTE_MAX_PENDING
+from backend.log_utils import get_logger
+from backend.metrics import REGISTRY, CallbackMetric, record_cache, register_queue
+
+logger = get_logger("precompute")
+
+# Prompt'lar değiştiğinde artırılmalı: eski kayıtların fingerprint'i tutmaz, yeniden üretilir
+RECOMMENDATION_VERSION = 1
+
+# Yazılan ai_messages tipi -> plan -> yeniden üretilecek öneri tipleri
+TRIGGERS = {
+    "quiz": {
+        "premium": ["test_recommendations:quiz"],
+        "premium_plus": ["test_recommendations:quiz", "diet", "exercise", "lifestyle"],
+    },
+    "lab_summary": {
+        "premium": ["test_recommendations:lab"],
+        "premium_plus": ["test_recommendations:lab", "diet", "exercise", "lifestyle"],
+    },
+    # Konuşma özeti (backend/chat_memory.py); öneri değil ama aynı gecikmeli/birleştirilen iş modeli
+    "chat": {
+        "premium": ["chat_summary"],
+        "premium_plus": ["chat_summary"],
+    },
+}
+
+_handlers: dict[str, Callable[[str], Awaitable[None]]] = {}
+
+
+def register(kind: str, handler: Callable[[str], Awaitable[None]]):
+    """Router'lar öneri tipi başına arka plan üreticisini kaydeder: handler(user_id)"""
+    _handlers[kind] = handler
+
+
+def recommendation_fingerprint(kind: str, *inputs) -> str:
+    canonical = json.dumps([kind, RECOMMENDATION_VERSION, *inputs], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+async def load_precomputed(user_id: str | None, kind: str, fingerprint: str) -> dict | None:
+    """Fingerprint tutuyorsa saklı yanıt, yoksa None"""
+    from backend.db import AsyncSessionLocal, async_get_precomputed_recommendation
+
+    if not PRECOMPUTE_ENABLED or not user_id or AsyncSessionLocal is None:
+        return None
+    try:
+        async with AsyncSessionLocal() as db:
+            row = await async_get_precomputed_recommendation(db, user_id, kind)
+    except Exception as e:
+        logger.warning(f"Precomputed öneri okunamadı ({kind}): {e}")
+        return None
+    hit = row is not None and row.input_fingerprint == fingerprint
+    record_cache("precomputed_recommendations", hit)
+    return row.response_payload if hit else None
+
+
+async def store_precomputed(user_id: str | None, kind: str, fingerprint: str, payload: dict):
+    from backend.db import AsyncSessionLocal, async_upsert_precomputed_recommendation
+
+    if not PRECOMPUTE_ENABLED or not user_id or AsyncSessionLocal is None:
+        return
+    try:
+        async with AsyncSessionLocal() as db:
+            await async_upsert_precomputed_recommendation(db, user_id, kind, fingerprint, payload)
+    except Exception as e:
+        # Saklanamazsa bir sonraki istek tekrar üretir; yanıtı bozmasın
+        logger.warning(f"Precomputed öneri yazılamadı ({kind}): {e}")
+
+
+class PrecomputeWorker:
+    """Event loop üzerinde tek task: (kullanıcı, tip) işleri PRECOMPUTE_DELAY_S gecikmeyle ve birleştirilerek çalışır"""
+
+    def __init__(self, delay_s: float, concurrency: int, max_pending: int):
+        self.delay_s = delay_s
+        self.max_pending = max_pending
+        self.concurrency = max(1, concurrency)
+        self._semaphore: asyncio.Semaphore | None = None
+        self._pending: dict[tuple[str, str], float] = {}  # (user_id, kind) -> çalışma zamanı (monotonic)
+        self._running: set[asyncio.Task] = set()
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.stats = {"enqueued": 0, "coalesced": 0, "dropped": 0, "completed": 0, "failed": 0}
+
+    def start(self):
+        """Startup hook'undan (event loop içinde, request context'i dışında) çağrılır"""
+        if not PRECOMPUTE_ENABLED or (self._task and not self._task.done()):
+            return
+        self._wake = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        tasks = [t for t in (self._task, *self._running) if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._pending.clear()
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, user_id: str, kinds: list[str]):
+        if self._task is None:
+            return
+        due = time.monotonic() + self.delay_s
+        for kind in kinds:
+            if kind not in _handlers:
+                continue
+            key = (user_id, kind)
+            if key in self._pending:
+                # Ardışık quiz + lab_summary: tek üretim, son yazımdan delay_s sonra
+                self.stats["coalesced"] += 1
+            elif len(self._pending) >= self.max_pending:
+                self.stats["dropped"] += 1
+                continue
+            else:
+                self.stats["enqueued"] += 1
+            self._pending[key] = due
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            due = [key for key, at in self._pending.items() if at <= now]
+            for key in due:
+                del self._pending[key]
+                task = asyncio.get_running_loop().create_task(self._process(*key))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            self._wake.clear()
+            timeout = min(self._pending.values(), default=now + 60) - time.monotonic()
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(timeout, 0.01))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, user_id: str, kind: str):
+        async with self._semaphore:
+            try:
+                await _handlers[kind](user_id)
+                self.stats["completed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Endpoint'in kendisi de üretebilir; arka plan hatası sadece loglanır
+                self.stats["failed"] += 1
+                logger.warning(f"Precompute başarısız (user={user_id}, kind={kind}): {getattr(e, 'detail', e)}")
+
+
+precompute_worker = PrecomputeWorker(PRECOMPUTE_DELAY_S, PRECOMPUTE_CONCURRENCY, PRECOMPUTE_MAX_PENDING)
+
+register_queue("precompute", precompute_worker.pending_count)
+REGISTRY.register(CallbackMetric(
+    "longo_precompute_jobs_total", "Öneri ön hesaplama işleri", ("result",),
+    lambda: {(key,): value for key, value in precompute_worker.stats.items()},
+    kind="counter",
+))
+
+
+def on_ai_message_written(user_id: str | None, message_type: str, user_plan: str):
+    """quiz/lab_summary (ve chat) kaydı yazıldığında: planın kullanabildiği işleri arka planda çalıştır"""
+    kinds = TRIGGERS.get(message_type, {}).get(user_plan)
+    if not PRECOMPUTE_ENABLED or not user_id or not kinds:
+        return
+    precompute_worker.enqueue(user_id, kinds)
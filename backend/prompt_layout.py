@@ -0,0 +1,80 @@
+"""Prompt düzeni ve provider prompt cache işaretleri.
+
+Upstream prompt cache'i (OpenAI/DeepSeek otomatik, Anthropic/Gemini
+cache_control ile) sadece isteğin başındaki birebir aynı önek için çalışır.
+Bu yüzden mesajlar sabit sırayla dizilir:
+
+1. statik önek   -> system mesajı (lru_cache'li, tüm kullanıcılarda aynı)
+2. kullanıcı     -> tek user mesajı (profil, quiz, lab, konuşma özeti; kullanıcının sonraki turlarında aynı)
+3. tur           -> son turlar, ürün listesi ve şimdiki soru (her istekte değişir)
+
+1 ve 2 cache sınırıdır; PROMPT_CACHE_CONTROL_PREFIXES'teki modellere
+giden payload'da bu mesajlar cache_control'lü content part'a çevrilir.
+Yanıttaki usage'dan okunan cache'li prompt token'ları metriklere ve
+llm_usage_daily.cached_prompt_tokens'a yazılır.
+"""
+from typing import Any, Dict, List, Optional
+
+from backend.config import PROMPT_CACHE_CONTROL_PREFIXES, PROMPT_CACHE_ENABLED
+
+# Mesaj dict'inde cache sınırı işareti; payload'a gitmeden silinir
+CACHE_FLAG = "cache"
+# OpenRouter'a sadece bu alanlar gider (context_data gibi iç alanlar atılır)
+_MESSAGE_KEYS = ("role", "content", "name")
+# Anthropic istek başına en fazla 4 cache_control kabul eder
+_MAX_BREAKPOINTS = 4
+
+
+def layout_messages(
+    static_prefix: str,
+    user_blocks: List[Optional[str]],
+    turn_blocks: List[Optional[str]],
+    context_data: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Statik önek -> kullanıcı bloğu -> tur blokları; boş bloklar atlanır"""
+    system = {"role": "system", "content": static_prefix, CACHE_FLAG: True}
+    if context_data is not None:
+        system["context_data"] = context_data
+    messages = [system]
+    user_text = "\n\n".join(block.strip() for block in user_blocks if block and block.strip())
+    if user_text:
+        messages.append({"role": "user", "content": user_text, CACHE_FLAG: True})
+    messages.extend({"role": "user", "content": block} for block in turn_blocks if block)
+    return messages
+
+
+def supports_cache_control(model: str) -> bool:
+    return PROMPT_CACHE_ENABLED and model.startswith(PROMPT_CACHE_CONTROL_PREFIXES)
+
+
+def apply_cache_markers(model: str, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Payload mesajları: iç alanlar atılır, destekleyen modelde cache sınırları cache_control alır.
+
+    İlk system mesajı her zaman sınırdır (tüm endpoint'lerde statik kısım
+    orada; parallel_chat system mesajını yeniden kurduğu için işaret kaybolabilir).
+    """
+    use_markers = supports_cache_control(model)
+    breakpoints = 0
+    cleaned = []
+    for index, message in enumerate(messages):
+        out = {key: message[key] for key in _MESSAGE_KEYS if key in message}
+        is_boundary = message.get(CACHE_FLAG) or (index == 0 and message.get("role") == "system")
+        if use_markers and is_boundary and isinstance(out.get("content"), str) and breakpoints < _MAX_BREAKPOINTS:
+            out["content"] = [{"type": "text", "text": out["content"], "cache_control": {"type": "ephemeral"}}]
+            breakpoints += 1
+        cleaned.append(out)
+    return cleaned
+
+
+def cached_prompt_tokens(usage: Optional[Dict[str, Any]]) -> int:
+    """usage içindeki cache'ten okunan prompt token'ları (OpenAI/OpenRouter ve Anthropic alan adları)"""
+    if not usage:
+        return 0
+    details = usage.get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens") if isinstance(details, dict) else None
+    if cached is None:
+        cached = usage.get("cache_read_input_tokens")
+    try:
+        return max(0, int(cached or 0))
+    except (TypeError, ValueError):
+        return 0
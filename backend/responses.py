@@ -0,0 +1,155 @@
+"""JSON yanıt sınıfı ve yanıt sıkıştırma middleware'i.
+
+Lab özeti, metabolik yaş ve premium-plus önerileri büyük iç içe JSON döner.
+orjson kuruluysa default yanıt sınıfı ORJSONResponse olur (stdlib json'dan
+birkaç kat hızlı, çıktı aynı: UTF-8, ensure_ascii yok). CompressionMiddleware
+Accept-Encoding'e göre br (brotli paketi varsa) veya gzip ile sıkıştırır;
+eşik altındaki, zaten sıkıştırılmış (Content-Encoding set) veya sıkıştırmadan
+fayda görmeyen (görsel, SSE) yanıtlara dokunmaz.
+"""
+import gzip
+import zlib
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+from backend.config import COMPRESSION_MIN_BYTES, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY
+
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+except ImportError:  # Opsiyonel: yoksa stdlib json
+    DefaultJSONResponse = JSONResponse
+
+try:
+    import brotli
+except ImportError:  # Opsiyonel: yoksa sadece gzip
+    brotli = None
+
+_COMPRESSIBLE_TYPES = ("application/json", "application/xml", "application/javascript", "text/", "image/svg+xml")
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """br > gzip; q=0 ile reddedilenler hariç"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token.strip()] = q
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def _is_compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    if content_type.startswith("text/event-stream"):
+        return False
+    return content_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._obj = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+            self.process, self._finish = self._obj.process, self._obj.finish
+        else:
+            # wbits=16+MAX_WBITS: gzip header/trailer'lı stream
+            self._obj = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self.process, self._finish = self._obj.compress, self._obj.flush
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """Tek parça yanıtlar bir kerede, streaming yanıtlar chunk chunk sıkıştırılır"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message = None
+        self.compressor: _Compressor | None = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_with_compression)
+
+    async def send_with_compression(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Başlıklar ilk body parçası görülene kadar bekletilir (boyut/stream kararı)
+            self.start_message = message
+            self.passthrough = not _is_compressible(Headers(raw=message["headers"]))
+            return
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            if self.passthrough or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if not more_body:
+                body = compress(body, self.encoding)
+                headers["Content-Length"] = str(len(body))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            del headers["Content-Length"]
+            self.compressor = _Compressor(self.encoding)
+            await self.send(start)
+
+        if self.passthrough:
+            await self.send(message)
+            return
+        chunk = self.compressor.process(body)
+        if not more_body:
+            chunk += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,507 @@
+"""RETENTION_DAYS uygulaması: arşivleme, free kullanıcı temizliği ve Postgres partition bakımı.
+
+- RETENTION_DAYS'ten eski ai_messages satırları (ve bildirimi yapılmış
+  high_risk_users kayıtları) batch'ler halinde gzip NDJSON arşivine yazılır,
+  sonra DB'den silinir.
+- Free kullanıcı verisi (session-* / user id'siz) FREE_RETENTION_DAYS sonra
+  arşivlenmeden silinir.
+- ai_messages'tan türetilen lab_test_results satırları aynı süreler sonunda
+  arşivlenmeden silinir.
+- Silinen/arşivlenen satırların artık hiçbir satırın referans almadığı
+  payload_blobs kayıtları (dedup blob'ları) RETENTION_BLOB_GRACE_HOURS
+  sonra silinir; silinen free kullanıcı verisi blob'larda kalmaz.
+- ai_messages Postgres'te partitioned ise aylık partition'lar önceden açılır,
+  süresi dolan partition'lar arşivlenip DETACH + DROP edilir.
+
+Her batch önce arşive (atomik rename), sonra DB'ye yazılır; arşiv dosya adı
+batch'in ilk id'sinden türetildiği için yarıda kesilen job tekrar çalıştığında
+aynı dosyanın üzerine yazar (resumable). Batch'ler arası RETENTION_BATCH_PAUSE_S
+beklenir ve aynı anda tek worker çalışır (advisory lock / dosya kilidi).
+
+    python -m backend.retention --dry-run
+    python -m backend.retention --convert-partitions   # tek seferlik Postgres migration
+"""
+import datetime
+import gzip
+import json
+import os
+import re
+import threading
+import time
+
+from sqlalchemy import delete, func, or_, select, text
+
+from backend.config import (
+    RETENTION_DAYS, FREE_RETENTION_DAYS, RETENTION_ENABLED, RETENTION_ARCHIVE_DIR,
+    RETENTION_BATCH_SIZE, RETENTION_BATCH_PAUSE_S, RETENTION_INTERVAL_HOURS,
+    RETENTION_PARTITION_MONTHS_AHEAD, RETENTION_BLOB_GRACE_HOURS,
+)
+from backend import payload_store
+from backend.db import AIMessage, HighRiskUser, LabTestResult, PayloadBlob, SessionLocal, engine, _hydrate_ai_messages
+from backend.log_utils import get_logger
+
+logger = get_logger("retention")
+
+FREE_USER_PREFIX = "session-"
+_ADVISORY_LOCK_KEY = 7301029
+_PARTITION_RE = re.compile(r"^ai_messages_y(\d{4})m(\d{2})$")
+
+
+def ensure_retention_indexes():
+    """Retention sorguları full scan yapmasın (create_all mevcut tablolara index eklemez)."""
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_ai_messages_created_at ON ai_messages (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_high_risk_users_detected_at ON high_risk_users (detected_at)",
+    ]
+    try:
+        with engine.begin() as conn:
+            for stmt in statements:
+                conn.execute(text(stmt))
+    except Exception as e:
+        logger.warning(f"retention index ensure skipped/failed: {e}")
+
+
+# ---------- Job kilidi ----------
+
+class _JobLock:
+    """Aynı anda tek retention job'ı: Postgres'te advisory lock, SQLite'ta dosya kilidi"""
+
+    def __init__(self, archive_dir: str):
+        self.archive_dir = archive_dir
+        self._conn = None
+        self._file = None
+
+    def acquire(self) -> bool:
+        if engine.dialect.name == "postgresql":
+            self._conn = engine.connect()
+            acquired = self._conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": _ADVISORY_LOCK_KEY}).scalar()
+            if not acquired:
+                self._conn.close()
+                self._conn = None
+            return bool(acquired)
+
+        import fcntl
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self._file = open(os.path.join(self.archive_dir, ".retention.lock"), "w")
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+
+    def release(self):
+        if self._conn is not None:
+            self._conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _ADVISORY_LOCK_KEY})
+            self._conn.close()
+            self._conn = None
+        if self._file is not None:
+            import fcntl
+
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+# ---------- Arşiv dosyaları ----------
+
+def _write_archive(path: str, records: list[dict]):
+    """gzip NDJSON yaz: önce .tmp, fsync, sonra atomik rename"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+            for record in records:
+                gz.write((json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+
+
+def _serialize_ai_message(row: AIMessage) -> dict:
+    return {
+        "id": row.id,
+        "external_user_id": row.external_user_id,
+        "message_type": row.message_type,
+        "request_payload": row.request_payload,
+        "response_payload": row.response_payload,
+        "model_used": row.model_used,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+    }
+
+
+def _serialize_high_risk_user(row: HighRiskUser) -> dict:
+    return {
+        "id": row.id,
+        "external_user_id": row.external_user_id,
+        "user_level": row.user_level,
+        "lab_summary_id": row.lab_summary_id,
+        "risk_level": row.risk_level,
+        "risk_reason": row.risk_reason,
+        "risky_tests": row.risky_tests,
+        "ai_analysis": row.ai_analysis,
+        "detected_at": row.detected_at.isoformat() if row.detected_at else None,
+        "notified": row.notified,
+        "notified_at": row.notified_at.isoformat() if row.notified_at else None,
+    }
+
+
+# ---------- Postgres partition bakımı ----------
+
+def _month_start(day: datetime.date) -> datetime.date:
+    return day.replace(day=1)
+
+
+def _add_months(day: datetime.date, months: int) -> datetime.date:
+    month_index = day.year * 12 + day.month - 1 + months
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def is_ai_messages_partitioned() -> bool:
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.connect() as conn:
+        relkind = conn.execute(
+            text("SELECT c.relkind FROM pg_class c WHERE c.relname = 'ai_messages' AND pg_table_is_visible(c.oid)")
+        ).scalar()
+    return relkind == "p"
+
+
+def ensure_monthly_partitions(months_ahead: int = RETENTION_PARTITION_MONTHS_AHEAD, start: datetime.date | None = None):
+    """Bu aydan itibaren months_ahead ay için partition aç (default partition'a veri düşmesin)."""
+    month = _month_start(start or datetime.datetime.utcnow().date())
+    end = _add_months(_month_start(datetime.datetime.utcnow().date()), months_ahead + 1)
+    with engine.begin() as conn:
+        while month < end:
+            nxt = _add_months(month, 1)
+            name = f"ai_messages_y{month.year:04d}m{month.month:02d}"
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF ai_messages "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{nxt.isoformat()}')"
+            ))
+            month = nxt
+
+
+def _list_monthly_partitions() -> list[tuple[str, datetime.date]]:
+    with engine.connect() as conn:
+        names = conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'ai_messages'"
+        )).scalars().all()
+    partitions = []
+    for name in names:
+        match = _PARTITION_RE.match(name)
+        if match:
+            partitions.append((name, datetime.date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def convert_ai_messages_to_partitioned():
+    """Tek seferlik: mevcut ai_messages'ı created_at'e göre aylık RANGE partitioned tabloya taşı.
+
+    Eski tablo ai_messages_legacy adıyla bırakılır; doğrulamadan sonra elle DROP edilmeli.
+    """
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("Partitioning yalnızca PostgreSQL için desteklenir")
+    if is_ai_messages_partitioned():
+        logger.info("ai_messages zaten partitioned")
+        return
+
+    with engine.begin() as conn:
+        oldest = conn.execute(text("SELECT MIN(created_at) FROM ai_messages")).scalar()
+        conn.execute(text("UPDATE ai_messages SET created_at = NOW() WHERE created_at IS NULL"))
+        conn.execute(text("ALTER TABLE ai_messages RENAME TO ai_messages_legacy"))
+        conn.execute(text(
+            "CREATE TABLE ai_messages (LIKE ai_messages_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+        ))
+        conn.execute(text("ALTER TABLE ai_messages ALTER COLUMN created_at SET NOT NULL"))
+        conn.execute(text("ALTER TABLE ai_messages ADD PRIMARY KEY (id, created_at)"))
+        conn.execute(text("ALTER SEQUENCE IF EXISTS ai_messages_id_seq OWNED BY ai_messages.id"))
+        conn.execute(text("CREATE TABLE ai_messages_default PARTITION OF ai_messages DEFAULT"))
+        for column in ("external_user_id", "message_type", "created_at"):
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_ai_messages_p_{column} ON ai_messages ({column})"))
+
+    # Partition'lar veri kopyalanmadan önce açılmalı; yoksa her şey default partition'a düşer
+    ensure_monthly_partitions(start=oldest.date() if oldest else None)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO ai_messages SELECT * FROM ai_messages_legacy"))
+    logger.info("ai_messages partitioned tabloya taşındı; ai_messages_legacy doğrulamadan sonra DROP edilebilir")
+
+
+# ---------- Job ----------
+
+class RetentionJob:
+    """Tek bir retention çalıştırması (run_once) + periyodik scheduler thread'i"""
+
+    def __init__(
+        self,
+        retention_days: int = RETENTION_DAYS,
+        free_retention_days: int = FREE_RETENTION_DAYS,
+        archive_dir: str = RETENTION_ARCHIVE_DIR,
+        batch_size: int = RETENTION_BATCH_SIZE,
+        pause_s: float = RETENTION_BATCH_PAUSE_S,
+        dry_run: bool = False,
+    ):
+        self.retention_days = retention_days
+        self.free_retention_days = free_retention_days
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+        self.pause_s = pause_s
+        self.dry_run = dry_run
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.last_run: dict | None = None
+
+    def _pause(self) -> bool:
+        """Batch'ler arası bekle; shutdown istendiyse False döner"""
+        return not self._stop.wait(self.pause_s)
+
+    def _archive_path(self, table: str, first_id: int, created_at) -> str:
+        month = created_at.strftime("%Y-%m") if created_at else "unknown"
+        return os.path.join(self.archive_dir, table, month, f"{table}_{first_id:012d}.ndjson.gz")
+
+    def purge_free_user_data(self, now: datetime.datetime) -> int:
+        cutoff = now - datetime.timedelta(days=self.free_retention_days)
+        free_filter = or_(AIMessage.external_user_id.like(f"{FREE_USER_PREFIX}%"), AIMessage.external_user_id.is_(None))
+        purged = 0
+        while True:
+            with SessionLocal() as db:
+                ids = db.execute(
+                    select(AIMessage.id)
+                    .where(free_filter, AIMessage.created_at < cutoff)
+                    .order_by(AIMessage.id)
+                    .limit(self.batch_size)
+                ).scalars().all()
+                if not ids:
+                    break
+                if self.dry_run:
+                    return purged + len(ids)
+                db.execute(delete(AIMessage).where(AIMessage.id.in_(ids)))
+                db.commit()
+            purged += len(ids)
+            if not self._pause():
+                break
+        return purged
+
+    def purge_lab_test_results(self, cutoff: datetime.datetime, now: datetime.datetime) -> int:
+        """lab_test_results ai_messages'tan türetilir: kaynak satırla aynı süre sonunda arşivlenmeden silinir"""
+        free_cutoff = now - datetime.timedelta(days=self.free_retention_days)
+        expired = or_(
+            LabTestResult.measured_at < cutoff,
+            (LabTestResult.external_user_id.like(f"{FREE_USER_PREFIX}%")) & (LabTestResult.measured_at < free_cutoff),
+        )
+        purged = 0
+        while True:
+            with SessionLocal() as db:
+                ids = db.execute(
+                    select(LabTestResult.id).where(expired).order_by(LabTestResult.id).limit(self.batch_size)
+                ).scalars().all()
+                if not ids:
+                    break
+                if self.dry_run:
+                    return purged + len(ids)
+                db.execute(delete(LabTestResult).where(LabTestResult.id.in_(ids)))
+                db.commit()
+            purged += len(ids)
+            if not self._pause():
+                break
+        return purged
+
+    def archive_ai_messages(self, cutoff: datetime.datetime, lower: datetime.datetime | None = None, delete_rows: bool = True) -> int:
+        archived = 0
+        last_id = 0
+        while True:
+            with SessionLocal() as db:
+                query = db.query(AIMessage).filter(AIMessage.created_at < cutoff, AIMessage.id > last_id)
+                if lower is not None:
+                    query = query.filter(AIMessage.created_at >= lower)
+                rows = query.order_by(AIMessage.id).limit(self.batch_size).all()
+                if not rows:
+                    break
+                if self.dry_run:
+                    return archived + len(rows)
+                _hydrate_ai_messages(db, rows)
+                _write_archive(
+                    self._archive_path("ai_messages", rows[0].id, rows[0].created_at),
+                    [_serialize_ai_message(row) for row in rows],
+                )
+                if delete_rows:
+                    db.execute(delete(AIMessage).where(AIMessage.id.in_([row.id for row in rows])))
+                    db.commit()
+                last_id = rows[-1].id
+            archived += len(rows)
+            if not self._pause():
+                break
+        return archived
+
+    def archive_high_risk_users(self, cutoff: datetime.datetime) -> int:
+        """Sadece bildirimi yapılmış (notified) kayıtlar arşivlenir; bekleyen riskler silinmez."""
+        archived = 0
+        while True:
+            with SessionLocal() as db:
+                rows = (
+                    db.query(HighRiskUser)
+                    .filter(HighRiskUser.detected_at < cutoff, HighRiskUser.notified == True)
+                    .order_by(HighRiskUser.id)
+                    .limit(self.batch_size)
+                    .all()
+                )
+                if not rows:
+                    break
+                if self.dry_run:
+                    return archived + len(rows)
+                _write_archive(
+                    self._archive_path("high_risk_users", rows[0].id, rows[0].detected_at),
+                    [_serialize_high_risk_user(row) for row in rows],
+                )
+                db.execute(delete(HighRiskUser).where(HighRiskUser.id.in_([row.id for row in rows])))
+                db.commit()
+            archived += len(rows)
+            if not self._pause():
+                break
+        return archived
+
+    def _referenced_blob_hashes(self) -> set[str] | None:
+        """Kalan ai_messages satırlarının referans aldığı blob hash'leri (sadece küçük payload iskeleti açılır)"""
+        referenced = set()
+        last_id = 0
+        while True:
+            with SessionLocal() as db:
+                rows = db.execute(
+                    select(AIMessage.id, AIMessage.request_payload_z, AIMessage.response_payload_z)
+                    .where(AIMessage.id > last_id)
+                    .order_by(AIMessage.id)
+                    .limit(self.batch_size)
+                ).all()
+            if not rows:
+                return referenced
+            for _, request_z, response_z in rows:
+                for blob in (request_z, response_z):
+                    if blob is not None:
+                        referenced |= payload_store.unpack_payload(blob)[1]
+            last_id = rows[-1][0]
+            if self._stop.is_set():
+                return None
+
+    def sweep_orphan_blobs(self, now: datetime.datetime) -> int:
+        """Hiçbir satırın referans almadığı payload_blobs kayıtlarını sil.
+
+        Tarama sırasında yazılan satırlar var olan blob'u yeniden kullanabilir; bu blob'ların
+        referenced_at'i tazelendiği için grace süresinden yeni olanlara dokunulmaz.
+        """
+        cutoff = now - datetime.timedelta(hours=RETENTION_BLOB_GRACE_HOURS)
+        referenced = self._referenced_blob_hashes()
+        if referenced is None:
+            return 0
+        last_used = func.coalesce(PayloadBlob.referenced_at, PayloadBlob.created_at)
+        swept = 0
+        last_hash = ""
+        while True:
+            with SessionLocal() as db:
+                hashes = db.execute(
+                    select(PayloadBlob.hash)
+                    .where(PayloadBlob.hash > last_hash, last_used < cutoff)
+                    .order_by(PayloadBlob.hash)
+                    .limit(self.batch_size)
+                ).scalars().all()
+                if not hashes:
+                    break
+                last_hash = hashes[-1]
+                orphans = [digest for digest in hashes if digest not in referenced]
+                if orphans and not self.dry_run:
+                    db.execute(delete(PayloadBlob).where(PayloadBlob.hash.in_(orphans), last_used < cutoff))
+                    db.commit()
+            swept += len(orphans)
+            if orphans and not self.dry_run and not self._pause():
+                break
+        return swept
+
+    def drop_expired_partitions(self, cutoff: datetime.datetime) -> list[str]:
+        """Tamamı cutoff'tan eski aylık partition'ları arşivle, DETACH + DROP et"""
+        dropped = []
+        for name, month in _list_monthly_partitions():
+            month_end = _add_months(month, 1)
+            if datetime.datetime.combine(month_end, datetime.time()) > cutoff:
+                break
+            lower = datetime.datetime.combine(month, datetime.time())
+            # Partition komple düşeceği için satır silmeye gerek yok; yarıda kalırsa aynı dosyalar yeniden yazılır
+            self.archive_ai_messages(datetime.datetime.combine(month_end, datetime.time()), lower=lower, delete_rows=False)
+            if self.dry_run or self._stop.is_set():
+                break
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE ai_messages DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+            logger.info(f"Retention: partition arşivlendi ve düşürüldü: {name}")
+        return dropped
+
+    def run_once(self) -> dict:
+        lock = _JobLock(self.archive_dir)
+        if not lock.acquire():
+            return {"skipped": "başka bir worker çalışıyor"}
+        started = time.time()
+        now = datetime.datetime.utcnow()
+        cutoff = now - datetime.timedelta(days=self.retention_days)
+        result = {"dry_run": self.dry_run, "cutoff": cutoff.isoformat()}
+        try:
+            result["free_purged"] = self.purge_free_user_data(now)
+            if is_ai_messages_partitioned():
+                if not self.dry_run:
+                    ensure_monthly_partitions()
+                result["partitions_dropped"] = self.drop_expired_partitions(cutoff)
+            # Partitioned değilse (veya default partition'da kalan eski satırlar) batch'li arşiv + silme
+            result["ai_messages_archived"] = self.archive_ai_messages(cutoff)
+            result["high_risk_users_archived"] = self.archive_high_risk_users(cutoff)
+            result["lab_test_results_purged"] = self.purge_lab_test_results(cutoff, now)
+            # Satır silmelerinden sonra: silinen/arşivlenen satırların blob'ları da gitsin
+            result["payload_blobs_swept"] = self.sweep_orphan_blobs(now)
+        finally:
+            lock.release()
+        result["duration_s"] = round(time.time() - started, 2)
+        self.last_run = result
+        logger.info(f"Retention job tamamlandı: {result}")
+        return result
+
+    def _loop(self, initial_delay_s: float):
+        if self._stop.wait(initial_delay_s):
+            return
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Retention job hatası: {e}")
+            if self._stop.wait(RETENTION_INTERVAL_HOURS * 3600):
+                return
+
+    def start(self, initial_delay_s: float = 300):
+        if not RETENTION_ENABLED or (self._thread and self._thread.is_alive()):
+            return
+        ensure_retention_indexes()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(initial_delay_s,), name="retention-job", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+retention_job = RetentionJob()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ai_messages retention / arşiv job'ı")
+    parser.add_argument("--dry-run", action="store_true", help="Sadece etkilenecek ilk batch'leri say")
+    parser.add_argument("--convert-partitions", action="store_true", help="Postgres: ai_messages'ı partitioned tabloya taşı")
+    args = parser.parse_args()
+
+    if args.convert_partitions:
+        convert_ai_messages_to_partitioned()
+    else:
+        ensure_retention_indexes()
+        RetentionJob(dry_run=args.dry_run).run_once()
@@ -7,6 +7,12 @@ from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 
+from backend.config import RISK_PRESCREEN_ENABLED, RISK_PRESCREEN_SUMMARY_CHARS
+from backend.log_utils import get_logger, log_payload
+from backend.risk_prescreen import DECISION_CRITICAL, DECISION_NORMAL, compact_tests_text, prescreen
+
+logger = get_logger("risk_detector")
+
 
 def detect_high_risk_with_ai(
     tests: List[Dict[str, Any]],
@@ -39,21 +45,47 @@ def detect_high_risk_with_ai(
         # Geçmiş testler AI summary'de bahsediliyor olabilir, bu yüzden sadece yeni testlere bakmalıyız
         tests_to_analyze = new_tests if new_tests else tests  # Yeni testler varsa onları kullan
         
-        tests_info = []
-        for test in tests_to_analyze:
-            test_info = f"- {test.get('name', 'Bilinmeyen')}: {test.get('value', 'N/A')}"
-            if test.get('unit'):
-                test_info += f" {test['unit']}"
-            if test.get('reference_range'):
-                test_info += f" (Referans: {test['reference_range']})"
-            if test.get('status'):
-                test_info += f" [Durum: {test['status']}]"
-            tests_info.append(test_info)
-        
-        tests_text = "\n".join(tests_info)
-        
-        # AI summary'yi text'e çevir (ama sadece bu seansın özeti için kullanılacak)
-        summary_text = json.dumps(ai_lab_summary, ensure_ascii=False, indent=2)
+        if RISK_PRESCREEN_ENABLED:
+            # Net normal / net kritik batch'ler kural tabanlı karara bağlanır, LLM'e sadece belirsizler gider
+            screen = prescreen(tests_to_analyze)
+            if screen["decision"] == DECISION_NORMAL:
+                logger.info("HIGH RISK tespit edilmedi (ön eleme, LLM'siz)")
+                logger.debug("Ön eleme normal: user=%s", external_user_id)
+                return None
+            if screen["decision"] == DECISION_CRITICAL:
+                logger.warning(f"Kritik değer (ön eleme, LLM'siz): {len(screen['critical'])} test")
+                logger.debug("Ön eleme kritik: user=%s", external_user_id)
+                return _save_high_risk(
+                    db, external_user_id, user_level, lab_summary_id,
+                    risk_level="critical",
+                    risk_reason="; ".join(c["reason"] for c in screen["critical"]),
+                    risky_tests=[c["name"] for c in screen["critical"]],
+                    ai_analysis=json.dumps({
+                        "source": "prescreen",
+                        "critical": [{"name": c["name"], "reason": c["reason"]} for c in screen["critical"]],
+                    }, ensure_ascii=False),
+                    new_tests=new_tests,
+                )
+            tests_text = compact_tests_text(screen)
+            # Özetin sadece genel değerlendirmesi referans olarak yeterli
+            overview = ai_lab_summary.get("genel_saglik_durumu") or ai_lab_summary.get("genel_durum") if isinstance(ai_lab_summary, dict) else None
+            summary_text = str(overview or "")[:RISK_PRESCREEN_SUMMARY_CHARS]
+        else:
+            tests_info = []
+            for test in tests_to_analyze:
+                test_info = f"- {test.get('name', 'Bilinmeyen')}: {test.get('value', 'N/A')}"
+                if test.get('unit'):
+                    test_info += f" {test['unit']}"
+                if test.get('reference_range'):
+                    test_info += f" (Referans: {test['reference_range']})"
+                if test.get('status'):
+                    test_info += f" [Durum: {test['status']}]"
+                tests_info.append(test_info)
+            
+            tests_text = "\n".join(tests_info)
+            
+            # AI summary'yi text'e çevir (ama sadece bu seansın özeti için kullanılacak)
+            summary_text = json.dumps(ai_lab_summary, ensure_ascii=False, indent=2)
         
         # AI'ya risk detection sorusu
         system_prompt = """Sen bir tıbbi risk değerlendirme uzmanısın. Lab sonuçlarını analiz ederek gerçekten HIGH RISK olan durumları tespit ediyorsun.
@@ -102,7 +134,7 @@ Bu lab sonuçlarında gerçekten HIGH RISK tespit eden bir durum var mı?
 Yukarıdaki kurallara göre değerlendir ve SADECE JSON formatında yanıt ver."""
 
         # AI'ya sor (async fonksiyonu sync context'te çalıştır)
-        print(f"🤖 AI'ya risk detection sorusu gönderiliyor...")
+        logger.debug("AI'ya risk detection sorusu gönderiliyor")
         import asyncio
         
         # Thread içinde async çalıştırmak için yeni event loop oluştur
@@ -123,11 +155,9 @@ Yukarıdaki kurallara göre değerlendir ve SADECE JSON formatında yanıt ver."
                     user_message=user_prompt
                 )
             )
-            print(f"📥 AI response alındı (uzunluk: {len(ai_response) if ai_response else 0})")
+            logger.debug(f"AI response alındı (uzunluk: {len(ai_response) if ai_response else 0})")
         except Exception as ai_error:
-            print(f"❌ AI response alma hatası: {ai_error}")
-            import traceback
-            traceback.print_exc()
+            logger.error(f"AI response alma hatası: {ai_error}", exc_info=True)
             return None
         
         # Response'u parse et
@@ -146,111 +176,123 @@ Yukarıdaki kurallara göre değerlendir ve SADECE JSON formatında yanıt ver."
                     cleaned_response = cleaned_response[json_start:json_end].strip()
             
             risk_data = json.loads(cleaned_response)
-            print(f"📊 AI risk data parse edildi: is_high_risk={risk_data.get('is_high_risk')}")
+            logger.debug(f"AI risk data parse edildi: is_high_risk={risk_data.get('is_high_risk')}")
             
             # High risk tespit edildiyse kaydet
             if risk_data.get('is_high_risk') == True:
-                risk_level = risk_data.get('risk_level', 'high')
-                risk_reason = risk_data.get('risk_reason', 'AI tarafından high risk tespit edildi')
-                risky_tests = risk_data.get('risky_tests', [])
-                
-                # Duplicate kontrolü: Son 7 gün içinde aynı kullanıcı için high risk kaydı var mı?
-                from backend.db import get_high_risk_users
-                
-                # Yeni testlerde risk varsa duplicate kontrolü yapma (mutlaka kayıt yap)
-                has_new_test_risk = False
-                if new_tests:
-                    # Yeni testlerin adlarını çıkar
-                    new_test_names = [t.get('name', '').lower().strip() for t in new_tests if t.get('name')]
-                    # Riskli testlerden yeni testlerde olanları bul
-                    risky_new_tests = [rt for rt in risky_tests if rt.lower().strip() in new_test_names]
-                    if risky_new_tests:
-                        has_new_test_risk = True
-                        print(f"🆕 Yeni testlerde risk tespit edildi: {risky_new_tests}")
-                
-                # Duplicate kontrolü (sadece yeni testlerde risk yoksa)
-                is_duplicate = False
-                if not has_new_test_risk:
-                    recent_risks = get_high_risk_users(
-                        db=db,
-                        external_user_id=external_user_id,
-                        limit=5  # Son 5 kaydı kontrol et
-                    )
-                    
-                    # Son 7 gün içindeki kayıtları filtrele
-                    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-                    recent_risks_filtered = [
-                        r for r in recent_risks 
-                        if r.detected_at and r.detected_at >= seven_days_ago
-                    ]
-                    
-                    # Duplicate kontrolü: Aynı riskli testler ve aynı risk seviyesi var mı?
-                    if recent_risks_filtered:
-                        for recent_risk in recent_risks_filtered:
-                            recent_risky_tests = recent_risk.risky_tests or []
-                            
-                            # Riskli testleri karşılaştır (set kullanarak sıra farkını göz ardı et)
-                            if (set(risky_tests) == set(recent_risky_tests) and 
-                                recent_risk.risk_level == risk_level):
-                                is_duplicate = True
-                                print(f"⚠️ Duplicate risk kaydı tespit edildi: User ID {external_user_id}")
-                                print(f"   Aynı riskli testler: {risky_tests}")
-                                print(f"   Aynı risk seviyesi: {risk_level}")
-                                print(f"   Önceki kayıt ID: {recent_risk.id}, Tarih: {recent_risk.detected_at}")
-                                break
-                
-                # Duplicate değilse veya yeni riskli testler varsa kaydet
-                if not is_duplicate:
-                    from backend.db import create_high_risk_user
-                    
-                    risk_record = create_high_risk_user(
-                        db=db,
-                        external_user_id=external_user_id,
-                        user_level=user_level,
-                        lab_summary_id=lab_summary_id,
-                        risk_level=risk_level,
-                        risk_reason=risk_reason,
-                        risky_tests=risky_tests,
-                        ai_analysis=ai_response,
-                    )
-                    
-                    print(f"🚨 HIGH RISK tespit edildi ve kaydedildi: User ID {external_user_id}, Risk Level: {risk_level}")
-                    print(f"   Risk Reason: {risk_reason}")
-                    print(f"   Risky Tests: {risky_tests}")
-                    print(f"   Kayıt ID: {risk_record.id}")
-                    
-                    return {
-                        'is_high_risk': True,
-                        'risk_level': risk_level,
-                        'risk_reason': risk_reason,
-                        'risky_tests': risky_tests,
-                        'risk_record_id': risk_record.id,
-                        'is_new_risk': True,
-                    }
-                else:
-                    # Duplicate ama bilgiyi döndür (kayıt yapılmadı)
-                    print(f"ℹ️ Duplicate risk kaydı atlandı: User ID {external_user_id}")
-                    return {
-                        'is_high_risk': True,
-                        'risk_level': risk_level,
-                        'risk_reason': risk_reason,
-                        'risky_tests': risky_tests,
-                        'risk_record_id': None,
-                        'is_new_risk': False,
-                        'is_duplicate': True,
-                    }
+                return _save_high_risk(
+                    db, external_user_id, user_level, lab_summary_id,
+                    risk_level=risk_data.get('risk_level', 'high'),
+                    risk_reason=risk_data.get('risk_reason', 'AI tarafından high risk tespit edildi'),
+                    risky_tests=risk_data.get('risky_tests', []),
+                    ai_analysis=ai_response,
+                    new_tests=new_tests,
+                )
             else:
-                print(f"✅ HIGH RISK tespit edilmedi: User ID {external_user_id}")
+                logger.info("HIGH RISK tespit edilmedi")
+                logger.debug("Risk yok: user=%s", external_user_id)
                 return None
                 
         except json.JSONDecodeError as e:
-            print(f"⚠️ Risk detection AI response parse hatası: {e}")
-            print(f"   Raw response: {ai_response[:200]}")
+            logger.warning(f"Risk detection AI response parse hatası: {e}")
+            logger.debug("Raw response: %s", log_payload(ai_response))
             return None
             
     except Exception as e:
-        print(f"❌ Risk detection hatası: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"Risk detection hatası: {e}", exc_info=True)
         return None
 
+
+def _save_high_risk(
+    db: Session,
+    external_user_id: str,
+    user_level: Optional[int],
+    lab_summary_id: Optional[int],
+    risk_level: str,
+    risk_reason: str,
+    risky_tests: List[str],
+    ai_analysis: str,
+    new_tests: Optional[List[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    """Duplicate kontrolü (son 7 gün) + high_risk_users kaydı; LLM ve ön eleme yolu ortak"""
+    # Duplicate kontrolü: Son 7 gün içinde aynı kullanıcı için high risk kaydı var mı?
+    from backend.db import get_high_risk_users
+    
+    # Yeni testlerde risk varsa duplicate kontrolü yapma (mutlaka kayıt yap)
+    has_new_test_risk = False
+    if new_tests:
+        # Yeni testlerin adlarını çıkar
+        new_test_names = [t.get('name', '').lower().strip() for t in new_tests if t.get('name')]
+        # Riskli testlerden yeni testlerde olanları bul
+        risky_new_tests = [rt for rt in risky_tests if rt.lower().strip() in new_test_names]
+        if risky_new_tests:
+            has_new_test_risk = True
+            logger.info(f"Yeni testlerde risk tespit edildi: {risky_new_tests}")
+    
+    # Duplicate kontrolü (sadece yeni testlerde risk yoksa)
+    is_duplicate = False
+    if not has_new_test_risk:
+        recent_risks = get_high_risk_users(
+            db=db,
+            external_user_id=external_user_id,
+            limit=5  # Son 5 kaydı kontrol et
+        )
+        
+        # Son 7 gün içindeki kayıtları filtrele
+        seven_days_ago = datetime.utcnow() - timedelta(days=7)
+        recent_risks_filtered = [
+            r for r in recent_risks 
+            if r.detected_at and r.detected_at >= seven_days_ago
+        ]
+        
+        # Duplicate kontrolü: Aynı riskli testler ve aynı risk seviyesi var mı?
+        if recent_risks_filtered:
+            for recent_risk in recent_risks_filtered:
+                recent_risky_tests = recent_risk.risky_tests or []
+                
+                # Riskli testleri karşılaştır (set kullanarak sıra farkını göz ardı et)
+                if (set(risky_tests) == set(recent_risky_tests) and 
+                    recent_risk.risk_level == risk_level):
+                    is_duplicate = True
+                    logger.info(f"Duplicate risk kaydı tespit edildi: testler={risky_tests}, seviye={risk_level}, önceki kayıt={recent_risk.id} ({recent_risk.detected_at})")
+                    logger.debug("Duplicate risk: user=%s", external_user_id)
+                    break
+    
+    # Duplicate değilse veya yeni riskli testler varsa kaydet
+    if not is_duplicate:
+        from backend.db import create_high_risk_user
+        
+        risk_record = create_high_risk_user(
+            db=db,
+            external_user_id=external_user_id,
+            user_level=user_level,
+            lab_summary_id=lab_summary_id,
+            risk_level=risk_level,
+            risk_reason=risk_reason,
+            risky_tests=risky_tests,
+            ai_analysis=ai_analysis,
+        )
+        
+        logger.warning(f"HIGH RISK tespit edildi ve kaydedildi: risk_level={risk_level}, risky_tests={risky_tests}, kayıt={risk_record.id}")
+        logger.debug("High risk: user=%s, reason=%s", external_user_id, log_payload(risk_reason))
+        
+        return {
+            'is_high_risk': True,
+            'risk_level': risk_level,
+            'risk_reason': risk_reason,
+            'risky_tests': risky_tests,
+            'risk_record_id': risk_record.id,
+            'is_new_risk': True,
+        }
+    else:
+        # Duplicate ama bilgiyi döndür (kayıt yapılmadı)
+        logger.info("Duplicate risk kaydı atlandı")
+        return {
+            'is_high_risk': True,
+            'risk_level': risk_level,
+            'risk_reason': risk_reason,
+            'risky_tests': risky_tests,
+            'risk_record_id': None,
+            'is_new_risk': False,
+            'is_duplicate': True,
+        }
@@ -0,0 +1,155 @@
+"""Risk detection öncesi kural tabanlı ön eleme.
+
+Yeni lab testleri lab_engine ile standart birime çevrilip analit başına
+kritik (panik) eşiklere ve referans aralığından sapmaya göre puanlanır:
+
+- Kritik eşik aşıldıysa (ör. potasyum > 6.2 mmol/L) -> "critical", LLM'siz kayıt
+- Tüm testler normal ya da sadece hafif sapmalıysa -> "normal", LLM çağrılmaz
+- Diğer durumlar (orta/ciddi sapma, pozitif kalitatif sonuç, tümör
+  belirteci, yorumlanamayan değer) -> "ambiguous", LLM'e kısa prompt ile sorulur
+
+Karar sayıları /metrics ve /ai/usage/report'ta (risk_prescreen) görünür.
+"""
+import threading
+from typing import Any, Dict, List, Optional
+
+from backend.lab_engine import analyze_test, format_lab_fact
+from backend.lab_history import normalize_test_name
+from backend.metrics import REGISTRY, CallbackMetric
+
+# Analit -> (isimler, standart birim, kritik alt, kritik üst); birim lab_engine'in standart birimi
+CRITICAL_THRESHOLDS = {
+    "glucose": (("glukoz", "glucose", "açlık kan şekeri", "açlık glukozu", "aks", "kan şekeri"), "mg/dL", 50, 400),
+    "potassium": (("potasyum", "potassium", "k"), "mmol/L", 2.8, 6.2),
+    "sodium": (("sodyum", "sodium", "na"), "mmol/L", 120, 160),
+    "calcium": (("kalsiyum", "calcium", "ca"), "mg/dL", 6.5, 13),
+    "hemoglobin": (("hemoglobin", "hgb", "hb"), "g/dL", 7, 20),
+    "platelets": (("trombosit", "platelet", "platelets", "plt"), "10³/µL", 50, 1000),
+    "wbc": (("lökosit", "beyaz küre", "wbc", "white blood cell"), "10³/µL", 2, 30),
+    "creatinine": (("kreatinin", "creatinine"), "mg/dL", None, 4),
+    "inr": (("inr", "pt-inr"), None, None, 4.5),
+    "hba1c": (("hba1c", "hemoglobin a1c", "glikozile hemoglobin"), "%", None, 12),
+    "tsh": (("tsh",), "mIU/L", 0.01, 20),
+    "bilirubin": (("total bilirubin", "bilirubin total", "t. bilirubin"), "mg/dL", None, 15),
+}
+_CRITICAL_BY_NAME = {
+    alias: (unit, low, high) for aliases, unit, low, high in CRITICAL_THRESHOLDS.values() for alias in aliases
+}
+
+# Referans dışıysa sapma küçük olsa da LLM'e sorulur
+TUMOR_MARKERS = ("psa", "total psa", "ca 125", "ca-125", "ca 19-9", "ca-19-9", "ca 15-3", "ca-15-3", "cea", "afp")
+_POSITIVE_WORDS = ("pozitif", "positive", "reaktif", "reactive", "+")
+_NORMAL_WORDS = ("negatif", "negative", "normal", "non-reaktif", "nonreaktif", "non-reactive", "-")
+
+# Üst sınırın 5 katı (sapma >= 4) analit eşiği olmasa da kritik sayılır
+GENERIC_CRITICAL_DEVIATION = 4.0
+# Bu orana kadar referans dışı değerler "hafif" (LLM'e gerek yok)
+MILD_DEVIATION = 0.2
+
+DECISION_NORMAL = "normal"
+DECISION_CRITICAL = "critical"
+DECISION_AMBIGUOUS = "ambiguous"
+
+_stats_lock = threading.Lock()
+_stats = {DECISION_NORMAL: 0, DECISION_CRITICAL: 0, DECISION_AMBIGUOUS: 0}
+
+
+def _same_scale(fact: Dict[str, Any], unit: Optional[str], low: Optional[float], high: Optional[float]) -> bool:
+    """Eşik sadece aynı birimde uygulanır; birim yoksa referans aralığı eşiklerin arasında kalmalı"""
+    if fact["unit"] is not None:
+        return fact["unit"] == unit
+    bounds = [b for b in (fact["low"], fact["high"]) if b is not None]
+    if not bounds:
+        return unit is None
+    return all((low is None or b > low) and (high is None or b < high) for b in bounds)
+
+
+def classify_test(test: Dict[str, Any]) -> Dict[str, Any]:
+    """Tek test: severity (0 normal, 1 hafif, 2 orta, 3 ciddi, 10 kritik) ve nedeni"""
+    fact = analyze_test(test)
+    key = normalize_test_name(fact["name"])
+    value = fact["value"]
+    result = {"name": fact["name"], "fact": fact, "severity": 0, "reason": None, "ambiguous": False}
+
+    critical = _CRITICAL_BY_NAME.get(key)
+    if critical and value is not None and _same_scale(fact, *critical):
+        _, low, high = critical
+        if (low is not None and value < low) or (high is not None and value > high):
+            bound = f"< {low}" if low is not None and value < low else f"> {high}"
+            result.update(severity=10, reason=f"{fact['name']} kritik değerde ({value:g} {fact['unit'] or ''}, eşik {bound})".replace(" ,", ","))
+            return result
+
+    if value is None:
+        text = str(fact["raw_value"] or "").strip().lower()
+        status = str(test.get("status") or "").strip().lower()
+        if text in _POSITIVE_WORDS or text.startswith(("pozitif", "positive", "reaktif", "reactive")):
+            result.update(severity=2, ambiguous=True, reason=f"{fact['name']} pozitif")
+        elif text in _NORMAL_WORDS or status in ("normal", "normal aralıkta", "negatif", "negative"):
+            pass
+        else:
+            result.update(ambiguous=True, reason=f"{fact['name']} yorumlanamadı")
+        return result
+
+    if fact["status"] is None:
+        # Aralık yoksa gönderilen durum kullanılır; o da yoksa karar LLM'e kalır
+        status = str(test.get("status") or "").strip().lower()
+        if status not in ("normal", "normal aralıkta"):
+            result.update(ambiguous=True, reason=f"{fact['name']} için referans aralığı yok")
+        return result
+
+    deviation = fact["deviation"] or 0.0
+    if fact["status"] == "normal":
+        return result
+    if fact["status"] == "yüksek" and deviation >= GENERIC_CRITICAL_DEVIATION:
+        result.update(severity=10, reason=f"{fact['name']} üst sınırın {deviation + 1:.0f} katı")
+        return result
+    severity = 1 if deviation <= MILD_DEVIATION else (2 if deviation < 1 else 3)
+    result.update(severity=severity, reason=f"{fact['name']} {fact['status']} (sınırın %{deviation * 100:.0f} dışında)")
+    if key in TUMOR_MARKERS:
+        result["ambiguous"] = True
+    return result
+
+
+def prescreen(tests: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Batch kararı: normal / critical / ambiguous + test bazlı sınıflandırma"""
+    classified = [classify_test(test) for test in tests if isinstance(test, dict)]
+    critical = [c for c in classified if c["severity"] >= 10]
+    escalate = [c for c in classified if c["ambiguous"] or 2 <= c["severity"] < 10]
+    if critical:
+        decision = DECISION_CRITICAL
+    elif escalate:
+        decision = DECISION_AMBIGUOUS
+    else:
+        decision = DECISION_NORMAL
+    with _stats_lock:
+        _stats[decision] += 1
+    return {
+        "decision": decision,
+        "critical": critical,
+        "escalate": escalate,
+        "abnormal": [c for c in classified if c["severity"] > 0 or c["ambiguous"]],
+        "normal_count": sum(1 for c in classified if c["severity"] == 0 and not c["ambiguous"]),
+        "max_severity": max((c["severity"] for c in classified), default=0),
+    }
+
+
+def compact_tests_text(screen: Dict[str, Any]) -> str:
+    """LLM'e sadece normal dışı testler (hesaplanmış satırlar) + normal test sayısı"""
+    lines = [f"- {format_lab_fact(c['fact'])}" for c in screen["abnormal"]]
+    if screen["normal_count"]:
+        lines.append(f"- Diğer {screen['normal_count']} test referans aralığında")
+    return "\n".join(lines)
+
+
+def prescreen_stats() -> Dict[str, int]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["llm_calls_avoided"] = stats[DECISION_NORMAL] + stats[DECISION_CRITICAL]
+    return stats
+
+
+REGISTRY.register(CallbackMetric(
+    "longo_risk_prescreen_total", "Risk ön eleme kararları (normal/critical LLM'siz, ambiguous LLM'e gider)", ("decision",),
+    lambda: {(decision,): count for decision, count in prescreen_stats().items() if decision != "llm_calls_avoided"},
+    kind="counter",
+))
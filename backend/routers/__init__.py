@@ -0,0 +1 @@
+"""FastAPI router'ları (main.py include_router ile bağlar)."""
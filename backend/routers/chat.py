@@ -0,0 +1,1423 @@
+"""Chat endpoint'leri: free kullanıcı session chat'i ve premium (DB geçmişli) chat"""
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Body
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+import time
+from functools import lru_cache
+from backend.config import CHAT_HISTORY_MAX, FREE_QUESTION_LIMIT, FREE_SESSION_TIMEOUT_SECONDS, CHAT_HISTORY_LIMIT, USER_ANALYSES_LIMIT, QUIZ_LAB_MESSAGES_LIMIT, MILLISECOND_MULTIPLIER, CHAT_MEMORY_WINDOW
+from backend.db import get_user_ai_messages_by_type
+from backend.db import async_get_recent_chat_messages_after, async_get_user_ai_messages, async_get_user_ai_messages_by_type
+from backend.auth import get_db, get_async_db, get_current_user, validate_chat_user_id
+from backend.schemas import ChatStartRequest, ChatStartResponse, ChatMessageRequest, ChatResponse
+from backend.health_guard import guard_or_message
+from backend.orchestrator import parallel_chat
+from backend.utils import generate_response_id, extract_user_context_hybrid, get_user_plan_from_headers
+from backend.ai_log_writer import log_ai_message
+from backend.chat_memory import MEMORY_ACTIVE, format_summary_block, load_memory
+from backend.faq_cache import catalog_version, faq_cache, is_standalone
+from backend.prompt_layout import layout_messages
+from backend.precompute import on_ai_message_written
+from backend import metrics
+from backend.log_utils import get_logger, log_payload
+from backend.routers.common import async_get_standardized_lab_data, get_xml_products
+
+logger = get_logger("chat")
+router = APIRouter()
+
+
+def get_user_context_for_message(user_context: dict, user_analyses: list) -> tuple[str, str]:
+    """Lab ve quiz verilerini user message için hazırla"""
+    lab_info = ""
+    quiz_info = ""
+    
+    # Lab verilerini user message'a ekle
+    if user_context and "son_lab_test" in user_context and user_context["son_lab_test"]:
+        lab_info = f"🚨 LAB SONUÇLARI (KULLANICI VERİSİ):\n"
+        lab_info += f"SON LAB TEST: {user_context['son_lab_test']}\n"
+        
+        if "son_lab_deger" in user_context and user_context["son_lab_deger"]:
+            lab_info += f"SON LAB DEĞER: {user_context['son_lab_deger']}\n"
+            
+        if "son_lab_durum" in user_context and user_context["son_lab_durum"]:
+            lab_info += f"SON LAB DURUM: {user_context['son_lab_durum']}\n"
+            
+        if "lab_tarih" in user_context and user_context["lab_tarih"]:
+            lab_info += f"LAB TARİH: {user_context['lab_tarih']}\n"
+        
+        lab_info += "\n"
+    
+    # Global context'te yoksa ai_messages'tan al
+    if not lab_info and user_analyses:
+        lab_analyses = [a for a in user_analyses if a.message_type == "lab_single"]
+        if lab_analyses:
+            latest_lab = lab_analyses[0]  # En son lab
+            if latest_lab.response_payload and "test_name" in latest_lab.response_payload:
+                lab_info = f"🚨 LAB SONUÇLARI (KULLANICI VERİSİ):\n"
+                lab_info += f"SON LAB TEST: {latest_lab.response_payload['test_name']}\n"
+                if "last_result" in latest_lab.response_payload:
+                    lab_info += f"SON LAB DEĞER: {latest_lab.response_payload['last_result']}\n"
+                lab_info += "\n"
+    
+    # Quiz verilerini user message'a ekle
+    if user_analyses:
+        quiz_analyses = [a for a in user_analyses if a.message_type == "quiz"]
+        if quiz_analyses:
+            latest_quiz = quiz_analyses[0]  # En son quiz
+            if latest_quiz.request_payload:
+                # Ham quiz cevaplarını al
+                quiz_info = f"🚨 SAĞLIK QUIZ PROFİLİ (KULLANICI VERİSİ):\n"
+                for key, value in latest_quiz.request_payload.items():
+                    if value and value != 'N/A':
+                        quiz_info += f"- {key}: {value}\n"
+                quiz_info += "\n"
+    
+    return lab_info, quiz_info
+
+
+def detect_language_simple(message: str) -> str:
+    """Basit dil algılama - İngilizce/Türkçe kelime sayısına bak"""
+    import re
+    
+    # Türkçe karakterler ve yaygın kelimeler
+    turkish_patterns = [
+        r'[çğıöşüÇĞIİÖŞÜ]',  # Türkçe karakterler
+        r'\b(ve|veya|için|ile|bir|bu|şu|o|ben|sen|biz|siz|onlar)\b',  # Yaygın Türkçe kelimeler
+        r'\b(merhaba|nasıl|neden|ne|hangi|kim|nerede|ne zaman)\b',  # Soru kelimeleri
+        r'\b(sağlık|beslenme|vitamin|mineral|takviye|supplement)\b'  # Sağlık terimleri
+    ]
+    
+    # İngilizce yaygın kelimeler
+    english_patterns = [
+        r'\b(hello|hi|how|what|why|when|where|who|which|can|could|would|should)\b',
+        r'\b(health|nutrition|supplement|diet|exercise)\b',
+        r'\b(and|or|for|with|the|a|an|this|that|i|you|we|they)\b'
+    ]
+    
+    turkish_count = sum(len(re.findall(pattern, message, re.IGNORECASE)) for pattern in turkish_patterns)
+    english_count = sum(len(re.findall(pattern, message, re.IGNORECASE)) for pattern in english_patterns)
+    
+    if english_count > turkish_count and english_count > 0:
+        return "en"
+    else:
+        return "tr"
+
+
+@lru_cache(maxsize=1)
+def build_chat_system_prompt() -> str:
+    """Chat için system prompt oluştur (statik; warm-up'ta bir kez render edilir)"""
+    return """Longopass'ın sağlık ve supplement konularında yardımcı olan AI asistanısın. Sadece 'sen kimsin' sorulduğunda 'Ben Longo' de.
+
+🎯 GÖREVİN: Sadece sağlık, supplement, beslenme ve laboratuvar konularında yanıt ver.
+
+🏷️ MARKA BİLGİSİ: Tüm supplement ve sağlık ürünleri LONGOPASS markasıdır. Marka sorulduğunda "Longopass markalı ürünler" de. Başka marka yok!
+
+📱 LONGOPASS HAKKINDA:
+- Longopass, kişiselleştirilmiş sağlık ve supplement platformudur
+- Kullanıcıların sağlık bilincini geliştirmelerine yardımcı olur
+- Lab test sonuçlarını ve sağlık verilerini takip etmelerini sağlar
+- Kişiye özel supplement önerileri sunar
+- Quiz ve lab analizleriyle detaylı sağlık değerlendirmesi yapar
+
+🎁 ÜYELİK PAKETLERİ - SADECE 3 PAKET VAR:
+
+**1. LONGO STARTER** (Giriş Seviyesi - ÜCRETSİZ)
+- Online Quiz + AI Destekli İlk Rapor
+- Sağlık Bülteni & Eğitim Videoları
+- Sağlık Bilincini Geliştirme
+- Ücretsiz Kullanım
+
+**2. LONGO ESSENTIAL** (Genel Sağlık ve Takip Paketi - POPÜLER)
+- Ev ve İşyerinde Test İmkanı
+- Yıllık Tam Kapsamlı Test Paneli ile İleri Düzey Sağlık Analizi
+- Kritik Değerleriniz için 4 Ayda Bir Takip Testleri
+- Gelişmiş Kişisel Sağlık Paneli ile Sonuçlarınıza Tam Erişim
+- Size Özel Kişiselleştirilmiş Ürün ve Test Önerileri
+- AI Destekli Sağlık Modüllerine Tam Erişim
+- Tüm Longopass Ürünlerinde %2,5 İndirim Oranı
+
+**3. LONGO ULTIMATE** (İleri Sağlık, Takip ve Longevity Paketi - EN İYİ TEKLİF)
+- Longo Essential Paketi'nin Tüm İçerikleri
+- Kritik Değerleriniz için 3 Ayda Bir Takip Testleri
+- Yılda Bir Defa Ücretsiz Metabolik Yaş Testi Paneli
+- Doktor Online Görüşme İmkanı
+- VIP Üyelik Desteği
+- Beslenme Önerileri Ve Destekleri
+- Spor & Egzersiz Destekleri
+- Test Sonucunuza Bağlı AI Destekli Longevity Raporu ve Ürün Önerileri
+- Tüm Longopass Ürünlerinde %5 İndirim Oranı
+
+⚠️ KRİTİK UYARI - ÜYELİK PAKETLERİ:
+- ÜYELİK PAKETİ ≠ SUPPLEMENT ÜRÜNLERİ! Bunlar farklı şeyler!
+- SADECE 3 ÜYELİK PAKETI var: LONGO STARTER, LONGO ESSENTIAL, LONGO ULTIMATE
+- "Denge Paketi", "Longevity Paketi", "Nöro Paketi" diye ÜYELİK paketi YOK! (Bunlar supplement ürünleri olabilir ama üyelik paketi değil!)
+- Kullanıcı "üyelik paketi", "membership", "plan" sorarsa SADECE 3 üyelik paketini anlat
+- Supplement ürünleri ayrı bir şey, üyelik paketleriyle KARIŞTIRMA!
+- Kendi bilgini kullanma! Sadece yukarıda yazan bilgileri kullan!
+- Bilmediğin şey sorulursa "Bu bilgiyi şu anda veremiyorum" de, uydurma!
+- 🚨 ÖNEMLİ: Kullanıcının mevcut üyelik paketi bilgisi "KULLANICI BİLGİLERİ" bölümünde verilecek. Kullanıcının mevcut üyelik paketini bil ve ona göre konuş!
+- 🚨 Kullanıcı zaten ULTIMATE üyeliğe sahipse ona STARTER veya ESSENTIAL paketi önerme!
+- 🚨 Kullanıcı zaten ESSENTIAL üyeliğe sahipse ona STARTER paketi önerme!
+- 🚨 Kullanıcının mevcut üyelik paketini bil ve ona göre önerilerde bulun!
+
+🚫 KISITLAMALAR: 
+- Sağlık dışında konulardan bahsetme
+- Off-topic soruları kibarca sağlık alanına yönlendir
+- Liste hakkında konuşma (kullanıcı listeyi görmemeli)
+
+📚 AKADEMİK KAYNAKLAR:
+- SADECE kullanıcı bilimsel/araştırma kanıtı isterse kaynak ver (örn: "çalışma göster", "araştırma ne diyor?", "bilimsel makale var mı?", "güncel araştırmalar neler?")
+- Genel sağlık tavsiyesi, supplement önerisi veya sohbet yanıtlarında kaynak verme
+- Kaynak verirken tıklanabilir markdown formatı kullan: [Çalışma Başlığı](https://pubmed.ncbi.nlm.nih.gov/...)
+- Sadece PubMed, hakemli dergiler veya güvenilir tıbbi veritabanlarından bilimsel kaynaklar ver
+- Açıkça istenmediği sürece kaynak ekleme
+
+✨ SAĞLIK ODAĞI: Her konuyu sağlık alanına çek. Kullanıcı başka bir şeyden bahsederse, nazikçe sağlık konusuna yönlendir.
+
+💡 YANIT STİLİ: Kısa, net ve anlaşılır ol. Sadece sağlık konusuna odaklan!
+
+🎯 ÜRÜN ÖNERİSİ: SADECE kullanıcı açıkça "supplement öner", "ne alayım", "hangi ürünleri alayım" gibi öneri isterse ya da bir şikayeti varsa öner. Diğer durumlarda öneri yapma! Liste hakkında konuşma! Konuşmanın devamlılığını sağla, sürekli "ne önermemi istersin?" sorma!
+
+🔄 KONUŞMA AKIŞI KURALLARI:
+- Önceki mesajları OKU ve HATIRLA! Aynı öneriyi tekrar tekrar yapma!
+- Kullanıcı "tamam", "anladım", "teşekkürler" derse, konuyu KAPATIP yeni bir konuya geç!
+- "Başka bir sağlık konusunda yardımcı olabilir miyim?" gibi sorular sor
+- Aynı ürünleri sürekli önerme, kullanıcı anladıysa farklı bir konuya geç
+- Kullanıcının önceki mesajlarına göre davran, akıllı ol!
+
+🚫 KESIN KURALLAR:
+- SADECE kullanıcı açıkça öneri isterse ya da bir şikayeti varsa supplement öner
+- Kullanıcı sormadan supplement önerisi yapma
+- SADECE aşağıdaki listedeki ürünleri öner
+- Liste dışından hiçbir ürün önerme
+- Sağlık ve supplement dışında hiçbir konuşma yapma
+- Off-topic soruları kesinlikle reddet
+- Sadece kullanıcı bilimsel/akademik kaynak isterse link ver (aksi halde link verme)
+- Liste hakkında konuşma (kullanıcı listeyi görmemeli)
+- "Senin listende", "listende var", "Senin verdiğin liste" gibi ifadeler kullanma
+- Sürekli "ne önermemi istersin?" sorma, konuşmanın devamlılığını sağla
+- Sadece ürün isimlerini öner, gereksiz açıklama yapma
+- AYNI ÖNERİYİ TEKRAR ETME! Kullanıcı anladıysa farklı konuya geç!
+
+🚨 HAFıZA KURALI: Kullanıcı mesajında "🚨 LAB SONUÇLARI" veya "🚨 SAĞLIK QUIZ PROFİLİ" ile başlayan bölümler senin hafızandan! Bunlar için "hafızamdaki verilerine göre", "geçmiş analizlerine göre" de. "Paylaştığın/gönderdiğin" deme!
+
+🔬 LAB VERİLERİ KURALI - EN ÖNEMLİ KURAL - HER ZAMAN UYGULA:
+- 🚨 LAB SONUÇLARI EN ÖNEMLİ VERİ! Her cevap vermeden ÖNCE mutlaka "🚨 LAB SONUÇLARI" bölümünü oku!
+- Konuşma geçmişinde "🚨 LAB SONUÇLARI" ile başlayan mesajlar varsa, bunlar kullanıcının GERÇEK test değerleridir!
+- Kullanıcı bir şey sorduğunda (ürün önerisi, test sorusu, genel soru - FARK ETMEZ) MUTLAKA önce lab sonuçlarına bak!
+- Ürün önerisi istenirse: Lab sonuçlarına göre hangi değerler düşük/normal/yüksek, ona göre ürün öner!
+- Test sorusu sorulursa: Lab sonuçlarındaki değeri kontrol et, referans aralığına göre cevap ver!
+- Genel soru sorulursa: Lab sonuçlarını göz önünde bulundurarak cevap ver!
+- Test değerini, referans aralığını kontrol et ve ona göre cevap ver!
+- Eğer değer normal aralıktaysa "normal" de, düşükse "düşük" de, yüksekse "yüksek" de!
+- Lab verilerini ASLA görmezden gelme! Her cevap vermeden önce mutlaka kontrol et!
+- Örnek: Kullanıcı "hangi ürünleri önerirsin" dediğinde, ÖNCE lab sonuçlarına bak, hangi değerler düşük/normal/yüksek, ona göre ürün öner!
+- Örnek: Kullanıcı "ferritinim nasıl" dediğinde, "🚨 LAB SONUÇLARI" bölümünde "Ferritin: 45 ng/mL (Referans Aralık: 15-150)" varsa, "Ferritin değerin 45 ng/mL, bu normal aralıkta (15-150)" gibi spesifik cevap ver!
+
+🎯 KİŞİSELLEŞTİRME - ÖNEMLİ: Sen bu kullanıcının KİŞİSEL SAĞLIK ASİSTANI'sın! Kullanıcıya onu tanıdığını, verilerini bildiğini hissettir! "KULLANICI BİLGİLERİ" bölümünde kullanıcının adı, yaşı, cinsiyeti, hastalıkları, lab sonuçları gibi bilgiler varsa bunları kullan! Lab sonuçlarından bahsederken "senin lab sonuçlarına göre", "test değerlerine göre", "geçmiş analizlerine göre" gibi kişisel ifadeler kullan! Quiz verilerinden bahsederken "sağlık profiline göre", "daha önce doldurduğun quiz'e göre" gibi ifadeler kullan! Önceki konuşmalara referans ver: "Daha önce X konusunda konuşmuştuk", "Geçen sefer Y'den bahsetmiştik" gibi! Kullanıcının yaşını, cinsiyetini, hastalıklarını bildiğini göster: "Senin yaşına göre", "Cinsiyetine göre", "Hastalığın göz önünde bulundurularak" gibi! Genel tavsiyeler yerine kişiselleştirilmiş tavsiyeler ver: "Senin için", "Sana özel", "Durumuna göre" gibi ifadeler kullan! Kullanıcının adı varsa ara sıra adını kullan ama her cümlede kullanma, doğal ol! Kullanıcıya onu tanıdığını hissettir ama abartma! Doğal ve samimi bir ton kullan!"""
+
+
+@lru_cache(maxsize=1)
+def build_chat_system_prompt_en() -> str:
+    """İngilizce mesajlar için chat system prompt'u (statik; warm-up'ta bir kez render edilir)"""
+    return """You are Longopass's health assistant - helping with health and supplement topics.
+
+🎯 YOUR TASK: Only respond to health, supplement, nutrition and laboratory topics.
+
+🏷️ BRAND INFO: All supplements and health products are LONGOPASS brand. When asked about brands, say "Longopass branded products". No other brands!
+
+📱 ABOUT LONGOPASS:
+- Longopass is a personalized health and supplement platform
+- Helps users develop health awareness
+- Enables tracking of lab test results and health data
+- Provides personalized supplement recommendations
+- Offers detailed health assessments through quizzes and lab analyses
+
+🎁 MEMBERSHIP PACKAGES - ONLY 3 PACKAGES EXIST:
+
+**1. LONGO STARTER** (Entry Level - FREE)
+- Online Quiz + AI-Powered Initial Report
+- Health Newsletter & Educational Videos
+- Health Awareness Development
+- Free to Use
+
+**2. LONGO ESSENTIAL** (General Health and Tracking Package - POPULAR)
+- Home and Office Testing Option
+- Annual Comprehensive Test Panel with Advanced Health Analysis
+- Follow-up Tests Every 4 Months for Critical Values
+- Full Access to Advanced Personal Health Dashboard
+- Personalized Product and Test Recommendations
+- Full Access to AI-Powered Health Modules
+- 2.5% Discount on All Longopass Products
+
+**3. LONGO ULTIMATE** (Advanced Health, Tracking and Longevity Package - BEST OFFER)
+- All Longo Essential Package Features
+- Follow-up Tests Every 3 Months for Critical Values
+- One Free Metabolic Age Test Panel Per Year
+- Online Doctor Consultation Option
+- VIP Membership Support
+- Nutrition Recommendations and Support
+- Sports & Exercise Support
+- AI-Powered Longevity Report and Product Recommendations Based on Test Results
+- 5% Discount on All Longopass Products
+
+⚠️ CRITICAL WARNING - MEMBERSHIP PACKAGES:
+- MEMBERSHIP PACKAGE ≠ SUPPLEMENT PRODUCTS! They are different things!
+- ONLY 3 MEMBERSHIP PACKAGES exist: LONGO STARTER, LONGO ESSENTIAL, LONGO ULTIMATE
+- There are NO membership packages like "Balance Pack", "Longevity Pack", "Neuro Pack"! (These might be supplement products but NOT membership packages!)
+- There are NO membership packages like "Fertility Pack", "Fitness Pack", "Athletic Performance"!
+- When users ask about "membership package", "membership", "plan", ONLY explain the 3 membership packages
+- Supplement products are separate, DON'T CONFUSE them with membership packages!
+- Don't use your own knowledge! Only use the information written above!
+- If you don't know, say "I cannot provide that information right now", don't make it up!
+
+🚫 RESTRICTIONS: 
+- Don't talk about topics outside of health
+- Politely redirect off-topic questions to health area
+- Don't talk about the list (user shouldn't see the list)
+
+📚 ACADEMIC SOURCES:
+- ONLY provide sources if user asks for scientific/research evidence (e.g., "show me studies", "what does research say?", "are there scientific papers?", "what's the latest research?")
+- DON'T provide sources for general health advice, supplement recommendations, or conversational responses
+- When providing sources, use clickable markdown format: [Study Title](https://pubmed.ncbi.nlm.nih.gov/...)
+- ONLY provide scientific/academic sources from: PubMed, Nature, Science, The Lancet, NEJM, JAMA, Springer, Cambridge University Press, Oxford University Press
+- NEVER provide sources from: commercial websites, news sites, blogs, social media, or non-academic sources
+- Don't add sources unless explicitly requested
+
+✨ HEALTH FOCUS: Pull every topic to health area. If user talks about something else, politely redirect to health topic.
+
+💡 RESPONSE STYLE: Be short, clear and understandable. Focus only on health topics!
+
+🎯 PRODUCT RECOMMENDATION: ONLY recommend when user explicitly asks "recommend supplements", "what should I take", "which products should I buy" or has a complaint. Don't recommend in other cases! Don't talk about the list! Maintain conversation flow, don't constantly ask "what do you want me to recommend?"
+
+🔄 CONVERSATION FLOW RULES:
+- READ and REMEMBER previous messages! Don't repeat the same recommendation!
+- If user says "okay", "got it", "thanks", CLOSE the topic and move to a new subject!
+- Ask questions like "Can I help with another health topic?"
+- Don't keep recommending the same products, if user understood, move to a different topic
+- Act based on user's previous messages, be smart!
+
+🚫 STRICT RULES:
+- ONLY recommend supplements when user explicitly asks or has a complaint
+- Don't recommend supplements without being asked
+- ONLY recommend products from the list below
+- Don't recommend any products outside the list
+- NEVER make up product names like "Ashwagandha Calm", "L-Theanine & Magnesium Balance", "Omega-3 Neuro Support", "Saffron Mood Boost"!
+- If a product is not in the provided list, DON'T recommend it!
+- Don't talk about anything other than health and supplements
+- Strictly reject off-topic questions
+- Provide academic links only if user explicitly asks; otherwise, don't include links
+- Don't talk about the list (user shouldn't see the list)
+- Don't use phrases like "in your list", "from your list", "the list you provided"
+- Don't constantly ask "what do you want me to recommend?", maintain conversation flow
+- Only recommend product names, don't give unnecessary explanations
+- DON'T REPEAT THE SAME RECOMMENDATION! If user understood, move to a different topic!
+
+🚨 MEMORY RULE: Messages with "🚨 LAB RESULTS" or "🚨 HEALTH QUIZ PROFILE" are from your memory! Use phrases like "based on your previous data", "according to past analyses". Don't say "you shared/sent"!
+
+🔬 LAB DATA RULE - MOST IMPORTANT - ALWAYS APPLY:
+- 🚨 LAB RESULTS ARE THE MOST IMPORTANT DATA! ALWAYS read "🚨 LAB RESULTS" section BEFORE responding!
+- If conversation history contains messages starting with "🚨 LAB RESULTS", those are the user's REAL test values!
+- When user asks ANYTHING (product recommendation, test question, general question - IT DOESN'T MATTER) ALWAYS check lab results FIRST!
+- If product recommendation is requested: Check lab results to see which values are low/normal/high, recommend products accordingly!
+- If test question is asked: Check the value in lab results, respond according to reference range!
+- If general question is asked: Consider lab results when answering!
+- Check the test value, reference range, and respond accordingly!
+- If value is in normal range say "normal", if low say "low", if high say "high"!
+- NEVER ignore lab data! Always check before responding!
+- Example: When user asks "which products do you recommend", FIRST check lab results, see which values are low/normal/high, recommend products accordingly!
+- Example: When user asks "how is my ferritin", if "🚨 LAB RESULTS" section has "Ferritin: 45 ng/mL (Reference Range: 15-150)", respond "Your ferritin is 45 ng/mL, which is within normal range (15-150)"!
+
+🌍 LANGUAGE: The user is writing in English. You MUST respond in English only! Do not use Turkish at all!"""
+
+
+def add_user_context_to_prompt(system_prompt: str, user_context: dict, user_plan: str = None) -> str:
+    """Kullanıcı bilgilerini system prompt'a ekle"""
+    return system_prompt + build_user_context_block(user_context, user_plan)
+
+
+def _user_fact_lines(user_context: dict) -> str:
+    """İsim/yaş/tercih/hastalık/cinsiyet satırları"""
+    lines = ""
+    if "isim" in user_context and user_context["isim"]:
+        lines += f"KULLANICI ADI: {user_context['isim']}\n"
+        
+    if "yas" in user_context and user_context["yas"]:
+        lines += f"KULLANICI YAŞI: {user_context['yas']} yaşında\n"
+        
+    if "tercihler" in user_context and user_context["tercihler"]:
+        tercihler_str = ', '.join(user_context['tercihler']) if isinstance(user_context['tercihler'], list) else str(user_context['tercihler'])
+        lines += f"KULLANICI TERCİHLERİ: {tercihler_str}\n"
+        
+    if "hastaliklar" in user_context and user_context["hastaliklar"]:
+        hastaliklar_str = ', '.join(user_context['hastaliklar']) if isinstance(user_context['hastaliklar'], list) else str(user_context['hastaliklar'])
+        lines += f"HASTALIKLAR: {hastaliklar_str}\n"
+        
+    if "cinsiyet" in user_context and user_context["cinsiyet"]:
+        lines += f"KULLANICI CİNSİYETİ: {user_context['cinsiyet']}\n"
+    return lines
+
+
+def build_message_context_block(message_context: dict) -> str:
+    """Bu mesajdan çıkarılan kullanıcı bilgileri (tur bloğu; önbellekli kullanıcı bloğuna girmez)"""
+    lines = _user_fact_lines(message_context or {})
+    if not lines:
+        return ""
+    return "=== BU MESAJDAN ÇIKARILAN KULLANICI BİLGİLERİ ===\n" + lines + "Bu bilgileri cevabında dikkate al.\n"
+
+
+def build_previous_turns_message(rows: list, user_message: str) -> str:
+    """Bağlam gerektiren soru için son turlar + şimdiki soru (tur bloğu)"""
+    # Hafıza açıkken son CHAT_MEMORY_WINDOW mesaj ham girer, daha eskisi özet bloğunda; kapalıyken son 3 mesaj
+    recent = rows[-CHAT_MEMORY_WINDOW:] if MEMORY_ACTIVE else rows[-3:]
+    context_message = "\n\n=== ÖNCEKİ KONUŞMA ===\n"
+    for r in recent:
+        if r['role'] == 'user':
+            context_message += f"KULLANICI: {r['content']}\n"
+        else:
+            context_message += f"ASISTAN: {r['content']}\n"
+    context_message += "\n=== ŞİMDİKİ SORU ===\n"
+    context_message += f"KULLANICI: {user_message}\n"
+    context_message += "\n=== TALİMAT ===\n"
+    context_message += "Yukarıdaki konuşmayı oku ve şimdiki soruyu bağlamda anla! Kimlik sorularına kimlik cevabı ver, supplement sorularına supplement cevabı ver!\n"
+    return context_message
+
+
+def build_user_context_block(user_context: dict, user_plan: str = None) -> str:
+    """Kullanıcı bilgileri bloğu (prompt düzeninde statik önekten sonraki kullanıcı kısmı)"""
+    system_prompt = ""
+    if not user_context or not any(user_context.values()):
+        return system_prompt + "\n\nGenel sağlık ve supplement konularında yardımcı ol. Kullanıcı bilgileri yoksa genel öneriler ver ve listeden mantıklı ürün öner.\n\n🍎 BESLENME ÖNERİSİ KURALLARI:\n- Kullanıcı 'beslenme önerisi ver' derse, SADECE beslenme tavsiyeleri ver!\n- Beslenme önerisi istenince supplement önerme!\n- Sadece doğal besinler, yemek önerileri, beslenme programı ver!\n- Supplement önerisi sadece kullanıcı özel olarak 'supplement öner' derse yap!"
+    
+    system_prompt += "\n\n=== KULLANICI BİLGİLERİ ===\n"
+    
+    # Üyelik bilgisini ekle - ÖNEMLİ: AI'ın kullanıcının üyelik seviyesini bilmesi gerekiyor
+    if user_plan:
+        plan_names = {
+            "free": "LONGO STARTER",
+            "premium": "LONGO ESSENTIAL",
+            "premium_plus": "LONGO ULTIMATE"
+        }
+        plan_name = plan_names.get(user_plan, user_plan.upper())
+        system_prompt += f"KULLANICI ÜYELİK PAKETİ: {plan_name}\n"
+        system_prompt += f"\n🚨 KRİTİK UYARI - ÜYELİK PAKETİ ÖNERİLERİ:\n"
+        system_prompt += f"- Bu kullanıcı şu anda {plan_name} üyeliğine sahip!\n"
+        if user_plan == "premium_plus":
+            system_prompt += f"- Kullanıcı zaten EN ÜST SEVİYE (ULTIMATE) üyeliğe sahip! Ona STARTER veya ESSENTIAL paketi önerme!\n"
+            system_prompt += f"- Kullanıcıya mevcut üyelik paketinin avantajlarını hatırlatabilirsin ama daha düşük seviye paket önerme!\n"
+        elif user_plan == "premium":
+            system_prompt += f"- Kullanıcı ESSENTIAL üyeliğe sahip! Ona STARTER paketi önerme!\n"
+            system_prompt += f"- Kullanıcıya ULTIMATE paketine yükseltme önerebilirsin ama STARTER önerme!\n"
+        elif user_plan == "free":
+            system_prompt += f"- Kullanıcı STARTER (ücretsiz) üyeliğe sahip. Ona ESSENTIAL veya ULTIMATE paketi önerebilirsin.\n"
+        system_prompt += f"- Kullanıcının mevcut üyelik paketini bil ve ona göre konuş!\n"
+    
+    system_prompt += _user_fact_lines(user_context)
+    
+    # Lab verilerini de göster - LAB SUMMARY BİLGİLERİ
+    if "lab_gecmisi" in user_context and user_context["lab_gecmisi"]:
+        system_prompt += f"LAB TEST GEÇMİŞİ (Son 1 Yıl):\n"
+        for i, lab in enumerate(user_context["lab_gecmisi"], 1):
+            system_prompt += f"{i}. {lab.get('ozet', '')}\n"
+    
+    # Lab summary bilgileri (en güncel)
+    if "lab_genel_durum" in user_context and user_context["lab_genel_durum"]:
+        system_prompt += f"\nLAB GENEL DURUM: {user_context['lab_genel_durum']}\n"
+        
+    if "lab_summary" in user_context and user_context["lab_summary"]:
+        system_prompt += f"LAB ÖZET: {user_context['lab_summary']}\n"
+    
+    if "lab_tarih" in user_context and user_context["lab_tarih"]:
+        system_prompt += f"LAB TARİH: {user_context['lab_tarih']}\n"
+    
+    # Kişiselleştirme talimatları - Kullanıcıya tanıdığını hissettir
+    system_prompt += "\n\n🎯 KİŞİSELLEŞTİRME KURALLARI - ÖNEMLİ:\n"
+    
+    # Kullanıcı adı varsa kullan
+    if "isim" in user_context and user_context["isim"]:
+        user_name = user_context["isim"]
+        system_prompt += f"- Kullanıcının adı: {user_name}. Konuşurken ara sıra adını kullan (örn: '{user_name}, senin lab sonuçlarına göre...', '{user_name}, daha önce konuşmuştuk...'). Ama her cümlede kullanma, doğal ol!\n"
+    
+    system_prompt += "- Sen bu kullanıcının KİŞİSEL SAĞLIK ASİSTANI'sın! Onu tanıdığını, verilerini bildiğini hissettir!\n"
+    system_prompt += "- Lab sonuçlarından bahsederken 'senin lab sonuçlarına göre', 'test değerlerine göre', 'geçmiş analizlerine göre' gibi kişisel ifadeler kullan!\n"
+    system_prompt += "- Quiz verilerinden bahsederken 'sağlık profiline göre', 'daha önce doldurduğun quiz'e göre' gibi ifadeler kullan!\n"
+    system_prompt += "- Önceki konuşmalara referans ver: 'Daha önce X konusunda konuşmuştuk', 'Geçen sefer Y'den bahsetmiştik' gibi!\n"
+    system_prompt += "- Kullanıcının yaşını, cinsiyetini, hastalıklarını bildiğini göster: 'Senin yaşına göre', 'Cinsiyetine göre', 'Hastalığın göz önünde bulundurularak' gibi!\n"
+    system_prompt += "- Genel tavsiyeler yerine kişiselleştirilmiş tavsiyeler ver: 'Senin için', 'Sana özel', 'Durumuna göre' gibi ifadeler kullan!\n"
+    system_prompt += "- Kullanıcıya onu tanıdığını hissettir ama abartma! Doğal ve samimi bir ton kullan!\n"
+    system_prompt += "- ÖNEMLİ: Bu bilgileri kesinlikle hatırla! Kullanıcı sana adını, yaşını, hastalığını veya lab sonuçlarını sorduğunda yukarıdaki bilgilerle cevap ver!\n"
+    
+    return system_prompt
+
+
+# ---------- FREE USER SESSION-BASED CHAT ----------
+
+# Global free user conversation memory (basit dict)
+free_user_conversations = {}
+
+
+# IP-based limiting for guest users (no account)
+ip_daily_limits = {}  # {ip: {"count": int, "reset_time": timestamp}}
+
+
+def check_ip_daily_limit(client_ip: str) -> tuple[bool, int]:
+    """Guest kullanıcılar için IP-based günlük limit kontrolü"""
+    import time
+    current_time = time.time()
+    
+    # 24 saat = 86400 saniye
+    daily_reset_seconds = 86400
+    
+    # Eski IP'leri temizle (48 saatten eski)
+    expired_ips = []
+    for ip, data in ip_daily_limits.items():
+        if current_time - data.get("reset_time", 0) > daily_reset_seconds * 2:  # 48 saat
+            expired_ips.append(ip)
+    
+    for ip in expired_ips:
+        del ip_daily_limits[ip]
+    
+    if client_ip not in ip_daily_limits:
+        # İlk kez gelen IP
+        ip_daily_limits[client_ip] = {
+            "count": 0,
+            "reset_time": current_time + daily_reset_seconds
+        }
+    
+    ip_data = ip_daily_limits[client_ip]
+    
+    # 24 saat geçmişse reset et
+    if current_time >= ip_data["reset_time"]:
+        ip_data["count"] = 0
+        ip_data["reset_time"] = current_time + daily_reset_seconds
+    
+    # Limit kontrolü
+    if ip_data["count"] >= FREE_QUESTION_LIMIT:
+        return False, 0  # Limit aşıldı
+    
+    # Limit artır
+    ip_data["count"] += 1
+    remaining = FREE_QUESTION_LIMIT - ip_data["count"]
+    
+    return True, remaining
+
+
+def check_user_daily_limit(user_id: str, client_ip: str) -> tuple[bool, int]:
+    """Free kullanıcılar için User ID + IP kombinasyonu ile günlük limit kontrolü"""
+    import time
+    current_time = time.time()
+    
+    # User ID + IP kombinasyonu için unique key
+    user_ip_key = f"{user_id}_{client_ip}"
+    
+    # 24 saat = 86400 saniye
+    daily_reset_seconds = 86400
+    
+    # Eski User+IP kombinasyonlarını temizle (48 saatten eski)
+    expired_keys = []
+    for key, data in ip_daily_limits.items():
+        if current_time - data.get("reset_time", 0) > daily_reset_seconds * 2:  # 48 saat
+            expired_keys.append(key)
+    
+    for key in expired_keys:
+        del ip_daily_limits[key]
+    
+    if user_ip_key not in ip_daily_limits:
+        # İlk kez gelen User ID + IP kombinasyonu
+        ip_daily_limits[user_ip_key] = {
+            "count": 0,
+            "reset_time": current_time + daily_reset_seconds
+        }
+    
+    user_ip_data = ip_daily_limits[user_ip_key]
+    
+    # 24 saat geçmişse reset et
+    if current_time >= user_ip_data["reset_time"]:
+        user_ip_data["count"] = 0
+        user_ip_data["reset_time"] = current_time + daily_reset_seconds
+    
+    # Limit kontrolü
+    if user_ip_data["count"] >= FREE_QUESTION_LIMIT:
+        return False, 0  # Limit aşıldı
+    
+    # Limit artır
+    user_ip_data["count"] += 1
+    remaining = FREE_QUESTION_LIMIT - user_ip_data["count"]
+    
+    return True, remaining
+
+
+async def handle_free_user_chat(req: ChatMessageRequest, x_user_id: str):
+    """Free kullanıcılar için session-based chat handler"""
+    from backend.cache_utils import get_session_question_count, increment_session_question_count
+    
+    # Session-based question count kontrolü
+    question_count = get_session_question_count(x_user_id)
+    
+    # Free kullanıcı soru limiti kontrolü
+    if question_count >= FREE_QUESTION_LIMIT:
+        return ChatResponse(
+            conversation_id=0,
+            reply="LIMIT_POPUP:🎯 Günlük 10 soru limitiniz doldu! Yarın tekrar konuşmaya devam edebilirsiniz. 💡 Premium plana geçerek sınırsız soru sorma imkanına sahip olun!",
+            latency_ms=0
+        )
+    
+    # Soru sayısını artır
+    increment_session_question_count(x_user_id)
+    
+    # Free user conversation memory'yi başlat (timestamp ile)
+    if x_user_id not in free_user_conversations:
+        free_user_conversations[x_user_id] = {
+            "messages": [],
+            "last_activity": time.time()
+        }
+    
+    # Eski session'ları temizle (2 saatten eski)
+    current_time = time.time()
+    expired_users = []
+    for user_id, data in free_user_conversations.items():
+        if current_time - data["last_activity"] > FREE_SESSION_TIMEOUT_SECONDS:
+            expired_users.append(user_id)
+    
+    for user_id in expired_users:
+        del free_user_conversations[user_id]
+        logger.debug(f"Eski session temizlendi: {user_id}")
+    
+    # Son aktivite zamanını güncelle
+    free_user_conversations[x_user_id]["last_activity"] = current_time
+    
+    # Health Guard ile kategori kontrolü - SIKI KONTROL
+    message_text = req.text or req.message
+    if not message_text:
+        raise HTTPException(400, "Mesaj metni gerekli")
+    
+    ok, msg = guard_or_message(message_text)
+    if not ok:
+        # User mesajını memory'ye ekle
+        free_user_conversations[x_user_id]["messages"].append({"role": "user", "content": message_text})
+        # AI yanıtını memory'ye ekle
+        free_user_conversations[x_user_id]["messages"].append({"role": "assistant", "content": msg})
+        # Log to ai_messages
+        try:
+            log_ai_message(
+                external_user_id=x_user_id,
+                message_type="chat",
+                request_payload={"message": message_text, "conversation_id": 1},
+                response_payload={"reply": msg, "conversation_id": 1},
+                model_used="health_guard"
+            )
+        except Exception as e:
+            logger.warning(f"Chat ai_messages kaydı hatası: {e}")
+        
+        return ChatResponse(conversation_id=1, reply=msg, latency_ms=0)
+    
+    # Ekstra kontrol: Sağlık/supplement dışı konuları reddet
+    txt = message_text.lower().strip()
+    off_topic_keywords = [
+        "hava durumu", "spor", "futbol", "film", "müzik", "oyun", "teknoloji",
+        "siyaset", "ekonomi", "haber", "eğlence", "seyahat", "alışveriş"
+    ]
+    
+    if any(keyword in txt for keyword in off_topic_keywords):
+        reply = "Üzgünüm, sağlık, supplement ve laboratuvar konularında yardımcı olabilirim. Size sağlık konusunda nasıl yardımcı olabilirim?"
+        # User mesajını memory'ye ekle
+        free_user_conversations[x_user_id]["messages"].append({"role": "user", "content": message_text})
+        # AI yanıtını memory'ye ekle
+        free_user_conversations[x_user_id]["messages"].append({"role": "assistant", "content": reply})
+        return ChatResponse(conversation_id=1, reply=reply, latency_ms=0)
+    
+    # Selamlama kontrolü
+    txt = message_text.lower().strip()
+    pure_greeting_keywords = [
+        "selam", "naber", "günaydın", "gunaydin",
+        "iyi akşamlar", "iyi aksamlar", "iyi geceler", "iyi günler", "iyi gunler"
+    ]
+    
+    if any(kw == txt for kw in pure_greeting_keywords):
+        reply = "Merhaba! Sağlık, supplement ve laboratuvar konularında yardımcı olabilirim. Size nasıl yardımcı olabilirim?"
+        # User mesajını memory'ye ekle
+        free_user_conversations[x_user_id]["messages"].append({"role": "user", "content": message_text})
+        # AI yanıtını memory'ye ekle
+        free_user_conversations[x_user_id]["messages"].append({"role": "assistant", "content": reply})
+        return ChatResponse(conversation_id=1, reply=reply, latency_ms=0)
+    
+    # AI yanıtı için OpenRouter kullan
+    try:
+        from backend.openrouter_client import get_ai_response
+        
+        # Dil algılama
+        detected_language = detect_language_simple(message_text)
+        logger.debug("Free chat - Detected language: %s for message: %s", detected_language, log_payload(message_text))
+        
+        # Free kullanıcılar için güzel prompt
+        if detected_language == "en":
+            system_prompt = """You are Longopass's health assistant - helping with health and supplement topics.
+
+🎯 YOUR TASK: Only respond to health, supplement, nutrition and laboratory topics.
+
+🎁 MEMBERSHIP PACKAGES - ONLY 3 PACKAGES EXIST:
+
+**1. LONGO STARTER** (Entry Level - FREE)
+- Online Quiz + AI-Powered Initial Report
+- Health Newsletter & Educational Videos
+- Health Awareness Development
+- Free to Use
+
+**2. LONGO ESSENTIAL** (General Health and Tracking Package - POPULAR)
+- Home and Office Testing Option
+- Annual Comprehensive Test Panel with Advanced Health Analysis
+- Follow-up Tests Every 4 Months for Critical Values
+- Full Access to Advanced Personal Health Dashboard
+- Personalized Product and Test Recommendations
+- Full Access to AI-Powered Health Modules
+- 2.5% Discount on All Longopass Products
+
+**3. LONGO ULTIMATE** (Advanced Health, Tracking and Longevity Package - BEST OFFER)
+- All Longo Essential Package Features
+- Follow-up Tests Every 3 Months for Critical Values
+- One Free Metabolic Age Test Panel Per Year
+- Online Doctor Consultation Option
+- VIP Membership Support
+- Nutrition Recommendations and Support
+- Sports & Exercise Support
+- AI-Powered Longevity Report and Product Recommendations Based on Test Results
+- 5% Discount on All Longopass Products
+
+⚠️ CRITICAL WARNING - MEMBERSHIP PACKAGES:
+- MEMBERSHIP PACKAGE ≠ SUPPLEMENT PRODUCTS! They are different things!
+- ONLY 3 MEMBERSHIP PACKAGES exist: LONGO STARTER, LONGO ESSENTIAL, LONGO ULTIMATE
+- There are NO membership packages like "Balance Pack", "Longevity Pack", "Neuro Pack"! (These might be supplement products but NOT membership packages!)
+- When users ask about "membership package", "membership", "plan", "which membership", "membership recommendation" ONLY explain the 3 membership packages
+- Supplement products are separate, DON'T CONFUSE them with membership packages!
+- Don't use your own knowledge! Only use the information written above!
+- If you don't know, say "I cannot provide that information right now", don't make it up!
+- 🚨🚨🚨 VERY IMPORTANT: When user mentions "membership", "which membership", "membership recommendation", "membership package" you MUST talk about the 3 membership packages above (STARTER, ESSENTIAL, ULTIMATE)! NEVER mention regular delivery, supplement products, "Daily Supplements membership", "Longevity Membership"! These are supplement products, NOT membership packages!
+
+🚫 RESTRICTIONS: 
+- Don't talk about topics outside of health
+- Politely redirect off-topic questions to health area
+- Don't talk about the list (user shouldn't see the list)
+
+📚 ACADEMIC SOURCES:
+- ONLY provide sources if user asks for scientific/research evidence (e.g., "show me studies", "what does research say?", "are there scientific papers?", "what's the latest research?")
+- DON'T provide sources for general health advice, supplement recommendations, or conversational responses
+- When providing sources, use clickable markdown format: [Study Title](https://pubmed.ncbi.nlm.nih.gov/...)
+- ONLY provide scientific/academic sources from: PubMed, Nature, Science, The Lancet, NEJM, JAMA, Springer, Cambridge University Press, Oxford University Press
+- NEVER provide sources from: commercial websites, news sites, blogs, social media, or non-academic sources
+- Don't add sources unless explicitly requested
+
+✨ HEALTH FOCUS: Pull every topic to health area. If user talks about something else, politely redirect to health topic.
+
+💡 RESPONSE STYLE: Be short, clear and understandable. Focus only on health topics!
+
+🎯 PRODUCT RECOMMENDATION: ONLY recommend when user explicitly asks "recommend supplements", "what should I take", "which products should I buy" or has a complaint. Don't recommend in other cases! Don't talk about the list! Maintain conversation flow, don't constantly ask "what do you want me to recommend?"
+
+🚫 STRICT RULES:
+- ONLY recommend supplements when user explicitly asks or has a complaint
+- Don't recommend supplements without being asked
+- ONLY recommend products from the list below
+- Don't recommend any products outside the list
+- NEVER make up product names like "Ashwagandha Calm", "L-Theanine & Magnesium Balance", "Omega-3 Neuro Support", "Saffron Mood Boost"!
+- If a product is not in the provided list, DON'T recommend it!
+- Don't talk about anything other than health and supplements
+- Strictly reject off-topic questions
+- Don't talk about the list (user shouldn't see the list)
+
+🏷️ BRAND INFO: All supplements and health products are LONGOPASS brand. When asked about brands, say "Longopass branded products". No other brands!
+
+🌍 LANGUAGE: The user is writing in English. You MUST respond in English only! Do not use Turkish at all!"""
+        else:
+            system_prompt = """Adın Longo - sağlık ve supplement konularında yardımcı olan bir asistan. 
+
+🎯 GÖREVİN: Sadece sağlık, supplement, beslenme ve laboratuvar konularında yanıt ver.
+
+🏷️ MARKA BİLGİSİ: Tüm supplement ve sağlık ürünleri LONGOPASS markasıdır. Marka sorulduğunda "Longopass markalı ürünler" de. Başka marka yok!
+
+🎁 ÜYELİK PAKETLERİ - SADECE 3 PAKET VAR:
+
+**1. LONGO STARTER** (Giriş Seviyesi - ÜCRETSİZ)
+- Online Quiz + AI Destekli İlk Rapor
+- Sağlık Bülteni & Eğitim Videoları
+- Sağlık Bilincini Geliştirme
+- Ücretsiz Kullanım
+
+**2. LONGO ESSENTIAL** (Genel Sağlık ve Takip Paketi - POPÜLER)
+- Ev ve İşyerinde Test İmkanı
+- Yıllık Tam Kapsamlı Test Paneli ile İleri Düzey Sağlık Analizi
+- Kritik Değerleriniz için 4 Ayda Bir Takip Testleri
+- Gelişmiş Kişisel Sağlık Paneli ile Sonuçlarınıza Tam Erişim
+- Size Özel Kişiselleştirilmiş Ürün ve Test Önerileri
+- AI Destekli Sağlık Modüllerine Tam Erişim
+- Tüm Longopass Ürünlerinde %2,5 İndirim Oranı
+
+**3. LONGO ULTIMATE** (İleri Sağlık, Takip ve Longevity Paketi - EN İYİ TEKLİF)
+- Longo Essential Paketi'nin Tüm İçerikleri
+- Kritik Değerleriniz için 3 Ayda Bir Takip Testleri
+- Yılda Bir Defa Ücretsiz Metabolik Yaş Testi Paneli
+- Doktor Online Görüşme İmkanı
+- VIP Üyelik Desteği
+- Beslenme Önerileri Ve Destekleri
+- Spor & Egzersiz Destekleri
+- Test Sonucunuza Bağlı AI Destekli Longevity Raporu ve Ürün Önerileri
+- Tüm Longopass Ürünlerinde %5 İndirim Oranı
+
+⚠️ KRİTİK UYARI - ÜYELİK PAKETLERİ:
+- ÜYELİK PAKETİ ≠ SUPPLEMENT ÜRÜNLERİ! Bunlar farklı şeyler!
+- SADECE 3 ÜYELİK PAKETI var: LONGO STARTER, LONGO ESSENTIAL, LONGO ULTIMATE
+- "Denge Paketi", "Longevity Paketi", "Nöro Paketi" diye ÜYELİK paketi YOK! (Bunlar supplement ürünleri olabilir ama üyelik paketi değil!)
+- Kullanıcı "üyelik paketi", "membership", "plan", "üyelik", "hangi üyelik", "üyelik önerisi" sorarsa SADECE 3 üyelik paketini anlat
+- Supplement ürünleri ayrı bir şey, üyelik paketleriyle KARIŞTIRMA!
+- Kendi bilgini kullanma! Sadece yukarıda yazan bilgileri kullan!
+- Bilmediğin şey sorulursa "Bu bilgiyi şu anda veremiyorum" de, uydurma!
+- 🚨🚨🚨 ÇOK ÖNEMLİ: Kullanıcı "üyelik" kelimesini kullandığında, "hangi üyelik", "üyelik önerisi", "üyelik paketi" dediğinde MUTLAKA yukarıdaki 3 üyelik paketinden (STARTER, ESSENTIAL, ULTIMATE) bahset! Düzenli teslimat, supplement ürünleri, "Günlük Takviyeler üyeliği", "Longevity Üyeliği" gibi şeylerden ASLA bahsetme! Bunlar supplement ürünleri, üyelik paketi değil!
+
+🚫 KISITLAMALAR: 
+- Sağlık dışında konulardan bahsetme
+- Off-topic soruları kibarca sağlık alanına yönlendir
+- Liste hakkında konuşma (kullanıcı listeyi görmemeli)
+
+📚 AKADEMİK KAYNAKLAR:
+- SADECE kullanıcı bilimsel/araştırma kanıtı isterse kaynak ver (örn: "çalışma göster", "araştırma ne diyor?", "bilimsel makale var mı?", "güncel araştırmalar neler?")
+- Genel sağlık tavsiyesi, supplement önerisi veya sohbet yanıtlarında kaynak verme
+- Kaynak verirken tıklanabilir markdown formatı kullan: [Çalışma Başlığı](https://pubmed.ncbi.nlm.nih.gov/...)
+- Sadece PubMed, hakemli dergiler veya güvenilir tıbbi veritabanlarından bilimsel kaynaklar ver
+- Açıkça istenmediği sürece kaynak ekleme
+
+✨ SAĞLIK ODAĞI: Her konuyu sağlık alanına çek. Kullanıcı başka bir şeyden bahsederse, nazikçe sağlık konusuna yönlendir.
+
+💡 YANIT STİLİ: Kısa, net ve anlaşılır ol. Sadece sağlık konusuna odaklan!
+
+🎯 ÜRÜN ÖNERİSİ: SADECE kullanıcı açıkça "supplement öner", "ne alayım", "hangi ürünleri alayım" gibi öneri isterse ya da bir şikayeti varsa öner. Diğer durumlarda öneri yapma! Liste hakkında konuşma! Konuşmanın devamlılığını sağla, sürekli "ne önermemi istersin?" sorma!
+
+🚫 KESIN KURALLAR:
+- SADECE kullanıcı açıkça öneri isterse ya da bir şikayeti varsa supplement öner
+- Kullanıcı sormadan supplement önerisi yapma
+- SADECE aşağıdaki listedeki ürünleri öner
+- Liste dışından hiçbir ürün önerme
+- Sağlık ve supplement dışında hiçbir konuşma yapma
+- Off-topic soruları kesinlikle reddet
+- Web sitelerinden link verme
+- Liste hakkında konuşma (kullanıcı listeyi görmemeli)
+- Liste hakkında konuşma! Kullanıcı listeyi vermiyor, ona söyleme! "Senin listende", "listende var" gibi ifadeler kullanma
+- "Senin verdiğin liste" gibi ifadeler kullanma
+- Sürekli "ne önermemi istersin?" sorma, konuşmanın devamlılığını sağla
+- Sadece ürün isimlerini öner, açıklama yapma"""
+        
+        # XML'den ürünleri çek
+        xml_products = get_xml_products()
+        
+        # Conversation history'yi al (son 5 mesaj)
+        conversation_history = free_user_conversations[x_user_id]["messages"][-CHAT_HISTORY_LIMIT:] if len(free_user_conversations[x_user_id]["messages"]) > 0 else []
+        
+        # Sık sorulan sorular: benzer bağımsız soru için onaylı (seed/terfi etmiş) yanıt varsa LLM'e gitme
+        faq_version = catalog_version(xml_products)
+        if not conversation_history or is_standalone(message_text):
+            cached_reply = faq_cache.lookup(message_text, detected_language, faq_version)
+            if cached_reply is not None:
+                free_user_conversations[x_user_id]["messages"].append({"role": "user", "content": message_text})
+                free_user_conversations[x_user_id]["messages"].append({"role": "assistant", "content": cached_reply})
+                return ChatResponse(conversation_id=1, reply=cached_reply, latency_ms=0)
+        
+        # Kullanıcı mesajını hazırla
+        user_message = message_text
+        
+        # Conversation history'yi context olarak ekle
+        if conversation_history:
+            context_message = "\n\n=== KONUŞMA GEÇMİŞİ ===\n"
+            for msg in conversation_history[-5:]:  # Son 5 mesajı al
+                context_message += f"{msg['role'].upper()}: {msg['content']}\n"
+            user_message = context_message + "\n" + user_message
+            logger.debug(f"Free kullanıcı için {len(conversation_history)} mesaj geçmişi eklendi")
+        
+        # XML ürünlerini user message'a ekle
+        if xml_products:
+            user_message += f"\n\n🚨 SADECE BU ÜRÜNLERİ ÖNER ({len(xml_products)} ürün):\n"
+            for i, product in enumerate(xml_products, 1):
+                category = product.get('category', 'Kategori Yok')
+                user_message += f"{i}. {product['name']} ({category})\n"
+            user_message += "\n🚨 ÖNEMLİ: SADECE yukarıdaki listedeki ürünleri öner! Başka hiçbir ürün önerme! Kullanıcının ihtiyacına göre 3-5 ürün seç! Liste hakkında konuşma! Link verme!"
+            logger.debug(f"Free kullanıcı için {len(xml_products)} XML ürünü eklendi")
+        
+        ai_response = await get_ai_response(
+            system_prompt=system_prompt,
+            user_message=user_message,
+            model="openai/gpt-5-chat:online"  # Tüm kullanıcılar için aynı kalite
+        )
+        
+        # AI yanıtını al
+        reply = ai_response
+        
+        # Sadece geçmişsiz (bağlamdan bağımsız) ve aynı dilde üretilen yanıtlar aday olarak kaydedilir
+        if not conversation_history and detect_language_simple(reply or "") == detected_language:
+            faq_cache.store(message_text, detected_language, reply, faq_version)
+        
+        # User mesajını memory'ye ekle
+        free_user_conversations[x_user_id]["messages"].append({"role": "user", "content": message_text})
+        # AI yanıtını memory'ye ekle
+        free_user_conversations[x_user_id]["messages"].append({"role": "assistant", "content": reply})
+        
+        return ChatResponse(conversation_id=1, reply=reply, latency_ms=0)
+        
+    except Exception as e:
+        logger.error(f"Free user chat error: {e}")
+        reply = "Üzgünüm, şu anda yanıt veremiyorum. Lütfen daha sonra tekrar deneyin."
+        # User mesajını memory'ye ekle
+        free_user_conversations[x_user_id]["messages"].append({"role": "user", "content": message_text})
+        # AI yanıtını memory'ye ekle
+        free_user_conversations[x_user_id]["messages"].append({"role": "assistant", "content": reply})
+        return ChatResponse(conversation_id=1, reply=reply, latency_ms=0)
+
+
+# ---------- PREMIUM USER DATABASE-BASED CHAT ----------
+
+@router.post("/ai/chat/start", response_model=ChatStartResponse)
+def chat_start(body: ChatStartRequest = Body(default={}),
+               db: Session = Depends(get_db),
+               x_user_id: str | None = Header(default=None),
+               x_user_level: int | None = Header(default=None)):
+    
+    # Plan kontrolü
+    user_plan = get_user_plan_from_headers(x_user_level)
+    is_premium = user_plan in ["premium", "premium_plus"]
+    
+    # User ID validasyonu (Free: Session ID, Premium: Real ID)
+    if not validate_chat_user_id(x_user_id or "", user_plan):
+        raise HTTPException(status_code=400, detail="Premium kullanıcılar için gerçek user ID gerekli")
+    
+    # Free kullanıcılar için session-based conversation
+    if not is_premium:
+        # Free kullanıcılar için basit conversation ID (session-based)
+        from backend.cache_utils import get_session_question_count
+        question_count = get_session_question_count(x_user_id or "anonymous")
+        
+        # Free kullanıcı soru limiti kontrolü
+        if question_count >= FREE_QUESTION_LIMIT:
+            return ChatStartResponse(
+                conversation_id=0,
+                detail="🎯 Günlük 10 soru limitiniz doldu! Yarın tekrar konuşmaya devam edebilirsiniz. 💡 Premium plana geçerek sınırsız soru sorma imkanına sahip olun!"
+            )
+        
+        # Free kullanıcılar için session-based conversation ID
+        return ChatStartResponse(conversation_id=1)  # Her zaman 1, session'da takip edilir
+    
+    # Premium kullanıcılar için yeni conversation ID oluştur
+    # User tablosu kullanılmıyor - sadece ai_messages ile çalışıyor
+    
+    # Yeni conversation ID oluştur (timestamp-based)
+    new_conversation_id = int(time.time() * MILLISECOND_MULTIPLIER)  # Millisecond timestamp
+    
+    return ChatStartResponse(conversation_id=new_conversation_id)
+
+
+@router.get("/ai/chat/conversations")
+def get_conversations(db: Session = Depends(get_db),
+                     x_user_id: str | None = Header(default=None),
+                     x_user_level: int | None = Header(default=None)):
+    """Kullanıcının tüm conversation'larını listele"""
+    
+    # Plan kontrolü
+    user_plan = get_user_plan_from_headers(x_user_level)
+    is_premium = user_plan in ["premium", "premium_plus"]
+    
+    # User ID validasyonu
+    if not validate_chat_user_id(x_user_id or "", user_plan):
+        raise HTTPException(status_code=400, detail="Premium kullanıcılar için gerçek user ID gerekli")
+    
+    # Free kullanıcılar için boş liste
+    if not is_premium:
+        return []
+    
+    # Premium kullanıcılar için conversation'ları al (daha fazla mesaj al ki tüm conversation'ları görelim)
+    chat_messages = get_user_ai_messages_by_type(db, x_user_id, "chat", limit=500)
+    
+    # Conversation ID'lere göre grupla
+    conversations_dict = {}
+    for msg in chat_messages:
+        if msg.request_payload and "conversation_id" in msg.request_payload:
+            conv_id = msg.request_payload["conversation_id"]
+            
+            if conv_id not in conversations_dict:
+                # İlk mesajı title olarak kullan
+                first_message = msg.request_payload.get("message", "") or msg.request_payload.get("text", "")
+                # Özel karakterleri ve HTML tag'lerini temizle
+                import re
+                title = re.sub(r'===.*?===', '', first_message)
+                title = re.sub(r'<[^>]*>', '', title)
+                title = title.strip()
+                title = title[:50] + "..." if len(title) > 50 else title or "Yeni Sohbet"
+                
+                conversations_dict[conv_id] = {
+                    "conversation_id": conv_id,
+                    "title": title,
+                    "created_at": msg.created_at.isoformat(),
+                    "updated_at": msg.created_at.isoformat()
+                }
+            else:
+                # En son mesaj tarihini güncelle
+                current_updated = conversations_dict[conv_id]["updated_at"]
+                if msg.created_at.isoformat() > current_updated:
+                    conversations_dict[conv_id]["updated_at"] = msg.created_at.isoformat()
+    
+    # Tarihe göre sırala (en yeni önce)
+    conversations = list(conversations_dict.values())
+    conversations.sort(key=lambda x: x["updated_at"], reverse=True)
+    
+    # Sadece son 10 conversation'ı döndür
+    return conversations[:10]
+
+
+@router.get("/ai/chat/{conversation_id}/history")
+def chat_history(conversation_id: int,
+                 db: Session = Depends(get_db),
+                 x_user_id: str | None = Header(default=None),
+                 x_user_level: int | None = Header(default=None)):
+    
+    # Plan kontrolü
+    user_plan = get_user_plan_from_headers(x_user_level)
+    is_premium = user_plan in ["premium", "premium_plus"]
+    
+    # User ID validasyonu (Free: Session ID, Premium: Real ID)
+    if not validate_chat_user_id(x_user_id or "", user_plan):
+        raise HTTPException(status_code=400, detail="Premium kullanıcılar için gerçek user ID gerekli")
+    
+    # Free kullanıcılar için session-based history (boş)
+    if not is_premium:
+        return []  # Free kullanıcılar için geçmiş yok
+    
+    # Premium kullanıcılar için database-based history
+    # User tablosu kullanılmıyor - sadece ai_messages ile çalışıyor
+    
+    # Sadece bu conversation'a ait chat mesajlarını al
+    chat_messages = get_user_ai_messages_by_type(db, x_user_id, "chat", limit=CHAT_HISTORY_MAX)
+    
+    # ai_messages formatını chat history formatına çevir
+    history = []
+    for msg in chat_messages:
+        # User message - conversation_id kontrolü
+        if msg.request_payload and "message" in msg.request_payload:
+            msg_conv_id = msg.request_payload.get("conversation_id") or msg.request_payload.get("conv_id")
+            if msg_conv_id == conversation_id:
+                history.append({
+                    "role": "user", 
+                    "content": msg.request_payload["message"] or msg.request_payload.get("text", ""), 
+                    "ts": msg.created_at.isoformat()
+                })
+        
+        # Assistant message - aynı conversation_id'ye ait olmalı (request'ten al)
+        if msg.response_payload and "reply" in msg.response_payload:
+            # Request payload'dan conversation_id kontrolü
+            msg_conv_id = None
+            if msg.request_payload:
+                msg_conv_id = msg.request_payload.get("conversation_id") or msg.request_payload.get("conv_id")
+            
+            if msg_conv_id == conversation_id:
+                history.append({
+                    "role": "assistant", 
+                    "content": msg.response_payload["reply"], 
+                    "ts": msg.created_at.isoformat()
+                })
+    
+    # Tarihe göre sırala (en eski önce)
+    history.sort(key=lambda x: x["ts"])
+    
+    return history
+
+
+@router.post("/ai/chat", response_model=ChatResponse)
+async def chat_message(req: ChatMessageRequest,
+                  current_user: str = Depends(get_current_user),
+                  db: AsyncSession = Depends(get_async_db),
+                  x_user_id: str | None = Header(default=None),
+                  x_user_level: int | None = Header(default=None),
+                  request: Request = None):
+    
+    # Plan kontrolü
+    user_plan = get_user_plan_from_headers(x_user_level)
+    
+    # DEBUG: User level ve plan kontrolü
+    logger.debug("chat: x_user_level=%s, user_plan=%s", x_user_level, user_plan)
+    
+    is_premium = user_plan in ["premium", "premium_plus"]
+    logger.debug("chat: is_premium=%s", is_premium)
+    
+    # Guest ve Free kullanıcılar için limiting
+    client_ip = request.client.host if request else "unknown"
+    
+    if not x_user_level:  # Guest (null/undefined) - HİÇ KONUŞAMASIN
+        # Guest kullanıcılar hiç konuşamaz, her zaman kayıt olma pop-up'ı göster
+        return ChatResponse(
+            conversation_id=req.conversation_id or 1,
+            reply="LIMIT_POPUP:🎯 Chatbot'u kullanabilmek için ücretsiz kayıt olun! Premium özelliklere erişmek ve sınırsız soru sormak için üyelik paketlerimize göz atın.",
+            latency_ms=0
+        )
+    elif x_user_level == 1:  # Free (hesap var) - Günde 10 mesaj
+        can_chat, remaining = check_user_daily_limit(x_user_id, client_ip)
+        if not can_chat:
+            # Limit doldu pop-up'ı
+            return ChatResponse(
+                conversation_id=req.conversation_id or 1,
+                reply="LIMIT_POPUP:🎯 Günlük 10 soru limitiniz doldu! Yarın tekrar konuşmaya devam edebilirsiniz. Longo Essential veya Longo Ultimate planlarından birine geçerek sınırsız soru sorma imkanına sahip olun!",
+                latency_ms=0
+            )
+    
+    # User ID validasyonu (Free: Session ID, Premium: Real ID)
+    if not validate_chat_user_id(x_user_id or "", user_plan):
+        raise HTTPException(status_code=400, detail="Premium kullanıcılar için gerçek user ID gerekli")
+    
+    # Free kullanıcılar için session-based chat
+    if not is_premium:
+        return await handle_free_user_chat(req, x_user_id)
+    
+    # Premium kullanıcılar için database-based chat
+    # User tablosu kullanılmıyor - sadece ai_messages ile çalışıyor
+
+    # FLEXIBLE INPUT HANDLING - Asıl site'dan herhangi bir format gelebilir
+    conversation_id = req.conversation_id or req.conv_id
+    if not conversation_id:
+        raise HTTPException(400, "Conversation ID gerekli")
+    
+    # Conversation ID artık sadece referans için kullanılıyor
+
+    
+    # FLEXIBLE INPUT HANDLING - Asıl site'dan herhangi bir format gelebilir
+    message_text = req.text or req.message
+    if not message_text:
+        raise HTTPException(400, "Mesaj metni gerekli")
+    
+    # Health Guard ile kategori kontrolü
+    ok, msg = guard_or_message(message_text)
+    if not ok:
+        # Fixed message - sadece ai_messages'a kaydedilecek
+        reply = msg
+        return ChatResponse(conversation_id=conversation_id, reply=reply, latency_ms=0)
+    
+    # XML'den supplement listesini ekle - Premium chat'te de ürün önerileri için
+    # XML'den ürünleri çek (free chat'teki gibi)
+    xml_products = get_xml_products()
+    supplements_list = xml_products
+    
+    # Selamlama sonrası özel yanıt kontrolü
+    txt = message_text.lower().strip()
+    pure_greeting_keywords = [
+        "selam", "naber", "günaydın", "merhaba",
+        "iyi akşamlar", "iyi aksamlar", "iyi geceler", "iyi günler", "iyi gunler"
+    ]
+    
+    # Eğer saf selamlama ise özel yanıt ver
+    if any(kw == txt for kw in pure_greeting_keywords):
+        reply = "Merhaba! Sağlık, supplement ve laboratuvar konularında yardımcı olabilirim. Size nasıl yardımcı olabilirim?"
+        return ChatResponse(conversation_id=conversation_id, reply=reply, latency_ms=0)
+
+    # context_build stage: geçmiş/lab okuma + prompt hazırlama (LLM çağrısına kadar)
+    context_start = time.perf_counter()
+
+    # Chat history'yi ai_messages'tan al (Message tablosu yerine)
+    # TÜM chat mesajlarını al - conversation_id'ye bakmadan (premium özellik: her şeyi hatırlar)
+    # Konuşma hafızası açıkken özete henüz girmemiş turlar ham gelir, daha eskiler özetten (backend/chat_memory.py)
+    if MEMORY_ACTIVE:
+        conversation_summary, covered_until_id = await load_memory(db, x_user_id)
+        chat_messages = await async_get_recent_chat_messages_after(db, x_user_id, covered_until_id, CHAT_HISTORY_LIMIT)
+    else:
+        conversation_summary = None
+        chat_messages = await async_get_user_ai_messages_by_type(db, x_user_id, "chat", limit=CHAT_HISTORY_LIMIT)
+    
+    # ai_messages formatını history formatına çevir - conversation_id'ye bakmadan
+    rows = []
+    for msg in chat_messages:
+        # User message
+        if msg.request_payload and "message" in msg.request_payload:
+            rows.append({"role": "user", "content": msg.request_payload["message"], "created_at": msg.created_at})
+        # Assistant message
+        if msg.response_payload and "reply" in msg.response_payload:
+            rows.append({"role": "assistant", "content": msg.response_payload["reply"], "created_at": msg.created_at})
+    
+    # Conversation history'yi tarih sırasına göre sırala
+    rows.sort(key=lambda x: x["created_at"])
+    
+    # Get user's previous analyses for context (CACHE THIS!)
+    user_analyses = await async_get_user_ai_messages(db, x_user_id, limit=USER_ANALYSES_LIMIT)
+    
+    # Global + Local Context Sistemi - OPTIMIZED
+    user_context = {}
+    
+    
+    # Lab verilerini helper fonksiyon ile al
+    lab_tests = await async_get_standardized_lab_data(db, x_user_id, 20)
+    
+    # Lab ve quiz verilerini user message için hazırla
+    lab_info, quiz_info = get_user_context_for_message(user_context, user_analyses)
+    
+    # Helper'dan gelen lab verilerini de ekle
+    if lab_tests:
+        lab_info = f"🚨 LAB SONUÇLARI (KULLANICI VERİSİ - GERÇEK TEST DEĞERLERİ):\n"
+        for test in lab_tests[:50]:  # İlk 50 test - tüm testleri göster
+            test_name = test.get('name', 'N/A')
+            test_value = test.get('value', 'N/A')
+            test_unit = test.get('unit', '')
+            ref_range = test.get('reference_range', 'N/A')
+            # Unit varsa value'ya ekle
+            if test_unit and test_value != 'N/A':
+                value_str = f"{test_value} {test_unit}"
+            else:
+                value_str = str(test_value)
+            lab_info += f"- {test_name}: {value_str} (Referans Aralık: {ref_range})\n"
+        lab_info += "\n⚠️ ÖNEMLİ: Yukarıdaki lab sonuçları kullanıcının GERÇEK test değerleridir. Kullanıcı bir test hakkında sorduğunda MUTLAKA bu değerlere bak ve ona göre cevap ver!\n\n"
+    
+    # Lab ve quiz bilgileri kullanıcı bloğunda gider (prompt önekinin kullanıcıya özel kısmı); tur mesajı sadece soru
+    user_message = message_text
+    
+    # Dil algılama ve system prompt hazırlama
+    detected_language = detect_language_simple(message_text)
+    logger.debug("Detected language: %s for message: %s", detected_language, log_payload(message_text))
+    system_prompt = build_chat_system_prompt()
+    
+    # Eğer İngilizce algılandıysa, system prompt'u tamamen İngilizce yap
+    if detected_language == "en":
+        system_prompt = build_chat_system_prompt_en()
+        logger.debug("Added English language instruction to system prompt")
+    
+    # 1.5. READ-THROUGH: Lab verisi global context'te yoksa DB'den çek
+    # LAB VERİLERİ PROMPT'TAN TAMAMEN ÇIKARILDI - TOKEN TASARRUFU İÇİN
+    # Lab verileri hala context'te tutuluyor ama prompt'a eklenmiyor
+    
+    # 2. Son mesajlardan yeni context bilgilerini çıkar (ONLY IF NEEDED)
+    # ÖNEMLİ: Global context user bazında olmalı, conversation bazında değil!
+    # Bu yüzden sadece yeni mesajdan context çıkar, eski mesajlardan değil
+    # recent_messages = rows[-(CHAT_HISTORY_MAX-1):] if len(rows) > 0 else []
+    new_context = {}
+    # Kullanıcı bloğu sadece kalıcı veriden kurulur (mesajdan çıkan bilgi tur bloğuna gider)
+    persisted_context = dict(user_context)
+    
+    # Yeni mesajdan context çıkar
+    current_message_context = extract_user_context_hybrid(message_text, x_user_id) or {}
+    for key, value in current_message_context.items():
+        normalized_key = key.strip().lower()
+        if normalized_key and value:
+            if normalized_key not in new_context:
+                new_context[normalized_key] = value
+            elif isinstance(value, list) and isinstance(new_context[normalized_key], list):
+                new_context[normalized_key] = list(set(new_context[normalized_key] + value))
+            else:
+                new_context[normalized_key] = value
+    
+    # Yeni context'i global context'e ekle
+    if new_context and any(new_context.values()):
+        context_changed = any(key not in user_context or user_context[key] != value 
+                            for key, value in new_context.items())
+        if context_changed:
+            user_context.update(new_context)
+    
+    # Prompt düzeni (backend/prompt_layout.py): statik önek -> kullanıcı bloğu -> tur blokları.
+    # Kullanıcı bilgileri system prompt'a eklenmez; system prompt tüm kullanıcılarda aynı kalır ve provider cache'inden okunur
+    # Bu mesajdan çıkan bilgiler kullanıcı bloğuna girmez; girerse blok her turda değişir ve önek cache'i kaçar
+    user_blocks = [build_user_context_block(persisted_context, user_plan)]
+    
+    # User analyses context - OPTIMIZED (only add if exists)
+    if user_analyses:
+        analyses_info = "KULLANICI GEÇMİŞİ:\n"
+        for analysis in user_analyses:
+            if analysis.message_type and analysis.message_type.startswith(('quiz', 'lab_', 'test_')):
+                analyses_info += f"- {analysis.message_type.upper()}: {analysis.created_at.strftime('%Y-%m-%d')}\n"
+                # Analiz içeriğini de ekle
+                if analysis.response_payload:
+                    if analysis.message_type == "quiz" and "supplement_recommendations" in analysis.response_payload:
+                        supplements = [s["name"] for s in analysis.response_payload["supplement_recommendations"][:3]]
+                        analyses_info += f"  Önerilen supplementler: {', '.join(supplements)}\n"
+                    elif analysis.message_type == "lab_single" and "test_name" in analysis.response_payload:
+                        analyses_info += f"  Test: {analysis.response_payload['test_name']}\n"
+        analyses_info += "\nBu bilgileri kullanarak daha kişiselleştirilmiş yanıtlar ver."
+        user_blocks.append(analyses_info)
+
+    # XML'den supplement listesini ekle - AI'ya ürün önerileri için (free chat gibi basit tut)
+    xml_products = get_xml_products()
+    supplements_list = xml_products
+    
+    # Quiz verilerini ai_messages'tan çek
+    quiz_messages = await async_get_user_ai_messages_by_type(db, x_user_id, "quiz", limit=QUIZ_LAB_MESSAGES_LIMIT)
+    
+    # Quiz verilerini ekle - Ham quiz cevapları (diğer endpoint'ler gibi); yoksa analizlerden çıkan profil
+    if quiz_messages:
+        raw_quiz_info = "=== QUIZ BİLGİLERİ ===\n"
+        for msg in quiz_messages:
+            if msg.request_payload:
+                raw_quiz_info += f"QUIZ TARİHİ: {msg.created_at.strftime('%Y-%m-%d')}\n"
+                raw_quiz_info += f"QUIZ CEVAPLARI: {msg.request_payload}\n\n"
+        user_blocks.append(raw_quiz_info)
+    elif quiz_info:
+        user_blocks.append(quiz_info)
+    
+    # Lab verileri - "🚨 LAB SONUÇLARI" formatında (yukarıda helper'dan hazırlandı)
+    user_blocks.append(lab_info)
+    
+    # Eski konuşmaların sabit boyutlu özeti
+    user_blocks.append(format_summary_block(conversation_summary))
+    
+    # Akıllı context ekleme - sadece gerekli olduğunda
+    needs_context = False
+    
+    if rows:
+        # 1. Tek kelime/fiil kontrolü
+        single_words = ["devam", "açıkla", "anlat", "edelim", "yapalım", "kullan", "hazırla", "tamam", "olur", "evet", "hayır", "anladım", "teşekkürler"]
+        if message_text.strip().lower() in single_words:
+            needs_context = True
+        
+        # 2. Soru kelimeleri kontrolü (bağlam gerektirir)
+        question_words = ["nasıl", "neden", "ne", "hangi", "kim", "nerede", "ne zaman", "kaç"]
+        if any(word in message_text.lower() for word in question_words):
+            needs_context = True
+        
+        # 3. Önceki mesajda supplement/ürün bahsedilmişse
+        last_assistant_msg = ""
+        for r in reversed(rows):
+            if r['role'] == 'assistant':
+                last_assistant_msg = r['content'].lower()
+                break
+        
+        if any(word in last_assistant_msg for word in ["ürün", "supplement", "takviye", "öner", "kombinasyon"]):
+            needs_context = True
+        
+        # 4. Kullanıcı "bu", "şu", "o" gibi referans kelimeler kullanmışsa
+        reference_words = ["bu", "şu", "o", "bunun", "şunun", "onun", "buna", "şuna", "ona"]
+        if any(word in message_text.lower() for word in reference_words):
+            needs_context = True
+
+            
+    
+    if needs_context and rows:
+        context_message = build_previous_turns_message(rows, user_message)
+        user_message = context_message  # user_message'ı context ile güncelle
+        logger.debug("Premium kullanıcı için akıllı context eklendi")
+    
+    # Tur blokları: mesajdan çıkan bilgiler, istenirse ürün listesi; güncel mesaj (gerekirse son turlarla) en sonda
+    turn_blocks = []
+    message_context_block = build_message_context_block(new_context)
+    if message_context_block:
+        turn_blocks.append(message_context_block)
+    
+    # XML supplement listesini her zaman ekle ama sadece açıkça istendiğinde ürün öner
+    supplement_keywords = [
+        "ne önerirsin", "ne öneriyorsun", "hangi ürün", "hangi takviye", "hangi supplement",
+        "ne alayım", "ne almalıyım", "hangi vitamin", "ürün öner", "takviye öner", 
+        "supplement öner", "ne kullanayım", "hangi marka", "önerdiğin ürün",
+        "önerdiğin takviye", "önerdiğin supplement", "hangi ürünleri", "ne tavsiye edersin"
+    ]
+    is_supplement_request = any(keyword in message_text.lower() for keyword in supplement_keywords)
+    
+    # SADECE supplement isteği varsa ürün listesini ekle
+    if is_supplement_request and supplements_list:
+        supplements_info = f"\n\n🚨 MEVCUT ÜRÜNLER ({len(supplements_list)} ürün):\n"
+        for i, product in enumerate(supplements_list, 1):
+            category = product.get('category', 'Kategori Yok')
+            product_id = product.get('id', '')
+            supplements_info += f"{i}. {product['name']} ({category}) [ID: {product_id}]\n"
+        
+        supplements_info += "\n🚨 ÖNEMLİ: SADECE yukarıdaki listedeki ürünleri öner! Başka hiçbir ürün önerme! Kullanıcının ihtiyacına göre 3-5 ürün seç! Liste hakkında konuşma! Link verme! Ürün önerirken SADECE ÜRÜN ADINI kullan, ID'yi kullanıcıya YAZMA (backend otomatik eşleştirecek)!"
+        
+        turn_blocks.append(supplements_info)
+        logger.debug(f"Supplement isteği tespit edildi, {len(supplements_list)} ürün eklendi")
+    else:
+        logger.debug("Supplement isteği yok, ürün listesi eklenmedi")
+
+    turn_blocks.append(user_message)
+    history = layout_messages(system_prompt, user_blocks, turn_blocks, context_data=user_context)
+
+    metrics.observe_stage("context_build", time.perf_counter() - context_start)
+
+    # parallel chat with synthesis
+    start = time.time()
+    try:
+        # Dil ham mesajdan algılanır (tur blokları Türkçe iskelet içerir)
+        res = parallel_chat(history, message_text)
+        final = res["content"]
+        used_model = res.get("model_used","unknown")
+    except Exception as e:
+        # Production'da log yerine fallback kullan
+        from backend.orchestrator import chat_fallback
+        fallback_res = chat_fallback(history)
+        final = fallback_res["content"]
+        used_model = fallback_res["model_used"]
+    
+    latency_ms = int((time.time()-start)*1000)
+
+    # Response ID oluştur ve context bilgilerini sakla
+    response_id = generate_response_id()
+    
+    # Assistant message artık ai_messages'a kaydedilecek
+    
+    # AI interaction kaydı kaldırıldı - create_ai_message kullanılıyor
+    
+    
+    # Database kaydı kaldırıldı - Asıl site zaten yapacak
+    # Sadece chat yanıtını döndür
+    
+    # Log to ai_messages
+    try:
+        log_ai_message(
+            external_user_id=x_user_id,
+            message_type="chat",
+            request_payload={"message": message_text, "conversation_id": conversation_id},
+            response_payload={"reply": final, "conversation_id": conversation_id},
+            model_used="openrouter"
+        )
+        # Pencere dışına taşan turlar arka planda özete katlanır
+        if MEMORY_ACTIVE:
+            on_ai_message_written(x_user_id, "chat", user_plan)
+    except Exception as e:
+        pass  # Silent fail for production
+    
+    # AI'ın gerçekten ürün önerip önermediğini kontrol et
+    recommended_products = None
+    if is_supplement_request and supplements_list:
+        logger.debug(f"Supplement isteği tespit edildi, {len(supplements_list)} ürün var")
+        logger.debug("AI yanıtı: %s", log_payload(final[:200]))
+        
+        # AI'ın gerçekten ürün önerip önermediğini kontrol et (daha sıkı)
+        ai_recommending_products = any(keyword in final.lower() for keyword in [
+            "öneriyorum", "öneririm", "öner", "şu ürün", "bu ürün", "şu takviye", "bu takviye", 
+            "şu supplement", "bu supplement", "ürünler:", "takviyeler:", "supplementler:",
+            "kombinasyon:", "şu kombinasyon", "bu kombinasyon", "ürün listesi", "takviye listesi"
+        ])
+        
+        logger.debug(f"AI ürün öneriyor mu: {ai_recommending_products}")
+        
+        # AI ürün öneriyorsa sepete ekle butonları göster
+        if ai_recommending_products:
+            # AI'ın önerdiği ürünleri tespit et (isme göre matching)
+            recommended_products = []
+            for product in supplements_list:  # TÜM ürünleri kontrol et
+                product_name = product.get('name', '').lower()
+                product_category = product.get('category', '').lower()
+                
+                # İsme göre eşleştirme (ID artık kullanıcıya gösterilmiyor)
+                # Ürün adı AI'ın yanıtında geçiyorsa ekle
+                if product_name in final.lower():
+                    recommended_products.append({
+                        "id": product.get('id', f"product_{len(recommended_products)}"),
+                        "name": product.get('name', ''),
+                        "category": product.get('category', ''),
+                        "price": "299.99",  # Placeholder - gerçek fiyat XML'den gelecek
+                        "image": f"https://longopass.myideasoft.com/images/{product.get('id', '')}.jpg"
+                    })
+                    logger.debug(f"Ürün eklendi (isim eşleşmesi): {product.get('name', '')}")
+            
+            logger.debug(f"Toplam {len(recommended_products)} ürün önerildi")
+            logger.debug("Önerilen ürünler: %s", log_payload(recommended_products))
+        else:
+            logger.debug("AI ürün önermiyor, butonlar gösterilmeyecek")
+    
+    logger.debug("Response'a gönderilen products: %d", len(recommended_products) if recommended_products else 0)
+    
+    return ChatResponse(
+        conversation_id=conversation_id, 
+        reply=final, 
+        latency_ms=latency_ms,
+        products=recommended_products
+    )
+
+
+@router.post("/ai/chat/clear-session")
+def clear_free_user_session(x_user_id: str | None = Header(default=None)):
+    """Free kullanıcının session'ını temizle"""
+    if x_user_id and x_user_id in free_user_conversations:
+        del free_user_conversations[x_user_id]
+        return {"message": "Session temizlendi", "user_id": x_user_id}
+    return {"message": "Session bulunamadı", "user_id": x_user_id}
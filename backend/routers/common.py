@@ -0,0 +1,153 @@
+"""Birden fazla router'ın kullandığı yardımcılar (XML ürün listesi, standart lab verisi, link temizleme)"""
+from sqlalchemy.ext.asyncio import AsyncSession
+import re
+import xml.etree.ElementTree as ET
+from backend.config import XML_REQUEST_TIMEOUT, XML_PRODUCTS_URL, XML_CATALOG_TTL_S
+from backend.cache_utils import MemoryCache
+from backend.db import get_user_ai_messages_by_type, get_latest_ai_message
+from backend.db import async_get_user_ai_messages_by_type, async_get_latest_ai_message
+from backend.tracing import traced
+from backend.log_utils import get_logger
+
+logger = get_logger("common")
+
+
+# Local link sanitizer for non-chat endpoints (recursive)
+# Pattern'ler import'ta bir kez derlenir (her string için re cache lookup'ı yok)
+_MD_LINK_RE = re.compile(r"\[([^\]]+)\]\((https?:\/\/[^\s)]+)\)")
+_BARE_URL_RE = re.compile(r"https?:\/\/[^\s]+")
+_BARE_DOMAIN_RE = re.compile(r"\b(?:www\.)?[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}(?:\/[\w\-./?%&=+#]*)?\b")
+_EMPTY_PARENS_RE = re.compile(r"\(\s*\)")
+_EMPTY_BRACKETS_RE = re.compile(r"\[\s*\]")
+_MULTI_SPACE_RE = re.compile(r"\s{2,}")
+
+
+def _sanitize_str(s: str) -> str:
+    # Link/domain/parantez içermeyen metinde (çoğu alan) regex'lere gerek yok
+    if "." not in s and ":" not in s and "(" not in s and "[" not in s:
+        return _MULTI_SPACE_RE.sub(" ", s).strip()
+    # Remove markdown links [text](url) -> text
+    s = _MD_LINK_RE.sub(r"\1", s)
+    # Remove bare URLs
+    s = _BARE_URL_RE.sub("", s)
+    # Remove bare domains (e.g., cdc.gov, nhs.uk, domain.com/path)
+    s = _BARE_DOMAIN_RE.sub("", s)
+    # Remove leftover empty parentheses or brackets produced by sanitization
+    s = _EMPTY_PARENS_RE.sub("", s)
+    s = _EMPTY_BRACKETS_RE.sub("", s)
+    # Collapse multiple spaces
+    return _MULTI_SPACE_RE.sub(" ", s).strip()
+
+
+def sanitize_json_links(data):
+    if isinstance(data, dict):
+        return {k: sanitize_json_links(v) for k, v in data.items()}
+    if isinstance(data, list):
+        return [sanitize_json_links(v) for v in data]
+    if isinstance(data, str):
+        return _sanitize_str(data)
+    return data
+
+
+_catalog_cache = MemoryCache("xml_catalog")
+
+
+def get_xml_products():
+    """Ürün kataloğu (XML_CATALOG_TTL_S boyunca bellekten). Dönen liste paylaşılır, değiştirilmemeli."""
+    products = _catalog_cache.get("products")
+    if products is None:
+        products = fetch_xml_products()
+        if products:  # Boş sonuç (XML hatası) cache'lenmesin, sonraki istek tekrar denesin
+            _catalog_cache.set("products", products, ttl_seconds=XML_CATALOG_TTL_S)
+    return products
+
+
+def prime_xml_products() -> int:
+    """Warm-up: kataloğu çekip cache'e koy; çekilemezse mevcut cache'e dokunmaz"""
+    products = fetch_xml_products()
+    if products:
+        _catalog_cache.set("products", products, ttl_seconds=XML_CATALOG_TTL_S)
+    return len(products)
+
+
+@traced("xml_fetch")
+def fetch_xml_products():
+    """XML'den tüm ürün bilgilerini çek"""
+    import requests  # Lazy: cold start'ta import maliyeti olmasın
+
+    try:
+        response = requests.get(XML_PRODUCTS_URL, timeout=XML_REQUEST_TIMEOUT)
+        root = ET.fromstring(response.text)
+        products = []
+        for item in root.findall('.//item'):
+            product = {}
+            
+            # ID
+            id_elem = item.find('id')
+            if id_elem is not None and id_elem.text:
+                product['id'] = id_elem.text.strip()
+            
+            # Label (ürün adı)
+            label_elem = item.find('label')
+            if label_elem is not None and label_elem.text:
+                product['name'] = label_elem.text.strip()
+            
+            # Main Category
+            category_elem = item.find('mainCategory')
+            if category_elem is not None and category_elem.text:
+                product['category'] = category_elem.text.strip()
+            
+            # Diğer alanları da ekle (varsa)
+            for child in item:
+                if child.tag not in ['id', 'label', 'mainCategory']:
+                    if child.text:
+                        product[child.tag] = child.text.strip()
+            
+            if product:  # En az bir alan varsa ekle
+                products.append(product)
+        
+        return products
+    except Exception as e:
+        logger.warning(f"XML çekme hatası: {e}")
+        return []
+
+
+def get_standardized_lab_data(db, user_id, limit=5):
+    """Tüm endpoint'ler için standart lab verisi - ham test verileri"""
+    # Önce lab_summary'den dene (en kapsamlı) - sadece en son kayıt kullanıldığı için limit 1
+    lab_summary = get_latest_ai_message(db, user_id, "lab_summary")
+    if lab_summary and lab_summary.request_payload:
+        payload = lab_summary.request_payload
+        # Hem "tests" hem de "lab_results" field'larını kontrol et
+        if "tests" in payload and payload["tests"]:
+            return payload["tests"]
+        elif "lab_results" in payload and payload["lab_results"]:
+            return payload["lab_results"]
+    
+    # Lab_summary yoksa lab_single'dan al
+    lab_single = get_user_ai_messages_by_type(db, user_id, "lab_single", limit)
+    tests = []
+    for msg in lab_single:
+        if msg.request_payload and "test" in msg.request_payload:
+            tests.append(msg.request_payload["test"])
+    
+    return tests
+
+
+async def async_get_standardized_lab_data(db: AsyncSession, user_id, limit=5):
+    """get_standardized_lab_data async versiyonu - async handler'lar için"""
+    lab_summary = await async_get_latest_ai_message(db, user_id, "lab_summary")
+    if lab_summary and lab_summary.request_payload:
+        payload = lab_summary.request_payload
+        if "tests" in payload and payload["tests"]:
+            return payload["tests"]
+        elif "lab_results" in payload and payload["lab_results"]:
+            return payload["lab_results"]
+    
+    lab_single = await async_get_user_ai_messages_by_type(db, user_id, "lab_single", limit)
+    tests = []
+    for msg in lab_single:
+        if msg.request_payload and "test" in msg.request_payload:
+            tests.append(msg.request_payload["test"])
+    
+    return tests
@@ -0,0 +1,281 @@
+"""Medical ID / Kişisel Sağlık Künyesi (QR) endpoint'leri"""
+from backend.auth import get_async_db, get_current_user, validate_chat_user_id
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Body
+from sqlalchemy.ext.asyncio import AsyncSession
+import os
+from datetime import datetime
+from backend.schemas import MedicalIdCreateRequest, MedicalIdResponse, MedicalIdFormRequest
+from backend.utils import get_user_plan_from_headers
+
+router = APIRouter()
+
+
+# ---------------------------------------------------------------------------
+# Medical ID / Kişisel Sağlık Künyesi (QR)
+# - Form kaydı QR'ı değiştirmez
+# - Şimdilik kilit şifresi: 1234 (sonra TC'ye geçilecek)
+# - Lab mevcut ai_messages'tan okunur (quiz künyeye girmez)
+
+# ---------------------------------------------------------------------------
+
+def _medical_id_public_base(request: Request) -> str:
+    env_base = os.getenv("MEDICAL_ID_PUBLIC_BASE") or os.getenv("PUBLIC_API_BASE")
+    if env_base:
+        return env_base.rstrip("/")
+    return str(request.base_url).rstrip("/")
+
+
+def _medical_id_urls(request: Request, token: str) -> tuple[str, str]:
+    base = _medical_id_public_base(request)
+    return f"{base}/m/{token}", f"{base}/ai/medical-id/qr/{token}"
+
+
+def _medical_id_guard(x_user_id: str | None, x_user_level: int | None) -> tuple[str, str]:
+    user_plan = get_user_plan_from_headers(x_user_level)
+    if user_plan == "free":
+        raise HTTPException(status_code=403, detail="Medical ID premium özelliktir")
+    if not x_user_id or not validate_chat_user_id(x_user_id, user_plan):
+        raise HTTPException(status_code=400, detail="Geçerli x-user-id gerekli")
+    return user_plan, x_user_id
+
+
+def _medical_id_response(request: Request, record) -> dict:
+    url, qr_image_url = _medical_id_urls(request, record.token)
+    return {
+        "success": True,
+        "token": record.token,
+        "url": url,
+        "qr_image_url": qr_image_url,
+        "created_at": record.created_at.isoformat() if record.created_at else None,
+        "expires_at": record.expires_at.isoformat() if record.expires_at else None,
+        "form_saved": bool(getattr(record, "form_data", None) or record.profile_snapshot),
+        "pin_hint": "1234",
+        "message": None,
+    }
+
+
+@router.get("/ai/medical-id/form-schema")
+async def medical_id_form_schema(current_user: str = Depends(get_current_user)):
+    """Ideasoft'un formu çizmesi için V1 alan şeması."""
+    from backend.medical_id.form_schema import FORM_SCHEMA_V1
+    return FORM_SCHEMA_V1
+
+
+@router.post("/ai/medical-id/create", response_model=MedicalIdResponse)
+async def create_or_get_medical_id(
+    request: Request,
+    body: MedicalIdCreateRequest = Body(default_factory=MedicalIdCreateRequest),
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    x_user_id: str | None = Header(default=None),
+    x_user_level: int | None = Header(default=None),
+):
+    """
+    Yoksa bir kez QR üretir. Varsa AYNI token döner (force_new=false).
+    Form güncellemesi QR'ı değiştirmez.
+    """
+    import secrets
+    from datetime import timedelta
+    from backend.db import (
+        async_get_active_medical_id,
+        async_create_medical_id,
+        async_revoke_medical_ids_for_user,
+        async_update_medical_id_form,
+        async_update_medical_id_profile,
+        async_ensure_medical_id_pin,
+    )
+    from backend.medical_id.pin import default_pin_hash, hash_pin
+
+    _medical_id_guard(x_user_id, x_user_level)
+    force_new = bool(body.force_new) if body else False
+    form = body.form if body else None
+    profile = body.profile if body else None
+    pin_hash = hash_pin(body.pin) if body and body.pin else default_pin_hash()
+
+    active = await async_get_active_medical_id(db, x_user_id)
+
+    if active and not force_new:
+        await async_ensure_medical_id_pin(db, active, pin_hash if not active.pin_hash else active.pin_hash)
+        if form is not None:
+            active = await async_update_medical_id_form(db, active, form)
+        if profile is not None:
+            active = await async_update_medical_id_profile(db, active, profile)
+        return _medical_id_response(request, active)
+
+    # Yeni QR yalnızca yoksa veya force_new
+    if force_new:
+        old_form = active.form_data if active else None
+        old_profile = active.profile_snapshot if active else None
+        await async_revoke_medical_ids_for_user(db, x_user_id)
+        if form is None:
+            form = old_form
+        if profile is None:
+            profile = old_profile
+
+    token = secrets.token_urlsafe(32)
+    expires_days = int(os.getenv("MEDICAL_ID_EXPIRES_DAYS", "365"))
+    expires_at = datetime.utcnow() + timedelta(days=expires_days) if expires_days > 0 else None
+
+    record = await async_create_medical_id(
+        db=db,
+        external_user_id=x_user_id,
+        token=token,
+        profile_snapshot=profile,
+        form_data=form,
+        pin_hash=pin_hash,
+        expires_at=expires_at,
+    )
+    return _medical_id_response(request, record)
+
+
+@router.post("/ai/medical-id/form", response_model=MedicalIdResponse)
+async def save_medical_id_form(
+    request: Request,
+    body: MedicalIdFormRequest,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    x_user_id: str | None = Header(default=None),
+    x_user_level: int | None = Header(default=None),
+):
+    """Künye formunu kaydet/güncelle — QR ASLA değişmez."""
+    from backend.db import async_get_active_medical_id, async_update_medical_id_form, async_create_medical_id, async_ensure_medical_id_pin
+    from backend.medical_id.pin import default_pin_hash
+    import secrets
+    from datetime import timedelta
+
+    _medical_id_guard(x_user_id, x_user_level)
+    active = await async_get_active_medical_id(db, x_user_id)
+    if not active:
+        # Form ilk kez geliyorsa sessizce create et (aynı QR bundan sonra sabit)
+        expires_days = int(os.getenv("MEDICAL_ID_EXPIRES_DAYS", "365"))
+        expires_at = datetime.utcnow() + timedelta(days=expires_days) if expires_days > 0 else None
+        active = await async_create_medical_id(
+            db=db,
+            external_user_id=x_user_id,
+            token=secrets.token_urlsafe(32),
+            form_data=body.form,
+            pin_hash=default_pin_hash(),
+            expires_at=expires_at,
+        )
+    else:
+        await async_ensure_medical_id_pin(db, active, default_pin_hash())
+        active = await async_update_medical_id_form(db, active, body.form)
+    return _medical_id_response(request, active)
+
+
+@router.get("/ai/medical-id/form")
+async def get_medical_id_form(
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    x_user_id: str | None = Header(default=None),
+    x_user_level: int | None = Header(default=None),
+):
+    """Kayıtlı formu getir (Ideasoft edit için)."""
+    from backend.db import async_get_active_medical_id
+
+    _medical_id_guard(x_user_id, x_user_level)
+    active = await async_get_active_medical_id(db, x_user_id)
+    if not active:
+        return {"success": True, "exists": False, "form": None, "token": None}
+    return {
+        "success": True,
+        "exists": True,
+        "token": active.token,
+        "form": active.form_data,
+        "profile": active.profile_snapshot,
+        "form_updated_at": active.form_updated_at.isoformat() if active.form_updated_at else None,
+    }
+
+
+@router.post("/ai/medical-id/revoke")
+async def revoke_medical_id(
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    x_user_id: str | None = Header(default=None),
+    x_user_level: int | None = Header(default=None),
+):
+    from backend.db import async_revoke_medical_ids_for_user
+
+    _medical_id_guard(x_user_id, x_user_level)
+    count = await async_revoke_medical_ids_for_user(db, x_user_id)
+    return {"success": True, "revoked": count}
+
+
+@router.get("/ai/medical-id/qr/{token}")
+async def medical_id_qr_image(token: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    from fastapi.responses import Response
+    from backend.db import async_get_medical_id_by_token
+    from backend.medical_id.qr import make_qr_png_bytes
+
+    record = await async_get_medical_id_by_token(db, token)
+    if not record or not record.is_active:
+        raise HTTPException(status_code=404, detail="Medical ID bulunamadı veya iptal edilmiş")
+    if record.expires_at and record.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=410, detail="Medical ID süresi dolmuş")
+
+    url, _ = _medical_id_urls(request, token)
+    try:
+        png = make_qr_png_bytes(url)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(content=png, media_type="image/png")
+
+
+@router.get("/m/{token}")
+async def public_medical_id_unlock_page(token: str, db: AsyncSession = Depends(get_async_db)):
+    """QR okutulunca önce şifre ekranı."""
+    from fastapi.responses import HTMLResponse
+    from backend.db import async_get_medical_id_by_token
+    from backend.medical_id.unlock_page import render_unlock_page
+
+    record = await async_get_medical_id_by_token(db, token)
+    if not record or not record.is_active:
+        raise HTTPException(status_code=404, detail="Künye bulunamadı veya iptal edilmiş")
+    if record.expires_at and record.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=410, detail="Künye süresi dolmuş")
+
+    return HTMLResponse(content=render_unlock_page(token))
+
+
+@router.post("/m/{token}/unlock")
+async def public_medical_id_unlock(token: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Şifre doğruysa künyeyi göster. Form + lab birleşik. Quiz yok."""
+    from fastapi.responses import HTMLResponse
+    from backend.db import async_get_medical_id_by_token
+    from backend.medical_id.pin import verify_pin
+    from backend.medical_id.unlock_page import render_unlock_page
+    from backend.medical_id.card_builder import async_build_health_card_data
+    from backend.medical_id.html_renderer import render_health_card_html
+
+    submitted_pin = None
+    ctype = (request.headers.get("content-type") or "").lower()
+    try:
+        if "application/json" in ctype:
+            payload = await request.json()
+            if isinstance(payload, dict):
+                submitted_pin = payload.get("pin") or payload.get("password")
+        else:
+            form = await request.form()
+            submitted_pin = form.get("pin") or form.get("password")
+    except Exception:
+        submitted_pin = None
+
+    record = await async_get_medical_id_by_token(db, token)
+    if not record or not record.is_active:
+        raise HTTPException(status_code=404, detail="Künye bulunamadı veya iptal edilmiş")
+    if record.expires_at and record.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=410, detail="Künye süresi dolmuş")
+
+    if not verify_pin(submitted_pin, getattr(record, "pin_hash", None)):
+        return HTMLResponse(
+            content=render_unlock_page(token, error="Şifre hatalı. Lütfen tekrar deneyin."),
+            status_code=401,
+        )
+
+    data = await async_build_health_card_data(
+        db=db,
+        external_user_id=record.external_user_id,
+        profile_snapshot=record.profile_snapshot,
+        form_data=getattr(record, "form_data", None),
+    )
+    return HTMLResponse(content=render_health_card_html(data))
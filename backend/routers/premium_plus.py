@@ -0,0 +1,1207 @@
+"""Premium Plus endpoint'leri: beslenme/egzersiz/yaşam tarzı önerileri, metabolik yaş, video call"""
+from fastapi import APIRouter, Depends, HTTPException, Header, Body, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import functools
+import json
+import os
+from backend.config import QUIZ_LAB_ANALYSES_LIMIT
+from backend.db import (
+    AsyncSessionLocal, async_get_user_ai_messages_by_type,
+    get_ai_message_stats, get_ai_messages_by_ids, get_latest_ai_message,
+)
+from backend.auth import get_db, get_async_db, get_current_user
+from backend.schemas import MetabolicAgeTestRequest
+from backend.utils import get_user_plan_from_headers
+from backend.ai_log_writer import log_ai_message
+from backend.log_utils import get_logger, log_payload
+from backend.precompute import recommendation_fingerprint, load_precomputed, store_precomputed, register as register_precompute
+from backend.routers.common import sanitize_json_links, get_standardized_lab_data, async_get_standardized_lab_data
+
+logger = get_logger("premium_plus")
+router = APIRouter()
+
+
+# ---------- PREMIUM PLUS BESLENME/SPOR/EGZERSİZ ÖNERİLERİ ----------
+
+async def _load_wellness_context(db: AsyncSession, x_user_id: str):
+    """Quiz geçmişi + standart lab verisi (diet/exercise/lifestyle aynı veriyi kullanır)"""
+    quiz_messages = await async_get_user_ai_messages_by_type(db, x_user_id, "quiz", QUIZ_LAB_ANALYSES_LIMIT)
+    lab_tests = await async_get_standardized_lab_data(db, x_user_id, 20)
+    return quiz_messages, lab_tests
+
+
+def _build_user_context(quiz_messages, lab_tests) -> dict:
+    """AI'ya gönderilecek context"""
+    user_context = {}
+    
+    # Quiz verilerini context'e ekle
+    if quiz_messages:
+        user_context["quiz_data"] = []
+        for msg in quiz_messages:
+            if msg.request_payload:
+                user_context["quiz_data"].append(msg.request_payload)
+    
+    # Lab verilerini context'e ekle
+    if lab_tests:
+        user_context["lab_data"] = {
+            "tests": lab_tests
+        }
+    return user_context
+
+
+@router.post("/ai/premium-plus/diet-recommendations")
+async def premium_plus_diet_recommendations(
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    x_user_id: str | None = Header(default=None),
+    x_user_level: int | None = Header(default=None)
+):
+    """Premium Plus kullanıcıları için detaylı beslenme önerileri"""
+    
+    # Plan kontrolü - Yeni sistem: userLevel bazlı
+    if x_user_level is not None:
+        if x_user_level == 1:
+            user_plan = "free"
+        elif x_user_level == 2:
+            user_plan = "premium"
+        elif x_user_level == 3:
+            user_plan = "premium_plus"
+        else:
+            user_plan = "free"  # Default fallback
+    else:
+        # Eski sistem fallback
+        user_plan = "free"
+    
+    if user_plan != "premium_plus":
+        raise HTTPException(
+            status_code=403, 
+            detail="Bu özellik sadece Premium Plus kullanıcıları için mevcuttur"
+        )
+    
+    # User ID validasyonu
+    if not x_user_id:
+        raise HTTPException(status_code=400, detail="User ID gerekli")
+    
+    # Quiz geçmişi + lab verisi (wellness-plan ile ortak)
+    quiz_messages, lab_tests = await _load_wellness_context(db, x_user_id)
+    
+    # Veri kontrolü - En az bir veri kaynağı olmalı
+    has_quiz_data = quiz_messages and any(msg.request_payload for msg in quiz_messages)
+    has_lab_data = lab_tests and len(lab_tests) > 0
+    
+    if not has_quiz_data and not has_lab_data:
+        raise HTTPException(
+            status_code=400, 
+            detail="Kişiselleştirilmiş beslenme önerileri için önce quiz yapmanız veya lab sonuçlarınızı paylaşmanız gerekiyor. Lütfen önce sağlık quizini tamamlayın veya lab test sonuçlarınızı girin."
+        )
+    
+    user_context = _build_user_context(quiz_messages, lab_tests)
+    return await _serve_section("diet", x_user_id, quiz_messages, lab_tests, user_context)
+
+
+async def _generate_diet(x_user_id: str, quiz_messages, lab_tests, user_context: dict) -> dict:
+    """Beslenme önerileri: prompt + AI çağrısı + kayıt (hata -> HTTPException 500)"""
+    # System prompt - Sadece beslenme odaklı
+    system_prompt = f"""Adın Longo - Premium Plus kullanıcıları için özel beslenme danışmanısın.
+
+GÖREVİN: Kullanıcının sağlık quiz profili ve lab verilerine göre kişiselleştirilmiş DETAYLI beslenme önerileri ver.
+
+KULLANICI VERİLERİ:
+{str(user_context)}
+
+VERİ ANALİZİ:
+- Quiz sonuçlarından yaş, cinsiyet, sağlık hedefleri, aktivite seviyesi
+- Lab sonuçlarından vitamin/mineral eksiklikleri, sağlık durumu
+- Bu verileri birleştirerek holistik beslenme yaklaşımı
+
+YANIT FORMATI - SADECE JSON:
+{{
+  "general_advice": "Kullanıcının durumuna göre genel beslenme önerisi paragrafı (2-3 cümle)",
+  "daily_calories": {{
+    "min": 2000,
+    "max": 2200,
+    "unit": "kcal"
+  }},
+  "macro_distribution": {{
+    "carbohydrate": {{
+      "percentage": 40,
+      "label": "Karbonhidrat"
+    }},
+    "protein": {{
+      "percentage": 30,
+      "label": "Protein"
+    }},
+    "fat": {{
+      "percentage": 30,
+      "label": "Yağ"
+    }}
+  }},
+  "recommended_supplements": [
+    {{
+      "name": "Vitamin D",
+      "dosage": "2000 IU",
+      "note": "Opsiyonel açıklama"
+    }},
+    {{
+      "name": "Omega-3",
+      "dosage": "Balık yağı veya alg bazlı",
+      "note": ""
+    }}
+  ],
+  "hydration": {{
+    "daily_target": "2.5-3L",
+    "label": "Günlük Su Tüketimi",
+    "tips": [
+      "Sabah kalktığınızda 1-2 bardak su",
+      "Her öğün öncesi 1 bardak su",
+      "Egzersiz sonrası ekstra 500 ml",
+      "İdrar rengi açık sarı olmalı"
+    ]
+  }},
+  "avoid_foods": [
+    "İşlenmiş gıdalar",
+    "Aşırı şeker tüketimi",
+    "Trans yağlar",
+    "Gazlı içecekler"
+  ],
+  "recommended_habits": [
+    "Düzenli öğün saatleri",
+    "Porsiyon kontrolü",
+    "Yavaş yemek yeme",
+    "Renkli sebze tüketimi"
+  ]
+}}
+
+ÖNEMLİ KURALLAR:
+- SADECE JSON formatında yanıt ver
+- Markdown kullanma (###, **, - gibi)
+- KESINLIKLE link verme
+- GENEL öneriler ver, spesifik günlük menü/program verme
+- Her öneri için NEDEN açıkla
+- Uygulanabilir ve pratik öneriler ver
+
+DİL: SADECE TÜRKÇE YANIT VER!"""
+
+    # User message'ı hazırla
+    user_message = f"""Kullanıcının mevcut durumu:
+
+KULLANICI BİLGİLERİ:
+"""
+    
+    # Quiz verilerini ekle
+    if user_context:
+        user_message += f"\nQUIZ VERİLERİ:\n"
+        for key, value in user_context.items():
+            if value and key.startswith(('yas', 'cinsiyet', 'hedef', 'aktivite', 'boy', 'kilo', 'quiz_', 'beslenme', 'hastalik', 'ilac')):
+                user_message += f"- {key.upper()}: {value}\n"
+    
+    # Quiz geçmişini ekle
+    if quiz_messages:
+        user_message += f"\nSON SAĞLIK QUIZ PROFİLİ:\n"
+        for msg in quiz_messages[-1:]:  # En son quiz
+            if msg.request_payload:
+                user_message += f"- Quiz verileri: {msg.request_payload}\n"
+    
+    # Lab analizlerini ekle
+    if lab_tests:
+        user_message += f"\nLAB ANALİZLERİ:\n"
+        for test in lab_tests[:5]:  # İlk 5 test
+            user_message += f"- {test.get('name', 'N/A')}: {test.get('value', 'N/A')} ({test.get('reference_range', 'N/A')})\n"
+    
+    user_message += f"""
+
+Lütfen bu kullanıcı için GENEL beslenme önerileri hazırla. Spesifik günlük menü verme, genel beslenme prensipleri ver."""
+
+    # AI çağrısı
+    try:
+        from backend.openrouter_client import async_get_ai_response
+        ai_response = await async_get_ai_response(
+            system_prompt=system_prompt,
+            user_message=user_message,
+            max_tokens=3000  # Diet recommendations için daha yüksek limit
+        )
+        
+        # JSON parse et
+        import json
+        try:
+            # Markdown code block'ları temizle
+            cleaned_response = ai_response.strip()
+            if cleaned_response.startswith('```json'):
+                json_start = cleaned_response.find('```json') + 7
+                json_end = cleaned_response.find('```', json_start)
+                if json_end != -1:
+                    cleaned_response = cleaned_response[json_start:json_end].strip()
+            elif cleaned_response.startswith('```'):
+                json_start = cleaned_response.find('```') + 3
+                json_end = cleaned_response.find('```', json_start)
+                if json_end != -1:
+                    cleaned_response = cleaned_response[json_start:json_end].strip()
+            
+            recommendations_json = json.loads(cleaned_response)
+        except json.JSONDecodeError as e:
+            logger.warning(f"JSON parse hatası: {e}")
+            # Fallback: Raw response döndür
+            recommendations_json = {"raw_response": ai_response}
+        
+        # Remove any links for non-chat endpoints
+        recommendations_json = sanitize_json_links(recommendations_json)
+
+        # AI mesajını kaydet
+        log_ai_message(
+            external_user_id=x_user_id,
+            message_type="diet_recommendations",
+            request_payload={},
+            response_payload={"recommendations": recommendations_json},
+            model_used="openrouter"
+        )
+        
+        return {
+            "success": True,
+            "message": "Beslenme önerileri hazırlandı",
+            "recommendations": recommendations_json,
+            "disclaimer": "Bu öneriler bilgilendirme amaçlıdır. Tıbbi kararlar için doktorunuza danışın."
+        }
+        
+    except Exception as e:
+        logger.warning(f"Diet recommendations hatası: {e}")
+        raise HTTPException(status_code=500, detail=f"Beslenme önerileri hazırlanırken hata: {str(e)}")
+
+
+@router.post("/ai/premium-plus/exercise-recommendations")
+async def premium_plus_exercise_recommendations(
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    x_user_id: str | None = Header(default=None),
+    x_user_level: int | None = Header(default=None)
+):
+    """Premium Plus kullanıcıları için detaylı egzersiz önerileri"""
+    
+    # Plan kontrolü - Yeni sistem: userLevel bazlı
+    if x_user_level is not None:
+        if x_user_level == 1:
+            user_plan = "free"
+        elif x_user_level == 2:
+            user_plan = "premium"
+        elif x_user_level == 3:
+            user_plan = "premium_plus"
+        else:
+            user_plan = "free"  # Default fallback
+    else:
+        # Eski sistem fallback
+        user_plan = "free"
+    
+    if user_plan != "premium_plus":
+        raise HTTPException(
+            status_code=403, 
+            detail="Bu özellik sadece Premium Plus kullanıcıları için mevcuttur"
+        )
+    
+    # User ID validasyonu
+    if not x_user_id:
+        raise HTTPException(status_code=400, detail="User ID gerekli")
+    
+    # Quiz geçmişi + lab verisi (wellness-plan ile ortak)
+    quiz_messages, lab_tests = await _load_wellness_context(db, x_user_id)
+    
+    # Veri kontrolü - En az bir veri kaynağı olmalı
+    has_quiz_data = quiz_messages and any(msg.request_payload for msg in quiz_messages)
+    has_lab_data = lab_tests and len(lab_tests) > 0
+    
+    if not has_quiz_data and not has_lab_data:
+        raise HTTPException(
+            status_code=400, 
+            detail="Kişiselleştirilmiş egzersiz önerileri için önce quiz yapmanız veya lab sonuçlarınızı paylaşmanız gerekiyor. Lütfen önce sağlık quizini tamamlayın veya lab test sonuçlarınızı girin."
+        )
+    
+    user_context = _build_user_context(quiz_messages, lab_tests)
+    return await _serve_section("exercise", x_user_id, quiz_messages, lab_tests, user_context)
+
+
+async def _generate_exercise(x_user_id: str, quiz_messages, lab_tests, user_context: dict) -> dict:
+    """Egzersiz önerileri: prompt + AI çağrısı + kayıt (hata -> HTTPException 500)"""
+    # System prompt - Sadece egzersiz odaklı
+    system_prompt = f"""Adın Longo - Premium Plus kullanıcıları için özel egzersiz danışmanısın.
+
+GÖREVİN: Kullanıcının sağlık quiz profili ve lab verilerine göre kişiselleştirilmiş DETAYLI egzersiz önerileri ver.
+
+KULLANICI VERİLERİ:
+{str(user_context)}
+
+VERİ ANALİZİ:
+- Quiz sonuçlarından yaş, cinsiyet, sağlık hedefleri, aktivite seviyesi
+- Lab sonuçlarından sağlık durumu ve performans göstergeleri
+- Bu verileri birleştirerek güvenli ve etkili egzersiz planı
+
+YANIT FORMATI - SADECE JSON:
+{{
+  "general_advice": "Kullanıcının durumuna göre genel egzersiz önerisi paragrafı (2-3 cümle)",
+  "lifestyle_tips": {{
+    "sleep_recovery": {{
+      "title": "Uyku ve Toparlanma",
+      "target": "7-9 saat kaliteli uyku",
+      "tips": [
+        "Aynı saatlerde yatıp kalkın",
+        "Yatak odası serin, karanlık ve sessiz olmalı",
+        "Yatmadan 2 saat önce ekran kullanımını azaltın"
+      ]
+    }},
+    "daily_activity": {{
+      "title": "Günlük Aktivite",
+      "tips": [
+        "Günde en az 8000-10000 adım hedefleyin",
+        "Oturma süresini her saat bölün (5 dk hareket)",
+        "Merdiven kullanmayı tercih edin",
+        "Parkta daha uzağa park edin"
+      ]
+    }},
+    "stress_management": {{
+      "title": "Stres Yönetimi",
+      "tips": [
+        "Günlük 10 dakika meditasyon veya nefes egzersizi",
+        "Doğada vakit geçirin",
+        "Hobilerinize zaman ayırın",
+        "Sosyal bağlantılarınızı güçlendirin"
+      ]
+    }},
+    "hydration": {{
+      "title": "Hidrasyon",
+      "tips": [
+        "Günde en az 2-3 litre su için",
+        "Antrenman sırasında sık sık su için",
+        "Kafein alımını dengeleyin"
+      ]
+    }},
+    "consistency": {{
+      "title": "Düzenlilik",
+      "tips": [
+        "Egzersiz rutininize sadık kalın",
+        "Kaçırılan günleri telafi etmeye çalışmayın",
+        "İlerlemenizi kaydedin",
+        "Haftalık hedefler belirleyin"
+      ]
+    }},
+    "body_awareness": {{
+      "title": "Vücut Dinleme",
+      "tips": [
+        "Aşırı yorgunluk hissediyorsanız ekstra dinlenme alın",
+        "Ağrı ve rahatsızlıkları ciddiye alın",
+        "Kademeli ilerleme prensibine uyun",
+        "Overtraining belirtilerine dikkat edin"
+      ]
+    }},
+    "motivation": {{
+      "title": "Motivasyon İpuçları",
+      "tips": [
+        "Gerçekçi hedefler belirleyin",
+        "İlerlemenizi fotoğraflarla kaydedin",
+        "Egzersiz arkadaşı bulun",
+        "Başarılarınızı kutlayın",
+        "Çeşitlilik katın, sıkılmayın"
+      ]
+    }}
+  }}
+}}
+
+ÖNEMLİ KURALLAR:
+- SADECE JSON formatında yanıt ver
+- Markdown kullanma (###, **, - gibi)
+- KESINLIKLE link verme
+- GENEL öneriler ver, spesifik günlük/haftalık program verme
+- Her öneri için NEDEN açıkla
+- Güvenlik öncelikli yaklaşım
+
+DİL: SADECE TÜRKÇE YANIT VER!"""
+
+    # User message'ı hazırla
+    user_message = f"""Kullanıcının mevcut durumu:
+
+KULLANICI BİLGİLERİ:
+"""
+    
+    # Quiz verilerini ekle
+    if user_context:
+        user_message += f"\nQUIZ VERİLERİ:\n"
+        for key, value in user_context.items():
+            if value and key.startswith(('yas', 'cinsiyet', 'hedef', 'aktivite', 'boy', 'kilo', 'quiz_', 'beslenme', 'hastalik', 'ilac')):
+                user_message += f"- {key.upper()}: {value}\n"
+    
+    # Quiz geçmişini ekle
+    if quiz_messages:
+        user_message += f"\nSON SAĞLIK QUIZ PROFİLİ:\n"
+        for msg in quiz_messages[-1:]:  # En son quiz
+            if msg.request_payload:
+                user_message += f"- Quiz verileri: {msg.request_payload}\n"
+    
+    # Lab analizlerini ekle
+    if lab_tests:
+        user_message += f"\nLAB ANALİZLERİ:\n"
+        for test in lab_tests[:5]:  # İlk 5 test
+            user_message += f"- {test.get('name', 'N/A')}: {test.get('value', 'N/A')} ({test.get('reference_range', 'N/A')})\n"
+    
+    user_message += f"""
+
+Lütfen bu kullanıcı için GENEL egzersiz önerileri hazırla. Spesifik günlük/haftalık program verme, genel egzersiz prensipleri ver."""
+
+    # AI çağrısı
+    try:
+        from backend.openrouter_client import async_get_ai_response
+        ai_response = await async_get_ai_response(
+            system_prompt=system_prompt,
+            user_message=user_message,
+            max_tokens=3000  # Exercise recommendations için daha yüksek limit
+        )
+        
+        # JSON parse et
+        import json
+        try:
+            # Markdown code block'ları temizle
+            cleaned_response = ai_response.strip()
+            if cleaned_response.startswith('```json'):
+                json_start = cleaned_response.find('```json') + 7
+                json_end = cleaned_response.find('```', json_start)
+                if json_end != -1:
+                    cleaned_response = cleaned_response[json_start:json_end].strip()
+            elif cleaned_response.startswith('```'):
+                json_start = cleaned_response.find('```') + 3
+                json_end = cleaned_response.find('```', json_start)
+                if json_end != -1:
+                    cleaned_response = cleaned_response[json_start:json_end].strip()
+            
+            recommendations_json = json.loads(cleaned_response)
+        except json.JSONDecodeError as e:
+            logger.warning(f"JSON parse hatası: {e}")
+            # Fallback: Raw response döndür
+            recommendations_json = {"raw_response": ai_response}
+        
+        # Remove any links for non-chat endpoints
+        recommendations_json = sanitize_json_links(recommendations_json)
+
+        # AI mesajını kaydet
+        log_ai_message(
+            external_user_id=x_user_id,
+            message_type="exercise_recommendations",
+            request_payload={},
+            response_payload={"recommendations": recommendations_json},
+            model_used="openrouter"
+        )
+        
+        return {
+            "success": True,
+            "message": "Egzersiz önerileri hazırlandı",
+            "recommendations": recommendations_json,
+            "disclaimer": "Bu öneriler bilgilendirme amaçlıdır. Tıbbi kararlar için doktorunuza danışın."
+        }
+        
+    except Exception as e:
+        logger.warning(f"Exercise recommendations hatası: {e}")
+        raise HTTPException(status_code=500, detail=f"Egzersiz önerileri hazırlanırken hata: {str(e)}")
+
+
+@router.post("/ai/premium-plus/lifestyle-recommendations")
+async def premium_plus_lifestyle_recommendations(
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    x_user_id: str | None = Header(default=None),
+    x_user_level: int | None = Header(default=None)
+):
+    """Premium Plus kullanıcıları için beslenme, spor ve egzersiz önerileri"""
+    
+    # Plan kontrolü - Yeni sistem: userLevel bazlı
+    if x_user_level is not None:
+        if x_user_level == 1:
+            user_plan = "free"
+        elif x_user_level == 2:
+            user_plan = "premium"
+        elif x_user_level == 3:
+            user_plan = "premium_plus"
+        else:
+            user_plan = "free"  # Default fallback
+    else:
+        # Eski sistem fallback
+        user_plan = "free"
+    
+    if user_plan != "premium_plus":
+        raise HTTPException(
+            status_code=403, 
+            detail="Bu özellik sadece Premium Plus kullanıcıları için mevcuttur"
+        )
+    
+    # User ID validasyonu
+    if not x_user_id:
+        raise HTTPException(status_code=400, detail="User ID gerekli")
+    
+    # User tablosu kullanılmıyor - sadece ai_messages ile çalışıyor
+    
+    # Quiz geçmişi + lab verisi (wellness-plan ile ortak)
+    quiz_messages, lab_tests = await _load_wellness_context(db, x_user_id)
+    
+    user_context = _build_user_context(quiz_messages, lab_tests)
+    return await _serve_section("lifestyle", x_user_id, quiz_messages, lab_tests, user_context)
+
+
+async def _generate_lifestyle(x_user_id: str, quiz_messages, lab_tests, user_context: dict) -> dict:
+    """Beslenme, spor ve yaşam tarzı planı (tek JSON: nutrition_plan, exercise_plan, lifestyle_tips)"""
+    # System prompt - Premium Plus özel
+    system_prompt = f"""Adın Longo - Premium Plus kullanıcıları için özel beslenme, spor ve egzersiz danışmanısın.
+
+🎯 GÖREVİN: Kullanıcının sağlık quiz profili ve lab verilerine göre kişiselleştirilmiş beslenme, spor ve egzersiz önerileri ver.
+
+📊 KULLANICI VERİLERİ:
+{str(user_context)}
+
+📊 VERİ ANALİZİ:
+- Quiz sonuçlarından yaş, cinsiyet, sağlık hedefleri, aktivite seviyesi
+- Lab sonuçlarından vitamin/mineral eksiklikleri, sağlık durumu
+- Bu verileri birleştirerek holistik yaklaşım
+
+🏃‍♂️ SPOR/EGZERSİZ ÖNERİLERİ:
+- Kullanıcının yaşına, kondisyonuna ve hedeflerine uygun
+- Haftalık program önerisi (kaç gün, ne kadar süre)
+- Kardiyovasküler, güç antrenmanı, esneklik dengesi
+- Başlangıç seviyesi için güvenli ve sürdürülebilir
+
+🥗 BESLENME ÖNERİLERİ:
+- Lab sonuçlarına göre eksik vitamin/mineraller için besin önerileri
+- Quiz'deki hedeflere uygun makro besin dağılımı
+- Öğün planlama ve porsiyon önerileri
+- Supplement ile beslenme dengesi
+
+⚡ ENERJİ VE PERFORMANS:
+- Egzersiz öncesi/sonrası beslenme
+- Hidrasyon stratejileri
+- Uyku ve recovery önerileri
+
+🚫 KISITLAMALAR:
+- Sadece genel öneriler, tıbbi tavsiye değil
+- Kişisel antrenör veya diyetisyen yerine geçmez
+- Güvenlik öncelikli yaklaşım
+
+💡 YANIT FORMATI:
+1. 📊 MEVCUT DURUM ANALİZİ
+   - Quiz verilerinden çıkarılan sağlık profili
+   - Lab sonuçlarından tespit edilen durum
+   - Risk faktörleri ve öncelikler
+   - Egzersiz kapasitesi değerlendirmesi
+
+2. 🏃‍♂️ DETAYLI EGZERSİZ PROGRAMI
+   - Her egzersiz için NEDEN açıkla
+   - Haftalık program (günler, süreler)
+   - Kardiyovasküler egzersizler
+   - Güç antrenmanı programı
+   - Esneklik ve mobilite egzersizleri
+
+3. 🥗 BESLENME ÖNERİLERİ
+   - Egzersiz öncesi/sonrası beslenme
+   - Hidrasyon stratejileri
+   - Enerji için besin önerileri
+
+4. ⚡ PERFORMANS İPUÇLARI
+   - Egzersiz teknikleri
+   - İlerleme stratejileri
+   - Güvenlik önerileri
+
+5. 📅 HAFTALIK PLAN ÖNERİSİ
+   - Detaylı günlük program
+   - Hedefler ve takip
+
+ÖNEMLİ KURALLAR:
+- KESINLIKLE link verme, sadece metin içeriği ver
+- KESINLIKLE kaynak gösterme, sadece öneriler ver
+- KESINLIKLE URL, web sitesi, kaynak belirtme
+- Temiz ve okunabilir format kullan
+- Detaylı ve kapsamlı analiz yap
+- Her öneri için NEDEN açıkla
+- Uygulanabilir ve pratik öneriler ver
+- Sadece egzersiz önerileri ve programları ver
+
+DİL: SADECE TÜRKÇE YANIT VER!"""
+
+    # User message'ı hazırla
+    user_message = f"""Kullanıcının mevcut durumu:
+
+KULLANICI BİLGİLERİ:
+"""
+    
+    # Quiz verilerini ekle
+    if user_context:
+        user_message += f"\nQUIZ VERİLERİ:\n"
+        for key, value in user_context.items():
+            if value and key.startswith(('yas', 'cinsiyet', 'hedef', 'aktivite', 'boy', 'kilo', 'quiz_', 'beslenme', 'hastalik', 'ilac')):
+                user_message += f"- {key.upper()}: {value}\n"
+    
+    # Quiz geçmişini ekle
+    if quiz_messages:
+        user_message += f"\nSON SAĞLIK QUIZ PROFİLİ:\n"
+        for msg in quiz_messages[-1:]:  # En son quiz
+            if msg.request_payload:
+                user_message += f"- Quiz verileri: {msg.request_payload}\n"
+    
+    # Lab analizlerini ekle
+    if lab_tests:
+        user_message += f"\nLAB ANALİZLERİ:\n"
+        for test in lab_tests[:2]:  # İlk 2 test
+            user_message += f"- {test.get('name', 'N/A')}: {test.get('value', 'N/A')} ({test.get('reference_range', 'N/A')})\n"
+    
+    # Global context'ten tüm verileri ekle
+    if user_context:
+        # Quiz verilerini ekle - TÜM quiz verilerini ekle
+        quiz_data_found = False
+        for key, value in user_context.items():
+            if value and key.startswith(('yas', 'cinsiyet', 'hedef', 'aktivite', 'boy', 'kilo', 'quiz_', 'beslenme', 'hastalik', 'ilac')):
+                if not quiz_data_found:
+                    user_message += f"\nGLOBAL QUIZ VERİLERİ:\n"
+                    quiz_data_found = True
+                user_message += f"- {key.upper()}: {value}\n"
+        
+        # Lab verilerini ekle - TÜM lab verilerini ekle
+        lab_data_found = False
+        for key, value in user_context.items():
+            if value and key.startswith(('lab_', 'son_lab_', 'test_', 'vitamin_', 'mineral_')):
+                if not lab_data_found:
+                    user_message += f"\nGLOBAL LAB VERİLERİ:\n"
+                    lab_data_found = True
+                user_message += f"- {key.upper()}: {value}\n"
+    
+    user_message += f"""
+
+Bu bilgilere göre kullanıcı için kapsamlı beslenme, spor ve egzersiz önerileri hazırla. 
+Kişiselleştirilmiş, sürdürülebilir ve güvenli bir program öner.
+
+ÖNEMLİ: Response'u şu JSON formatında ver:
+
+{{
+  "nutrition_plan": "Beslenme önerileri buraya...",
+  "exercise_plan": "Spor ve egzersiz programı buraya...",
+  "lifestyle_tips": "Yaşam tarzı önerileri buraya..."
+}}
+
+Sadece bu 3 field'ı doldur, başka hiçbir şey ekleme!"""
+
+    # AI'ya gönder
+    try:
+        from backend.openrouter_client import async_get_ai_response
+        
+        reply = await async_get_ai_response(system_prompt, user_message)
+        
+        # AI response'unu parse et
+        try:
+            import json
+            parsed_reply = json.loads(reply)
+            
+            return {
+                "status": "success",
+                "nutrition_plan": parsed_reply.get("nutrition_plan", ""),
+                "exercise_plan": parsed_reply.get("exercise_plan", ""),
+                "lifestyle_tips": parsed_reply.get("lifestyle_tips", ""),
+                "quiz_count": len(quiz_messages) if quiz_messages else 0,
+                "lab_count": len(lab_tests) if lab_tests else 0
+            }
+        except json.JSONDecodeError:
+            # JSON parse edilemezse eski formatı kullan
+            return {
+                "status": "success",
+                "nutrition_plan": reply,
+                "exercise_plan": "",
+                "lifestyle_tips": "",
+                "quiz_count": len(quiz_messages) if quiz_messages else 0,
+                "lab_count": len(lab_tests) if lab_tests else 0
+            }
+        
+    except Exception as e:
+        logger.error(f"Premium Plus lifestyle recommendations error: {e}")
+        raise HTTPException(status_code=500, detail="Öneriler oluşturulurken hata oluştu")
+
+
+# Metabolik Yaş Testi - Premium Plus (Test sonucu analizi)
+WELLNESS_SECTIONS = {
+    "diet": _generate_diet,
+    "exercise": _generate_exercise,
+    "lifestyle": _generate_lifestyle,
+}
+
+
+async def _serve_section(kind: str, x_user_id: str, quiz_messages, lab_tests, user_context: dict) -> dict:
+    """Girdiler (quiz + lab) son üretimden beri değişmediyse saklı öneri, değiştiyse yeniden üret ve sakla"""
+    fingerprint = recommendation_fingerprint(kind, user_context)
+    stored = await load_precomputed(x_user_id, kind, fingerprint)
+    if stored is not None:
+        return stored
+    result = await WELLNESS_SECTIONS[kind](x_user_id, quiz_messages, lab_tests, user_context)
+    await store_precomputed(x_user_id, kind, fingerprint, result)
+    return result
+
+
+async def _precompute_section(kind: str, x_user_id: str):
+    """Arka plan (quiz/lab_summary yazımı sonrası): endpoint ile aynı yol, kullanıcı açtığında hazır olsun"""
+    async with AsyncSessionLocal() as db:
+        quiz_messages, lab_tests = await _load_wellness_context(db, x_user_id)
+    if not quiz_messages and not lab_tests:
+        return
+    await _serve_section(kind, x_user_id, quiz_messages, lab_tests, _build_user_context(quiz_messages, lab_tests))
+
+
+for _kind in WELLNESS_SECTIONS:
+    register_precompute(_kind, functools.partial(_precompute_section, _kind))
+
+
+async def _run_section(name: str, coro):
+    """(bölüm, sonuç, hata mesajı); bir bölümün hatası diğerlerini düşürmesin"""
+    try:
+        return name, await coro, None
+    except HTTPException as e:
+        return name, None, e.detail
+    except Exception as e:
+        logger.warning(f"Wellness plan {name} hatası: {e}")
+        return name, None, str(e)
+
+
+async def _stream_sections(tasks: list[asyncio.Task]):
+    """NDJSON: her bölüm hazır oldukça bir satır, en sonda done satırı"""
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            name, result, error = await next_done
+            line = {"section": name, "data": result} if error is None else {"section": name, "error": error}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+        yield json.dumps({"done": True}) + "\n"
+    finally:
+        # İstemci bağlantıyı kopardıysa kalan LLM çağrıları boşuna beklemesin
+        for task in tasks:
+            task.cancel()
+
+
+@router.post("/ai/premium-plus/wellness-plan")
+async def premium_plus_wellness_plan(
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    x_user_id: str | None = Header(default=None),
+    x_user_level: int | None = Header(default=None),
+    stream: bool = Query(default=False, description="Bölümleri hazır oldukça NDJSON olarak gönder"),
+):
+    """Beslenme + egzersiz + yaşam tarzı tek istekte: context bir kez toplanır, üç AI çağrısı paralel (süre = en yavaşı)"""
+    if get_user_plan_from_headers(x_user_level) != "premium_plus":
+        raise HTTPException(
+            status_code=403, 
+            detail="Bu özellik sadece Premium Plus kullanıcıları için mevcuttur"
+        )
+    
+    # User ID validasyonu
+    if not x_user_id:
+        raise HTTPException(status_code=400, detail="User ID gerekli")
+    
+    quiz_messages, lab_tests = await _load_wellness_context(db, x_user_id)
+    
+    # Veri kontrolü - diet/exercise ile aynı: en az bir veri kaynağı olmalı
+    has_quiz_data = quiz_messages and any(msg.request_payload for msg in quiz_messages)
+    if not has_quiz_data and not lab_tests:
+        raise HTTPException(
+            status_code=400, 
+            detail="Kişiselleştirilmiş wellness planı için önce quiz yapmanız veya lab sonuçlarınızı paylaşmanız gerekiyor. Lütfen önce sağlık quizini tamamlayın veya lab test sonuçlarınızı girin."
+        )
+    
+    user_context = _build_user_context(quiz_messages, lab_tests)
+    tasks = [
+        asyncio.create_task(_run_section(name, _serve_section(name, x_user_id, quiz_messages, lab_tests, user_context)))
+        for name in WELLNESS_SECTIONS
+    ]
+    
+    if stream:
+        return StreamingResponse(_stream_sections(tasks), media_type="application/x-ndjson")
+    
+    plan, errors = {}, {}
+    for name, result, error in await asyncio.gather(*tasks):
+        if error is None:
+            plan[name] = result
+        else:
+            errors[name] = error
+    if not plan:
+        raise HTTPException(status_code=500, detail=f"Wellness planı hazırlanırken hata: {errors}")
+    
+    return {
+        "success": True,
+        "message": "Wellness planı hazırlandı" if not errors else "Wellness planı kısmen hazırlandı",
+        **plan,
+        "errors": errors,
+        "disclaimer": "Bu öneriler bilgilendirme amaçlıdır. Tıbbi kararlar için doktorunuza danışın."
+    }
+
+
+@router.post("/ai/premium-plus/metabolic-age-test")
+async def metabolic_age_test(
+    req: MetabolicAgeTestRequest,
+    current_user: str = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    x_user_id: str | None = Header(default=None),
+    x_user_level: int | None = Header(default=None)
+):
+    """Metabolik yaş testi - Premium Plus kullanıcıları için longevity raporu"""
+    
+    # Plan kontrolü - sadece Premium Plus
+    user_plan = get_user_plan_from_headers(x_user_level)
+    if user_plan != "premium_plus":
+        raise HTTPException(
+            status_code=403, 
+            detail="Bu özellik sadece Premium Plus kullanıcıları için kullanılabilir"
+        )
+    
+    if not x_user_id:
+        raise HTTPException(status_code=400, detail="x-user-id gerekli")
+    
+    # Quiz verilerini al (sadece ek bilgi için) - sadece en son quiz kullanılıyor
+    latest_quiz = get_latest_ai_message(db, x_user_id, "quiz")
+    quiz_data = {}
+    
+    if latest_quiz and latest_quiz.request_payload:
+        quiz_data = latest_quiz.request_payload
+    
+    # Lab verilerini al (sadece ek bilgi için)
+    lab_tests = get_standardized_lab_data(db, x_user_id, limit=20)
+    
+    # Kapsamlı test paneli sayısı (lab_summary): tek aggregate sorgu, payload'lar sadece ilk/son kayıt için
+    comprehensive_test_count = 0
+    first_comprehensive_test = None
+    last_comprehensive_test = None
+    
+    try:
+        lab_summary_stats = get_ai_message_stats(db, x_user_id, "lab_summary")
+        comprehensive_test_count = lab_summary_stats["count"]
+        if comprehensive_test_count >= 2:
+            edges = get_ai_messages_by_ids(db, (lab_summary_stats["first_id"], lab_summary_stats["last_id"]))
+            first_comprehensive_test = edges.get(lab_summary_stats["first_id"])
+            last_comprehensive_test = edges.get(lab_summary_stats["last_id"])
+    except Exception as e:
+        logger.warning(f"Lab summary mesajları alınırken hata: {e}")
+    
+    logger.debug(f"Kapsamlı test sayısı: {comprehensive_test_count}")
+    
+    # Longopass gelişim skoru hesaplama
+    longopass_score = 0
+    longopass_note = "Birden fazla kapsamlı test analizi gerekmektedir"
+    
+    if comprehensive_test_count >= 2:
+        # İlk ve son testleri karşılaştır
+        longopass_note = "İlk ve son kapsamlı test panelleri karşılaştırılarak hesaplandı"
+        logger.debug(
+            "İlk test: %s, Son test: %s",
+            first_comprehensive_test.created_at if first_comprehensive_test else "Yok",
+            last_comprehensive_test.created_at if last_comprehensive_test else "Yok",
+        )
+        # AI'ya bu bilgiyi gönderelim
+    
+    # AI context oluştur - Metabolik yaş testi sonucu + quiz + lab
+    ai_context = f"""
+METABOLİK YAŞ TESTİ SONUCU:
+- Kronolojik Yaş: {req.chronological_age}
+- Metabolik Yaş: {req.metabolic_age}
+- Yaş Farkı: {req.metabolic_age - req.chronological_age} yaş
+- Test Tarihi: {req.test_date or 'Belirtilmemiş'}
+- Test Yöntemi: {req.test_method or 'Belirtilmemiş'}
+- Test Notları: {req.test_notes or 'Yok'}
+"""
+    
+    # Ek veriler varsa ekle
+    if req.additional_data:
+        ai_context += "\nEK TEST VERİLERİ:\n"
+        for key, value in req.additional_data.items():
+            ai_context += f"- {key}: {value}\n"
+
+    ai_context += f"""
+
+QUIZ VERİLERİ (Sağlık Profili):
+- Sağlık Hedefleri: {quiz_data.get('health_goals', 'N/A')}
+- Aile Öyküsü: {quiz_data.get('family_history', 'N/A')}
+- Mevcut İlaçlar: {quiz_data.get('current_medications', 'N/A')}
+- Yaşam Tarzı: {quiz_data.get('lifestyle', 'N/A')}
+- Beslenme: {quiz_data.get('diet', 'N/A')}
+- Uyku Kalitesi: {quiz_data.get('sleep_quality', 'N/A')}
+- Stres Seviyesi: {quiz_data.get('stress_level', 'N/A')}
+- Egzersiz Sıklığı: {quiz_data.get('exercise_frequency', 'N/A')}
+
+LAB TEST SONUÇLARI (Biyokimyasal Durum):
+"""
+    
+    if lab_tests:
+        for test in lab_tests[:5]:  # İlk 5 test
+            ai_context += f"- {test.get('name', 'N/A')}: {test.get('value', 'N/A')} {test.get('unit', '')} (Referans: {test.get('reference_range', 'N/A')})\n"
+    else:
+        ai_context += "Lab test verisi bulunamadı.\n"
+    
+    # Longopass gelişim skoru bilgisi
+    ai_context += f"""
+
+LONGOPASS GELİŞİM SKORU HESAPLAMA:
+- Kapsamlı test paneli sayısı: {comprehensive_test_count}
+- Durum: {'En az 2 test paneli var, karşılaştırma yapılabilir' if comprehensive_test_count >= 2 else 'Henüz yeterli test yok, skor 0 olmalı'}
+"""
+    
+    if comprehensive_test_count >= 2 and first_comprehensive_test and last_comprehensive_test:
+        ai_context += f"""- İlk test tarihi: {first_comprehensive_test.created_at.strftime('%Y-%m-%d') if first_comprehensive_test.created_at else 'Bilinmiyor'}
+- Son test tarihi: {last_comprehensive_test.created_at.strftime('%Y-%m-%d') if last_comprehensive_test.created_at else 'Bilinmiyor'}
+- İlk test verileri: {first_comprehensive_test.response_payload if hasattr(first_comprehensive_test, 'response_payload') else 'Veri yok'}
+- Son test verileri: {last_comprehensive_test.response_payload if hasattr(last_comprehensive_test, 'response_payload') else 'Veri yok'}
+
+ÖNEMLİ: İlk ve son test sonuçlarını karşılaştırarak gelişim skoru hesapla (0-100 arası). İyileşme varsa pozitif skor, kötüleşme varsa düşük skor ver.
+"""
+    else:
+        ai_context += f"""
+ÖNEMLİ: longopass_development_score.value = 0 olmalı (henüz en az 2 kapsamlı test paneli yok)
+"""
+    
+    ai_context += f"""
+
+GÖREV: Bu kullanıcının metabolik yaş testi sonucunu analiz et ve longevity raporu oluştur.
+
+Aşağıdaki JSON formatında yanıt ver:
+
+{{
+    "longevity_report": {{
+        "biological_age": {{
+            "value": {req.metabolic_age},
+            "real_age": {req.chronological_age},
+            "difference": {req.metabolic_age - req.chronological_age},
+            "status": "[X yaş genç/yaşlı veya Optimal]"
+        }},
+        "health_score": {{
+            "value": [0-100 arası],
+            "label": "[Çok İyi/İyi/Orta/Kötü]",
+            "percentile": "[Üst %X'te]"
+        }},
+        "longopass_development_score": {{
+            "value": 0,
+            "note": "Birden fazla kapsamlı test analizi gerekmektedir"
+        }},
+        "metabolic_age": {{
+            "value": [hesaplanan değer],
+            "status": "[Harika/İyi/Orta/Kötü]"
+        }}
+    }},
+    "detailed_analysis": {{
+        "cardiovascular_health": {{
+            "status": "[Mükemmel/İyi/Orta/Kötü]",
+            "metrics": [
+                {{"name": "VO2 Max", "value": "X ml/kg/dk", "status": "✓"}},
+                {{"name": "Dinlenme Nabzı", "value": "X bpm", "status": "✓"}},
+                {{"name": "Kan Basıncı", "value": "X/Y mmHg", "status": "✓"}}
+            ]
+        }},
+        "metabolic_health": {{
+            "status": "[Mükemmel/İyi/Orta/Kötü]",
+            "metrics": [
+                {{"name": "HbA1c", "value": "X%", "status": "✓/⚠️"}},
+                {{"name": "Açlık Glukozu", "value": "X mg/dL", "status": "✓/⚠️"}}
+            ]
+        }},
+        "inflammation_profile": {{
+            "status": "[Mükemmel/İyi/Orta/Kötü]",
+            "metrics": [
+                {{"name": "hs-CRP", "value": "X mg/L", "status": "✓/⚠️"}},
+                {{"name": "Homosistein", "value": "X μmol/L", "status": "✓/⚠️"}}
+            ]
+        }},
+        "hormonal_balance": {{
+            "status": "[Mükemmel/İyi/Orta/Kötü]",
+            "metrics": [
+                {{"name": "Tiroid (TSH)", "value": "X mIU/L", "status": "✓/⚠️"}},
+                {{"name": "Vitamin D", "value": "X ng/mL", "status": "✓/⚠️"}}
+            ]
+        }},
+        "cognitive_health": {{
+            "status": "[Mükemmel/İyi/Orta/Kötü]",
+            "metrics": [
+                {{"name": "B12 Vitamini", "value": "X pg/mL", "status": "✓/⚠️"}},
+                {{"name": "Omega-3 İndeksi", "value": "X%", "status": "✓/⚠️"}}
+            ]
+        }},
+        "body_composition": {{
+            "status": "[Mükemmel/İyi/Orta/Kötü]",
+            "metrics": [
+                {{"name": "BMI", "value": "X", "status": "✓/⚠️"}},
+                {{"name": "Vücut Yağ Oranı", "value": "X%", "status": "✓/⚠️"}},
+                {{"name": "Kas Kütlesi", "value": "İdeal/Düşük/Yüksek", "status": "✓/⚠️"}}
+            ]
+        }}
+    }},
+    "personalized_improvements": [
+        {{
+            "category": "Kategori adı",
+            "recommendation": "Öneri metni",
+            "priority": "high/medium/low"
+        }}
+    ]
+}}
+
+ÖNEMLİ:
+- Metabolik yaş testi sonucunu (kronolojik yaş vs metabolik yaş) analiz et
+- Quiz ve lab verilerini de dikkate alarak longevity skorunu 0-100 arasında ver
+- Risk ve koruyucu faktörleri belirle
+- Kişiselleştirilmiş öneriler ver
+- Gelecek sağlık durumunu tahmin et
+"""
+    
+    # AI çağrısı
+    try:
+        from backend.openrouter_client import get_ai_response
+        ai_response = await get_ai_response(
+            system_prompt="""Sen bir longevity uzmanısın. Kullanıcının metabolik yaş testi sonucunu analiz ederek detaylı longevity raporu oluşturuyorsun.
+
+GÖREV:
+- Verilen JSON formatında MUTLAKA yanıt ver
+- Kullanıcının lab verilerine göre detaylı sağlık kategorilerini (kardiyovasküler, metabolik, enflamasyon vb.) analiz et
+- Her kategori için "status" (Mükemmel/İyi/Orta/Kötü) ve "metrics" listesi oluştur
+- Mevcut lab verilerine göre gerçekçi değerler ver
+
+ÖNEMLİ KURALLAR:
+- SADECE JSON formatında yanıt ver, başka metin ekleme
+- Tüm field'ları doldur (boş bırakma)
+- Lab verilerinde olmayan metrikler için tahmin yap veya "Veri yok" de
+- Status değerleri: Mükemmel, İyi, Orta, Kötü
+- Metrics'te status: ✓ (normal) veya ⚠️ (dikkat)
+
+Sadece JSON formatında yanıt ver.""",
+            user_message=ai_context,
+            max_tokens=2500
+        )
+        
+        # JSON parse et
+        try:
+            # Markdown code block'ları temizle
+            if "```json" in ai_response:
+                ai_response = ai_response.split("```json")[1].split("```")[0]
+            elif "```" in ai_response:
+                ai_response = ai_response.split("```")[1].split("```")[0]
+            
+            # Son } karakterine kadar al
+            last_brace = ai_response.rfind("}")
+            if last_brace != -1:
+                ai_response = ai_response[:last_brace + 1]
+            
+            result = json.loads(ai_response.strip())
+        except json.JSONDecodeError as e:
+            logger.warning("JSON parse hatası: %s, AI Response: %s", e, log_payload(ai_response))
+            # Fallback response - Yeni format
+            result = {
+                "longevity_report": {
+                    "biological_age": {
+                        "value": req.metabolic_age,
+                        "real_age": req.chronological_age,
+                        "difference": req.metabolic_age - req.chronological_age,
+                        "status": "Normal"
+                    },
+                    "health_score": {
+                        "value": 75,
+                        "label": "İyi",
+                        "percentile": "Üst %50'de"
+                    },
+                    "longopass_development_score": {
+                        "value": 0,
+                        "note": "Birden fazla kapsamlı test analizi gerekmektedir"
+                    },
+                    "metabolic_age": {
+                        "value": req.metabolic_age,
+                        "status": "Normal"
+                    }
+                },
+                "detailed_analysis": {
+                    "cardiovascular_health": {"status": "İyi", "metrics": []},
+                    "metabolic_health": {"status": "İyi", "metrics": []},
+                    "inflammation_profile": {"status": "Orta", "metrics": []},
+                    "hormonal_balance": {"status": "İyi", "metrics": []},
+                    "cognitive_health": {"status": "İyi", "metrics": []},
+                    "body_composition": {"status": "İyi", "metrics": []}
+                },
+                "personalized_improvements": [
+                    {"category": "Yaşam Tarzı", "recommendation": "Düzenli egzersiz ve dengeli beslenme", "priority": "high"}
+                ]
+            }
+        
+        # Response oluştur - Yeni format
+        response_data = {
+            "success": True,
+            "message": "Longevity raporu hazırlandı",
+            "report": result,
+            "disclaimer": "Bu analiz bilgilendirme amaçlıdır. Tıbbi kararlar için doktorunuza danışın."
+        }
+        
+        # AI mesajını kaydet
+        log_ai_message(
+            external_user_id=x_user_id,
+            message_type="metabolic_age_test",
+            request_payload=req.model_dump(),
+            response_payload=response_data,
+            model_used="metabolic_age_ai"
+        )
+        
+        return response_data
+        
+    except Exception as e:
+        logger.error(f"Metabolik yaş testi hatası: {e}")
+        raise HTTPException(status_code=500, detail=f"Metabolik yaş analizi sırasında hata: {str(e)}")
+
+
+# Video Call Endpoints
+@router.post("/ai/premium-plus/video-call/join")
+async def join_video_call(
+    payload: dict = Body(...),
+    current_user: str = Depends(get_current_user),
+    x_user_id: str | None = Header(default=None),
+    x_user_level: int | None = Header(default=None)
+):
+    """Video call'a katılmak için Daily.co token oluştur"""
+    try:
+        # Premium Plus kontrolü
+        user_plan = get_user_plan_from_headers(x_user_level)
+        if user_plan != "premium_plus":
+            raise HTTPException(status_code=403, detail="Bu özellik sadece Premium Plus üyeler için")
+        
+        meeting_id = payload.get("meeting_id")
+        if not meeting_id:
+            raise HTTPException(status_code=400, detail="meeting_id gerekli")
+        
+        # Daily.co API key (environment variable'dan alınacak)
+        daily_api_key = os.getenv("DAILY_API_KEY")
+        logger.debug("Daily API Key var mı: %s", bool(daily_api_key))
+        if not daily_api_key:
+            raise HTTPException(status_code=500, detail="Daily.co API key bulunamadı")
+        
+        # Mock room name (gerçekte database'den alınacak)
+        room_name = f"longopass-meeting-{meeting_id}"
+        
+        # Daily.co meeting token oluştur
+        import requests
+        logger.debug("Room name: %s", room_name)
+        
+        token_response = requests.post(
+            "https://api.daily.co/v1/meeting-tokens",
+            headers={
+                "Authorization": f"Bearer {daily_api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "properties": {
+                    "room_name": room_name,
+                    "is_owner": False,
+                    "user_name": "Hasta"
+                }
+            }
+        )
+        
+        logger.debug("Daily.co response status: %s, body: %s", token_response.status_code, log_payload(token_response.text))
+        
+        if token_response.status_code != 200:
+            raise HTTPException(status_code=500, detail=f"Daily.co token oluşturulamadı: {token_response.status_code} - {token_response.text}")
+        
+        token_data = token_response.json()
+        logger.debug("Token data: %s", log_payload(token_data))
+        
+        return {
+            "success": True,
+            "meetingUrl": f"https://longopass.daily.co/{room_name}",
+            "token": token_data.get("token")
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Video call hatası: {str(e)}")
@@ -0,0 +1,275 @@
+"""Quiz analizi endpoint'i"""
+from backend.auth import get_db, get_current_user, validate_chat_user_id
+from fastapi import APIRouter, Depends, HTTPException, Header
+from sqlalchemy.orm import Session
+import json
+from backend.config import AVAILABLE_TESTS
+from backend.schemas import QuizRequest, QuizResponse
+from backend.orchestrator import parallel_quiz_analyze
+from backend.utils import parse_json_safe, get_user_plan_from_headers
+from backend.ai_log_writer import log_ai_message
+from backend.log_utils import get_logger, log_payload
+from backend.precompute import on_ai_message_written
+from backend.routers.common import sanitize_json_links, get_xml_products
+
+logger = get_logger("quiz")
+router = APIRouter()
+
+
+# ---------- ANALYZE (FREE: one-time), LAB ----------
+
+
+@router.post("/ai/quiz", response_model=QuizResponse)
+async def analyze_quiz(body: QuizRequest,
+                 current_user: str = Depends(get_current_user),
+                 db: Session = Depends(get_db),
+                 x_user_id: str | None = Header(default=None),
+                 x_user_level: int | None = Header(default=None)):
+    """Quiz endpoint - Sadece AI model işlemi, asıl site entegrasyonu için optimize edildi"""
+    
+    # Logger tanımla
+    
+    # Plan kontrolü
+    user_plan = get_user_plan_from_headers(x_user_level)
+    
+    # User ID validasyonu (Free: Session ID, Premium: Real ID)
+    if not validate_chat_user_id(x_user_id or "", user_plan):
+        raise HTTPException(status_code=400, detail="Premium kullanıcılar için gerçek user ID gerekli")
+    
+    # User tablosu kullanılmıyor - sadece ai_messages ile çalışıyor
+    
+    # Quiz data'yı dict'e çevir ve validate et - TAMAMEN ESNEK
+    logger.debug("Quiz body: %s", log_payload(body.quiz_answers))
+    
+    # Eğer quiz_answers boşsa, body'nin kendisini kullan
+    if body.quiz_answers:
+        quiz_dict = validate_input_data(body.quiz_answers, [])
+    else:
+        # Body'nin kendisini kullan (quiz_answers field'ı yoksa)
+        body_dict = body.dict()
+        body_dict.pop('available_supplements', None)  # Supplement field'ını çıkar
+        quiz_dict = validate_input_data(body_dict, [])
+    
+    # XML'den supplement listesini al (eğer body'de yoksa) - GÜNCEL ÜRÜNLER
+    xml_products = get_xml_products()
+    supplements_dict = body.available_supplements or xml_products
+    
+    # Use parallel quiz analysis with supplements
+    res = parallel_quiz_analyze(quiz_dict, supplements_dict)
+    final_json = res["content"]
+    
+    data = parse_json_safe(final_json) or {}
+    # Remove any links for non-chat endpoints
+    try:
+        data = sanitize_json_links(data)
+    except Exception:
+        pass
+    
+    # product_id -> productId dönüştür ve ürün adına ID ekle (eskiden olduğu gibi)
+    try:
+        supplement_recommendations = data.get("supplement_recommendations", [])
+        if isinstance(supplement_recommendations, list):
+            for item in supplement_recommendations:
+                if not isinstance(item, dict):
+                    continue
+                product_id = item.get("product_id")
+                if product_id:
+                    # Integer'a çevir (sepete ekleme için)
+                    try:
+                        item["productId"] = int(product_id)
+                    except (ValueError, TypeError):
+                        item["productId"] = str(product_id)
+                    
+                    # Ürün adına ID ekle (eskiden olduğu gibi: "Probiyotik (ID: 181)")
+                    product_name = item.get("name", "")
+                    if product_name and f"(ID: {product_id})" not in product_name:
+                        item["name"] = f"{product_name} (ID: {product_id})"
+    except Exception:
+        pass
+
+    if not data:
+        # Fallback: Default response döndür
+        data = {
+            "success": True,
+            "message": "Quiz analizi tamamlandı",
+            "nutrition_advice": {
+                "title": "Beslenme Önerileri",
+                "recommendations": [
+                    "Dengeli beslenme programı uygulayın",
+                    "Bol sebze ve meyve tüketin",
+                    "Yeterli protein alımına dikkat edin"
+                ]
+            },
+            "lifestyle_advice": {
+                "title": "Yaşam Tarzı Önerileri",
+                "recommendations": [
+                    "Düzenli egzersiz yapın",
+                    "Yeterli uyku alın",
+                    "Stres yönetimi teknikleri uygulayın"
+                ]
+            },
+            "general_warnings": {
+                "title": "Genel Uyarılar",
+                "warnings": [
+                    "Doktorunuza danışmadan supplement kullanmayın",
+                    "Alerjik reaksiyonlara dikkat edin"
+                ]
+            },
+            "supplement_recommendations": [
+                {
+                    "name": "D Vitamini",
+                    "description": "Kemik sağlığı ve bağışıklık için",
+                    "daily_dose": "600-800 IU (doktorunuza danışın)",
+                    "benefits": ["Kalsiyum emilimini artırır", "Bağışıklık güçlendirir"],
+                    "warnings": ["Yüksek dozlarda toksik olabilir"],
+                    "priority": "high"
+                },
+                {
+                    "name": "Omega-3",
+                    "description": "Kalp ve beyin sağlığı için",
+                    "daily_dose": "1000-2000 mg (doktorunuza danışın)",
+                    "benefits": ["Kalp sağlığını destekler", "Beyin fonksiyonlarını artırır"],
+                    "warnings": ["Kan sulandırıcı ilaçlarla etkileşebilir"],
+                    "priority": "high"
+                }
+            ],
+            "disclaimer": "Bu içerik bilgilendirme amaçlıdır; tıbbi tanı/tedavi için hekiminize başvurun."
+        }
+    
+    
+    # Log to ai_messages
+    try:
+        log_ai_message(
+            external_user_id=x_user_id,
+            message_type="quiz",
+            request_payload=quiz_dict,
+            response_payload=data,
+            model_used="openrouter"
+        )
+        # Quiz profili değişti: premium-plus ve test önerileri arka planda yeniden üretilsin
+        on_ai_message_written(x_user_id, "quiz", user_plan)
+    except Exception as e:
+        pass  # Silent fail for production
+    
+    # Test recommendations ekle (sadece premium+ kullanıcılar için)
+    logger.debug("User plan: %s", user_plan)
+    if user_plan in ["premium", "premium_plus"]:
+        try:
+            # Quiz verisini al (yeni gönderilen veri)
+            logger.debug("Quiz dict: %s", log_payload(quiz_dict))
+            if quiz_dict:
+                # Quiz verisini AI'ya gönder
+                quiz_info_parts = []
+                for key, value in quiz_dict.items():
+                    if isinstance(value, list):
+                        quiz_info_parts.append(f"{key}: {', '.join(map(str, value))}")
+                    else:
+                        quiz_info_parts.append(f"{key}: {value}")
+                user_info = f"Quiz verileri: {', '.join(quiz_info_parts)}\n"
+                
+                # Mevcut test listesini al
+                from backend.config import AVAILABLE_TESTS
+                available_tests_info = "\n".join([
+                    f"- {test['test_name']} ({test['category']}): {test['description']}"
+                    for test in AVAILABLE_TESTS
+                ])
+                
+                ai_context = f"""
+KULLANICI QUIZ CEVAPLARI:
+{user_info}
+
+MEVCUT TEST LİSTESİ (Sadece bunlardan seç):
+{available_tests_info}
+
+GÖREV: Quiz cevaplarına göre yukarıdaki listeden test öner. Maksimum 3 test öner.
+
+KURALLAR:
+- Aile hastalık geçmişi varsa ilgili testleri öner
+- Yaş/cinsiyet risk faktörlerini değerlendir
+- Sadece gerekli testleri öner
+- Sadece yukarıdaki listeden seç
+
+ÖNEMLİ: 
+- Ailede diyabet varsa Şeker ve Diyabet Testi öner
+- Ailede kalp hastalığı varsa Lipid ve Kolesterol Testi öner
+- Yaş 40+ ise Vitamin ve Mineral Seviyeleri Testi öner
+- Yaş 50+ ise Tümör Belirteçleri Testi öner
+- Sadece gerçekten gerekli olan testleri öner
+
+JSON formatında yanıt ver:
+{{"recommended_tests": [{{"test_name": "Test Adı", "reason": "Neden önerildiği", "benefit": "Faydası"}}]}}
+"""
+                
+                from backend.openrouter_client import get_ai_response
+                ai_response = await get_ai_response(
+                    system_prompt="Sen bir sağlık danışmanısın. Kullanıcının verilerine göre test önerileri yapıyorsun. KESINLIKLE link verme, sadece metin içeriği ver. Sadece JSON formatında kısa ve öz cevap ver.",
+                    user_message=ai_context
+                )
+                
+                # Debug: AI response'u log et
+                logger.debug("Quiz AI response: %s", log_payload(ai_response))
+                
+                # AI response'unu parse et
+                import json
+                try:
+                    cleaned_response = ai_response.strip()
+                    if cleaned_response.startswith('```json'):
+                        json_start = cleaned_response.find('```json') + 7
+                        json_end = cleaned_response.find('```', json_start)
+                        if json_end != -1:
+                            cleaned_response = cleaned_response[json_start:json_end].strip()
+                        else:
+                            cleaned_response = cleaned_response[json_start:].strip()
+                    elif cleaned_response.startswith('```'):
+                        json_start = cleaned_response.find('```') + 3
+                        json_end = cleaned_response.find('```', json_start)
+                        if json_end != -1:
+                            cleaned_response = cleaned_response[json_start:json_end].strip()
+                        else:
+                            cleaned_response = cleaned_response[json_start:].strip()
+                    
+                    cleaned_response = cleaned_response.replace('\n', ' ').replace('\r', '')
+                    if not cleaned_response.strip().endswith('}'):
+                        last_brace = cleaned_response.rfind('}')
+                        if last_brace != -1:
+                            cleaned_response = cleaned_response[:last_brace + 1]
+                        else:
+                            cleaned_response = '{"recommended_tests": []}'
+                    
+                    parsed_response = json.loads(cleaned_response)
+                    if "recommended_tests" in parsed_response:
+                        recommended_tests = parsed_response["recommended_tests"][:3]
+                        
+                        # Response oluştur
+                        test_rec_response = {
+                            "title": "Test Önerileri",
+                            "recommended_tests": recommended_tests,
+                            "analysis_summary": "Quiz verilerine göre analiz tamamlandı",
+                        }
+                        
+                        data["test_recommendations"] = test_rec_response
+                except Exception as parse_error:
+                    logger.error(f"Quiz test recommendations parse hatası: {parse_error}")
+                    
+        except Exception as e:
+            logger.error(f"Quiz test recommendations hatası: {e}")
+    
+    # Return quiz response
+    return data
+
+
+# Input validation helper
+def validate_input_data(data: dict, required_fields: list = None) -> dict:
+    """Input data validation for production - TAMAMEN ESNEK"""
+    if not data:
+        data = {}
+    
+    # Required fields için default değer ata (ama strict validation yapma)
+    if required_fields:
+        for field in required_fields:
+            if field not in data:
+                data[field] = None
+    
+    # Her türlü input'u kabul et (string, int, float, dict, list)
+    # Pydantic schema'lar zaten extra = "allow" ile esnek
+    return data
@@ -0,0 +1,72 @@
+"""Widget asset'leri ve ana site için supplements XML feed'i"""
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, RedirectResponse, Response
+import time
+from backend.cache_utils import cache_supplements
+from backend.config import WIDGET_CACHE_MAX_AGE
+from backend.routers.common import get_xml_products
+from backend.widget_assets import widget_assets, choose_encoding, etag_matches
+
+router = APIRouter()
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+
+@router.get("/widget/manifest.json")
+def widget_manifest():
+    """Kararlı isim -> fingerprint'li URL; ana site immutable URL'leri buradan alır"""
+    return JSONResponse(widget_assets.manifest(), headers={"Cache-Control": "no-cache"})
+
+
+@router.api_route("/widget/{filename}", methods=["GET", "HEAD"], include_in_schema=False)
+def widget_asset(filename: str, request: Request):
+    """Widget dosyaları bellekten: ETag/304, önceden sıkıştırılmış br/gzip, fingerprint'li URL'de immutable cache"""
+    asset, fingerprinted, stale = widget_assets.resolve(filename)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if stale:
+        return RedirectResponse(f"/widget/{asset.fingerprinted}", status_code=302, headers={"Cache-Control": "no-cache"})
+
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE if fingerprinted else f"public, max-age={WIDGET_CACHE_MAX_AGE}",
+        "Vary": "Accept-Encoding",
+    }
+    encoding = choose_encoding(request.headers.get("accept-encoding"), asset)
+    body, headers["ETag"] = asset.variants[encoding] if encoding else (asset.body, asset.etag)
+    if etag_matches(request.headers.get("if-none-match"), asset):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(len(body))
+        return Response(media_type=asset.content_type, headers=headers)
+    return Response(body, media_type=asset.content_type, headers=headers)
+
+
+@router.get("/api/supplements.xml")
+@cache_supplements(ttl_seconds=3600)  # 1 saat cache
+def get_supplements_xml():
+    """XML feed endpoint - Ana site için supplement listesi"""
+    # Gerçek supplement verileri (XML'den - güncel)
+    supplements = get_xml_products()
+    
+    # XML oluştur
+    xml_content = f"""<?xml version="1.0" encoding="UTF-8"?>
+<supplements>
+    <total_count>{len(supplements)}</total_count>
+    <last_updated>{time.strftime('%Y-%m-%d %H:%M:%S')}</last_updated>
+    <products>"""
+    
+    for supplement in supplements:
+        xml_content += f"""
+        <product id="{supplement['id']}">
+            <name>{supplement['name']}</name>
+            <category>{supplement['category']}</category>
+            <available>true</available>
+        </product>"""
+    
+    xml_content += """
+    </products>
+</supplements>"""
+    
+    return Response(xml_content, media_type="application/xml")
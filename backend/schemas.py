@@ -197,6 +197,14 @@ class LabAnalysisResponse(BaseModel):
     class Config:
         extra = "allow"
 
+class LabBatchResponse(BaseModel):
+    title: str = "Toplu Test Sonucu Yorumu"
+    test_count: int = 0
+    results: List[LabAnalysisResponse] = Field(default_factory=list, description="Gönderilen sırayla test bazlı yorumlar")
+    
+    class Config:
+        extra = "allow"
+
 class SingleSessionResponse(BaseModel):
     title: str = "Test Seansı Analizi"
     session_info: Optional[Dict[str, Any]] = Field(default_factory=dict)
@@ -0,0 +1,294 @@
+"""Process içi request tracing (span ağacı).
+
+Span'ler contextvar ile yayılır: middleware her istek için kök span açar;
+handler, orchestrator, openrouter_client ve DB cursor span'leri onun
+altına düşer. Kök span bitince trace en yavaş TRACE_SLOW_MAX trace'i
+tutan buffer'a girer (/ai/admin/traces/slow). TRACE_EXPORT_PATH set
+edilirse TRACE_EXPORT_MIN_MS üstündeki trace'ler arka plan thread'inde
+OTLP/JSON satırları olarak dosyaya eklenir (collector otlpjsonfile
+receiver'ı ile okunabilir).
+"""
+import contextvars
+import functools
+import heapq
+import inspect
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+# backend.db da import ettiği için config yerine env (config OPENROUTER_API_KEY ister)
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+TRACE_SLOW_MAX = int(os.getenv("TRACE_SLOW_MAX", "50"))  # Saklanan en yavaş trace sayısı
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "500"))  # Trace başına span limiti
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")  # OTLP/JSON lines dosyası (boşsa export yok)
+TRACE_EXPORT_MIN_MS = float(os.getenv("TRACE_EXPORT_MIN_MS", "1000"))  # Bu süreden uzun trace'ler export edilir
+
+_current: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("current_span", default=None)
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "dropped")
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: list[Span] = []
+        self.dropped = 0
+
+
+class Span:
+    __slots__ = ("name", "trace", "span_id", "parent_id", "start_ns", "end_ns", "attrs", "error")
+
+    def __init__(self, name: str, trace: Trace, parent_id: str | None, attrs: dict):
+        self.name = name
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attrs = attrs
+        self.error: str | None = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self, **attrs):
+        if attrs:
+            self.attrs.update(attrs)
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+    def finish(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def _new_span(name: str, attrs: dict) -> Span:
+    parent = _current.get()
+    if parent is None:
+        return Span(name, Trace(), None, attrs)
+    trace = parent.trace
+    if len(trace.spans) >= TRACE_MAX_SPANS:
+        # Büyük döngülerde (ör. 100 satır DB taraması) trace sınırsız büyümesin
+        trace.dropped += 1
+        return None
+    return Span(name, trace, parent.span_id, attrs)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """with span("xml_fetch", url=...) as s: ... - aktif trace yoksa yeni kök span açar"""
+    if not TRACE_ENABLED:
+        yield _NOOP
+        return
+    s = _new_span(name, attrs)
+    if s is None:
+        yield _NOOP
+        return
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        s.finish()
+        _current.reset(token)
+        s.trace.spans.append(s)
+        if s.parent_id is None:
+            _collector.submit(s)
+
+
+def child_span(name: str, **attrs):
+    """Context'e girmeyen yaprak span (DB cursor event'leri gibi başla/bitir çiftleri için).
+
+    Aktif trace yoksa None döner; çağıran finish() çağırıp end_child_span'e verir.
+    """
+    if not TRACE_ENABLED or _current.get() is None:
+        return None
+    return _new_span(name, attrs)
+
+
+def end_child_span(s: "Span | None", error: str | None = None):
+    if s is None:
+        return
+    s.error = error
+    s.finish()
+    s.trace.spans.append(s)
+
+
+def current_span():
+    return _current.get() or _NOOP
+
+
+def traced(name: str | None = None):
+    """Fonksiyonu span ile sar (sync ve async)"""
+    def decorator(fn):
+        span_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---------- Toplama / export ----------
+
+def trace_to_dict(root: Span) -> dict:
+    """Span listesini parent->children ağacına çevir"""
+    spans = list(root.trace.spans)
+    children: dict[str | None, list[Span]] = {}
+    for s in spans:
+        children.setdefault(s.parent_id, []).append(s)
+
+    def node(s: Span) -> dict:
+        kids = sorted(children.get(s.span_id, []), key=lambda c: c.start_ns)
+        item = {
+            "name": s.name,
+            "span_id": s.span_id,
+            "start_offset_ms": round((s.start_ns - root.start_ns) / 1e6, 3),
+            "duration_ms": round(s.duration_ms, 3),
+        }
+        if s.attrs:
+            item["attrs"] = s.attrs
+        if s.error:
+            item["error"] = s.error
+        if kids:
+            item["children"] = [node(k) for k in kids]
+        return item
+
+    return {
+        "trace_id": root.trace.trace_id,
+        "name": root.name,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(root.start_ns / 1e9)) + "Z",
+        "duration_ms": round(root.duration_ms, 3),
+        "span_count": len(spans),
+        "dropped_spans": root.trace.dropped,
+        "root": node(root),
+    }
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def trace_to_otlp(root: Span) -> dict:
+    """OTLP/JSON ExportTraceServiceRequest"""
+    spans = []
+    for s in list(root.trace.spans):
+        item = {
+            "traceId": root.trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 2 if s.parent_id is None else 1,  # SERVER / INTERNAL
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns or s.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attrs.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "longopass-ai"}}]},
+            "scopeSpans": [{"scope": {"name": "backend.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+class _SlowTraceCollector:
+    """En yavaş N kök span'i min-heap'te tutar; export'u arka plan thread'ine bırakır"""
+
+    def __init__(self, capacity: int, export_path: str | None, export_min_ms: float):
+        self.capacity = capacity
+        self.export_path = export_path
+        self.export_min_ms = export_min_ms
+        self._heap: list[tuple[float, int, Span]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._export_queue: queue.Queue = queue.Queue(maxsize=1000)
+        self._export_thread: threading.Thread | None = None
+
+    def submit(self, root: Span):
+        duration = root.duration_ms
+        with self._lock:
+            item = (duration, next(self._seq), root)
+            if len(self._heap) < self.capacity:
+                heapq.heappush(self._heap, item)
+            elif duration > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+        if self.export_path and duration >= self.export_min_ms:
+            self._ensure_exporter()
+            try:
+                self._export_queue.put_nowait(root)
+            except queue.Full:
+                pass
+
+    def slowest(self, limit: int) -> list[dict]:
+        with self._lock:
+            items = sorted(self._heap, key=lambda x: x[0], reverse=True)[:limit]
+        return [trace_to_dict(root) for _, _, root in items]
+
+    def clear(self):
+        with self._lock:
+            self._heap.clear()
+
+    def _ensure_exporter(self):
+        if self._export_thread and self._export_thread.is_alive():
+            return
+        with self._lock:
+            if self._export_thread and self._export_thread.is_alive():
+                return
+            self._export_thread = threading.Thread(target=self._export_loop, name="trace-exporter", daemon=True)
+            self._export_thread.start()
+
+    def _export_loop(self):
+        while True:
+            root = self._export_queue.get()
+            try:
+                with open(self.export_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace_to_otlp(root), ensure_ascii=False, default=str) + "\n")
+            except Exception as e:
+                from backend.log_utils import get_logger  # log_utils metrics -> tracing import ediyor
+                get_logger("tracing").warning(f"trace export hatası ({self.export_path}): {e}")
+
+
+_collector = _SlowTraceCollector(TRACE_SLOW_MAX, TRACE_EXPORT_PATH, TRACE_EXPORT_MIN_MS)
+
+
+def slowest_traces(limit: int = 20) -> list[dict]:
+    return _collector.slowest(limit)
+
+
+def clear_traces():
+    _collector.clear()
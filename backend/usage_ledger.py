@@ -0,0 +1,161 @@
+"""OpenRouter token / maliyet ledger'ı.
+
+call_chat_model her yanıttaki usage bloğunu buraya bildirir. Kayıtlar
+bellekte (gün, endpoint, model, plan, kullanıcı) anahtarıyla toplanır ve
+USAGE_LEDGER_FLUSH_S'de bir tek upsert ile llm_usage_daily tablosuna
+eklenir; istek yolunda DB yazımı yoktur. Endpoint ve kullanıcı bilgisi
+request middleware'inin set ettiği ASGI scope'tan okunur.
+"""
+import atexit
+import datetime
+import threading
+
+from backend.config import USAGE_LEDGER_ENABLED, USAGE_LEDGER_FLUSH_S, MODEL_PRICES_PER_MTOK
+from backend.db import SessionLocal, upsert_llm_usage
+from backend.metrics import current_scope, route_label
+from backend.prompt_layout import cached_prompt_tokens
+from backend.utils import get_user_plan_from_headers
+from backend.log_utils import get_logger
+
+logger = get_logger("usage_ledger")
+
+
+def estimate_cost_usd(model: str, usage: dict) -> float:
+    """OpenRouter usage.cost döndürdüyse onu, yoksa config fiyat tablosunu kullan"""
+    cost = usage.get("cost")
+    if cost is not None:
+        try:
+            return float(cost)
+        except (TypeError, ValueError):
+            pass
+    prompt_price, completion_price = MODEL_PRICES_PER_MTOK.get(model, (0.0, 0.0))
+    prompt = usage.get("prompt_tokens") or 0
+    completion = usage.get("completion_tokens") or 0
+    return (prompt * prompt_price + completion * completion_price) / 1_000_000
+
+
+def _request_identity(scope: dict | None) -> tuple[str, str, str]:
+    """(endpoint, plan, external_user_id) - request dışı çağrılarda ("-", "unknown", "")"""
+    if scope is None:
+        return "-", "unknown", ""
+    user_id, level = "", None
+    for name, value in scope.get("headers") or ():
+        if name == b"x-user-id":
+            user_id = value.decode("latin-1")
+        elif name == b"x-user-level":
+            try:
+                level = int(value)
+            except ValueError:
+                level = None
+    return route_label(scope), get_user_plan_from_headers(level), user_id
+
+
+class UsageLedger:
+    """Bellekte toplayıp periyodik olarak llm_usage_daily'ye upsert eden ledger"""
+
+    def __init__(self, flush_s: float):
+        self.flush_interval = max(flush_s, 0.1)
+        self._pending: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Flush thread'ini başlat (idempotent)"""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="usage-ledger", daemon=True)
+            self._thread.start()
+
+    def record(self, model: str, usage: dict, endpoint: str, user_plan: str, external_user_id: str):
+        prompt = int(usage.get("prompt_tokens") or 0)
+        completion = int(usage.get("completion_tokens") or 0)
+        cost = estimate_cost_usd(model, usage)
+        cached = cached_prompt_tokens(usage)
+        key = (datetime.datetime.utcnow().date(), endpoint, model, user_plan, external_user_id or "")
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = [0, 0, 0, 0.0, 0, 0]
+            entry[0] += 1
+            entry[1] += prompt
+            entry[2] += completion
+            entry[3] += cost
+            entry[4] = max(entry[4], prompt)
+            entry[5] += cached
+        if not self._stop.is_set():
+            self.start()
+
+    def pending_keys(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Biriken toplamları tek upsert ile yaz; hata olursa bir sonraki flush'a geri koy"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            rows = [
+                {
+                    "day": day,
+                    "endpoint": endpoint,
+                    "model": model,
+                    "user_plan": plan,
+                    "external_user_id": user_id,
+                    "requests": requests,
+                    "prompt_tokens": prompt,
+                    "completion_tokens": completion,
+                    "cost_usd": cost,
+                    "max_prompt_tokens": max_prompt,
+                    "cached_prompt_tokens": cached,
+                }
+                for (day, endpoint, model, plan, user_id), (requests, prompt, completion, cost, max_prompt, cached) in pending.items()
+            ]
+            db = SessionLocal()
+            try:
+                upsert_llm_usage(db, rows)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"llm_usage_daily yazılamadı ({len(rows)} satır), sonraki flush'ta tekrar denenecek: {e}")
+                with self._lock:
+                    for key, values in pending.items():
+                        entry = self._pending.setdefault(key, [0, 0, 0, 0.0, 0, 0])
+                        for i in (0, 1, 2, 3, 5):
+                            entry[i] += values[i]
+                        entry[4] = max(entry[4], values[4])
+            finally:
+                db.close()
+
+    def stop(self, timeout: float = 10.0):
+        """Shutdown: thread'i durdur ve kalan toplamları yaz"""
+        self._stop.set()
+        thread = self._thread
+        if thread and thread.is_alive():
+            thread.join(timeout=timeout)
+        self.flush()
+
+
+usage_ledger = UsageLedger(flush_s=USAGE_LEDGER_FLUSH_S)
+atexit.register(usage_ledger.stop)
+
+
+def record_usage(model: str, usage: dict | None):
+    """call_chat_model'den: usage bloğunu aktif request'in endpoint/plan/kullanıcısıyla ledger'a ekle"""
+    if not USAGE_LEDGER_ENABLED or not usage:
+        return
+    try:
+        endpoint, plan, user_id = _request_identity(current_scope.get())
+        usage_ledger.record(model, usage, endpoint, plan, user_id)
+    except Exception as e:
+        # Ledger hatası LLM yanıtını asla bozmasın
+        logger.warning(f"usage ledger kaydı atlandı: {e}")
@@ -1,7 +1,9 @@
 import json
 import time
 from typing import Tuple
+from backend.metrics import timed_stage
 
+@timed_stage("json_repair")
 def parse_json_safe(text: str):
     try:
         # Clean markdown code blocks
@@ -650,3 +652,18 @@ def detect_message_type(message: str) -> str:
         return "preference"
     
     return "general"
+
+def get_user_plan_from_headers(x_user_level: int | None) -> str:
+    """Header'lardan user plan'ı belirle - sadece x_user_level kullan"""
+    if x_user_level is not None:
+        if x_user_level == 1:
+            return "free"
+        elif x_user_level == 2:
+            return "premium"
+        elif x_user_level == 3:
+            return "premium_plus"
+        else:
+            return "free"  # Default fallback
+    else:
+        # x_user_level gelmezse (üye değilse) free olarak kabul et
+        return "free"
@@ -0,0 +1,144 @@
+"""Startup warm-up ve readiness (/ready).
+
+Deploy sonrası ilk isteğin ödediği maliyetler (XML katalog çekimi,
+OpenRouter TLS handshake'i, DB havuzu açılışı, statik prompt render'ı,
+widget asset'lerinin sıkıştırılması) startup'ta arka planda ödenir. /health sadece process'in ayakta olduğunu
+söyler; /ready warm-up bitene kadar 503 döner, load balancer trafiği sadece
+ısınmış worker'lara yollar. Zorunlu adım (DB) başarısızsa worker hazır
+sayılmaz; diğer adımların hatası raporlanır ama readiness'i engellemez
+(ilk istek aynı işi tekrar dener).
+"""
+import asyncio
+import time
+
+from backend.config import WARMUP_ENABLED, WARMUP_DB_CONNECTIONS, WARMUP_STEP_TIMEOUT_S
+from backend.log_utils import get_logger
+from backend.metrics import REGISTRY, CallbackMetric
+
+logger = get_logger("warmup")
+
+
+class WarmupState:
+    def __init__(self):
+        self.status = "pending"  # pending, warming, ready, failed, draining
+        self.steps: dict[str, dict] = {}
+        self.started_at: float | None = None
+        self.duration_ms: float | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def snapshot(self) -> dict:
+        return {
+            "status": self.status,
+            "ready": self.ready,
+            "duration_ms": self.duration_ms,
+            "steps": dict(self.steps),
+        }
+
+
+state = WarmupState()
+
+REGISTRY.register(CallbackMetric(
+    "longo_ready", "Worker warm-up'ı bitirip trafik almaya hazır mı (1/0)", (), lambda: {(): int(state.ready)},
+))
+
+
+# ---------- Adımlar ----------
+
+def _warm_db() -> dict:
+    from backend.db import warm_pools
+    return {"connections": warm_pools(WARMUP_DB_CONNECTIONS)}
+
+
+async def _warm_async_db() -> dict:
+    from backend.db import async_warm_pool
+    return {"connections": await async_warm_pool(WARMUP_DB_CONNECTIONS)}
+
+
+def _warm_llm_connection() -> dict:
+    from backend.openrouter_client import warm_up_connection
+    status = warm_up_connection()
+    if status in (401, 403):
+        raise RuntimeError(f"OpenRouter API key reddedildi (HTTP {status})")
+    return {"http_status": status}
+
+
+def _prime_catalog() -> dict:
+    from backend.routers.common import prime_xml_products
+    count = prime_xml_products()
+    if not count:
+        raise RuntimeError("XML katalog boş döndü")
+    return {"products": count}
+
+
+def _render_prompts() -> dict:
+    from backend.routers.chat import build_chat_system_prompt, build_chat_system_prompt_en
+    return {
+        "chat_system_prompt_chars": len(build_chat_system_prompt()),
+        "chat_system_prompt_en_chars": len(build_chat_system_prompt_en()),
+    }
+
+
+def _load_widget_assets() -> dict:
+    from backend.widget_assets import widget_assets
+    return {"files": widget_assets.load()}
+
+
+# (isim, fonksiyon, zorunlu mu)
+STEPS = [
+    ("db", _warm_db, True),
+    ("db_async", _warm_async_db, True),
+    ("llm_connection", _warm_llm_connection, False),
+    ("catalog", _prime_catalog, False),
+    ("prompts", _render_prompts, False),
+    ("widget_assets", _load_widget_assets, False),
+]
+
+
+async def _run_step(name: str, fn, required: bool):
+    start = time.perf_counter()
+    try:
+        if asyncio.iscoroutinefunction(fn):
+            result = await asyncio.wait_for(fn(), WARMUP_STEP_TIMEOUT_S)
+        else:
+            result = await asyncio.wait_for(asyncio.to_thread(fn), WARMUP_STEP_TIMEOUT_S)
+        entry = {"ok": True, **(result or {})}
+    except Exception as e:
+        error = "timeout" if isinstance(e, asyncio.TimeoutError) else f"{type(e).__name__}: {e}"
+        entry = {"ok": False, "required": required, "error": error[:300]}
+        (logger.error if required else logger.warning)(f"Warm-up adımı başarısız: {name}: {error}")
+    entry["ms"] = round((time.perf_counter() - start) * 1000, 1)
+    state.steps[name] = entry
+
+
+async def run_warmup():
+    """Adımlar paralel koşar; bitince status ready (veya zorunlu adım düştüyse failed) olur"""
+    state.status = "warming"
+    state.started_at = time.time()
+    start = time.perf_counter()
+    await asyncio.gather(*(_run_step(name, fn, required) for name, fn, required in STEPS))
+    state.duration_ms = round((time.perf_counter() - start) * 1000, 1)
+    failed_required = [name for name, _, required in STEPS if required and not state.steps[name]["ok"]]
+    if state.status == "draining":
+        return
+    state.status = "failed" if failed_required else "ready"
+    logger.info(f"Warm-up bitti: {state.status} ({state.duration_ms} ms)", extra={"steps": state.steps})
+
+
+_task: asyncio.Task | None = None
+
+
+def start_warmup():
+    """Startup hook'undan (event loop içinde) çağrılır; warm-up'ı arka plan task'ı olarak başlatır"""
+    global _task
+    if not WARMUP_ENABLED:
+        state.status = "ready"
+        return
+    _task = asyncio.get_running_loop().create_task(run_warmup())
+
+
+def mark_draining():
+    """Shutdown başında: /ready 503 dönsün ki load balancer yeni istek yollamasın"""
+    state.status = "draining"
@@ -0,0 +1,183 @@
+"""Widget asset pipeline: backend/widget dosyaları bellekten servis edilir.
+
+Her dosya bir kez okunur; JS/CSS (rjsmin/rcssmin kuruluysa) minify edilir,
+içerik hash'i ile strong ETag ve fingerprint'li isim
+(longo-health-widget.<hash>.js) üretilir, metin asset'leri için gzip ve
+brotli (brotli paketi varsa) varyantları önceden sıkıştırılır. Asset'ler
+birbirine verdikleri /widget/... referanslarında fingerprint'li isimlere
+yeniden yazılır; böylece görsel de immutable cache'lenebilir.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from backend.config import WIDGET_MINIFY
+from backend.log_utils import get_logger
+
+logger = get_logger("widget_assets")
+
+WIDGET_DIR = os.path.join(os.path.dirname(__file__), "widget")
+_COMPRESSIBLE = {".js", ".css", ".html", ".svg", ".json"}
+_MIN_COMPRESS_BYTES = 1024
+# Referans veren dosyalar en son işlenir: önce görseller, sonra CSS, JS, en son HTML
+_ORDER = {".css": 1, ".js": 2, ".html": 3}
+_FINGERPRINT_RE = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{10})(?P<ext>\.[^.]+)$")
+_HTML_REF_RE = re.compile(r'(<(?:script|link|img)\b[^>]*?\b(?:src|href)="[^"]*?/widget/)([^"/?#]+)(")')
+
+try:
+    import brotli
+except ImportError:  # Opsiyonel: yoksa sadece gzip
+    brotli = None
+
+
+def _minify(name: str, text: str) -> str:
+    if not WIDGET_MINIFY:
+        return text
+    try:
+        if name.endswith(".js"):
+            import rjsmin
+            return rjsmin.jsmin(text)
+        if name.endswith(".css"):
+            import rcssmin
+            return rcssmin.cssmin(text)
+    except ImportError:
+        pass
+    return text
+
+
+def _content_type(name: str) -> str:
+    if name.endswith(".js"):
+        return "text/javascript; charset=utf-8"
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type in ("application/json", "image/svg+xml"):
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+class Asset:
+    __slots__ = ("name", "fingerprinted", "content_type", "etag", "body", "variants")
+
+    def __init__(self, name: str, body: bytes, compress: bool):
+        self.name = name
+        self.body = body
+        self.content_type = _content_type(name)
+        digest = hashlib.sha256(body).hexdigest()
+        stem, ext = os.path.splitext(name)
+        self.fingerprinted = f"{stem}.{digest[:10]}{ext}"
+        self.etag = f'"{digest[:32]}"'
+        # encoding -> (gövde, etag); strong ETag temsil (encoding) başına ayrı olmalı
+        self.variants: dict[str, tuple[bytes, str]] = {}
+        if compress and len(body) >= _MIN_COMPRESS_BYTES:
+            if brotli is not None:
+                self.variants["br"] = (brotli.compress(body, quality=11), f'"{digest[:32]}-br"')
+            self.variants["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest[:32]}-gz"')
+
+    def etags(self) -> set[str]:
+        return {self.etag} | {etag for _, etag in self.variants.values()}
+
+
+class AssetStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._assets: dict[str, Asset] | None = None
+        self._by_fingerprint: dict[str, Asset] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> int:
+        """Dosyaları oku, işle, hash'le (startup warm-up'ında; ilk istekte de lazy çağrılır)"""
+        names = sorted(
+            (n for n in os.listdir(self.directory) if os.path.isfile(os.path.join(self.directory, n))),
+            key=lambda n: (_ORDER.get(os.path.splitext(n)[1], 0), n),
+        )
+        assets: dict[str, Asset] = {}
+        by_fingerprint: dict[str, Asset] = {}
+        for name in names:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                raw = f.read()
+            ext = os.path.splitext(name)[1]
+            if ext in _ORDER:
+                text = raw.decode("utf-8")
+                if ext in (".js", ".css"):
+                    text = _minify(name, text)
+                    # Daha önce işlenmiş asset referanslarını (ör. /widget/longo.jpeg) fingerprint'li isme çevir
+                    for ref in assets.values():
+                        text = text.replace(f"/widget/{ref.name}", f"/widget/{ref.fingerprinted}")
+                else:
+                    # HTML: sadece gerçek tag'ler; &lt;script ...&gt; kod örnekleri kararlı URL'de kalsın
+                    text = _HTML_REF_RE.sub(
+                        lambda m: m.group(1) + (assets[m.group(2)].fingerprinted if m.group(2) in assets else m.group(2)) + m.group(3),
+                        text,
+                    )
+                raw = text.encode("utf-8")
+            asset = Asset(name, raw, compress=ext in _COMPRESSIBLE)
+            assets[name] = asset
+            by_fingerprint[asset.fingerprinted] = asset
+        with self._lock:
+            self._assets = assets
+            self._by_fingerprint = by_fingerprint
+        logger.info(f"Widget asset'leri yüklendi: {len(assets)} dosya", extra={"brotli": brotli is not None})
+        return len(assets)
+
+    def _ensure_loaded(self):
+        if self._assets is None:
+            with self._lock:
+                loaded = self._assets is not None
+            if not loaded:
+                self.load()
+
+    def resolve(self, filename: str) -> tuple[Asset | None, bool, bool]:
+        """(asset, fingerprint'li mi, eski fingerprint mi)"""
+        self._ensure_loaded()
+        asset = self._by_fingerprint.get(filename)
+        if asset is not None:
+            return asset, True, False
+        asset = self._assets.get(filename)
+        if asset is not None:
+            return asset, False, False
+        # Önceki deploy'un hash'i: içerik değişti, güncel fingerprint'e yönlendir
+        m = _FINGERPRINT_RE.match(filename)
+        if m:
+            asset = self._assets.get(m.group("stem") + m.group("ext"))
+            if asset is not None:
+                return asset, True, True
+        return None, False, False
+
+    def manifest(self) -> dict[str, str]:
+        self._ensure_loaded()
+        return {name: f"/widget/{asset.fingerprinted}" for name, asset in self._assets.items()}
+
+
+def choose_encoding(accept_encoding: str | None, asset: Asset) -> str | None:
+    """Accept-Encoding'e göre br > gzip > identity (q=0 olanlar hariç)"""
+    if not accept_encoding or not asset.variants:
+        return None
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token.strip()] = q
+    for encoding in ("br", "gzip"):
+        if encoding in asset.variants and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def etag_matches(if_none_match: str | None, asset: Asset) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etags = asset.etags()
+    # If-None-Match weak karşılaştırma kullanır: W/ önekini yok say
+    return any(tag.strip().removeprefix("W/") in etags for tag in if_none_match.split(","))
+
+
+widget_assets = AssetStore(WIDGET_DIR)
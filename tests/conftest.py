@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# backend.config import anında API anahtarı ister; testler LLM çağırmaz
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "test.db"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+import time
+
+from backend.ai_log_writer import AIMessageWriter
+
+
+def _writer(monkeypatch, max_queue=2):
+    writer = AIMessageWriter(batch_size=10, flush_ms=250, max_queue=max_queue, enqueue_timeout=0.5)
+    # Writer thread çalışmasın: kuyruk dolu kalsın
+    monkeypatch.setattr(writer, "start", lambda: None)
+    written = []
+
+    def slow_write(rows):
+        time.sleep(0.3)
+        written.append((threading.current_thread(), len(rows)))
+
+    monkeypatch.setattr(writer, "_write", slow_write)
+    return writer, written
+
+
+def test_full_queue_does_not_block_event_loop(monkeypatch):
+    writer, written = _writer(monkeypatch)
+
+    async def handler():
+        started = time.perf_counter()
+        writer.enqueue_many([{"external_user_id": "u", "message_type": "chat"} for _ in range(5)])
+        elapsed = time.perf_counter() - started
+        loop_thread = threading.current_thread()
+        await asyncio.sleep(0.5)
+        return elapsed, loop_thread
+
+    elapsed, loop_thread = asyncio.run(handler())
+
+    assert elapsed < 0.1
+    assert writer.stats["enqueued"] == 2
+    assert writer.stats["offloaded"] == 3
+    assert written and all(thread is not loop_thread for thread, _ in written)
+
+
+def test_full_queue_outside_loop_writes_in_caller(monkeypatch):
+    writer, written = _writer(monkeypatch, max_queue=1)
+
+    writer.enqueue_many([{"external_user_id": "u", "message_type": "chat"} for _ in range(2)])
+
+    assert writer.stats["sync_fallback"] == 1
+    assert written == [(threading.current_thread(), 1)]
@@ -0,0 +1,36 @@
+from backend import orchestrator
+from backend.prompt_layout import layout_messages
+
+ENGLISH_QUESTION = "What can you recommend for my sleep and how should we take it"
+
+
+def _capture(monkeypatch):
+    sent = []
+
+    def fake_call(model, messages, temperature=None, max_tokens=None):
+        sent.append(messages)
+        return {"content": "Here is a helpful and sufficiently long answer about sleep support."}
+
+    monkeypatch.setattr(orchestrator, "call_chat_model", fake_call)
+    monkeypatch.setattr(orchestrator, "is_valid_chat", lambda text: True)
+    return sent
+
+
+def test_language_comes_from_user_message_not_last_block(monkeypatch):
+    sent = _capture(monkeypatch)
+    # Son tur bloğu Türkçe iskelet (ürün listesi); dil kullanıcının ham mesajından algılanmalı
+    messages = layout_messages(
+        "Sen bir sağlık asistanısın.", [], [ENGLISH_QUESTION, "🚨 MEVCUT ÜRÜNLER (2 ürün):\n1. Magnezyum\n2. Çinko"],
+    )
+
+    orchestrator.parallel_chat(messages, ENGLISH_QUESTION)
+
+    assert orchestrator.SYSTEM_HEALTH_ENGLISH in sent[0][0]["content"]
+
+
+def test_language_defaults_to_last_message(monkeypatch):
+    sent = _capture(monkeypatch)
+
+    orchestrator.parallel_chat(layout_messages("Sen bir sağlık asistanısın.", [], ["Uykum için ne önerirsin?"]))
+
+    assert orchestrator.SYSTEM_HEALTH_ENGLISH not in sent[0][0]["content"]
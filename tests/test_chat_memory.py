@@ -0,0 +1,37 @@
+from backend.config import CHAT_MEMORY_WINDOW
+from backend.routers import chat
+
+
+def _rows(count):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"mesaj-{i}"}
+        for i in range(count)
+    ]
+
+
+def _raw_turns(prompt):
+    previous = prompt.split("=== ÖNCEKİ KONUŞMA ===")[1].split("=== ŞİMDİKİ SORU ===")[0]
+    return [line for line in previous.splitlines() if line.startswith(("KULLANICI:", "ASISTAN:"))]
+
+
+def test_raw_turns_capped_at_window_when_memory_active(monkeypatch):
+    monkeypatch.setattr(chat, "MEMORY_ACTIVE", True)
+    rows = _rows(CHAT_MEMORY_WINDOW + 12)
+
+    turns = _raw_turns(chat.build_previous_turns_message(rows, "peki bunu nasıl kullanayım?"))
+
+    assert len(turns) == CHAT_MEMORY_WINDOW
+    assert turns[-1].endswith(rows[-1]["content"])
+
+
+def test_raw_turns_uncapped_below_window(monkeypatch):
+    monkeypatch.setattr(chat, "MEMORY_ACTIVE", True)
+    rows = _rows(max(1, CHAT_MEMORY_WINDOW - 1))
+
+    assert len(_raw_turns(chat.build_previous_turns_message(rows, "devam"))) == len(rows)
+
+
+def test_memory_disabled_keeps_last_three(monkeypatch):
+    monkeypatch.setattr(chat, "MEMORY_ACTIVE", False)
+
+    assert len(_raw_turns(chat.build_previous_turns_message(_rows(10), "devam"))) == 3
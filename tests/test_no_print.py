@@ -0,0 +1,23 @@
+import ast
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+# Benchmark'lar CLI raporu basar; uygulama kodu structured logger kullanır (backend/log_utils.py)
+EXCLUDED = {BACKEND / "benchmarks"}
+
+
+def _print_calls(path):
+    tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+    return [
+        node.lineno for node in ast.walk(tree)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "print"
+    ]
+
+
+def test_no_print_outside_benchmarks():
+    offenders = []
+    for path in sorted(BACKEND.rglob("*.py")):
+        if any(excluded in path.parents for excluded in EXCLUDED):
+            continue
+        offenders.extend(f"{path.relative_to(BACKEND.parent)}:{line}" for line in _print_calls(path))
+    assert not offenders, "print() yerine get_logger kullanın: " + ", ".join(offenders)